@@ -0,0 +1,399 @@
+#! /usr/bin/env python
+
+'''
+Simulate many imaging exposures, such as all of the exposures in a
+proposal described by the yaml files from yaml_generator, using a pool
+of worker processes.
+
+Exposures that share an instrument, detector, filter, pupil and set of
+reference files are grouped together, and each group is simulated by a
+single worker. Workers keep large inputs such as PSF libraries and SIAF
+instances in memory between exposures (see mirage.utils.resident_assets),
+along with data from reference files (see
+mirage.utils.reference_registry), so that these are read once per group
+rather than once per exposure. Exposures that fail are retried, and a
+summary of all exposures is logged and optionally saved.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.batch_simulator import BatchSim
+        batch = BatchSim('my_yaml_directory/', processes=4, summary_file='summary.csv')
+        summary = batch.create()
+
+    or run from the command line:
+    ::
+        python batch_simulator.py my_yaml_directory/ --processes 4
+'''
+
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+import traceback
+
+from astropy.io import ascii
+from astropy.table import Table
+import numpy as np
+import yaml
+
+from .imaging_simulator import ImgSim
+from .logging import logging_functions
+from .utils import resident_assets
+from .utils.constants import DISPERSED_MODES, LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME, TSO_MODES
+
+
+classpath = os.path.dirname(__file__)
+log_config_file = os.path.join(classpath, 'logging', LOG_CONFIG_FILENAME)
+logging_functions.create_logger(log_config_file, STANDARD_LOGFILE_NAME)
+
+# Observing modes that cannot be simulated with ImgSim
+UNSUPPORTED_MODES = DISPERSED_MODES + TSO_MODES + ['soss']
+
+
+class BatchSim():
+    """Class to simulate a batch of exposures
+
+    Parameters
+    ----------
+    yaml_files : str or list
+        Yaml files to simulate. This can be a directory, in which case all
+        yaml files within it are simulated, a list of yaml files, or an
+        ascii table containing a ``yamlfile`` column, such as the table
+        saved by ``yaml_generator.SimInput``
+
+    yaml_dir : str
+        Directory containing yaml files listed in a table without a full
+        path. If None, the directory containing the table is used.
+
+    processes : int
+        Number of worker processes used to simulate exposures. If 1, all
+        exposures are simulated in this process.
+
+    max_attempts : int
+        Maximum number of times to try simulating each exposure
+
+    summary_file : str
+        Name of a csv file in which to save the summary of all exposures.
+        If None, the summary is not saved.
+
+    concurrent_dark_prep : bool
+        Passed to ``ImgSim``. If True, the dark of each exposure is
+        prepared while its seed image is created.
+
+    offline : bool
+        Passed to ``ImgSim``
+    """
+    def __init__(self, yaml_files=None, yaml_dir=None, processes=1, max_attempts=2, summary_file=None,
+                 concurrent_dark_prep=False, offline=False):
+        self.yaml_files = yaml_files
+        self.yaml_dir = yaml_dir
+        self.processes = processes
+        self.max_attempts = max_attempts
+        self.summary_file = summary_file
+        self.concurrent_dark_prep = concurrent_dark_prep
+        self.offline = offline
+
+    def create(self):
+        """Simulate all exposures
+
+        Returns
+        -------
+        summary : astropy.table.Table
+            Table listing the yaml file, exposure group, status ('complete',
+            'failed' or 'skipped'), number of attempts, run time in seconds
+            and any error for each exposure
+        """
+        self.logger = logging.getLogger('mirage.batch_simulator')
+        self.logger.info('\n\nRunning batch_simulator....\n')
+
+        paramfiles = self.find_yaml_files()
+        groups = self.group_exposures(paramfiles)
+        self.logger.info('Simulating {} exposures in {} groups using {} processes'
+                         .format(len(paramfiles), len(groups), self.processes))
+
+        group_numbers = {}
+        for number, group_files in enumerate(groups.values()):
+            for paramfile in group_files:
+                group_numbers[paramfile] = number
+        tasks = self.make_tasks(groups)
+
+        if self.processes > 1:
+            results = self.run_pool(tasks, len(paramfiles))
+        else:
+            results = []
+            resident_assets.enable()
+            try:
+                for task in tasks:
+                    results.extend(simulate_exposures(task, self.max_attempts, self.concurrent_dark_prep,
+                                                      self.offline))
+                    self.log_progress(results, len(paramfiles))
+            finally:
+                resident_assets.disable()
+
+        # Report the results in the order of the input files
+        order = {paramfile: index for index, paramfile in enumerate(paramfiles)}
+        results = sorted(results, key=lambda result: order[result['yamlfile']])
+        summary = Table(rows=[[result['yamlfile'], group_numbers[result['yamlfile']], result['status'],
+                               result['attempts'], result['time'], result['error']] for result in results],
+                        names=['yamlfile', 'group', 'status', 'attempts', 'time', 'error'],
+                        dtype=[str, int, str, int, float, str])
+
+        for status in ['complete', 'skipped', 'failed']:
+            self.logger.info('{} exposures {}'.format(np.sum(summary['status'] == status), status))
+        for row in summary[summary['status'] == 'failed']:
+            self.logger.error('Failed: {}\n{}'.format(row['yamlfile'], row['error']))
+
+        if self.summary_file is not None:
+            ascii.write(summary, self.summary_file, format='csv', overwrite=True)
+            self.logger.info('Summary of exposures saved to {}'.format(self.summary_file))
+        self.logger.info('\nBatch simulator complete')
+        return summary
+
+    def exposure_group(self, paramfile):
+        """Find the values that define the group an exposure belongs to
+
+        Parameters
+        ----------
+        paramfile : str
+            Name of the exposure's yaml file
+
+        Returns
+        -------
+        group : tuple
+            Instrument, detector, filter and pupil names, followed by the
+            reference file entries of the yaml file
+        """
+        with open(paramfile, 'r') as infile:
+            params = yaml.safe_load(infile)
+        detector = params['Readout']['array_name'].split('_')[0]
+        reffiles = tuple(sorted((key, str(value)) for key, value in params['Reffiles'].items()))
+        return (params['Inst']['instrument'].lower(), detector, params['Readout']['filter'],
+                params['Readout']['pupil']) + reffiles
+
+    def find_yaml_files(self):
+        """Create the list of yaml files to simulate from self.yaml_files
+
+        Returns
+        -------
+        paramfiles : list
+            Full paths of the yaml files
+        """
+        if isinstance(self.yaml_files, str) and os.path.isdir(self.yaml_files):
+            paramfiles = sorted(os.path.join(self.yaml_files, filename) for filename in os.listdir(self.yaml_files)
+                                if filename.endswith('.yaml'))
+        elif isinstance(self.yaml_files, str):
+            table = ascii.read(self.yaml_files)
+            yaml_dir = self.yaml_dir
+            if yaml_dir is None:
+                yaml_dir = os.path.dirname(self.yaml_files)
+            paramfiles = [os.path.join(yaml_dir, str(filename)) for filename in table['yamlfile']]
+        else:
+            paramfiles = list(self.yaml_files)
+
+        if len(paramfiles) == 0:
+            raise ValueError('No yaml files found in {}'.format(self.yaml_files))
+        return [os.path.abspath(paramfile) for paramfile in paramfiles]
+
+    def group_exposures(self, paramfiles):
+        """Group exposures that share an instrument, detector, filter,
+        pupil and reference files
+
+        Parameters
+        ----------
+        paramfiles : list
+            Names of the yaml files of the exposures
+
+        Returns
+        -------
+        groups : collections.OrderedDict
+            Lists of yaml files, keyed by the values from exposure_group()
+        """
+        groups = OrderedDict()
+        for paramfile in paramfiles:
+            groups.setdefault(self.exposure_group(paramfile), []).append(paramfile)
+        return groups
+
+    def log_progress(self, results, total):
+        """Log the number of exposures that have been simulated
+
+        Parameters
+        ----------
+        results : list
+            Results from simulate_exposures() for all exposures simulated
+            so far
+
+        total : int
+            Total number of exposures
+        """
+        failed = len([result for result in results if result['status'] == 'failed'])
+        self.logger.info('Batch progress: {} of {} exposures done, {} failed'.format(len(results), total, failed))
+
+    def make_tasks(self, groups):
+        """Split groups of exposures into tasks for the worker processes.
+        Large groups are split so that there are enough tasks to keep all
+        processes busy.
+
+        Parameters
+        ----------
+        groups : collections.OrderedDict
+            Groups of yaml files, from group_exposures()
+
+        Returns
+        -------
+        tasks : list
+            Lists of yaml files, each of which is simulated by one worker
+        """
+        total = sum(len(group_files) for group_files in groups.values())
+        max_task_size = max(int(np.ceil(total / self.processes)), 1)
+        tasks = []
+        for group_files in groups.values():
+            for start in range(0, len(group_files), max_task_size):
+                tasks.append(group_files[start:start + max_task_size])
+
+        # Start the largest tasks first
+        return sorted(tasks, key=len, reverse=True)
+
+    def run_pool(self, tasks, total):
+        """Simulate exposures using a pool of worker processes. If a worker
+        process ends unexpectedly (e.g. because it ran out of memory), the
+        pool is restarted, and the unfinished tasks are run again.
+
+        Parameters
+        ----------
+        tasks : list
+            Lists of yaml files, from make_tasks()
+
+        total : int
+            Total number of exposures
+
+        Returns
+        -------
+        results : list
+            Results from simulate_exposures() for all exposures
+        """
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing.get_context()
+
+        results = []
+        remaining = list(tasks)
+        for attempt in range(1, self.max_attempts + 1):
+            if len(remaining) == 0:
+                break
+            unfinished = []
+            with ProcessPoolExecutor(max_workers=self.processes, mp_context=context,
+                                     initializer=resident_assets.enable) as pool:
+                futures = {pool.submit(simulate_exposures, task, self.max_attempts, self.concurrent_dark_prep,
+                                       self.offline): task for task in remaining}
+                for future in as_completed(futures):
+                    try:
+                        results.extend(future.result())
+                        self.log_progress(results, total)
+                    except BrokenProcessPool:
+                        unfinished.append(futures[future])
+            if len(unfinished) > 0:
+                self.logger.warning('A worker process ended unexpectedly. {} tasks will be restarted.'
+                                    .format(len(unfinished)))
+            remaining = unfinished
+
+        for task in remaining:
+            for paramfile in task:
+                results.append({'yamlfile': paramfile, 'status': 'failed', 'attempts': self.max_attempts,
+                                'time': 0., 'error': 'Worker process ended unexpectedly'})
+        return results
+
+    def add_options(self, parser=None, usage=None):
+        if parser is None:
+            parser = argparse.ArgumentParser(usage=usage, description="Simulate a batch of imaging exposures.")
+        parser.add_argument("yaml_files", help='Directory of yaml files, or table of yaml files with a yamlfile column')
+        parser.add_argument("--yaml_dir", help='Directory containing the yaml files listed in the table', default=None)
+        parser.add_argument("--processes", help='Number of worker processes', type=int, default=1)
+        parser.add_argument("--max_attempts", help='Maximum number of attempts for each exposure', type=int, default=2)
+        parser.add_argument("--summary_file", help='Name of csv file in which to save the summary', default=None)
+        parser.add_argument("--concurrent_dark_prep", help="Prepare each dark while its seed image is created", action='store_true')
+        return parser
+
+
+def simulate_exposures(paramfiles, max_attempts, concurrent_dark_prep=False, offline=False):
+    """Simulate a list of exposures one after another, trying each up to
+    ``max_attempts`` times. Large inputs shared by the exposures are kept
+    in memory if mirage.utils.resident_assets is enabled. The log of each
+    exposure is saved in the ``mirage_logs`` subdirectory of its output
+    directory.
+
+    Parameters
+    ----------
+    paramfiles : list
+        Names of the exposures' yaml files
+
+    max_attempts : int
+        Maximum number of times to try simulating each exposure
+
+    concurrent_dark_prep : bool
+        Passed to ``ImgSim``
+
+    offline : bool
+        Passed to ``ImgSim``
+
+    Returns
+    -------
+    results : list
+        For each exposure, a dictionary containing the 'yamlfile', 'status',
+        number of 'attempts', run 'time' in seconds, and any 'error'
+    """
+    logger = logging.getLogger('mirage.batch_simulator.simulate_exposures')
+    results = []
+    for paramfile in paramfiles:
+        result = {'yamlfile': paramfile, 'status': 'failed', 'attempts': 0, 'time': 0., 'error': ''}
+        with open(paramfile, 'r') as infile:
+            mode = yaml.safe_load(infile)['Inst']['mode'].lower()
+        if mode in UNSUPPORTED_MODES:
+            result['status'] = 'skipped'
+            result['error'] = '{} mode exposures cannot be simulated by batch_simulator'.format(mode)
+            results.append(result)
+            continue
+
+        # Worker processes share the working directory, so each exposure
+        # is logged to its own file rather than to STANDARD_LOGFILE_NAME,
+        # and that file is then copied to the exposure's mirage_logs
+        # directory, replacing the copies made by ImgSim
+        start = time.time()
+        with tempfile.TemporaryDirectory() as log_dir:
+            exposure_log = os.path.join(log_dir, os.path.basename(paramfile).replace('.yaml', '.log'))
+            with logging_functions.log_to_file(exposure_log):
+                while result['attempts'] < max_attempts:
+                    result['attempts'] += 1
+                    try:
+                        simulator = ImgSim(paramfile=paramfile, offline=offline,
+                                           concurrent_dark_prep=concurrent_dark_prep)
+                        simulator.create()
+                        result['status'] = 'complete'
+                        result['error'] = ''
+                        break
+                    except Exception:
+                        result['error'] = traceback.format_exc()
+                        logger.warning('Attempt {} of {} to simulate {} failed'.format(result['attempts'],
+                                                                                       max_attempts, paramfile))
+            logging_functions.move_logfile_to_standard_location(paramfile, exposure_log)
+        result['time'] = time.time() - start
+        results.append(result)
+    return results
+
+
+if __name__ == '__main__':
+
+    usagestring = 'USAGE: batch_simulator.py yaml_directory --processes 4'
+
+    batch = BatchSim()
+    parser = batch.add_options(usage=usagestring)
+    args = parser.parse_args(namespace=batch)
+    batch.create()
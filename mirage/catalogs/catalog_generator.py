@@ -29,6 +29,7 @@ from astropy.io import ascii
 from astropy.table import Table, Column
 import numpy as np
 
+from mirage.catalogs.utils import read_catalog, write_catalog
 from mirage.logging import logging_functions
 from mirage.utils.constants import LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME
 from mirage.utils.utils import standardize_filters, make_mag_column_names
@@ -308,13 +309,15 @@ class PointSourceCatalog():
         self.table = pad_table_comments(tab)
 
     def save(self, output_name):
-        """Write out the catalog to an ascii file
+        """Write out the catalog to an ascii file, or to a FITS binary
+        table if ``output_name`` has a FITS extension (e.g. ``.fits``)
 
         Parameters
         ----------
-        something
+        output_name : str
+            Name of the catalog file
         """
-        self.table.write(output_name, format='ascii', overwrite=True)
+        write_catalog(self.table, output_name)
 
 
 class GalaxyCatalog(PointSourceCatalog):
@@ -890,13 +893,13 @@ def add_velocity_columns(input_table, ra_velocities, dec_velocities, velocity_un
 
 
 def cat_from_file(filename, catalog_type='point_source'):
-    """Read in a Mirage-formatted ascii catalog file and place into an
-    instance of a catalog object
+    """Read in a Mirage-formatted ascii or FITS binary table catalog file
+    and place into an instance of a catalog object
 
     Parameters
     ----------
     filename : str
-        Name of ascii catalog to be read in
+        Name of catalog to be read in
 
     catalog_type : str
         Type of source catalog. Allowed values are:
@@ -914,7 +917,7 @@ def cat_from_file(filename, catalog_type='point_source'):
         raise ValueError(("Input catalog type {} is not one of the allowed types: {}"
                          .format(catalog_type, allowed_types)))
 
-    cat_table = ascii.read(filename)
+    cat_table = read_catalog(filename)
 
     if 'position_pixels' in cat_table.meta['comments'][0:4]:
         xpos = 'x'
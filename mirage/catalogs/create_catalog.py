@@ -27,6 +27,7 @@ from mirage.apt.apt_inputs import get_filters, ra_dec_update
 from mirage.catalogs.catalog_generator import PointSourceCatalog, GalaxyCatalog, \
     ExtendedCatalog, MovingPointSourceCatalog, MovingExtendedCatalog, \
     MovingSersicCatalog
+from mirage.catalogs.utils import read_catalog
 from mirage.logging import logging_functions
 from mirage.utils.constants import FGS_FILTERS, NIRCAM_FILTERS, NIRCAM_PUPIL_WHEEL_FILTERS, \
     NIRISS_FILTERS, NIRISS_PUPIL_WHEEL_FILTERS, NIRCAM_2_FILTER_CROSSES, NIRCAM_WL8_CROSSING_FILTERS, \
@@ -824,7 +825,7 @@ def johnson_catalog_to_mirage_catalog(catalog_file, filters, ra_column_name='RAJ
         all_filters.extend(filt_list)
 
     # Read in the input catalog
-    catalog = ascii.read(catalog_file)
+    catalog = read_catalog(catalog_file)
 
     # Quick check to be sure required columns are present
     req_cols = ['K', 'Av', ra_column_name, dec_column_name]
@@ -2078,7 +2079,7 @@ def crop_besancon(ra, dec, box_width, catalog_file, ra_column_name='RAJ2000', de
     max_dec = dec + box_width / 2
 
     # Read in input catalog
-    catalog = ascii.read(catalog_file)
+    catalog = read_catalog(catalog_file)
 
     # Check for requested columns
     if ra_column_name not in catalog.colnames:
@@ -37,6 +37,7 @@ from synphot.spectrum import SpectralElement
 from synphot.models import Empirical1D
 
 from . import hdf5_catalog
+from mirage.catalogs import utils as catalog_utils
 from mirage.logging import logging_functions
 from mirage.utils.constants import FLAMBDA_CGS_UNITS, FNU_CGS_UNITS, MEAN_GAIN_VALUES, \
                                    LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME, VEGA_SPECTRUM
@@ -484,7 +485,7 @@ def make_all_spectra(catalog_files, input_spectra=None, input_spectra_file=None,
         flambda_output_catalog = os.path.join(cat_dir, outbase)
 
         catalog, filter_info = add_flam_columns(ascii_catalog, mag_sys)
-        catalog.write(flambda_output_catalog, format='ascii', overwrite=True)
+        catalog_utils.write_catalog(catalog, flambda_output_catalog)
         logger.info('Catalog updated with f_lambda columns, saved to: {}'.format(flambda_output_catalog))
 
         # Renormalize
@@ -549,7 +550,7 @@ def read_catalog(filename):
     Parameters
     ----------
     filename : str
-        Name of (ascii) catalog file
+        Name of ascii or FITS binary table catalog file
 
     Returns
     -------
@@ -560,7 +561,7 @@ def read_catalog(filename):
         Magnitude system (e.g. 'abmag', 'stmag', 'vegamag') of the
         source magnitudes in the catalog
     """
-    catalog = ascii.read(filename)
+    catalog = catalog_utils.read_catalog(filename)
 
     # Check to be sure index column is present
     if 'index' not in catalog.colnames:
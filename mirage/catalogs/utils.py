@@ -5,9 +5,11 @@
 import os
 
 from astropy.io import ascii
+from astropy.table import Table
 import numpy as np
 from mirage.utils.constants import IMAGING_ALLOWED_CATALOGS, WFSS_ALLOWED_CATALOGS, \
-                                   TS_IMAGING_ALLOWED_CATALOGS, TS_GRISM_ALLOWED_CATALOGS
+                                   TS_IMAGING_ALLOWED_CATALOGS, TS_GRISM_ALLOWED_CATALOGS, \
+                                   BINARY_CATALOG_EXTENSIONS
 
 
 def catalog_index_check(catalogs):
@@ -32,7 +34,7 @@ def catalog_index_check(catalogs):
     min_indexes = []
     max_indexes = []
     for catalog in catalogs:
-        cat = ascii.read(catalog)
+        cat = read_catalog(catalog)
         if 'index' in cat.colnames:
             # Collect the min and max index values from each catalog
             min_val = np.min(cat['index'])
@@ -69,6 +71,35 @@ def catalog_index_check(catalogs):
     return overlaps, max_index
 
 
+def convert_catalog(input_file, output_file=None):
+    """Convert an ascii source catalog to a FITS binary table, which is
+    much faster to read for large catalogs. The columns and the comment
+    lines describing the catalog (e.g. position units and magnitude
+    system) are kept.
+
+    Parameters
+    ----------
+    input_file : str
+        Name of ascii catalog
+
+    output_file : str
+        Name of the FITS binary table to create. If None, the extension
+        of ``input_file`` is replaced by ``.fits``
+
+    Returns
+    -------
+    output_file : str
+        Name of the FITS binary table
+    """
+    if output_file is None:
+        output_file = os.path.splitext(input_file)[0] + '.fits'
+    if not is_binary_catalog(output_file):
+        raise ValueError(("{} does not have one of the extensions used for binary catalogs: {}"
+                          .format(output_file, BINARY_CATALOG_EXTENSIONS)))
+    write_catalog(read_catalog(input_file), output_file)
+    return output_file
+
+
 def determine_used_cats(obs_mode, cat_dict):
     """Return a list of the source catalogs that will be used by Mirage,
     based on the observation mode
@@ -148,13 +179,63 @@ def get_nonsidereal_catalog_name(cat_dict, target_name, instrument_name):
     return cat_file
 
 
+def is_binary_catalog(filename):
+    """Determine from its extension whether a catalog file is a FITS
+    binary table rather than an ascii table
+
+    Parameters
+    ----------
+    filename : str
+        Name of catalog file
+
+    Returns
+    -------
+    binary : bool
+        True if the catalog is a FITS binary table
+    """
+    return str(filename).lower().endswith(BINARY_CATALOG_EXTENSIONS)
+
+
+def read_catalog(filename, **kwargs):
+    """Read in a source catalog saved as either an ascii table or, if the
+    file has one of the ``BINARY_CATALOG_EXTENSIONS``, a FITS binary table.
+    The comment lines at the top of ascii catalogs are kept in the COMMENT
+    cards of binary catalogs, and both are returned in
+    ``catalog.meta['comments']``.
+
+    Parameters
+    ----------
+    filename : str
+        Name of catalog file
+
+    kwargs : dict
+        Keyword arguments passed to ``astropy.io.ascii.read`` for ascii
+        catalogs
+
+    Returns
+    -------
+    catalog : astropy.table.Table
+        Catalog contents
+    """
+    if not is_binary_catalog(filename):
+        return ascii.read(filename, **kwargs)
+
+    catalog = Table.read(filename, format='fits')
+
+    # Strings are read in as bytes
+    catalog.convert_bytestring_to_unicode()
+    if 'comments' in catalog.meta:
+        catalog.meta['comments'] = list(catalog.meta['comments'])
+    return catalog
+
+
 def read_nonsidereal_catalog(filename):
     """Read in a Mirage formatted non-sidereal source catalog
 
     Paramters
     ---------
     filename : str
-        Name of ascii catalog
+        Name of ascii or FITS binary table catalog
 
     Returns
     -------
@@ -169,7 +250,7 @@ def read_nonsidereal_catalog(filename):
         True if the source velocity is given in pixels/hour.
         False if arcsec/hour
     """
-    catalog_table = ascii.read(filename, comment='#')
+    catalog_table = read_catalog(filename, comment='#')
 
     # Check to see whether the position is in x,y or ra,dec
     pixelflag = False
@@ -188,3 +269,22 @@ def read_nonsidereal_catalog(filename):
     except:
         pass
     return catalog_table, pixelflag, pixelvelflag
+
+
+def write_catalog(catalog, filename):
+    """Write out a source catalog, as a FITS binary table if the file name
+    has one of the ``BINARY_CATALOG_EXTENSIONS``, or as an ascii table
+    otherwise
+
+    Parameters
+    ----------
+    catalog : astropy.table.Table
+        Catalog contents
+
+    filename : str
+        Name of catalog file
+    """
+    if is_binary_catalog(filename):
+        catalog.write(filename, format='fits', overwrite=True)
+    else:
+        catalog.write(filename, format='ascii', overwrite=True)
@@ -0,0 +1,220 @@
+#! /usr/bin/env python
+
+"""This module contains ``LinearizedDarkCache``, an on-disk cache of dark
+current ramps that have been linearized by the JWST calibration pipeline,
+reordered into a readout pattern and cropped to a subarray, along with
+their superbias and reference pixel signals and zeroframes.
+
+Each entry is saved as a FITS file whose name is a key created from the
+contents of the raw dark current file and the reference files used to
+linearize it, the version of the pipeline, the CRDS context used to select
+any reference files that were not provided, and the readout pattern and
+subarray of the output. Any change to these inputs results in a new key.
+Callers must not use the cache when one of these inputs cannot be
+determined, since entries are never invalidated otherwise. Once the total
+size of the entries is larger than the size limit of the cache, the least
+recently used entries are removed.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.dark.dark_cache import LinearizedDarkCache
+        cache = LinearizedDarkCache('/path/to/cache', max_size=20.)
+        key = cache.key(dark_file, reference_files, settings)
+        entry = cache.load(key)
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from astropy.io import fits
+import numpy as np
+
+from mirage.utils import read_fits
+from mirage.utils.constants import LINEARIZED_DARK_CACHE_SIZE
+from mirage.utils.utils import file_hash
+
+
+# Header keywords holding information about the dark and the reference files
+# used to linearize it, which are needed by DarkPrep
+INFO_KEYWORDS = ['DETECTOR', 'INSTRUME', 'FASTAXIS', 'SLOWAXIS', 'R_LINEAR', 'R_MASK', 'R_SATURA', 'R_SUPERB']
+
+
+class LinearizedDarkCache():
+    def __init__(self, directory, max_size=LINEARIZED_DARK_CACHE_SIZE):
+        """Instantiate the cache
+
+        Parameters
+        ----------
+        directory : str
+            Directory in which the cached files are saved. Created if it
+            does not exist. The directory can be shared by several
+            processes.
+
+        max_size : float
+            Maximum total size, in GB, of the cached files. When this is
+            exceeded, the least recently used files are removed.
+        """
+        self.logger = logging.getLogger('mirage.dark.dark_cache')
+        self.directory = directory
+        self.max_bytes = max_size * 1e9
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, dark_file, reference_files, settings):
+        """Create the key of a linearized dark
+
+        Parameters
+        ----------
+        dark_file : str
+            Name of the raw dark current file
+
+        reference_files : dict
+            Reference files used to linearize the dark, keyed by type.
+            Values that are not existing files (e.g. 'none', where the
+            pipeline selects the file from CRDS) are used as-is.
+
+        settings : dict
+            Any other values that affect the linearized dark, such as the
+            pipeline version, readout pattern and subarray bounds. Values
+            must be convertible to JSON.
+
+        Returns
+        -------
+        key : str
+            Hexadecimal SHA-256 digest identifying the linearized dark
+        """
+        contents = {'dark': file_hash(dark_file)}
+        for name, filename in reference_files.items():
+            if os.path.isfile(str(filename)):
+                contents[name] = file_hash(filename)
+            else:
+                contents[name] = str(filename)
+        contents['settings'] = settings
+        return hashlib.sha256(json.dumps(contents, sort_keys=True, default=str).encode()).hexdigest()
+
+    def filename(self, key):
+        """Name of the file holding a cache entry
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry
+
+        Returns
+        -------
+        filename : str
+            Full path of the file
+        """
+        return os.path.join(self.directory, '{}_linearized_dark.fits'.format(key))
+
+    def load(self, key):
+        """Read an entry from the cache
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry
+
+        Returns
+        -------
+        entry : dict
+            None if the entry is not in the cache. Otherwise a dictionary
+            containing the 'data', 'sbAndRefpix', 'zeroframe' and
+            'zero_sbAndRefpix' arrays, the 'header' of the linearized dark,
+            using the keywords of read_fits.Read_fits.translate, and 'info',
+            which contains the values of INFO_KEYWORDS
+        """
+        filename = self.filename(key)
+        try:
+            with fits.open(filename, memmap=False) as hdulist:
+                entry = {'data': hdulist['SCI'].data,
+                         'sbAndRefpix': hdulist['SBANDREFPIX'].data,
+                         'zeroframe': hdulist['ZEROFRAME'].data,
+                         'zero_sbAndRefpix': hdulist['ZEROSBANDREFPIX'].data}
+                entry['info'] = {keyword: hdulist[0].header.get(keyword) for keyword in INFO_KEYWORDS}
+                entry['header'] = {keyword: hdulist['SCI'].header.get(keyword) for keyword in read_fits.Read_fits().translate}
+        except (OSError, KeyError):
+            return None
+
+        # Mark the entry as recently used
+        os.utime(filename)
+        self.logger.info('Using cached linearized dark {}'.format(filename))
+        return entry
+
+    def save(self, key, linear_dark, zero_model, info):
+        """Add an entry to the cache, and remove the least recently used
+        entries if the cache is too large
+
+        Parameters
+        ----------
+        key : str
+            Key of the entry
+
+        linear_dark : read_fits.Read_fits
+            Linearized dark current, with data and sbAndRefpix arrays
+
+        zero_model : read_fits.Read_fits
+            Linearized zeroframe, with data and sbAndRefpix arrays
+
+        info : dict
+            Values of INFO_KEYWORDS to save with the entry
+        """
+        primary = fits.PrimaryHDU()
+        for keyword in INFO_KEYWORDS:
+            if info[keyword] is not None:
+                primary.header[keyword] = info[keyword]
+
+        # The header of the linearized dark is saved in the SCI extension.
+        # Values of None are not saved, and are restored as None since
+        # the keyword is missing
+        science = fits.ImageHDU(np.asarray(linear_dark.data), name='SCI')
+        for keyword, value in linear_dark.header.items():
+            if value is not None:
+                science.header[keyword] = value
+
+        hdulist = fits.HDUList([primary, science,
+                                fits.ImageHDU(np.asarray(linear_dark.sbAndRefpix), name='SBANDREFPIX'),
+                                fits.ImageHDU(np.asarray(zero_model.data), name='ZEROFRAME'),
+                                fits.ImageHDU(np.asarray(zero_model.sbAndRefpix), name='ZEROSBANDREFPIX')])
+
+        # Write to a temporary file first, so that other processes never
+        # read a partially written entry
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(handle)
+        try:
+            hdulist.writeto(temporary, overwrite=True)
+            os.replace(temporary, self.filename(key))
+        finally:
+            if os.path.isfile(temporary):
+                os.remove(temporary)
+        self.logger.info('Linearized dark saved to cache as {}'.format(self.filename(key)))
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the total size of
+        the cache is within its limit
+        """
+        entries = []
+        for filename in os.listdir(self.directory):
+            if filename.endswith('_linearized_dark.fits'):
+                path = os.path.join(self.directory, filename)
+                try:
+                    status = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, path))
+
+        total = sum(entry[1] for entry in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.logger.info('Removed {} from the linearized dark cache'.format(path))
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -39,10 +39,12 @@ from astropy.io import fits, ascii
 import astropy.units as u
 
 import mirage
+from mirage.dark.dark_cache import LinearizedDarkCache
 from mirage.logging import logging_functions
+from mirage.ramp_generator.ramp_engine import average_rapid_groups
 from mirage.utils import read_fits, utils, siaf_interface
 from mirage.utils.constants import FGS1_DARK_SEARCH_STRING, FGS2_DARK_SEARCH_STRING, \
-                                   LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME
+                                   LINEARIZED_DARK_CACHE_SIZE, LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME
 from mirage.utils.file_splitting import find_file_splits
 from mirage.utils.timer import Timer
 from mirage.reference_files import crds_tools
@@ -93,6 +95,13 @@ class DarkPrep():
         # Check that CRDS-related environment variables are set correctly
         self.crds_datadir = crds_tools.env_variables()
 
+        # Data type of reordered darks. See check_params()
+        self.working_dtype = np.float64
+
+        # Cache of linearized darks, used when raw darks are linearized
+        # with the pipeline. None if the cache is not used. See check_params()
+        self.dark_cache = None
+
         # Initialize timer
         self.timer = Timer()
 
@@ -151,6 +160,22 @@ class DarkPrep():
         self.runStep['superbias'] = self.check_run_step(self.params['Reffiles']['superbias'])
         self.runStep['linearity'] = self.check_run_step(self.params['Reffiles']['linearity'])
 
+        self.working_dtype = utils.get_working_precision(self.params)
+
+        try:
+            cache_directory = self.params['Output']['linearized_dark_cache']
+        except KeyError:
+            cache_directory = None
+            self.logger.info('Output:linearized_dark_cache not present in yaml file. Linearized darks will not be cached.')
+        try:
+            cache_size = float(self.params['Output']['linearized_dark_cache_size'])
+        except KeyError:
+            cache_size = LINEARIZED_DARK_CACHE_SIZE
+        if cache_directory is not None and str(cache_directory).lower() != 'none':
+            self.dark_cache = LinearizedDarkCache(cache_directory, max_size=cache_size)
+        else:
+            self.dark_cache = None
+
     def check_run_step(self, filename):
         """Check to see if a filename exists in the parameter file
         or if it is set to none.
@@ -188,8 +213,14 @@ class DarkPrep():
         yd = modshape[-2]
         xd = modshape[-1]
 
-        if ((self.subarray_bounds[0] != 0) or (self.subarray_bounds[2] != (xd - 1))
-           or (self.subarray_bounds[1] != 0) or (self.subarray_bounds[3] != (yd - 1))):
+        # Data read in from a subarray window of the file have already
+        # been cropped
+        if getattr(model, 'bounds', None) is not None:
+            if list(model.bounds) != list(self.subarray_bounds):
+                raise ValueError(("Dark current data were read in using subarray bounds of {}, "
+                                  "but the requested bounds are {}.".format(model.bounds, self.subarray_bounds)))
+        elif ((self.subarray_bounds[0] != 0) or (self.subarray_bounds[2] != (xd - 1))
+              or (self.subarray_bounds[1] != 0) or (self.subarray_bounds[3] != (yd - 1))):
 
             if len(modshape) == 4:
                 model.data = model.data[:, :, self.subarray_bounds[1]:self.subarray_bounds[3] + 1,
@@ -293,6 +324,18 @@ class DarkPrep():
                          .format(reqints, ndarkints)))
             self.integration_copy(reqints, ndarkints)
 
+    def frames_needed(self):
+        """Number of dark current frames needed to create each output
+        integration
+
+        Returns
+        -------
+        frames : int
+            ngroup * (nframe + nskip) for the requested readout pattern
+        """
+        return int(self.params['Readout']['ngroup']) * (int(self.params['Readout']['nframe']) +
+                                                        int(self.params['Readout']['nskip']))
+
     def data_volume_check(self, obj):
         """Make sure that the input integration has
         enough frames/groups to create the requested
@@ -403,7 +446,10 @@ class DarkPrep():
                 pass
 
         else:
-            self.dark.read_astropy()
+            # Only the frames needed for the output are read. The full
+            # frame is kept so that reference pixels are available
+            # when linearizing
+            self.dark.read_astropy(frames=self.frames_needed())
 
         # We assume that the input dark current integration is raw, which means
         # the data are in the original ADU measured by the detector. So the
@@ -611,6 +657,243 @@ class DarkPrep():
 
         return linDarkobj
 
+    def linearize_and_crop_dark(self, filename):
+        """Read in a dark current file, reorder it into the requested
+        readout pattern, linearize it if it is a raw dark, and crop
+        it to the requested subarray. Results are placed in self.linDark,
+        self.dark and self.zeroModel
+
+        Parameters
+        ----------
+        filename : str
+            Name of the raw or linearized dark current file
+        """
+        # Read in the input dark current frame
+        if not self.runStep['linearized_darkfile']:
+            self.get_base_dark(filename)
+            self.linDark = None
+        else:
+            self.read_linear_dark(filename)
+            self.dark = self.linDark
+
+        # Make sure there is enough data (frames/groups)
+        # in the input integration to produce
+        # the proposed output integration
+        self.data_volume_check(self.dark)
+
+        # Put the input dark (or linearized dark) into the
+        # requested readout pattern
+        self.dark, sbzeroframe = self.reorder_dark(self.dark)
+        self.logger.info(('DARK has been reordered to {} to match the input readpattern of {}'
+                          .format(self.dark.data.shape, self.dark.header['READPATT'])))
+
+        # If a raw dark was read in, create linearized version
+        # here using the SSB pipeline. Better to do this
+        # on the full dark before cropping, so that reference
+        # pixels can be used in the processing.
+        if ((self.params['Inst']['use_JWST_pipeline']) & (self.runStep['linearized_darkfile'] is False)):
+
+            # Linearize the dark ramp via the SSB pipeline.
+            # Also save a diff image of the original dark minus
+            # the superbias and refpix subtracted dark, to use later.
+
+            # In order to linearize the dark, the JWST pipeline must
+            # be present, and self.dark will have to be translated back
+            # into a RampModel instance
+            # print('Working on {}'.format(self.dark))
+            self.linDark = self.linearize_dark(self.dark)
+            self.logger.info("Linearized dark shape: {}".format(self.linDark.data.shape))
+
+            if self.params['Readout']['readpatt'].upper() in ['RAPID', 'NISRAPID', 'FGSRAPID']:
+                self.logger.info(("Output is {}, grabbing zero frame from linearized dark"
+                                  .format(self.params['Readout']['readpatt'].upper())))
+                self.zeroModel = read_fits.Read_fits()
+                self.zeroModel.data = self.linDark.data[:, 0, :, :]
+                self.zeroModel.sbAndRefpix = self.linDark.sbAndRefpix[:, 0, :, :]
+            elif ((self.params['Readout']['readpatt'].upper() not in ['RAPID', 'NISRAPID', 'FGSRAPID']) &
+                  (self.dark.zeroframe is not None)):
+                self.logger.info(("Now we need to linearize the zeroframe because the "
+                                  "output readpattern is not RAPID, NISRAPID, or FGSRAPID"))
+                # Now we need to linearize the zeroframe. Place it
+                # into a RampModel instance before running the
+                # pipeline steps
+                self.zeroModel = read_fits.Read_fits()
+                self.zeroModel.data = np.expand_dims(self.dark.zeroframe, axis=1)
+                self.zeroModel.header = self.linDark.header
+                self.zeroModel.header['NGROUPS'] = 1
+                self.zeroModel = self.linearize_dark(self.zeroModel, save_refs=False)
+                # Return the zeroModel data to 3 dimensions
+                # integrations, y, x
+                self.zeroModel.data = self.zeroModel.data[:, 0, :, :]
+                self.zeroModel.sbAndRefpix = self.zeroModel.sbAndRefpix[:, 0, :, :]
+                # In this case the zeroframe has changed from what
+                # was read in. So let's remove the original zeroframe
+                # to avoid confusion
+                self.linDark.zeroframe = np.zeros(self.linDark.zeroframe.shape)
+            else:
+                # In this case, the input dark has no zero frame data.
+                # Let's add an (admittedly crude) approximation. Mirage
+                # will use this to create the zeroframe in the simulated
+                # data. The calibration pipeline does not currently do
+                # anything with the zeroframe. In the future it will be
+                # be used to determine signal rate for pixels that are
+                # saturated in all groups. Our approximation here will be
+                # the signal in the first group of the dark data normalized
+                # to the exposure time of a single frame. This block of the
+                # code should only be run if the input dark is a non-RAPID
+                # dark from ground testing (i.e. a converted FITSWriter file)
+                self.logger.info(('Non-RAPID input dark with no zeroframe extension.'
+                                  ' Creating an approximation.'))
+                self.zeroModel = read_fits.Read_fits()
+                nint, ng, ny, nx = self.dark.data.shape
+                frametime = self.linDark.header['TFRAME']
+                grouptime = self.linDark.header['TGROUP']
+                zframe = self.linDark.data[0, 0, :, :] / grouptime * frametime
+
+                # Make 3D, replicate the zeroframe to cover the needed number
+                # of integrations
+                self.zeroModel.data = np.expand_dims(zframe, axis=0)
+                self.zeroModel.sbAndRefpix = np.expand_dims(self.linDark.sbAndRefpix[0, 0, :, :], axis=0)
+                for i in range(2, nint+1):
+                    self.zeroModel.data = np.vstack((self.zeroModel.data, np.expand_dims(zframe, axis=0)))
+                    self.zeroModel.sbAndRefpix = np.vstack((self.zeroModel.sbAndRefpix, np.expand_dims(self.linDark.sbAndRefpix[0, 0, :, :], axis=0)))
+
+                self.zeroModel.header = self.linDark.header
+                self.zeroModel.header['NGROUPS'] = 1
+
+            # Now crop self.linDark, self.dark, and zeroModel
+            # to requested subarray
+            self.dark = self.crop_dark(self.dark)
+            self.linDark = self.crop_dark(self.linDark)
+
+            if self.zeroModel is not None:
+                self.zeroModel = self.crop_dark(self.zeroModel)
+
+        elif self.runStep['linearized_darkfile']:
+            # If no pipeline is run
+            self.zeroModel = read_fits.Read_fits()
+            self.zeroModel.data = self.dark.zeroframe
+            self.zeroModel.sbAndRefpix = sbzeroframe
+            self.zeroModel.bounds = self.dark.bounds
+
+            # Crop the linearized dark to the requested
+            # subarray size
+            # THIS WILL CROP self.dark AS WELL SINCE
+            # self.linDark IS JUST A REFERENCE IN THE NON
+            # PIPELINE CASE!!
+            self.linDark = self.crop_dark(self.linDark)
+            if self.zeroModel.data is not None:
+                self.zeroModel = self.crop_dark(self.zeroModel)
+        else:
+            raise NotImplementedError(("Mode not yet supported! Must use either: use_JWST_pipeline "
+                                       "= True and a raw or linearized dark or supply a linearized dark. "
+                                       "Cannot yet skip the pipeline and provide a raw dark."))
+
+    def linearized_dark_cache_key(self, filename):
+        """Create the key of the linearized version of a raw dark in the
+        linearized dark cache
+
+        Parameters
+        ----------
+        filename : str
+            Name of the raw dark current file
+
+        Returns
+        -------
+        key : str
+            Key of the linearized dark. None if the cache is not used, or
+            if the dark does not need to be linearized
+        """
+        if ((self.dark_cache is None) or (not self.params['Inst']['use_JWST_pipeline'])
+           or self.runStep['linearized_darkfile']):
+            return None
+
+        import jwst
+
+        # Reference files that are not provided are selected from CRDS by
+        # the pipeline, so the CRDS context is part of the key. If the
+        # context cannot be determined, the selected files are unknown and
+        # the cache is not used.
+        reference_files = {'badpixmask': self.params['Reffiles']['badpixmask'],
+                           'saturation': self.params['Reffiles']['saturation'],
+                           'superbias': self.params['Reffiles']['superbias'],
+                           'linearity': self.params['Reffiles']['linearity']}
+        crds_selected = [name for name, filename in reference_files.items() if not os.path.isfile(str(filename))]
+        crds_context = None
+        if len(crds_selected) > 0:
+            crds_context = crds_tools.get_context()
+            if crds_context is None:
+                self.logger.info(('CRDS context used to select the {} reference files is unknown. Not using the '
+                                  'linearized dark cache.').format(', '.join(sorted(crds_selected))))
+                return None
+
+        settings = {'pipeline_version': jwst.__version__,
+                    'crds_context': crds_context,
+                    'readpatt': self.params['Readout']['readpatt'].upper(),
+                    'ngroup': int(self.params['Readout']['ngroup']),
+                    'nframe': int(self.params['Readout']['nframe']),
+                    'nskip': int(self.params['Readout']['nskip']),
+                    'subarray_bounds': [int(value) for value in self.subarray_bounds],
+                    'working_dtype': np.dtype(self.working_dtype).name}
+        return self.dark_cache.key(filename, reference_files, settings)
+
+    def load_cached_dark(self, key):
+        """Populate self.linDark, self.dark and self.zeroModel using an
+        entry in the linearized dark cache
+
+        Parameters
+        ----------
+        key : str
+            Key of the cache entry, from linearized_dark_cache_key()
+
+        Returns
+        -------
+        found : bool
+            True if the entry was found in the cache
+        """
+        if key is None:
+            return False
+        entry = self.dark_cache.load(key)
+        if entry is None:
+            return False
+
+        self.linDark = read_fits.Read_fits()
+        self.linDark.data = entry['data']
+        self.linDark.sbAndRefpix = entry['sbAndRefpix']
+        self.linDark.header = entry['header']
+        self.dark = self.linDark
+
+        self.zeroModel = read_fits.Read_fits()
+        self.zeroModel.data = entry['zeroframe']
+        self.zeroModel.sbAndRefpix = entry['zero_sbAndRefpix']
+        self.zeroModel.header = entry['header']
+
+        self.detector = entry['info']['DETECTOR']
+        self.instrument = entry['info']['INSTRUME']
+        self.fastaxis = entry['info']['FASTAXIS']
+        self.slowaxis = entry['info']['SLOWAXIS']
+        self.linearity_reffile = entry['info']['R_LINEAR']
+        self.mask_reffile = entry['info']['R_MASK']
+        self.saturation_reffile = entry['info']['R_SATURA']
+        self.superbias_reffile = entry['info']['R_SUPERB']
+        return True
+
+    def save_cached_dark(self, key):
+        """Save self.linDark and self.zeroModel in the linearized dark cache
+
+        Parameters
+        ----------
+        key : str
+            Key of the cache entry, from linearized_dark_cache_key(). If
+            None, nothing is saved
+        """
+        if key is None:
+            return
+        info = {'DETECTOR': self.detector, 'INSTRUME': self.instrument, 'FASTAXIS': self.fastaxis,
+                'SLOWAXIS': self.slowaxis, 'R_LINEAR': self.linearity_reffile, 'R_MASK': self.mask_reffile,
+                'R_SATURA': self.saturation_reffile, 'R_SUPERB': self.superbias_reffile}
+        self.dark_cache.save(key, self.linDark, self.zeroModel, info)
+
     @logging_functions.log_fail
     def prepare(self):
         """MAIN FUNCTION"""
@@ -793,125 +1076,13 @@ class DarkPrep():
                 if len(frames) == 0:
                     continue
 
-                # Read in the input dark current frame
-                if not self.runStep['linearized_darkfile']:
-                    self.get_base_dark(filename)
-                    self.linDark = None
-                else:
-                    self.read_linear_dark(filename)
-                    self.dark = self.linDark
-
-                # Make sure there is enough data (frames/groups)
-                # in the input integration to produce
-                # the proposed output integration
-                self.data_volume_check(self.dark)
-
-                # Put the input dark (or linearized dark) into the
-                # requested readout pattern
-                self.dark, sbzeroframe = self.reorder_dark(self.dark)
-                self.logger.info(('DARK has been reordered to {} to match the input readpattern of {}'
-                                  .format(self.dark.data.shape, self.dark.header['READPATT'])))
-
-                # If a raw dark was read in, create linearized version
-                # here using the SSB pipeline. Better to do this
-                # on the full dark before cropping, so that reference
-                # pixels can be used in the processing.
-                if ((self.params['Inst']['use_JWST_pipeline']) & (self.runStep['linearized_darkfile'] is False)):
-
-                    # Linearize the dark ramp via the SSB pipeline.
-                    # Also save a diff image of the original dark minus
-                    # the superbias and refpix subtracted dark, to use later.
-
-                    # In order to linearize the dark, the JWST pipeline must
-                    # be present, and self.dark will have to be translated back
-                    # into a RampModel instance
-                    # print('Working on {}'.format(self.dark))
-                    self.linDark = self.linearize_dark(self.dark)
-                    self.logger.info("Linearized dark shape: {}".format(self.linDark.data.shape))
-
-                    if self.params['Readout']['readpatt'].upper() in ['RAPID', 'NISRAPID', 'FGSRAPID']:
-                        self.logger.info(("Output is {}, grabbing zero frame from linearized dark"
-                                          .format(self.params['Readout']['readpatt'].upper())))
-                        self.zeroModel = read_fits.Read_fits()
-                        self.zeroModel.data = self.linDark.data[:, 0, :, :]
-                        self.zeroModel.sbAndRefpix = self.linDark.sbAndRefpix[:, 0, :, :]
-                    elif ((self.params['Readout']['readpatt'].upper() not in ['RAPID', 'NISRAPID', 'FGSRAPID']) &
-                          (self.dark.zeroframe is not None)):
-                        self.logger.info(("Now we need to linearize the zeroframe because the "
-                                          "output readpattern is not RAPID, NISRAPID, or FGSRAPID"))
-                        # Now we need to linearize the zeroframe. Place it
-                        # into a RampModel instance before running the
-                        # pipeline steps
-                        self.zeroModel = read_fits.Read_fits()
-                        self.zeroModel.data = np.expand_dims(self.dark.zeroframe, axis=1)
-                        self.zeroModel.header = self.linDark.header
-                        self.zeroModel.header['NGROUPS'] = 1
-                        self.zeroModel = self.linearize_dark(self.zeroModel, save_refs=False)
-                        # Return the zeroModel data to 3 dimensions
-                        # integrations, y, x
-                        self.zeroModel.data = self.zeroModel.data[:, 0, :, :]
-                        self.zeroModel.sbAndRefpix = self.zeroModel.sbAndRefpix[:, 0, :, :]
-                        # In this case the zeroframe has changed from what
-                        # was read in. So let's remove the original zeroframe
-                        # to avoid confusion
-                        self.linDark.zeroframe = np.zeros(self.linDark.zeroframe.shape)
-                    else:
-                        # In this case, the input dark has no zero frame data.
-                        # Let's add an (admittedly crude) approximation. Mirage
-                        # will use this to create the zeroframe in the simulated
-                        # data. The calibration pipeline does not currently do
-                        # anything with the zeroframe. In the future it will be
-                        # be used to determine signal rate for pixels that are
-                        # saturated in all groups. Our approximation here will be
-                        # the signal in the first group of the dark data normalized
-                        # to the exposure time of a single frame. This block of the
-                        # code should only be run if the input dark is a non-RAPID
-                        # dark from ground testing (i.e. a converted FITSWriter file)
-                        self.logger.info(('Non-RAPID input dark with no zeroframe extension.'
-                                          ' Creating an approximation.'))
-                        self.zeroModel = read_fits.Read_fits()
-                        nint, ng, ny, nx = self.dark.data.shape
-                        frametime = self.linDark.header['TFRAME']
-                        grouptime = self.linDark.header['TGROUP']
-                        zframe = self.linDark.data[0, 0, :, :] / grouptime * frametime
-
-                        # Make 3D, replicate the zeroframe to cover the needed number
-                        # of integrations
-                        self.zeroModel.data = np.expand_dims(zframe, axis=0)
-                        self.zeroModel.sbAndRefpix = np.expand_dims(self.linDark.sbAndRefpix[0, 0, :, :], axis=0)
-                        for i in range(2, nint+1):
-                            self.zeroModel.data = np.vstack((self.zeroModel.data, np.expand_dims(zframe, axis=0)))
-                            self.zeroModel.sbAndRefpix = np.vstack((self.zeroModel.sbAndRefpix, np.expand_dims(self.linDark.sbAndRefpix[0, 0, :, :], axis=0)))
-
-                        self.zeroModel.header = self.linDark.header
-                        self.zeroModel.header['NGROUPS'] = 1
-
-                    # Now crop self.linDark, self.dark, and zeroModel
-                    # to requested subarray
-                    self.dark = self.crop_dark(self.dark)
-                    self.linDark = self.crop_dark(self.linDark)
-
-                    if self.zeroModel is not None:
-                        self.zeroModel = self.crop_dark(self.zeroModel)
-
-                elif self.runStep['linearized_darkfile']:
-                    # If no pipeline is run
-                    self.zeroModel = read_fits.Read_fits()
-                    self.zeroModel.data = self.dark.zeroframe
-                    self.zeroModel.sbAndRefpix = sbzeroframe
-
-                    # Crop the linearized dark to the requested
-                    # subarray size
-                    # THIS WILL CROP self.dark AS WELL SINCE
-                    # self.linDark IS JUST A REFERENCE IN THE NON
-                    # PIPELINE CASE!!
-                    self.linDark = self.crop_dark(self.linDark)
-                    if self.zeroModel.data is not None:
-                        self.zeroModel = self.crop_dark(self.zeroModel)
-                else:
-                    raise NotImplementedError(("Mode not yet supported! Must use either: use_JWST_pipeline "
-                                               "= True and a raw or linearized dark or supply a linearized dark. "
-                                               "Cannot yet skip the pipeline and provide a raw dark."))
+                # Read in the dark current file, linearize it if necessary,
+                # and crop it to the requested subarray. Raw darks linearized
+                # by the pipeline are taken from the cache if possible
+                cache_key = self.linearized_dark_cache_key(filename)
+                if not self.load_cached_dark(cache_key):
+                    self.linearize_and_crop_dark(filename)
+                    self.save_cached_dark(cache_key)
 
                 if file_index == 0:
                     #print('self.linDark shape is {}. Expecting it to be 4D'.format(self.linDark.data.shape))
@@ -1027,7 +1198,8 @@ class DarkPrep():
             self.linDark = read_fits.Read_fits()
             #self.linDark.file = self.params['Reffiles']['linearized_darkfile']
             self.linDark.file = input_file
-            self.linDark.read_astropy()
+            # Only the requested subarray and frames are read from the file
+            self.linDark.read_astropy(frames=self.frames_needed(), bounds=self.subarray_bounds)
         except:
             raise IOError('WARNING: Unable to read in linearized dark ramp.')
 
@@ -1122,11 +1294,6 @@ class DarkPrep():
             Zeroth frame data from the dark current data. This is saved separately
             because averaging for non-RAPID readout patterns will destroy the frame
         """
-        if self.params['Reffiles']['linearized_darkfile']:
-            datatype = np.float32
-        else:
-            datatype = np.int32
-
         # Get the info for the dark integration
         darkpatt = dark.header['READPATT']
         dark_nframe = dark.header['NFRAMES']
@@ -1134,12 +1301,6 @@ class DarkPrep():
         dark_nskip = self.readpatterns['nskip'].data[mtch][0]
 
         nint, ngroup, yd, xd = dark.data.shape
-        #outdark = np.zeros((self.params['Readout']['nint'], self.params['Readout']['ngroup'], yd, xd))
-        outdark = np.zeros((1, self.params['Readout']['ngroup'], yd, xd))
-
-        if dark.sbAndRefpix is not None:
-            #outsb = np.zeros((self.params['Readout']['nint'], self.params['Readout']['ngroup'], yd, xd))
-            outsb = np.zeros((1, self.params['Readout']['ngroup'], yd, xd))
 
         # We can only keep a zero frame around if the input dark
         # is RAPID, NISRAPID, or FGSRAPID. Otherwise that information is lost.
@@ -1169,43 +1330,19 @@ class DarkPrep():
         # other cases here.
 
         if ((darkpatt in rapids) and (self.params['Readout']['readpatt'] not in rapids)):
-
-            framesPerGroup = self.params['Readout']['nframe'] + self.params['Readout']['nskip']
-            accumimage = np.zeros_like(outdark[0, 0, :, :], dtype=datatype)
-
+            # Average together the appropriate frames of all integrations
+            # and groups, skipping the appropriate frames
+            self.logger.info(("Averaging dark current ramp into {} groups of {} frames, skipping {} frames "
+                              "per group.".format(self.params['Readout']['ngroup'],
+                                                  self.params['Readout']['nframe'],
+                                                  self.params['Readout']['nskip'])))
+            outdark = np.zeros((nint, self.params['Readout']['ngroup'], yd, xd), dtype=self.working_dtype)
+            average_rapid_groups(dark.data, self.params['Readout']['ngroup'], self.params['Readout']['nframe'],
+                                 self.params['Readout']['nskip'], out=outdark)
             if dark.sbAndRefpix is not None:
-                zeroaccumimage = np.zeros_like(outdark[0, 0, :, :], dtype=np.float32)
-
-            # Loop over integrations
-            #for integ in range(self.params['Readout']['nint']):
-            for integ in range(dark.data.shape[0]):
-                frames = np.arange(0, self.params['Readout']['nframe'])
-
-                # Loop over groups
-                for i in range(self.params['Readout']['ngroup']):
-                    # Average together the appropriate frames,
-                    # skip the appropriate frames
-                    self.logger.info(("Averaging dark current ramp. Frames {}, to become "
-                                      "group {}".format(frames, i)))
-
-                    # If averaging needs to be done
-                    if self.params['Readout']['nframe'] > 1:
-                        accumimage = np.mean(dark.data[integ, frames, :, :], axis=0)
-                        if dark.sbAndRefpix is not None:
-                            zeroaccumimage = np.mean(dark.sbAndRefpix[integ, frames, :, :], axis=0)
-
-                        # If no averaging needs to be done
-                    else:
-                        accumimage = dark.data[integ, frames[0], :, :]
-                        if dark.sbAndRefpix is not None:
-                            zeroaccumimage = dark.sbAndRefpix[integ, frames[0], :, :]
-
-                    outdark[integ, i, :, :] += accumimage
-                    if dark.sbAndRefpix is not None:
-                        outsb[integ, i, :, :] += zeroaccumimage
-
-                    # Increment the frame indexes
-                    frames = frames + framesPerGroup
+                outsb = np.zeros((nint, self.params['Readout']['ngroup'], yd, xd), dtype=self.working_dtype)
+                average_rapid_groups(dark.sbAndRefpix, self.params['Readout']['ngroup'],
+                                     self.params['Readout']['nframe'], self.params['Readout']['nskip'], out=outsb)
 
         elif (self.params['Readout']['readpatt'] == darkpatt):
             # If the input dark is not RAPID, or if the readout
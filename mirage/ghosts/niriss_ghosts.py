@@ -167,15 +167,18 @@ def get_ghost(x, y, flux, filter_name, pupil_name, gap_file, shift=0, log_skippe
     return xgs, ygs, flux_gs
 
 
-def source_mags_to_ghost_mags(row, flux_cal_file, magnitude_system, gap_summary_file, filter_value_ghost, log_skipped_filters=False):
-    """Works only for NIRISS. Given a row from a source catalog, create a ghost source
-    catalog containing the magnitudes of the ghost associated with the source in all
-    filters contained in the original catalog.
+def catalog_mags_to_ghost_mags(catalog, flux_cal_file, magnitude_system, gap_summary_file, filter_value_ghost,
+                               log_skipped_filters=False):
+    """Works only for NIRISS. Given a source catalog, create a ghost source
+    catalog containing the magnitudes of the ghosts associated with the sources
+    in all filters contained in the original catalog. Each magnitude column is
+    converted as a whole, so the flux calibration and ghost gap information are
+    looked up only once per filter.
 
     Parameters
     ----------
-    row : astropy.table.Row
-        Row containing a source from a source catalog
+    catalog : astropy.table.Table
+        Table containing the sources from a source catalog
 
     flux_cal_file : str
         Name of file containing the flux calibration information
@@ -187,26 +190,23 @@ def source_mags_to_ghost_mags(row, flux_cal_file, magnitude_system, gap_summary_
     gap_summary_file : str
         Name of file that controls ghost locations relative to sources
 
-    log_skipped_filters : bool
-        If False, notices of skipped magnitude translations will not be logged.
-        This is convenient for catalogs with lots of sources, because otherwise
-        there can be many repeats of the message.
-
     filter_value_ghost : str
         CLEAR or GR150, to select frac50 of ghosts from gap_summary_file.
 
+    log_skipped_filters : bool
+        If False, notices of skipped magnitude translations will not be logged.
+
     Returns
     -------
-    ghost_row : astropy.table.Table
-        Single row table containing the ghost magnitudes in all filters
+    ghost_mags : astropy.table.Table
+        Table containing the ghost magnitudes in all filters, with one row
+        for each source in ``catalog``
 
     skipped_non_niriss_cols : bool
         If True, non NIRISS magnitude columns were found and skipped
-
     """
-    logger = logging.getLogger('mirage.ghosts.niriss_ghosts.source_mags_to_ghost_mags')
-    mag_cols = [key for key in row.colnames if 'magnitude' in key]
-    ghost_row = Table()
+    mag_cols = [key for key in catalog.colnames if 'magnitude' in key]
+    ghost_mags = Table()
     skipped_non_niriss_cols = False
     for mag_col in mag_cols:
 
@@ -233,22 +233,60 @@ def source_mags_to_ghost_mags(row, flux_cal_file, magnitude_system, gap_summary_
         vegazeropoint, photflam, photfnu, pivot = \
             fluxcal_info(flux_cal_file, 'niriss', filter_value, pupil_value, 'NIS', 'N')
 
-        # Convert source magnitude to count rate
-        mag = float(row[mag_col])
-        countrate = magnitude_to_countrate('niriss', filt, magnitude_system, mag,
+        # Convert source magnitudes to count rates
+        countrates = magnitude_to_countrate('niriss', filt, magnitude_system, catalog[mag_col],
                                             photfnu=photfnu, photflam=photflam,
                                             vegamag_zeropoint=vegazeropoint)
 
-        # Get the count rate associated with the ghost
+        # Get the count rates associated with the ghosts
         if filter_value_ghost[0] == 'G':
             filter_value_ghost = 'GR150'
-        _, _, ghost_countrate = get_ghost(1024, 1024, countrate, filter_value_ghost, pupil_value, gap_summary_file,
-                                          log_skipped_filters=log_skipped_filters)
+        _, _, ghost_countrates = get_ghost(1024, 1024, countrates, filter_value_ghost, pupil_value, gap_summary_file,
+                                           log_skipped_filters=log_skipped_filters)
 
-        # Convert count rate to magnitude
-        ghost_mag = countrate_to_magnitude('niriss', filt, magnitude_system, ghost_countrate,
-                                            photfnu=photfnu, photflam=photflam,
-                                            vegamag_zeropoint=vegazeropoint)
-        ghost_row[mag_col] = [ghost_mag]
-    return ghost_row, skipped_non_niriss_cols
+        # Convert count rates to magnitudes
+        ghost_mags[mag_col] = countrate_to_magnitude('niriss', filt, magnitude_system, ghost_countrates,
+                                                     photfnu=photfnu, photflam=photflam,
+                                                     vegamag_zeropoint=vegazeropoint)
+    return ghost_mags, skipped_non_niriss_cols
+
+
+def source_mags_to_ghost_mags(row, flux_cal_file, magnitude_system, gap_summary_file, filter_value_ghost, log_skipped_filters=False):
+    """Works only for NIRISS. Given a row from a source catalog, create a ghost source
+    catalog containing the magnitudes of the ghost associated with the source in all
+    filters contained in the original catalog.
 
+    Parameters
+    ----------
+    row : astropy.table.Row
+        Row containing a source from a source catalog
+
+    flux_cal_file : str
+        Name of file containing the flux calibration information
+        for all filters
+
+    magnitude_system : str
+        Magnitude system of the magnitudes in the input catalog
+
+    gap_summary_file : str
+        Name of file that controls ghost locations relative to sources
+
+    log_skipped_filters : bool
+        If False, notices of skipped magnitude translations will not be logged.
+        This is convenient for catalogs with lots of sources, because otherwise
+        there can be many repeats of the message.
+
+    filter_value_ghost : str
+        CLEAR or GR150, to select frac50 of ghosts from gap_summary_file.
+
+    Returns
+    -------
+    ghost_row : astropy.table.Table
+        Single row table containing the ghost magnitudes in all filters
+
+    skipped_non_niriss_cols : bool
+        If True, non NIRISS magnitude columns were found and skipped
+
+    """
+    return catalog_mags_to_ghost_mags(row.table[row.index:row.index + 1], flux_cal_file, magnitude_system,
+                                      gap_summary_file, filter_value_ghost, log_skipped_filters=log_skipped_filters)
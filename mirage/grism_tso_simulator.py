@@ -65,6 +65,7 @@ from scipy.interpolate import interp1d, interp2d
 
 from mirage import wfss_simulator
 from mirage.catalogs import catalog_generator, spectra_from_catalog
+from mirage.catalogs.utils import read_catalog
 from mirage.seed_image import catalog_seed_image
 from mirage.dark import dark_prep
 from mirage.logging import logging_functions
@@ -312,7 +313,7 @@ class GrismTSO():
         tso_params = utils.read_yaml(self.tso_paramfile)
         tso_catalog_file = tso_params['simSignals']['tso_grism_catalog']
 
-        tso_catalog = ascii.read(tso_catalog_file)
+        tso_catalog = read_catalog(tso_catalog_file)
 
         transmission_file = tso_catalog['Transmission_spectrum'].data
         transmission_spectrum = ascii.read(transmission_file[0])
@@ -14,6 +14,8 @@ HISTORY:
 import os
 import argparse
 import logging
+import multiprocessing
+import traceback
 import yaml
 import shutil
 
@@ -48,14 +50,20 @@ class ImgSim():
         skipped and these darks will be used instead. If None, ``dark_prep`` will
         be called and new dark objects will be created.
 
+    concurrent_dark_prep : bool
+        If True, ``dark_prep`` is run in a separate process while the seed
+        image is created, and the prepared dark is passed back in memory.
+        If False, the two are run one after the other.
+
     """
-    def __init__(self, paramfile=None, override_dark=None, offline=False):
+    def __init__(self, paramfile=None, override_dark=None, offline=False, concurrent_dark_prep=False):
         self.env_var = 'MIRAGE_DATA'
         datadir = expand_environment_variable(self.env_var, offline=offline)
 
         self.paramfile = paramfile
         self.override_dark = override_dark
         self.offline = offline
+        self.concurrent_dark_prep = concurrent_dark_prep
 
     def create(self):
         # Initialize the log using dictionary from the yaml file
@@ -63,10 +71,22 @@ class ImgSim():
         self.logger.info('\n\nRunning imaging_simulator....\n')
         self.logger.info('using parameter file: {}'.format(self.paramfile))
 
+        # Start the dark preparation in a separate process if requested,
+        # so that it runs while the seed image is created
+        dark_process = None
+        if self.override_dark is None and self.concurrent_dark_prep:
+            dark_process = self.start_dark_prep_process()
+
         # Create seed image
-        cat = catalog_seed_image.Catalog_seed(offline=self.offline)
-        cat.paramfile = self.paramfile
-        cat.make_seed()
+        try:
+            cat = catalog_seed_image.Catalog_seed(offline=self.offline)
+            cat.paramfile = self.paramfile
+            cat.make_seed()
+        except BaseException:
+            if dark_process is not None:
+                dark_process[0].terminate()
+                dark_process[0].join()
+            raise
 
         # Create observation generator object
         obs = obs_generator.Observation(offline=self.offline)
@@ -74,15 +94,16 @@ class ImgSim():
         # Prepare dark current exposure if
         # needed.
         if self.override_dark is None:
-            self.logger.info('Perform dark preparation:')
-            d = dark_prep.DarkPrep(offline=self.offline)
-            d.paramfile = self.paramfile
-            d.prepare()
+            if dark_process is not None:
+                prep_dark, dark_files = self.finish_dark_prep_process(*dark_process)
+            else:
+                self.logger.info('Perform dark preparation:')
+                prep_dark, dark_files = self.run_dark_prep()
 
-            if len(d.dark_files) == 1:
-                obs.linDark = d.prepDark
+            if len(dark_files) == 1:
+                obs.linDark = prep_dark
             else:
-                obs.linDark = d.dark_files
+                obs.linDark = dark_files
         else:
             self.logger.info('\n\noverride_dark has been set. Skipping dark_prep.')
             if isinstance(self.override_dark, str):
@@ -112,6 +133,79 @@ class ImgSim():
         self.logger.info('\nImaging simulator complete')
         logging_functions.move_logfile_to_standard_location(self.paramfile, STANDARD_LOGFILE_NAME)
 
+    def finish_dark_prep_process(self, process, connection):
+        """Wait for the dark preparation process started by
+        start_dark_prep_process() to finish, and collect its results
+
+        Parameters
+        ----------
+        process : multiprocessing.Process
+            Dark preparation process
+
+        connection : multiprocessing.connection.Connection
+            Receiving end of the pipe used by the process to send its results
+
+        Returns
+        -------
+        prep_dark : mirage.utils.read_fits.Read_fits
+            Prepared dark current, from DarkPrep.prepDark
+
+        dark_files : str or list
+            Names of the dark current files saved by DarkPrep
+        """
+        self.logger.info('Waiting for dark preparation to finish.')
+        try:
+            success, result = connection.recv()
+        except EOFError:
+            success, result = False, 'Process ended with exit code {}'.format(process.exitcode)
+        finally:
+            connection.close()
+            process.join()
+
+        if not success:
+            raise RuntimeError('Dark preparation failed:\n{}'.format(result))
+        self.logger.info('Dark preparation complete.')
+        return result
+
+    def run_dark_prep(self):
+        """Run ``dark_prep`` on self.paramfile
+
+        Returns
+        -------
+        prep_dark : mirage.utils.read_fits.Read_fits
+            Prepared dark current, from DarkPrep.prepDark
+
+        dark_files : str or list
+            Names of the dark current files saved by DarkPrep
+        """
+        d = dark_prep.DarkPrep(offline=self.offline)
+        d.paramfile = self.paramfile
+        d.prepare()
+        return d.prepDark, d.dark_files
+
+    def start_dark_prep_process(self):
+        """Start running ``dark_prep`` in a separate process
+
+        Returns
+        -------
+        dark_process : tuple
+            None if processes cannot be forked on this platform. Otherwise,
+            the process and the receiving end of the pipe that its results
+            will be sent through, for use with finish_dark_prep_process()
+        """
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            self.logger.warning('Unable to fork a dark preparation process on this platform. Running it after '
+                                'the seed image is created.')
+            return None
+
+        self.logger.info('Perform dark preparation in a separate process:')
+        context = multiprocessing.get_context('fork')
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=dark_prep_worker, args=(self, sender))
+        process.start()
+        sender.close()
+        return process, receiver
+
     def get_output_dir(self):
         """Get the output directory name from self.paramfile
 
@@ -136,9 +230,31 @@ class ImgSim():
             parser = argparse.ArgumentParser(usage=usage, description="Wrapper for the creation of WFSS simulated exposures.")
         parser.add_argument("paramfile", help='Name of simulator input yaml file')
         parser.add_argument("--override_dark", help="If supplied, skip the dark preparation step and use the supplied dark to make the exposure", default=None)
+        parser.add_argument("--concurrent_dark_prep", help="If supplied, prepare the dark in a separate process while the seed image is created", action='store_true')
         return parser
 
 
+def dark_prep_worker(simulator, connection):
+    """Run ``dark_prep`` for an ImgSim instance in a forked process, and
+    send the results, or the traceback of any error, back to the parent
+    process
+
+    Parameters
+    ----------
+    simulator : ImgSim
+        Imaging simulator, with paramfile set
+
+    connection : multiprocessing.connection.Connection
+        Sending end of the pipe to the parent process
+    """
+    try:
+        connection.send((True, simulator.run_dark_prep()))
+    except BaseException:
+        connection.send((False, traceback.format_exc()))
+    finally:
+        connection.close()
+
+
 if __name__ == '__main__':
 
     usagestring = 'USAGE: imaging_simualtor.py file1.yaml'
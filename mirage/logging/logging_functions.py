@@ -3,6 +3,7 @@
 """This module contains functions related to logging in Mirage
 """
 
+from contextlib import contextmanager
 import datetime
 from functools import wraps
 import logging
@@ -36,6 +37,35 @@ def create_logger(filename, output_log_file):
     logger = logging.getLogger('mirage')
 
 
+@contextmanager
+def log_to_file(output_log_file):
+    """Context manager that temporarily sends the output of the root
+    logger's file handlers to a different file, e.g. so that processes
+    running in the same directory do not write to the same log file.
+
+    Parameters
+    ----------
+    output_log_file : str
+        Name of the text log file to output the log to.
+    """
+    root = logging.getLogger()
+    file_handlers = [handler for handler in root.handlers if isinstance(handler, logging.FileHandler)]
+    new_handler = logging.FileHandler(output_log_file, mode='w')
+    if len(file_handlers) > 0:
+        new_handler.setLevel(file_handlers[0].level)
+        new_handler.setFormatter(file_handlers[0].formatter)
+    for handler in file_handlers:
+        root.removeHandler(handler)
+    root.addHandler(new_handler)
+    try:
+        yield output_log_file
+    finally:
+        root.removeHandler(new_handler)
+        new_handler.close()
+        for handler in file_handlers:
+            root.addHandler(handler)
+
+
 def create_standard_logfile_name(base_file, log_type='catalog_seed'):
     """Construct the name for the final log file.
 
@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+
+"""This module contains a cache for PSF stamps evaluated from a gridded
+PSF library (``photutils.psf.GriddedPSFModel``).
+
+Evaluating the gridded library requires interpolating between the PSFs
+in the grid, which is by far the most expensive part of adding a point
+source to a seed image. The PSF varies slowly across the detector, so
+sources that fall within the same region of the detector, and have
+nearly the same sub-pixel phase, can share a single evaluation.
+
+The cache quantizes the location of each requested PSF into a (position
+cell, x-phase bin, y-phase bin) key. On a miss, the library is evaluated
+once at the center of the cell and phase bins, and the result is stored.
+When the cache is full, the least recently used stamp is discarded.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.psf.psf_cache import PSFStampCache
+        cache = PSFStampCache(phase_resolution=0.05, position_resolution=256, max_stamps=500)
+        psf = cache.evaluate(library, x=xpts, y=ypts, flux=1., x_0=1023.4, y_0=511.8)
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from mirage.utils.constants import PSF_PHASE_RESOLUTION, PSF_POSITION_RESOLUTION, PSF_CACHE_MAX_STAMPS
+
+
+class PSFStampCache():
+    """Least recently used cache of PSF stamps evaluated from one or more
+    gridded PSF libraries.
+
+    Parameters
+    ----------
+    phase_resolution : float
+        Width, in pixels, of the sub-pixel phase bins. Must be greater than
+        zero and no larger than 1.
+
+    position_resolution : int
+        Size, in pixels, of the square cells on the detector within which
+        the library is assumed not to vary.
+
+    max_stamps : int
+        Maximum number of stamps to hold. When this is exceeded, the least
+        recently used stamp is discarded.
+    """
+    def __init__(self, phase_resolution=PSF_PHASE_RESOLUTION, position_resolution=PSF_POSITION_RESOLUTION,
+                 max_stamps=PSF_CACHE_MAX_STAMPS):
+        if (phase_resolution <= 0.) or (phase_resolution > 1.):
+            raise ValueError(('phase_resolution must be greater than 0 and no larger than 1 pixel. Got {}.'
+                              .format(phase_resolution)))
+        if position_resolution < 1:
+            raise ValueError('position_resolution must be at least 1 pixel. Got {}.'.format(position_resolution))
+        if max_stamps < 1:
+            raise ValueError('max_stamps must be at least 1. Got {}.'.format(max_stamps))
+
+        self.phase_resolution = phase_resolution
+        self.position_resolution = int(position_resolution)
+        self.max_stamps = int(max_stamps)
+        self.stamps = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.stamps)
+
+    def clear(self):
+        """Remove all stamps from the cache and reset the statistics"""
+        self.stamps.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, location):
+        """Split a coordinate into the quantities used to build the cache
+        key, and find the coordinate at which the library is evaluated for
+        that key.
+
+        Parameters
+        ----------
+        location : float
+            X or Y coordinate of the PSF center
+
+        Returns
+        -------
+        cell : int
+            Index of the position cell containing ``location``
+
+        phase_bin : int
+            Index of the sub-pixel phase bin containing ``location``
+
+        reference_pixel : int
+            Integer pixel at the center of ``cell``
+
+        reference_phase : float
+            Sub-pixel phase at the center of ``phase_bin``
+        """
+        pixel = int(np.floor(location))
+        phase = location - pixel
+        cell = pixel // self.position_resolution
+        phase_bin = int(phase / self.phase_resolution)
+
+        reference_pixel = cell * self.position_resolution + self.position_resolution // 2
+        bin_start = phase_bin * self.phase_resolution
+        bin_end = min(bin_start + self.phase_resolution, 1.)
+        reference_phase = (bin_start + bin_end) / 2.
+        return cell, phase_bin, reference_pixel, reference_phase
+
+    def evaluate(self, library, x, y, flux, x_0, y_0):
+        """Return the PSF from ``library`` centered at (``x_0``, ``y_0``) and
+        evaluated at the pixel coordinates (``x``, ``y``). This mirrors the
+        call signature of ``GriddedPSFModel.evaluate``.
+
+        Parameters
+        ----------
+        library : photutils.psf.GriddedPSFModel
+            Gridded PSF library to evaluate
+
+        x : numpy.ndarray
+            Integer x coordinates at which to evaluate the PSF
+
+        y : numpy.ndarray
+            Integer y coordinates at which to evaluate the PSF. Same shape
+            as ``x``
+
+        flux : float
+            Total flux of the PSF
+
+        x_0 : float
+            X coordinate of the PSF center
+
+        y_0 : float
+            Y coordinate of the PSF center
+
+        Returns
+        -------
+        psf : numpy.ndarray
+            PSF evaluated at (``x``, ``y``). Same shape as ``x``
+        """
+        x_cell, x_bin, x_ref, x_phase = self.quantize(x_0)
+        y_cell, y_bin, y_ref, y_phase = self.quantize(y_0)
+
+        # Positions of the requested pixels relative to the pixel
+        # containing the PSF center
+        dx = np.asarray(x, dtype=np.int64) - int(np.floor(x_0))
+        dy = np.asarray(y, dtype=np.int64) - int(np.floor(y_0))
+        xmin = int(dx.min())
+        ymin = int(dy.min())
+        xmax = int(dx.max())
+        ymax = int(dy.max())
+
+        key = (id(library), x_cell, y_cell, x_bin, y_bin, xmin, xmax, ymin, ymax)
+        try:
+            stamp = self.stamps[key]
+            self.stamps.move_to_end(key)
+            self.hits += 1
+        except KeyError:
+            ypts, xpts = np.mgrid[y_ref + ymin: y_ref + ymax + 1, x_ref + xmin: x_ref + xmax + 1]
+            stamp = library.evaluate(x=xpts, y=ypts, flux=1., x_0=x_ref + x_phase, y_0=y_ref + y_phase)
+            self.stamps[key] = stamp
+            self.misses += 1
+            if len(self.stamps) > self.max_stamps:
+                self.stamps.popitem(last=False)
+
+        return stamp[dy - ymin, dx - xmin] * flux
@@ -0,0 +1,105 @@
+#! /usr/bin/env python
+
+"""This module contains the functions used by ``Observation`` to create
+the crosstalk signal for a stack of frames or groups read out using four
+amplifiers, working on all frames at once.
+
+Each frame is divided into four 512 column wide amplifier regions, by
+reshaping the column axis to (amplifier, 512). The crosstalk coefficients
+are arranged into 4x4 matrices (receiving amplifier, source amplifier),
+which are applied to all amplifiers of all frames with ``np.einsum``.
+Signal from adjacent amplifiers, and from amplifiers 3 apart, is read
+out in the opposite direction, so the source region is flipped left to
+right before being applied.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.ramp_generator.crosstalk import crosstalk_matrices, crosstalk_signal
+        matrices = crosstalk_matrices(coeffs)
+        xtalk = crosstalk_signal(groups, matrices)
+"""
+import numpy as np
+
+
+AMPLIFIER_COLUMNS = 512
+
+# Direction of the one pixel shift applied to the "post" crosstalk terms,
+# for each receiving amplifier
+POST_SHIFT = [1, -1, 1, -1]
+
+
+def crosstalk_matrices(coeffs):
+    """Arrange crosstalk coefficients into matrices
+
+    Parameters
+    ----------
+    coeffs : astropy.table.Table, astropy.table.Row or dict
+        Crosstalk coefficients for a detector, from the crosstalk
+        coefficient file. Must contain 'xtSR' and 'xtSRpost' entries for
+        each source amplifier S and receiving amplifier R (1-4). Only the
+        first value of each entry is used.
+
+    Returns
+    -------
+    matrices : dict
+        4x4 matrices (receiving amplifier, source amplifier) of the primary
+        and "post" coefficients, split into 'flipped' pairs, where the
+        source signal is flipped left to right, and 'direct' pairs, where it
+        is not. Keys are 'primary_flipped', 'primary_direct', 'post_flipped'
+        and 'post_direct'.
+    """
+    matrices = {key: np.zeros((4, 4)) for key in ['primary_flipped', 'primary_direct', 'post_flipped', 'post_direct']}
+    for amp in range(4):
+        for subamp in range(4):
+            if subamp == amp:
+                continue
+            pair = 'flipped' if np.absolute(amp - subamp) in [1, 3] else 'direct'
+            index = 'xt{}{}'.format(amp + 1, subamp + 1)
+            matrices['primary_{}'.format(pair)][subamp, amp] = float(np.asarray(coeffs[index]).ravel()[0])
+            matrices['post_{}'.format(pair)][subamp, amp] = float(np.asarray(coeffs[index + 'post']).ravel()[0])
+    return matrices
+
+
+def crosstalk_signal(data, matrices):
+    """Create the crosstalk signal for a stack of frames
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Array of frames, with shape (..., y, 2048)
+
+    matrices : dict
+        Crosstalk coefficient matrices from ``crosstalk_matrices``
+
+    Returns
+    -------
+    xtalk : numpy.ndarray
+        Crosstalk signal, with the same shape as ``data``
+    """
+    shape = data.shape
+    amps = data.reshape(shape[:-1] + (4, AMPLIFIER_COLUMNS))
+    flipped = amps[..., ::-1]
+
+    # Primary terms
+    xtalk = np.einsum('ra,...ax->...rx', matrices['primary_flipped'], flipped)
+    xtalk += np.einsum('ra,...ax->...rx', matrices['primary_direct'], amps)
+
+    # "Post" terms are shifted by one pixel according to the readout
+    # direction of the receiving amplifier
+    post = np.einsum('ra,...ax->...rx', matrices['post_flipped'], flipped)
+    for subamp, shift in enumerate(POST_SHIFT):
+        xtalk[..., subamp, :] += np.roll(post[..., subamp, :], shift, axis=-1)
+
+    # For amplifiers 2 apart, the shift is applied to each amplifier region
+    # of a frame as a whole, so that pixels wrap onto the adjacent row
+    post = np.einsum('ra,...ax->...rx', matrices['post_direct'], amps)
+    for subamp, shift in enumerate(POST_SHIFT):
+        region = np.ascontiguousarray(post[..., subamp, :])
+        region_shape = region.shape
+        region = np.roll(region.reshape(region_shape[:-2] + (-1, )), shift, axis=-1)
+        xtalk[..., subamp, :] += region.reshape(region_shape)
+
+    return xtalk.reshape(shape)
@@ -0,0 +1,79 @@
+#! /usr/bin/env python
+
+"""This module contains the functions used by ``Observation.add_ipc`` to
+convolve a stack of frames or groups with an interpixel capacitance (IPC)
+kernel. All planes in the stack are convolved at once, rather than one
+group at a time.
+
+For kernels with odd dimensions (as all IPC reference files have), the
+results match those of the IPC correction step in the JWST calibration
+pipeline, on which ``add_ipc`` was based. Pixels beyond the edges of the
+stack are treated as zero. For kernels with an even number of rows or
+columns, the extra kernel row/column is on the low side of the center.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.ramp_generator.ipc_convolution import convolve_planes
+        convolved = convolve_planes(groups, kernel)
+"""
+import numpy as np
+from scipy import ndimage
+
+
+def convolve_planes(planes, kernel):
+    """Convolve each 2D plane of a stack with the same 2D kernel
+
+    Parameters
+    ----------
+    planes : numpy.ndarray
+        3D array (plane, y, x)
+
+    kernel : numpy.ndarray
+        2D IPC kernel
+
+    Returns
+    -------
+    convolved : numpy.ndarray
+        3D array with the same shape and dtype as ``planes``
+    """
+    flipped = kernel[np.newaxis, ::-1, ::-1]
+    return ndimage.correlate(planes, flipped, mode='constant', cval=0.)
+
+
+def convolve_planes_pixel_kernel(planes, kernel):
+    """Convolve each 2D plane of a stack with a kernel that varies from
+    pixel to pixel
+
+    Parameters
+    ----------
+    planes : numpy.ndarray
+        3D array (plane, y, x)
+
+    kernel : numpy.ndarray
+        4D IPC kernel (kernel y, kernel x, y, x), where the last two axes
+        match those of ``planes``
+
+    Returns
+    -------
+    convolved : numpy.ndarray
+        3D array with the same shape and dtype as ``planes``
+    """
+    kny, knx, ny, nx = kernel.shape
+    bottom = kny // 2
+    left = knx // 2
+    padded = np.pad(planes, ((0, 0), (bottom, kny - bottom - 1), (left, knx - left - 1)))
+
+    # The middle pixel of the IPC kernel is expected to be the largest,
+    # so add that last
+    middle = (kny // 2, knx // 2)
+    elements = [(j, i) for j in range(kny) for i in range(knx) if (j, i) != middle] + [middle]
+
+    convolved = np.zeros_like(planes)
+    for j, i in elements:
+        jstart = kny - j - 1
+        istart = knx - i - 1
+        convolved += kernel[j, i] * padded[:, jstart:jstart + ny, istart:istart + nx]
+    return convolved
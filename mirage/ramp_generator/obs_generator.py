@@ -37,6 +37,9 @@ import logging
 import warnings
 import argparse
 import shutil
+import tempfile
+import mmap
+import multiprocessing
 
 import asdf
 import yaml
@@ -51,13 +54,19 @@ import pysiaf
 import mirage
 from mirage.logging import logging_functions
 from mirage.ramp_generator import unlinearize, moving_target_position_table
+from mirage.ramp_generator.crosstalk import AMPLIFIER_COLUMNS, crosstalk_matrices, crosstalk_signal
+from mirage.ramp_generator.ipc_convolution import convolve_planes, convolve_planes_pixel_kernel
+from mirage.ramp_generator.ramp_engine import average_groups, average_rapid_groups, groups_per_block, \
+    poisson_realization
 from mirage.reference_files import crds_tools
 from mirage.seed_image import ephemeris_tools
-from mirage.utils import file_io, read_fits, utils, siaf_interface
+from mirage.seed_image.batch_stamps import scatter_add_stamps, stamp_pixel_indices
+from mirage.utils import file_io, read_fits, reference_registry, utils, siaf_interface
 from mirage.utils import set_telescope_pointing_separated as stp
 from mirage.utils.constants import EXPTYPES, MEAN_GAIN_VALUES, LOG_CONFIG_FILENAME, \
                                    STANDARD_LOGFILE_NAME, NUM_RESETS_BEFORE_EXP, NUM_RESETS_BEFORE_INT, \
-                                   TABLE_BASETIME
+                                   TABLE_BASETIME, RAMP_BLOCK_PIXEL_LIMIT, IPC_BLOCK_PIXEL_LIMIT, \
+                                   CROSSTALK_BLOCK_PIXEL_LIMIT
 from mirage.utils.timer import Timer
 
 
@@ -70,6 +79,19 @@ classdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
 log_config_file = os.path.join(classdir, 'logging', LOG_CONFIG_FILENAME)
 logging_functions.create_logger(log_config_file, STANDARD_LOGFILE_NAME)
 
+# Inputs shared with the worker processes that build integrations in
+# parallel. Populated by Observation.add_crs_and_noise_parallel before the
+# workers are forked, so that the seed image and reference data are not
+# pickled.
+PARALLEL_INTEGRATION_INPUTS = {}
+
+# Data types of the products written to the output files. When the exposure
+# is created a block of integrations at a time, each block is converted to
+# these types as it is stored, so that the full exposure never needs to be
+# converted when the files are saved. See process_exposure_in_chunks()
+OUTPUT_DTYPES = {'lin_outramp': np.float32, 'lin_zeroframe': np.float32, 'err': np.float32,
+                 'groupdq': np.uint8, 'raw_outramp': np.uint16, 'raw_zeroframe': np.uint16}
+
 
 class Observation():
     def __init__(self, offline=False):
@@ -113,6 +135,35 @@ class Observation():
         # Check that CRDS-related environment variables are set correctly
         self.crds_datadir = crds_tools.env_variables()
 
+        # Build integrations using the vectorized ramp engine, a block
+        # of frames at a time. See set_ramp_options()
+        self.vectorized_ramp = False
+        self.ramp_block_pixel_limit = RAMP_BLOCK_PIXEL_LIMIT
+
+        # Number of processes to use when building integrations, and the
+        # seed sequence from which per-integration seeds are spawned when
+        # more than one process is used. See set_ramp_options()
+        self.parallel = 1
+        self.integration_seeds = None
+
+        # Integration number to include in the cosmic ray list file name.
+        # Used when integrations are built by separate processes.
+        self.crlist_integration = None
+
+        # Number of integrations processed at a time when the exposure is
+        # streamed into disk-backed output arrays. 0 processes the entire
+        # exposure at once. See set_ramp_options()
+        self.stream_integrations = 0
+
+        # Data type of the integrations created from the seed image.
+        # See set_ramp_options()
+        self.working_dtype = np.float64
+
+        # Portion of a 4D IPC kernel matching the science pixels of the
+        # data, along with the full kernel and the bounds of that portion.
+        # See add_ipc()
+        self.ipc_pixel_kernel = None
+
         # Initialize timer
         self.timer = Timer()
 
@@ -129,7 +180,7 @@ class Observation():
         exposure : numpy.ndarray
             Exposure with crosstalk effects added
         """
-        ints, groups, yd, xd = exposure.shape
+        yd, xd = exposure.shape[-2:]
         if self.params['Readout']['namp'] == 4:
             if self.instrument.upper() == 'NIRCAM':
                 xdet = self.detector[3:5].upper()
@@ -148,13 +199,18 @@ class Observation():
             ys = 0
             ye = yd
 
-            for integ in range(ints):
-                for group in range(groups):
-                    xtinput = exposure[integ, group, ys:ye, xs:xe]
-                    xtimage = self.crosstalk_image(xtinput, xtcoeffs)
-
-                    # Now add the crosstalk image to the signalimage
-                    exposure[integ, group, ys:ye, xs:xe] += xtimage
+            # Create and add the crosstalk signal for all integrations
+            # and groups, a block of groups at a time
+            if not exposure.flags.c_contiguous:
+                exposure = np.ascontiguousarray(exposure)
+            planes = exposure.reshape((-1, yd, xd))
+            block_size = max(1, CROSSTALK_BLOCK_PIXEL_LIMIT // (yd * xd))
+            for start in range(0, planes.shape[0], block_size):
+                xtinput = planes[start:start + block_size, ys:ye, xs:xe]
+                xtimage = self.crosstalk_image(xtinput, xtcoeffs)
+
+                # Now add the crosstalk image to the signalimage
+                planes[start:start + block_size, ys:ye, xs:xe] += xtimage
         else:
             self.logger.info(("Crosstalk calculation requested, but the chosen subarray "
                               "is read out using only 1 amplifier. "
@@ -207,8 +263,16 @@ class Observation():
                                       'which to use.'.format(num_integrations, seed.shape[0])))
                 ngroups = int(seed.shape[1] / (self.params['Readout']['nframe'] + self.params['Readout']['nskip']))
 
-        sim_exposure = np.zeros((nint, ngroups, yd, xd))
-        sim_zero = np.zeros((nint, yd, xd))
+        # Once integration seeds have been spawned (e.g. for an earlier
+        # segment or block of integrations), keep using them, even for a
+        # single integration, so that results do not depend on the blocking
+        if (self.parallel > 1) and ((nint > 1) or (self.integration_seeds is not None)):
+            if 'fork' in multiprocessing.get_all_start_methods():
+                return self.add_crs_and_noise_parallel(seed, nint, ngroups)
+            self.logger.warning('Unable to fork worker processes on this platform. Creating integrations in serial.')
+
+        sim_exposure = np.zeros((nint, ngroups, yd, xd), dtype=self.working_dtype)
+        sim_zero = np.zeros((nint, yd, xd), dtype=self.working_dtype)
 
         # Run one integration at a time
         # because each needs its own collection
@@ -219,15 +283,74 @@ class Observation():
                 inseed = seed
             elif seeddim == 4:
                 inseed = seed[integ, :, :, :]
-            if self.runStep['cosmicray']:
-                ramp, rampzero = self.frame_to_ramp(inseed)
-            else:
-                ramp, rampzero = self.frame_to_ramp_no_cr(inseed)
+            ramp, rampzero = self.simulate_integration(inseed)
 
             sim_exposure[integ, :, :, :] = ramp
             sim_zero[integ, :, :] = rampzero
         return sim_exposure, sim_zero
 
+    def add_crs_and_noise_parallel(self, seed, nint, ngroups):
+        """Add cosmic rays and poisson noise to a noiseless seed, building
+        the integrations in ``self.parallel`` worker processes.
+
+        Each integration gets its own Poisson and cosmic ray seeds, spawned
+        from a ``numpy.random.SeedSequence`` created from
+        ``simSignals:poissonseed`` and ``cosmicRay:seed``. The results are
+        therefore reproducible and do not depend on the number of
+        processes, although they differ from those produced by a single
+        process. Workers are forked from the current process, and write
+        their integrations directly into arrays in shared memory.
+
+        Parameters
+        ----------
+        seed : numpy.ndarray
+            2D seed image or 4D seed exposure
+
+        nint : int
+            Number of integrations to create
+
+        ngroups : int
+            Number of groups in each integration
+
+        Returns
+        -------
+        sim_exposure : numpy.ndarray
+            Exposure with CRs and noise added
+
+        sim_zero : numpy.ndarray
+            Zeroth read(s) of exposure
+        """
+        yd, xd = seed.shape[-2:]
+        nproc = min(self.parallel, nint)
+        self.logger.info('Creating {} integrations using {} processes.'.format(nint, nproc))
+
+        # Consecutive calls (e.g. for the segments of a split exposure)
+        # continue the same sequence, so each integration is unique
+        if self.integration_seeds is None:
+            self.integration_seeds = np.random.SeedSequence([self.params['simSignals']['poissonseed'],
+                                                             self.params['cosmicRay']['seed']])
+        tasks = []
+        for integ, child in enumerate(self.integration_seeds.spawn(nint)):
+            # Seeds must be usable by np.random.seed and random.Random
+            # after being incremented once per frame
+            poissonseed, crseed = child.generate_state(2, dtype=np.uint32) >> 1
+            tasks.append((integ, int(poissonseed), int(crseed)))
+
+        sim_exposure = shared_array((nint, ngroups, yd, xd), dtype=self.working_dtype)
+        sim_zero = shared_array((nint, yd, xd), dtype=self.working_dtype)
+
+        PARALLEL_INTEGRATION_INPUTS['observation'] = self
+        PARALLEL_INTEGRATION_INPUTS['seed'] = seed
+        PARALLEL_INTEGRATION_INPUTS['sim_exposure'] = sim_exposure
+        PARALLEL_INTEGRATION_INPUTS['sim_zero'] = sim_zero
+        try:
+            with multiprocessing.get_context('fork').Pool(processes=nproc) as pool:
+                for integ in pool.imap_unordered(simulate_integration_worker, tasks):
+                    self.logger.info("Integration {} complete.".format(integ))
+        finally:
+            PARALLEL_INTEGRATION_INPUTS.clear()
+        return sim_exposure, sim_zero
+
     def add_detector_effects(self, ramp):
         """Add detector-based effects to input data.
         Currently only crosstalk effects are added.
@@ -275,8 +398,9 @@ class Observation():
         Add interpixel capacitance effects to the data. This is done by
         convolving the data with a kernel. The kernel is read in from the
         file specified by self.params['Reffiles']['ipc']. The core of this
-        function was copied from the IPC correction step in the JWST
-        calibration pipeline.
+        function was based on the IPC correction step in the JWST
+        calibration pipeline. All integrations and groups are convolved together, a
+        block of groups at a time, and the data are modified in place.
 
         Parameters
         ----------
@@ -287,14 +411,16 @@ class Observation():
         Returns
         -------
         returns : obj
-            4d numpy ndarray of the modified data
+            4d numpy ndarray of the modified data. This is ``data`` itself
+            unless ``data`` is not C-contiguous.
         """
-        output_data = np.copy(data)
+        if not data.flags.c_contiguous:
+            data = np.ascontiguousarray(data)
         # Shape of the data, which may include reference pix
-        shape = output_data.shape
+        shape = data.shape
 
         # Find the number of reference pixel rows and columns
-        # in output_data
+        # in data
         if self.subarray_bounds[0] < 4:
             left_columns = 4 - self.subarray_bounds[0]
         else:
@@ -316,11 +442,11 @@ class Observation():
         try:
             # If add_ipc has already been called, then the correct
             # IPC kernel already exists, in self.kernel
-            kernel = np.copy(self.kernel)
-        except:
+            kernel = self.kernel
+        except AttributeError:
             # If add_ipc has not been called yet, then read in the
             # kernel from the specified file.
-            kernel = fits.getdata(self.params['Reffiles']['ipc'])
+            kernel, _ = reference_registry.read_fits_data(self.params['Reffiles']['ipc'], ext=None)
             # Invert the kernel if requested, to go from a kernel
             # designed to remove IPC effects to one designed to
             # add IPC effects
@@ -328,97 +454,37 @@ class Observation():
                 self.logger.info("Inverting IPC kernel prior to convolving with image")
                 kernel = self.invert_ipc_kernel(kernel)
             self.kernel = np.copy(kernel)
-        kshape = kernel.shape
 
         # These axes lengths exclude reference pixels, if there are any.
         ny = shape[-2] - (bottom_rows + top_rows)
         nx = shape[-1] - (left_columns + right_columns)
-
-        # The temporary array temp is larger than the science part of
-        # output_data by a border (set to zero) that's about half of the
-        # kernel size, so the convolution can be done without checking for
-        # out of bounds.
-        # b_b, t_b, l_b, and r_b are the widths of the borders on the
-        # bottom, top, left, and right, respectively.
-        b_b = kshape[0] // 2
-        t_b = kshape[0] - b_b - 1
-        l_b = kshape[1] // 2
-        r_b = kshape[1] - l_b - 1
-        tny = ny + b_b + t_b
-        yoff = bottom_rows           # offset in output_data
-        tnx = nx + l_b + r_b
-        xoff = left_columns          # offset in output_data
-
-        # Loop over integrations and groups
-        for integration in range(shape[0]):
-            for group in range(shape[1]):
-
-                # Copy the science portion (not the reference pixels) of
-                # output_data to this temporary array, then make
-                # subsequent changes in-place to output_data.
-                temp = np.zeros((tny, tnx), dtype=output_data.dtype)
-                temp[b_b:b_b + ny, l_b:l_b + nx] = \
-                    output_data[integration, group, yoff:yoff + ny, xoff:xoff + nx].copy()
-
-                # After setting this slice to zero, we'll incrementally add
-                # to it.
-                output_data[integration, group, yoff:yoff + ny, xoff:xoff + nx] = 0.
-
-                if len(kshape) == 2:
-                    # 2-D IPC kernel.  Loop over pixels of the deconvolution
-                    # kernel. In this section, `part` has the same shape
-                    # as `temp`.
-                    middle_j = kshape[0] // 2
-                    middle_i = kshape[1] // 2
-                    for j in range(kshape[0]):
-                        jstart = kshape[0] - j - 1
-                        for i in range(kshape[1]):
-                            if i == middle_i and j == middle_j:
-                                continue  # the middle pixel is done last
-                            part = kernel[j, i] * temp
-                            istart = kshape[1] - i - 1
-                            output_data[integration, group, yoff:yoff + ny, xoff:xoff + nx] += \
-                                part[jstart:jstart + ny, istart:istart + nx]
-                    # The middle pixel of the IPC kernel is expected to be
-                    # the largest, so add that last.
-                    part = kernel[middle_j, middle_i] * temp
-                    output_data[integration, group, yoff:yoff + ny, xoff:xoff + nx] += \
-                        part[middle_j:middle_j + ny, middle_i:middle_i + nx]
-
-                else:
-                    # 4-D IPC kernel.  Extract a subset of the kernel:
-                    # all of the first two axes, but only the portion
-                    # of the last two axes corresponding to the science
-                    # data (i.e. possibly a subarray,
-                    # and certainly excluding reference pixels).
-                    k_temp = np.zeros((kshape[0], kshape[1], tny, tnx),
-                                      dtype=kernel.dtype)
-                    k_temp[:, :, b_b:b_b + ny, l_b:l_b + nx] = \
-                        kernel[:, :, yoff:yoff + ny, xoff:xoff + nx]
-
-                    # In this section, `part` has shape (ny, nx), which is
-                    # smaller than `temp`.
-                    middle_j = kshape[0] // 2
-                    middle_i = kshape[1] // 2
-                    for j in range(kshape[0]):
-                        jstart = kshape[0] - j - 1
-                        for i in range(kshape[1]):
-                            if i == middle_i and j == middle_j:
-                                continue   # the middle pixel is done last
-                            istart = kshape[1] - i - 1
-                            # The slice of k_temp includes different pixels
-                            # for the first or second axes within each loop,
-                            # but the same slice for the last two axes.
-                            # The slice of temp (a copy of the science data)
-                            # includes a different offset for each loop.
-                            part = k_temp[j, i, b_b:b_b + ny, l_b:l_b + nx] * \
-                                temp[jstart:jstart + ny, istart:istart + nx]
-                            output_data[integration, group, yoff:yoff + ny, xoff:xoff + nx] += part
-                    # Add the product for the middle pixel last.
-                    part = k_temp[middle_j, middle_i, b_b:b_b + ny, l_b:l_b + nx] * \
-                        temp[middle_j:middle_j + ny, middle_i:middle_i + nx]
-                    output_data[integration, group, yoff:yoff + ny, xoff:xoff + nx] += part
-        return output_data
+        yoff = bottom_rows           # offset in data
+        xoff = left_columns          # offset in data
+
+        # 4-D IPC kernel. Extract the portion of the last two axes
+        # corresponding to the science data (i.e. possibly a subarray,
+        # and certainly excluding reference pixels). This is kept for
+        # later calls.
+        if len(kernel.shape) == 4:
+            bounds = (yoff, ny, xoff, nx)
+            if (self.ipc_pixel_kernel is None or self.ipc_pixel_kernel[0] is not kernel or
+                    self.ipc_pixel_kernel[1] != bounds):
+                self.ipc_pixel_kernel = (kernel, bounds,
+                                         np.ascontiguousarray(kernel[:, :, yoff:yoff + ny, xoff:xoff + nx]))
+            pixel_kernel = self.ipc_pixel_kernel[2]
+
+        # Convolve the science portion (not the reference pixels) of all
+        # integrations and groups, a block of groups at a time
+        planes = data.reshape((-1, ) + shape[-2:])
+        science = planes[:, yoff:yoff + ny, xoff:xoff + nx]
+        block_size = max(1, IPC_BLOCK_PIXEL_LIMIT // (ny * nx))
+        for start in range(0, planes.shape[0], block_size):
+            block = science[start:start + block_size]
+            if len(kernel.shape) == 2:
+                science[start:start + block_size] = convolve_planes(block, kernel)
+            else:
+                science[start:start + block_size] = convolve_planes_pixel_kernel(block, pixel_kernel)
+        return data
 
     def add_mirage_info(self):
         """Place Mirage-related information in a FITS hdulist so that it can
@@ -564,47 +630,29 @@ class Observation():
         # other cases here.
         rapids = ["RAPID", "NISRAPID", "FGSRAPID"]
         if ((darkpatt in rapids) and (self.params['Readout']['readpatt'] not in rapids)):
-            deltaframe = self.params['Readout']['nskip'] + \
-                         self.params['Readout']['nframe']
-            frames = np.arange(0, self.params['Readout']['nframe'])
-            accumimage = np.zeros_like(synthetic[0, :, :], dtype=np.int32)
-            sbaccumimage = np.zeros_like(synthetic[0, :, :], dtype=np.int32)
-
-            # Loop over integrations
-            for integ in range(self.params['Readout']['nint']):
-
-                # Loop over groups
-                for i in range(self.params['Readout']['ngroup']):
-                    # average together the appropriate frames,
-                    # skip the appropriate frames
-                    self.logger.info(('Averaging dark current ramp in add_synthetic_to_dark.'
-                                      'Frames {}, to become group {}'.format(frames, i)))
-
-                    # If averaging needs to be done
-                    if self.params['Readout']['nframe'] > 1:
-                        accumimage = np.mean(dark.data[integ, frames, :, :], axis=0)
-                        sbaccumimage = np.mean(dark.sbAndRefpix[integ, frames, :, :],
-                                               axis=0)
-
-                        # If no averaging needs to be done
-                    else:
-                        accumimage = dark.data[integ, frames[0], :, :]
-                        sbaccumimage = dark.sbAndRefpix[integ, frames[0], :, :]
-
-                    # Now add the averaged dark frame to the synthetic data,
-                    # which has already been placed into the correct readout pattern
-                    synthetic[integ, i, :, :] += accumimage
-                    reorder_sbandref[integ, i, :, :] = sbaccumimage
-
-                    # Increment the frame indexes
-                    frames = frames + deltaframe
+            # Average together the appropriate frames of all integrations
+            # and groups, skipping the appropriate frames
+            self.logger.info('Averaging dark current ramp in add_synthetic_to_dark.')
+            ngroup = self.params['Readout']['ngroup']
+            nframe = self.params['Readout']['nframe']
+            nskip = self.params['Readout']['nskip']
+            nint = synthetic.shape[0]
+            average_rapid_groups(dark.sbAndRefpix[0:nint], ngroup, nframe, nskip, out=reorder_sbandref)
+
+            # Now add the averaged dark frames to the synthetic data, which
+            # have already been placed into the correct readout pattern.
+            # Average one integration at a time to limit memory use.
+            accumimage = np.empty((1, ) + synthetic.shape[1:], dtype=synthetic.dtype)
+            for integ in range(nint):
+                average_rapid_groups(dark.data[integ:integ+1], ngroup, nframe, nskip, out=accumimage)
+                synthetic[integ] += accumimage[0]
 
         elif (darkpatt == self.params['Readout']['readpatt']):
             # If the input dark is not RAPID, or if the readout pattern
             # of the input dark and the output ramp match, then no averaging
             # needs to be done and we can simply add the synthetic groups to
             # the dark current groups.
-            synthetic = synthetic + dark.data[:, 0:self.params['Readout']['ngroup'], :, :]
+            synthetic += dark.data[:, 0:self.params['Readout']['ngroup'], :, :]
             reorder_sbandref = dark.sbAndRefpix
         return synthetic, zeroframe, reorder_sbandref
 
@@ -983,7 +1031,7 @@ class Observation():
                 pixels = np.where(just_this_bit != 0)
                 dqmask[pixels] = np.bitwise_or(dqmask[pixels], standard_bitvalue)
         else:
-            dqmask = inmask
+            dqmask = np.copy(inmask)
 
         return dqmask
 
@@ -1019,6 +1067,22 @@ class Observation():
                                          (self.params['Readout']['nframe']+self.params['Readout']['nskip']))
         return crhits, crs_perframe
 
+    def cr_list_filename(self):
+        """Name of the file listing the cosmic rays added to the
+        integration being created. When integrations are created by
+        separate processes, each integration has its own file.
+
+        Returns
+        -------
+        filename : str
+            Name of the cosmic ray list file
+        """
+        base_name = self.params['Output']['file'].split('/')[-1]
+        suffix = '_cosmicrays.list'
+        if self.crlist_integration is not None:
+            suffix = '_int{:04d}_cosmicrays.list'.format(self.crlist_integration + 1)
+        return os.path.join(self.params['Output']['directory'], base_name[0:-5] + suffix)
+
     @logging_functions.log_fail
     def create(self, override_refs=None):
         """MAIN FUNCTION"""
@@ -1048,6 +1112,10 @@ class Observation():
         #print('self.linDark:', self.linDark)
         #print('self.seed:', self.seed)
 
+        # Read in the ramp options before the dark, since they determine
+        # how much of the dark is read at once
+        self.set_ramp_options()
+
         # Get the input dark if a filename is supplied
         self.dark_setup()
 
@@ -1219,62 +1287,32 @@ class Observation():
                                   "seed image. Unable to determine whether the "
                                   "seed image is in units of ADU or electrons."))
 
-            # Translate to ramp if necessary,
-            # Add poisson noise and cosmic rays
-            # Rearrange into requested read pattern
-            # All done in one function to save memory
-            simexp, simzero = self.add_crs_and_noise(self.seed_image, num_integrations=num_integrations)
-
-            # Multiply flat fields
-            simexp = self.add_flatfield_effects(simexp)
-            simzero = self.add_flatfield_effects(np.expand_dims(simzero, axis=1))[:, 0, :, :]
-
-            # Mask any reference pixels
-            if self.params['Output']['grism_source_image'] is False:
-                simexp, simzero = self.mask_refpix(simexp, simzero)
-
-            # Add IPC effects
-            # (Dark current ramp already has IPC in it)
-            if self.runStep['ipc']:
-                simexp = self.add_ipc(simexp)
-                simzero = self.add_ipc(np.expand_dims(simzero, axis=1))[:, 0, :, :]
-
-            # Add the simulated source ramp to the dark ramp
-            lin_outramp, lin_zeroframe, lin_sbAndRefpix = self.add_synthetic_to_dark(simexp,
-                                                                                     self.linear_dark,
-                                                                                     syn_zeroframe=simzero)
-
-            # Add other detector effects (Crosstalk/PAM)
-            self.logger.info('Adding crosstalk')
-            lin_outramp = self.add_detector_effects(lin_outramp)
-            lin_zeroframe = self.add_detector_effects(np.expand_dims(lin_zeroframe, axis=1))[:, 0, :, :]
-
-            # We need to first subtract superbias and refpix signals from the
-            # original saturation limits, and then linearize them
-            # Refpix signals will vary from group to group, but only by a few
-            # ADU. So let's cheat and just use the refpix signals from group 0
-
-            # Create a linearized saturation map
-            limits = np.zeros_like(self.satmap) + 1.e6
-
-            if self.linear_dark.sbAndRefpix is not None:
-                lin_satmap = unlinearize.nonLinFunc(self.satmap - self.linear_dark.sbAndRefpix[0, 0, :, :],
-                                                    nonlincoeffs, limits)
-            elif ((self.linear_dark.sbAndRefpix is None) & (self.runStep['superbias'])):
-                # If the superbias and reference pixel signal is not available
-                # but the superbias reference file is, then just use that.
-                lin_satmap = unlinearize.nonLinFunc(self.satmap - self.superbias,
-                                                    nonlincoeffs, limits)
-
-            elif ((self.linear_dark.sbAndRefpix is None) & (self.runStep['superbias'] is False)):
-                # If superbias and refpix signal is not available and
-                # the superbias reffile is also not available, fall back to
-                # a superbias value that is roughly correct. Error in this value
-                # will cause errors in saturation flagging for the highest signal
-                # pixels.
-                manual_sb = np.zeros_like(self.satmap) + 12000.
-                lin_satmap = unlinearize.nonLinFunc(self.satmap - manual_sb,
-                                                    nonlincoeffs, limits)
+            # Integrations are created in the working precision
+            if np.dtype(self.working_dtype).itemsize < self.seed_image.dtype.itemsize:
+                self.seed_image = self.seed_image.astype(self.working_dtype)
+
+            # Create a linearized saturation map, used to flag saturated
+            # pixels and to unlinearize the exposure
+            lin_satmap = self.linearized_saturation_map(nonlincoeffs)
+
+            if self.params['Output']['save_intermediates']:
+                accuracy_file = os.path.join(self.params['Output']['directory'],
+                                             basename[0:-5] + '_doNonLin_accuracy.fits')
+            else:
+                accuracy_file = None
+
+            if self.stream_integrations > 0:
+                # Create the exposure a block of integrations at a time
+                products = self.process_exposure_in_chunks(num_integrations, nonlincoeffs, lin_satmap,
+                                                           accuracy_file=accuracy_file)
+            else:
+                # Translate to ramp if necessary,
+                # Add poisson noise and cosmic rays
+                # Rearrange into requested read pattern
+                # All done in one function to save memory
+                simexp, simzero = self.add_crs_and_noise(self.seed_image, num_integrations=num_integrations)
+                products = self.process_integrations(simexp, simzero, self.linear_dark, nonlincoeffs, lin_satmap,
+                                                     accuracy_file=accuracy_file)
 
             # Save the ramp if requested. This is the linear ramp,
             # ready to go into the Jump step of the pipeline
@@ -1290,83 +1328,36 @@ class Observation():
                 #linearrampfile = linearrampfile.split('/')[-1]
                 linearrampfile = os.path.join(self.params['Output']['directory'], linearrampfile)
 
-                # Saturation flagging - to create the pixeldq extension
-                # and make data ready for ramp fitting
-                # Since we subtracted the superbias and refpix signal from the
-                # saturation map prior to linearizing, we can now compare that map
-                # to lin_outramp, which also does not include superbias nor refpix
-                # signal, and is linear.
-                groupdq = self.flag_saturation(lin_outramp, lin_satmap)
-
-                # Create the error and groupdq extensions
-                err, pixeldq = self.create_other_extensions(copy.deepcopy(lin_outramp))
-
                 if self.params['Inst']['use_JWST_pipeline']:
-                    self.save_DMS(lin_outramp, lin_zeroframe, linearrampfile, mod='ramp',
-                                  err_ext=err, group_dq=groupdq, pixel_dq=pixeldq)
+                    self.save_DMS(products['lin_outramp'], products['lin_zeroframe'], linearrampfile, mod='ramp',
+                                  err_ext=products['err'], group_dq=products['groupdq'],
+                                  pixel_dq=products['pixeldq'])
                 else:
-                    self.save_fits(lin_outramp, lin_zeroframe, linearrampfile, mod='ramp',
-                                   err_ext=err, group_dq=groupdq, pixel_dq=pixeldq)
+                    self.save_fits(products['lin_outramp'], products['lin_zeroframe'], linearrampfile, mod='ramp',
+                                   err_ext=products['err'], group_dq=products['groupdq'],
+                                   pixel_dq=products['pixeldq'])
 
                 stp.add_wcs(linearrampfile, roll=self.params['Telescope']['rotation'])
                 self.logger.info("Final linearized exposure saved to:")
                 self.logger.info("{}".format(linearrampfile))
                 self.linear_output = linearrampfile
 
-            # If the raw version is requested, we need to unlinearize
-            # the ramp
+            # Save the raw ramp if requested
             self.raw_output = None
             if 'raw' in self.params['Output']['datatype'].lower():
-                if self.linear_dark.sbAndRefpix is not None:
-                    if self.params['Output']['save_intermediates']:
-                        #base_name = self.params['Output']['file'].split('/')[-1]
-                        ofile = os.path.join(self.params['Output']['directory'],
-                                             basename[0:-5] + '_doNonLin_accuracy.fits')
-                        savefile = True
-                    else:
-                        ofile = None
-                        savefile = False
-
-                    self.logger.info('Unlinearizing exposure.')
-                    raw_outramp = unlinearize.unlinearize(lin_outramp, nonlincoeffs, self.satmap,
-                                                          lin_satmap,
-                                                          maxiter=self.params['nonlin']['maxiter'],
-                                                          accuracy=self.params['nonlin']['accuracy'],
-                                                          save_accuracy_map=savefile,
-                                                          accuracy_file=ofile)
-                    raw_zeroframe = unlinearize.unlinearize(lin_zeroframe, nonlincoeffs, self.satmap,
-                                                            lin_satmap,
-                                                            maxiter=self.params['nonlin']['maxiter'],
-                                                            accuracy=self.params['nonlin']['accuracy'],
-                                                            save_accuracy_map=False)
-
-                    # Add the superbias and reference pixel signal back in
-                    self.logger.info('Adding superbias and reference pixel signals.')
-                    raw_outramp = self.add_superbias_and_refpix(raw_outramp, lin_sbAndRefpix)
-                    raw_zeroframe = self.add_superbias_and_refpix(raw_zeroframe, self.linear_dark.zero_sbAndRefpix)
-
-                    # Make sure all signals are < 65535
-                    raw_outramp[raw_outramp > 65535] = 65535
-                    raw_zeroframe[raw_zeroframe > 65535] = 65535
-
-                    # Save the raw ramp
-                    #base_name = self.params['Output']['file'].split('/')[-1]
-                    rawrampfile = os.path.join(self.params['Output']['directory'], basename)
-                    if self.params['Inst']['use_JWST_pipeline']:
-                        self.save_DMS(raw_outramp, raw_zeroframe, rawrampfile, mod='1b')
-                    else:
-                        self.save_fits(raw_outramp, raw_zeroframe, rawrampfile, mod='1b')
-                    stp.add_wcs(rawrampfile, roll=self.params['Telescope']['rotation'])
-                    self.logger.info("Final raw exposure saved to: ")
-                    self.logger.info("{}".format(rawrampfile))
-                    self.raw_output = rawrampfile
-
-                    # Adding this as an attribute so it can be accessed by soss_simulator.py
-                    self.raw_outramp = raw_outramp
+                #base_name = self.params['Output']['file'].split('/')[-1]
+                rawrampfile = os.path.join(self.params['Output']['directory'], basename)
+                if self.params['Inst']['use_JWST_pipeline']:
+                    self.save_DMS(products['raw_outramp'], products['raw_zeroframe'], rawrampfile, mod='1b')
                 else:
-                    raise ValueError(("WARNING: raw output ramp requested, but the signal associated "
-                                      "with the superbias and reference pixels is not present in "
-                                      "the dark current data object. Quitting."))
+                    self.save_fits(products['raw_outramp'], products['raw_zeroframe'], rawrampfile, mod='1b')
+                stp.add_wcs(rawrampfile, roll=self.params['Telescope']['rotation'])
+                self.logger.info("Final raw exposure saved to: ")
+                self.logger.info("{}".format(rawrampfile))
+                self.raw_output = rawrampfile
+
+                # Adding this as an attribute so it can be accessed by soss_simulator.py
+                self.raw_outramp = products['raw_outramp']
 
             # Stop the timer and record the elapsed time
             self.timer.stop(name='seg_{}'.format(str(i+1).zfill(4)))
@@ -1496,10 +1487,8 @@ class Observation():
 
         # pixel dq extension - populate using the mask reference file
         if self.runStep['badpixfile']:
-            mask_hdu = fits.open(self.params['Reffiles']['badpixmask'])
-            mask = mask_hdu[1].data
-            dqdef = mask_hdu[2].data
-            mask_hdu.close()
+            mask, _ = reference_registry.read_fits_data(self.params['Reffiles']['badpixmask'])
+            dqdef, _ = reference_registry.read_fits_data(self.params['Reffiles']['badpixmask'], ext=2)
 
             # Crop to match output subarray size
             if "FULL" not in self.params['Readout']['array_name']:
@@ -1516,8 +1505,9 @@ class Observation():
                 # If the pipeline is not to be used, then the
                 # best we can do is assume that the input bad
                 # pixel value definitions match what the pipeline
-                # expects, and keep the mask as read in.
-                pixeldq = mask
+                # expects, and keep the mask as read in. The mask read
+                # in is shared, so use a copy.
+                pixeldq = np.copy(mask)
         else:
             self.logger.info(("No bad pixel mask provided. Setting all pixels in "
                               "pixel data quality extension to 0, indicating they "
@@ -1548,7 +1538,9 @@ class Observation():
         Parameters
         ----------
         orig : numpy.ndarray
-            Array to add crosstalk to
+            Array to add crosstalk to. May be a single 2D frame, or a
+            stack of frames, in which case the crosstalk signal for all
+            frames is calculated at once.
 
         coeffs : numpy.ndarray
             Crosstalk coefficients from the input coefficint file
@@ -1559,45 +1551,14 @@ class Observation():
             Input data modified to have crosstalk
         """
         xtalk_corr_im = np.zeros_like(orig)
-        subamp_shift = {"0": 1, "1": -1, "2": 1, "3": -1}
-
-        # List of starting columns for all quadrants.
-        xtqstart = [0, 512, 1024, 1536, 2048]
-
-        for amp in range(4):
-            to_mult = orig[:, xtqstart[amp]:xtqstart[amp+1]]
-            receivers = []
-            for i in range(4):
-                if i != amp:
-                    receivers.append(i)
-            # Reverse the values to multply if the amps being used
-            # are adjacent or 3 amps apart
-            for subamp in receivers:
-                index = 'xt'+str(amp+1)+str(subamp+1)
-                if ((np.absolute(amp-subamp) == 1) | (np.absolute(amp-subamp) == 3)):
-                    corr_amp = np.fliplr(to_mult) * coeffs[index]
-                if (np.absolute(amp-subamp) == 2):
-                    corr_amp = to_mult * coeffs[index]
-
-                xtalk_corr_im[:, xtqstart[subamp]:xtqstart[subamp+1]] += corr_amp
-
-            # Per Armin's instructions, now repeat the process
-            # using his xt??post coefficients, but shift the arrays
-            # by one pixel according to readout direction.
-            for subamp in receivers:
-                index = 'xt'+str(amp+1)+str(subamp+1)+'post'
-                if ((np.absolute(amp-subamp) == 1) | (np.absolute(amp-subamp) == 3)):
-                    corr_amp = np.fliplr(to_mult) * coeffs[index]
-                    corr_amp = np.roll(corr_amp, subamp_shift[str(subamp)], axis=1)
-                if (np.absolute(amp-subamp) == 2):
-                    corr_amp = to_mult * coeffs[index]
-                    corr_amp = np.roll(corr_amp, subamp_shift[str(subamp)])
-
-                xtalk_corr_im[:, xtqstart[subamp]:xtqstart[subamp+1]] += corr_amp
-
-        # Save the crosstalk correction image
+
+        # Only the 4 amplifier regions of the detector produce crosstalk
+        ncols = 4 * AMPLIFIER_COLUMNS
+        xtalk_corr_im[..., 0:ncols] = crosstalk_signal(orig[..., 0:ncols], crosstalk_matrices(coeffs))
+
+        # Save the crosstalk correction image of the last frame
         if self.params['Output']['save_intermediates'] is True:
-            phdu = fits.PrimaryHDU(xtalk_corr_im)
+            phdu = fits.PrimaryHDU(xtalk_corr_im.reshape((-1, ) + xtalk_corr_im.shape[-2:])[-1])
             base_name = self.params['Output']['file'].split('/')[-1]
             xtalkout = os.path.join(self.params['Output']['directory'], base_name[0:-5] +
                                     '_xtalk_correction_image.fits')
@@ -1605,6 +1566,39 @@ class Observation():
 
         return xtalk_corr_im
 
+    def dark_integrations(self, start, stop):
+        """Get a range of integrations of the linearized dark. If only
+        part of the dark was read from its file (see ``read_dark_file``),
+        the integrations are read from the file. Otherwise they are views
+        of the integrations in ``self.linear_dark``.
+
+        Parameters
+        ----------
+        start : int
+            Index of the first integration
+
+        stop : int
+            Index one beyond the last integration
+
+        Returns
+        -------
+        dark : read_fits object
+            Dark with the data, zeroframe and superbias and refpix arrays
+            limited to the given integrations
+        """
+        if getattr(self.linear_dark, 'integrations', None) is not None:
+            dark = read_fits.Read_fits()
+            dark.file = self.linear_dark.file
+            dark.read_astropy(integrations=(start, stop))
+            return dark
+
+        dark = copy.copy(self.linear_dark)
+        for attribute in ['data', 'sbAndRefpix', 'zeroframe', 'zero_sbAndRefpix']:
+            value = getattr(self.linear_dark, attribute)
+            if value is not None:
+                setattr(dark, attribute, value[start:stop])
+        return dark
+
     def dark_setup(self):
         """The input value for self.linDark can be one of several types.
         Deal with that here and get self.linear_dark
@@ -1613,7 +1607,9 @@ class Observation():
         if isinstance(self.linDark, mirage.utils.read_fits.Read_fits):
             # Case where user has provided a Read_fits object
             self.logger.info('Dark object provided')
-            self.linear_dark = copy.deepcopy(self.linDark)
+            # The dark arrays are never modified, so they are shared rather
+            # than copied
+            self.linear_dark = copy.copy(self.linDark)
             self.linDark = ['none']
         else:
             if self.linDark is None:
@@ -1669,30 +1665,46 @@ class Observation():
 
         # Add cosmic rays to a frame
         nray = int(ncr)
+        if nray < 1:
+            return image
 
-        i = 0
+        # Draw the locations and library entries of all cosmic rays at once.
+        # Values are drawn in the same order as when cosmic rays were added
+        # one at a time, so a given seed produces the same cosmic rays.
+        draws = np.array([self.generator1.random() for i in range(4 * nray)]).reshape(nray, 4)
         dims = image.shape
-        while i < nray:
-            i = i+1
-            j = int(self.generator1.random()*dims[0])
-            k = int(self.generator1.random()*dims[1])
-            n = int(self.generator1.random()*10.0)
-            m = int(self.generator1.random()*1000.0)
-            crimage = np.copy(self.cosmicrays[n][m, :, :])
-            i1 = max(j-10, 0)
-            i2 = min(j+11, dims[0])
-            j1 = max(k-10, 0)
-            j2 = min(k+11, dims[1])
-            k1 = 10-(j-i1)
-            k2 = 10+(i2-j)
-            l1 = 10-(k-j1)
-            l2 = 10+(j2-k)
-
-            # Insert cosmic ray (divided by gain to put into ADU)
-            image[i1:i2, j1:j2] = image[i1:i2, j1:j2] + crimage[k1:k2, l1:l2] / self.gain  # self.gainim[k1:k2, l1:l2]
-
-            self.cosmicraylist.write("{} {} {} {} {} {} {}\n".format((j2-j1)/2+j1, (i2-i1)/2+i1, ngroup,
-                                     iframe, n, m, np.max(crimage[k1:k2, l1:l2])))
+        j = (draws[:, 0] * dims[0]).astype(int)
+        k = (draws[:, 1] * dims[1]).astype(int)
+        n = (draws[:, 2] * 10.0).astype(int)
+        m = (draws[:, 3] * 1000.0).astype(int)
+
+        # Collect the library images, 10 pixels on either side of the hit
+        crimages = np.zeros((nray, ) + self.cosmicrays[0].shape[1:])
+        for library_file in np.unique(n):
+            in_file = n == library_file
+            crimages[in_file] = self.cosmicrays[library_file][m[in_file], :, :]
+
+        # Insert cosmic rays (divided by gain to put into ADU). Cosmic rays
+        # that overlap are summed.
+        scatter_add_stamps(image, crimages / self.gain, k - 10, j - 10)
+
+        # Write the list of cosmic rays. Positions are the centers of the
+        # portions of the library images that land on the frame.
+        i1 = np.maximum(j - 10, 0)
+        i2 = np.minimum(j + 11, dims[0])
+        j1 = np.maximum(k - 10, 0)
+        j2 = np.minimum(k + 11, dims[1])
+        _, on_image = stamp_pixel_indices(k - 10, j - 10, crimages.shape[1:], dims)
+        crlist = np.zeros(nray, dtype=[('x', float), ('y', float), ('group', int), ('frame', int),
+                                       ('file_index', int), ('file_frame', int), ('max_signal', float)])
+        crlist['x'] = (j2 - j1) / 2 + j1
+        crlist['y'] = (i2 - i1) / 2 + i1
+        crlist['group'] = ngroup
+        crlist['frame'] = iframe
+        crlist['file_index'] = n
+        crlist['file_frame'] = m
+        crlist['max_signal'] = np.max(np.where(on_image, crimages, -np.inf), axis=(1, 2))
+        np.savetxt(self.cosmicraylist, crlist, fmt='%s %s %d %d %d %d %s')
         return image
 
     def do_poisson(self, signalimage, seedval):
@@ -1731,23 +1743,14 @@ class Observation():
         # Quantum yield is 1.0 for all NIRCam filters
         pym1 = 0.
 
-        # Can't add Poisson noise to pixels with negative values
-        # Set those to zero when adding noise, then replace with
-        # original value
+        # Can't add Poisson noise to pixels with negative values.
+        # Set those to zero, so that they are zero in the output.
+        # ramp_engine.poisson_realization does the same.
         signalgain = signalimage * self.gain
-        highpix = np.where(signalgain == np.nanmax(signalgain))
-        if np.nanmin(signalgain) < 0.:
-            neg = signalgain < 0.
-            negatives = copy.deepcopy(signalgain)
-            negatives[neg] = signalgain[neg]
-            signalgain[neg] = 0.
+        signalgain[signalgain < 0.] = 0.
 
         # Add poisson noise
-        newimage = np.random.poisson(signalgain, signalgain.shape).astype(np.float64)
-
-        if np.nanmin(signalgain) < 0.:
-            newimage[neg] = negatives[neg].astype(np.float64)
-
+        newimage = np.random.poisson(signalgain, signalgain.shape).astype(self.working_dtype)
         newimage /= self.gain
 
         # Quantum yield for NIRCam is always 1.0 (so psym1=0)
@@ -1844,7 +1847,7 @@ class Observation():
         if ndim == 3:
             data = np.vstack((np.zeros((1, yd, xd)), data))
 
-        outramp = np.zeros((self.params['Readout']['ngroup'], yd, xd), dtype=float)
+        outramp = np.zeros((self.params['Readout']['ngroup'], yd, xd), dtype=self.working_dtype)
 
         # Set up functions to apply cosmic rays later
         # Need the total number of active pixels in the
@@ -1856,9 +1859,7 @@ class Observation():
             crhits, crs_perframe = self.cr_funcs(npix, seed=self.params['cosmicRay']['seed'])
 
             # open output file to contain the list of cosmic rays
-            base_name = self.params['Output']['file'].split('/')[-1]
-            crlistout = os.path.join(self.params['Output']['directory'], base_name[0:-5] + '_cosmicrays.list')
-            self.open_cr_list_file(crlistout, crhits)
+            self.open_cr_list_file(self.cr_list_filename(), crhits)
 
         # Difference between the latest outimage frame and the
         # latest newsignalimage frame. This is important when nframe>1
@@ -1869,7 +1870,7 @@ class Observation():
 
         # Define signal in the previous frame
         # Needed in loop below
-        previoussignal = np.zeros((yd, xd))
+        previoussignal = np.zeros((yd, xd), dtype=self.working_dtype)
 
         # Container for zeroth frame
         zeroframe = None
@@ -1881,7 +1882,7 @@ class Observation():
         for i in range(self.params['Readout']['ngroup']):
 
             # Hold the averaged group signal
-            accumimage = np.zeros((yd, xd))
+            accumimage = np.zeros((yd, xd), dtype=self.working_dtype)
 
             # Group 0: the initial nskip frames don't exist,
             # so adjust indexes accordingly
@@ -1976,7 +1977,7 @@ class Observation():
             yd, xd = data.shape
 
         # Define output ramp
-        outramp = np.zeros((self.params['Readout']['ngroup'], yd, xd))
+        outramp = np.zeros((self.params['Readout']['ngroup'], yd, xd), dtype=self.working_dtype)
 
         # If a ramp is given, create a -1st frame that is all zeros
         # so that we can create deltaframes for all frames later
@@ -1987,13 +1988,13 @@ class Observation():
         zeroframe = None
 
         if ndim == 2:
-            totalsignal = np.zeros((yd, xd))
+            totalsignal = np.zeros((yd, xd), dtype=self.working_dtype)
 
         # Total frames per group (including skipped frames)
         framesPerGroup = self.params['Readout']['nframe']+self.params['Readout']['nskip']
         # Loop over each group
         for i in range(self.params['Readout']['ngroup']):
-            accumimage = np.zeros((yd, xd))
+            accumimage = np.zeros((yd, xd), dtype=self.working_dtype)
 
             # Loop over frames within each group if necessary
             # create each frame
@@ -2030,6 +2031,111 @@ class Observation():
             outramp[i, :, :] = accumimage
         return outramp, zeroframe
 
+    def frame_to_ramp_vectorized(self, data):
+        """Convert rate image to ramp, add poisson noise and, if requested,
+        cosmic rays. Frames are built a block of groups at a time. The
+        Poisson noise for all frames in a block is drawn at once using a
+        ``numpy.random.Generator`` seeded with ``simSignals:poissonseed``,
+        the frames are accumulated using ``np.cumsum``, and the frames
+        in each group are averaged using ``average_groups``.
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            Seed image. Should be a 2d frame or 3d integration.
+            If the original seed image is a 4d exposure, call
+            frame_to_ramp_vectorized with one integration at a time.
+
+        Returns
+        -------
+        outramp : numpy.ndarray
+            3d integration with cosmic rays and poisson noise
+
+        zeroframe : numpy.ndarray
+            2d zeroth frame
+        """
+        ndim = len(data.shape)
+        if ndim == 3:
+            ngroupin, yd, xd = data.shape
+        elif ndim == 2:
+            yd, xd = data.shape
+        else:
+            raise ValueError("Seed image should be 2D or 3D. Got {} dimensions.".format(ndim))
+
+        ngroup = self.params['Readout']['ngroup']
+        nframe = self.params['Readout']['nframe']
+        nskip = self.params['Readout']['nskip']
+        framesPerGroup = nframe + nskip
+        totalframes = ngroup * framesPerGroup - nskip
+
+        # If a ramp is given, create a -1st frame that is all zeros
+        # so that we can create deltaframes for all frames
+        if ndim == 3:
+            data = np.vstack((np.zeros((1, yd, xd)), data))
+        elif ndim == 2:
+            deltaframe = data * self.frametime
+
+        if self.runStep['cosmicray']:
+            npix = int(yd * xd + 0.02)
+            crhits, crs_perframe = self.cr_funcs(npix, seed=self.params['cosmicRay']['seed'])
+            self.open_cr_list_file(self.cr_list_filename(), crhits)
+
+        # A single generator provides the noise for all frames. Advance the
+        # seed by the number of frames, as the frame-by-frame method does,
+        # so that each integration has a different noise realization.
+        rng = np.random.default_rng(self.params['simSignals']['poissonseed'])
+        self.params['simSignals']['poissonseed'] += totalframes
+
+        outramp = np.zeros((ngroup, yd, xd), dtype=self.working_dtype)
+        previoussignal = np.zeros((yd, xd), dtype=self.working_dtype)
+        zeroframe = None
+
+        block_groups = groups_per_block(ngroup, framesPerGroup, yd * xd, self.ramp_block_pixel_limit)
+        for firstgroup in range(0, ngroup, block_groups):
+            lastgroup = min(firstgroup + block_groups, ngroup)
+
+            # Each block holds whole groups, including their skipped frames.
+            # The skipped frames at the start of group 0 don't exist, so
+            # their slots are left with no signal.
+            frames = np.zeros(((lastgroup - firstgroup) * framesPerGroup, yd, xd), dtype=self.working_dtype)
+            firstslot = nskip if firstgroup == 0 else 0
+            firstframe = firstgroup * framesPerGroup - nskip + firstslot
+            lastframe = lastgroup * framesPerGroup - nskip
+            self.logger.info('    Creating frames {} to {} for groups {} to {}'
+                             .format(firstframe, lastframe - 1, firstgroup, lastgroup - 1))
+
+            # Signal arriving in each frame, with Poisson noise
+            if ndim == 3:
+                frames[firstslot:] = poisson_realization(rng, np.diff(data[firstframe:lastframe+1], axis=0),
+                                                         self.gain)
+            elif ndim == 2:
+                frames[firstslot:] = poisson_realization(rng, deltaframe, self.gain,
+                                                         size=(lastframe - firstframe, yd, xd))
+
+            # Cosmic rays arriving in each frame
+            if self.runStep['cosmicray']:
+                for slot in range(firstslot, frames.shape[0]):
+                    frameindex = firstgroup * framesPerGroup - nskip + slot
+                    frames[slot] = self.do_cosmic_rays(frames[slot], firstgroup + slot // framesPerGroup,
+                                                       slot % framesPerGroup, crs_perframe[frameindex],
+                                                       self.params['cosmicRay']['seed'])
+                    self.params['cosmicRay']['seed'] += 1
+
+            # Accumulate the signal, including that from skipped frames
+            frames[0] += previoussignal
+            np.cumsum(frames, axis=0, out=frames)
+            previoussignal = frames[-1].copy()
+
+            if zeroframe is None:
+                zeroframe = frames[firstslot].copy()
+
+            outramp[firstgroup:lastgroup] = average_groups(frames, nframe, nskip)
+
+        if self.runStep['cosmicray']:
+            self.cosmicraylist.close()
+
+        return outramp, zeroframe
+
     def get_cr_rate(self):
         """Get the base cosmic ray impact probability.
 
@@ -2080,13 +2186,15 @@ class Observation():
                               "Setting these coefficients such that no linearity "
                               "correction is made.".format(numnan)))
 
-        for i, cof in enumerate(range(nonlin.shape[0])):
-            tmp = nonlin[cof, :, :]
-            if i == 1:
-                tmp[nans] = 1.
-            else:
-                tmp[nans] = 0.
-            nonlin[cof, :, :] = tmp
+            # The coefficients read in are shared, so modify a copy
+            nonlin = np.copy(nonlin)
+            for i, cof in enumerate(range(nonlin.shape[0])):
+                tmp = nonlin[cof, :, :]
+                if i == 1:
+                    tmp[nans] = 1.
+                else:
+                    tmp[nans] = 0.
+                nonlin[cof, :, :] = tmp
 
         # # Crop to appropriate subarray - ALREADY DONE IN read_cal_file
         # if "FULL" not in self.params['Readout']['array_name']:
@@ -2190,6 +2298,45 @@ class Observation():
                           "runs.".format(outname)))
         return newkernel
 
+    def linearized_saturation_map(self, nonlincoeffs):
+        """Create a linearized saturation map. We need to first subtract
+        superbias and refpix signals from the original saturation limits,
+        and then linearize them. Refpix signals will vary from group to
+        group, but only by a few ADU. So let's cheat and just use the refpix
+        signals from group 0
+
+        Parameters
+        ----------
+        nonlincoeffs : numpy.ndarray
+            Non-linearity coefficients
+
+        Returns
+        -------
+        lin_satmap : numpy.ndarray
+            2D linearized saturation map
+        """
+        limits = np.zeros_like(self.satmap) + 1.e6
+
+        if self.linear_dark.sbAndRefpix is not None:
+            lin_satmap = unlinearize.nonLinFunc(self.satmap - self.linear_dark.sbAndRefpix[0, 0, :, :],
+                                                nonlincoeffs, limits)
+        elif ((self.linear_dark.sbAndRefpix is None) & (self.runStep['superbias'])):
+            # If the superbias and reference pixel signal is not available
+            # but the superbias reference file is, then just use that.
+            lin_satmap = unlinearize.nonLinFunc(self.satmap - self.superbias,
+                                                nonlincoeffs, limits)
+
+        elif ((self.linear_dark.sbAndRefpix is None) & (self.runStep['superbias'] is False)):
+            # If superbias and refpix signal is not available and
+            # the superbias reffile is also not available, fall back to
+            # a superbias value that is roughly correct. Error in this value
+            # will cause errors in saturation flagging for the highest signal
+            # pixels.
+            manual_sb = np.zeros_like(self.satmap) + 12000.
+            lin_satmap = unlinearize.nonLinFunc(self.satmap - manual_sb,
+                                                nonlincoeffs, limits)
+        return lin_satmap
+
     def map_seeds_to_dark(self):
         """
         Create a mapping of which seed image filenames belong to each dark
@@ -2386,6 +2533,184 @@ class Observation():
         grouptable = grouptable[:, 0]
         return grouptable
 
+    def process_exposure_in_chunks(self, num_integrations, nonlincoeffs, lin_satmap, accuracy_file=None):
+        """Create the exposure from ``self.seed_image`` and
+        ``self.linear_dark`` a block of ``self.stream_integrations``
+        integrations at a time. Each block is run through
+        ``add_crs_and_noise`` and ``process_integrations``, and the results
+        are converted to the data types of the output files
+        (``OUTPUT_DTYPES``) and written into arrays backed by temporary
+        files in the output directory. Darks read from a file are read a
+        block at a time, so apart from the seed image, which is held in
+        full, only one block of integrations is held in memory at a time.
+        Blocks always contain whole integrations. Integrations are not
+        split into blocks of groups.
+
+        Parameters
+        ----------
+        num_integrations : int
+            Number of integrations to create. If None, this is taken from
+            the seed image or the yaml file, as in ``add_crs_and_noise``
+
+        nonlincoeffs : numpy.ndarray
+            Non-linearity coefficients
+
+        lin_satmap : numpy.ndarray
+            Linearized saturation map
+
+        accuracy_file : str
+            Name of the file in which to save the unlinearization accuracy
+            map. The number (starting at 1) of the first integration of
+            each block is added to the name. If None, no maps are saved.
+
+        Returns
+        -------
+        products : dict
+            Output products, as returned by ``process_integrations``, for
+            the entire exposure, in the data types of the output files
+        """
+        if num_integrations is not None:
+            nint = num_integrations
+        elif len(self.seed_image.shape) == 4:
+            nint = self.seed_image.shape[0]
+        else:
+            nint = self.params['Readout']['nint']
+
+        products = {}
+        for start in range(0, nint, self.stream_integrations):
+            stop = min(start + self.stream_integrations, nint)
+            self.logger.info('Processing integrations {} to {} of {}.'.format(start + 1, stop, nint))
+
+            if len(self.seed_image.shape) == 4:
+                seed = self.seed_image[start:stop, :, :, :]
+            else:
+                seed = self.seed_image
+            simexp, simzero = self.add_crs_and_noise(seed, num_integrations=stop - start)
+
+            block_accuracy_file = None
+            if accuracy_file is not None:
+                block_accuracy_file = accuracy_file.replace('_doNonLin_accuracy.fits',
+                                                            '_int{:04d}_doNonLin_accuracy.fits'.format(start + 1))
+            block = self.process_integrations(simexp, simzero, self.dark_integrations(start, stop), nonlincoeffs,
+                                              lin_satmap, accuracy_file=block_accuracy_file)
+
+            for key, value in block.items():
+                # The pixel DQ map is the same for all integrations
+                if (key == 'pixeldq') or (value is None):
+                    products[key] = value
+                    continue
+                if key not in products:
+                    products[key] = disk_array((nint, ) + value.shape[1:], OUTPUT_DTYPES.get(key, value.dtype),
+                                               self.params['Output']['directory'])
+                products[key][start:stop] = value
+        return products
+
+    def process_integrations(self, simexp, simzero, dark, nonlincoeffs, lin_satmap, accuracy_file=None):
+        """Add flat field, IPC, dark current and crosstalk effects to
+        integrations containing noise and cosmic rays, then create the
+        linear and/or raw versions requested in the yaml file
+
+        Parameters
+        ----------
+        simexp : numpy.ndarray
+            4D integrations from ``add_crs_and_noise``
+
+        simzero : numpy.ndarray
+            Zeroth frames of the integrations
+
+        dark : read_fits object
+            Linearized dark current for the same integrations
+
+        nonlincoeffs : numpy.ndarray
+            Non-linearity coefficients
+
+        lin_satmap : numpy.ndarray
+            Linearized saturation map
+
+        accuracy_file : str
+            Name of the file in which to save the unlinearization accuracy
+            map. If None, no map is saved.
+
+        Returns
+        -------
+        products : dict
+            If the linear output is requested, the linear integrations and
+            zeroframes ('lin_outramp', 'lin_zeroframe'), and the 'groupdq',
+            'err' and 'pixeldq' extensions. If the raw output is requested,
+            the raw integrations and zeroframes ('raw_outramp',
+            'raw_zeroframe')
+        """
+        # Multiply flat fields
+        simexp = self.add_flatfield_effects(simexp)
+        simzero = self.add_flatfield_effects(np.expand_dims(simzero, axis=1))[:, 0, :, :]
+
+        # Mask any reference pixels
+        if self.params['Output']['grism_source_image'] is False:
+            simexp, simzero = self.mask_refpix(simexp, simzero)
+
+        # Add IPC effects
+        # (Dark current ramp already has IPC in it)
+        if self.runStep['ipc']:
+            simexp = self.add_ipc(simexp)
+            simzero = self.add_ipc(np.expand_dims(simzero, axis=1))[:, 0, :, :]
+
+        # Add the simulated source ramp to the dark ramp
+        lin_outramp, lin_zeroframe, lin_sbAndRefpix = self.add_synthetic_to_dark(simexp, dark,
+                                                                                 syn_zeroframe=simzero)
+
+        # Add other detector effects (Crosstalk/PAM)
+        self.logger.info('Adding crosstalk')
+        lin_outramp = self.add_detector_effects(lin_outramp)
+        lin_zeroframe = self.add_detector_effects(np.expand_dims(lin_zeroframe, axis=1))[:, 0, :, :]
+
+        products = {}
+        if 'linear' in self.params['Output']['datatype'].lower():
+            # Saturation flagging - to create the pixeldq extension
+            # and make data ready for ramp fitting
+            # Since we subtracted the superbias and refpix signal from the
+            # saturation map prior to linearizing, we can now compare that map
+            # to lin_outramp, which also does not include superbias nor refpix
+            # signal, and is linear.
+            products['groupdq'] = self.flag_saturation(lin_outramp, lin_satmap)
+
+            # Create the error and groupdq extensions
+            products['err'], products['pixeldq'] = self.create_other_extensions(copy.deepcopy(lin_outramp))
+            products['lin_outramp'] = lin_outramp
+            products['lin_zeroframe'] = lin_zeroframe
+
+        # If the raw version is requested, we need to unlinearize
+        # the ramp
+        if 'raw' in self.params['Output']['datatype'].lower():
+            if dark.sbAndRefpix is None:
+                raise ValueError(("WARNING: raw output ramp requested, but the signal associated "
+                                  "with the superbias and reference pixels is not present in "
+                                  "the dark current data object. Quitting."))
+
+            self.logger.info('Unlinearizing exposure.')
+            raw_outramp = unlinearize.unlinearize(lin_outramp, nonlincoeffs, self.satmap,
+                                                  lin_satmap,
+                                                  maxiter=self.params['nonlin']['maxiter'],
+                                                  accuracy=self.params['nonlin']['accuracy'],
+                                                  save_accuracy_map=accuracy_file is not None,
+                                                  accuracy_file=accuracy_file)
+            raw_zeroframe = unlinearize.unlinearize(lin_zeroframe, nonlincoeffs, self.satmap,
+                                                    lin_satmap,
+                                                    maxiter=self.params['nonlin']['maxiter'],
+                                                    accuracy=self.params['nonlin']['accuracy'],
+                                                    save_accuracy_map=False)
+
+            # Add the superbias and reference pixel signal back in
+            self.logger.info('Adding superbias and reference pixel signals.')
+            raw_outramp = self.add_superbias_and_refpix(raw_outramp, lin_sbAndRefpix)
+            raw_zeroframe = self.add_superbias_and_refpix(raw_zeroframe, dark.zero_sbAndRefpix)
+
+            # Make sure all signals are < 65535
+            raw_outramp[raw_outramp > 65535] = 65535
+            raw_zeroframe[raw_zeroframe > 65535] = 65535
+            products['raw_outramp'] = raw_outramp
+            products['raw_zeroframe'] = raw_zeroframe
+        return products
+
     def read_cal_file(self, filename):
         """Read in the specified calibration fits file. This is for files that contain
         images (e.g. flats, superbias, etc)
@@ -2398,15 +2723,14 @@ class Observation():
         Returns
         -------
         image : numpy.ndarray
-            Array data from input file
+            Array data from input file. This is shared with other readers of
+            the file, and is read-only
 
         header : list
             Information from file header
         """
         try:
-            with fits.open(filename) as h:
-                image = h[1].data
-                header = h[0].header
+            image, header = reference_registry.read_fits_data(filename)
         except FileNotFoundError:
             self.logger.error("ERROR: Unable to open {}".format(filename))
 
@@ -2434,9 +2758,7 @@ class Observation():
             idx = '_%2.2d_' % (i)
             str1 = idx + self.params['cosmicRay']['suffix'] + '.fits'
             name = self.crfile + str1
-            with fits.open(name) as h:
-                im = h[1].data
-                head = h[0].header
+            im, head = reference_registry.read_fits_data(name)
             self.cosmicrays.append(im)
             self.cosmicraysheader.append(head)
 
@@ -2484,7 +2806,13 @@ class Observation():
         """
         obj = read_fits.Read_fits()
         obj.file = filename
-        obj.read_astropy()
+        if self.stream_integrations > 0:
+            # When the exposure is created a block of integrations at a
+            # time, only the first integration is read here. Each block of
+            # integrations is read when it is needed. See dark_integrations()
+            obj.read_astropy(integrations=(0, 1))
+        else:
+            obj.read_astropy()
         return obj
 
     def read_gain_map(self):
@@ -2495,7 +2823,8 @@ class Observation():
             self.gainim, self.gainhead = self.read_cal_file(self.params['Reffiles']['gain'])
             # set any NaN's to 1.0
             bad = ((~np.isfinite(self.gainim)) | (self.gainim == 0))
-            self.gainim[bad] = 1.0
+            if np.any(bad):
+                self.gainim = np.where(bad, 1.0, self.gainim)
 
             # Pixels that have a gain value of 0
             # will be reset to have values of 1.0
@@ -2520,7 +2849,8 @@ class Observation():
             try:
                 self.satmap, self.satheader = self.read_cal_file(self.params['Reffiles']['saturation'])
                 bad = ~np.isfinite(self.satmap)
-                self.satmap[bad] = 1.e6
+                if np.any(bad):
+                    self.satmap = np.where(bad, 1.e6, self.satmap)
             except Exception:
                 self.logger.warning(('WARNING: unable to open saturation file {}.'
                                      .format(self.params['Reffiles']['saturation'])))
@@ -2763,7 +3093,9 @@ class Observation():
         if len(imshape) == 3:
             ramp = np.expand_dims(ramp, axis=0)
 
-        # insert data into model
+        # insert data into model. Arrays already in the data type of the
+        # model (e.g. those created a block of integrations at a time)
+        # are used without being copied
         outModel.data = ramp
 
         if mod == 'ramp':
@@ -3134,7 +3466,9 @@ class Observation():
         if len(imshape) == 3:
             ramp = np.expand_dims(ramp, axis=0)
 
-        if mod == '1b':
+        # Unsigned 16-bit integer ramps (e.g. those created a block of
+        # integrations at a time) cannot be above the limit
+        if mod == '1b' and ramp.dtype != np.uint16:
             toohigh = ramp > 65535
             ramp[toohigh] = 65535
 
@@ -3156,13 +3490,14 @@ class Observation():
         extra_fits_hdulist = self.add_mirage_info()
         extra_header0 = extra_fits_hdulist[0].header
 
+        # Arrays that are already in the output data type are not copied
         if mod == 'ramp':
             ex0 = fits.PrimaryHDU(header=extra_header0)
-            ex1 = fits.ImageHDU(ramp.astype(np.float32), name='SCI')
-            ex2 = fits.ImageHDU(pixel_dq.astype(np.uint32), name='PIXELDQ')
-            ex3 = fits.ImageHDU(group_dq.astype(np.uint8), name='GROUPDQ')
-            ex4 = fits.ImageHDU(err_ext.astype(np.float32), name='ERR')
-            ex5 = fits.ImageHDU(zeroframe.astype(np.float32), name='ZEROFRAME')
+            ex1 = fits.ImageHDU(ramp.astype(np.float32, copy=False), name='SCI')
+            ex2 = fits.ImageHDU(pixel_dq.astype(np.uint32, copy=False), name='PIXELDQ')
+            ex3 = fits.ImageHDU(group_dq.astype(np.uint8, copy=False), name='GROUPDQ')
+            ex4 = fits.ImageHDU(err_ext.astype(np.float32, copy=False), name='ERR')
+            ex5 = fits.ImageHDU(zeroframe.astype(np.float32, copy=False), name='ZEROFRAME')
             ex6 = fits.BinTableHDU(name='GROUP')
             ex7 = fits.BinTableHDU(name='INT_TIMES')
             outModel = fits.HDUList([ex0, ex1, ex2, ex3, ex4, ex5, ex6, ex7])
@@ -3170,8 +3505,8 @@ class Observation():
 
         elif mod == '1b':
             ex0 = fits.PrimaryHDU(header=extra_header0)
-            ex1 = fits.ImageHDU(ramp.astype(np.uint16), name='SCI')
-            ex2 = fits.ImageHDU(zeroframe.astype(np.uint16), name='ZEROFRAME')
+            ex1 = fits.ImageHDU(ramp.astype(np.uint16, copy=False), name='SCI')
+            ex2 = fits.ImageHDU(zeroframe.astype(np.uint16, copy=False), name='ZEROFRAME')
             ex3 = fits.BinTableHDU(name='GROUP')
             ex4 = fits.BinTableHDU(name='INT_TIMES')
             outModel = fits.HDUList([ex0, ex1, ex2, ex3, ex4])
@@ -3443,6 +3778,67 @@ class Observation():
                 mapping[dark_element] = self.seed
         return mapping
 
+    def set_ramp_options(self):
+        """Read in the optional parameters controlling whether integrations
+        are built using the vectorized ramp engine, how many processes
+        are used to build them, how many are processed at a time, and the
+        precision in which they are created
+        """
+        try:
+            self.vectorized_ramp = self.params['simSignals']['vectorized_ramp']
+        except KeyError:
+            self.vectorized_ramp = False
+            self.logger.info('simSignals:vectorized_ramp not present in yaml file. Building integrations frame by frame.')
+
+        try:
+            self.parallel = int(self.params['simSignals']['parallel'])
+        except KeyError:
+            self.parallel = 1
+            self.logger.info('simSignals:parallel not present in yaml file. Building integrations in a single process.')
+
+        # Values less than 1 mean use all available cores
+        max_cores = multiprocessing.cpu_count()
+        if (self.parallel < 1) or (self.parallel > max_cores):
+            self.parallel = max_cores
+
+        try:
+            self.stream_integrations = max(int(self.params['Output']['stream_integrations']), 0)
+        except KeyError:
+            self.stream_integrations = 0
+            self.logger.info('Output:stream_integrations not present in yaml file. Processing all integrations at once.')
+
+        self.working_dtype = utils.get_working_precision(self.params)
+
+        try:
+            reference_registry.set_memory_limit(float(self.params['Output']['reference_memory_limit']))
+        except KeyError:
+            self.logger.info(('Output:reference_memory_limit not present in yaml file. Keeping up to {} GB of '
+                              'reference file data in memory.'.format(reference_registry.MEMORY_LIMIT / 1e9)))
+
+    def simulate_integration(self, seed):
+        """Create one integration, with cosmic rays and poisson noise, from
+        a noiseless seed image or integration
+
+        Parameters
+        ----------
+        seed : numpy.ndarray
+            2D seed image or 3D seed integration
+
+        Returns
+        -------
+        ramp : numpy.ndarray
+            3D integration with cosmic rays and poisson noise
+
+        zeroframe : numpy.ndarray
+            2D zeroth frame
+        """
+        if self.vectorized_ramp:
+            return self.frame_to_ramp_vectorized(seed)
+        elif self.runStep['cosmicray']:
+            return self.frame_to_ramp(seed)
+        else:
+            return self.frame_to_ramp_no_cr(seed)
+
     def simple_get_image(self, name):
         """Read in an array from a fits file and crop using subarray_bounds
 
@@ -3488,6 +3884,87 @@ class Observation():
         return parser
 
 
+def disk_array(shape, dtype, directory):
+    """Create a zero-filled array backed by an anonymous temporary file.
+    The file is removed once the array is no longer used.
+
+    Parameters
+    ----------
+    shape : tup
+        Shape of the array
+
+    dtype : numpy.dtype
+        Data type of the array
+
+    directory : str
+        Directory in which to create the temporary file
+
+    Returns
+    -------
+    array : numpy.memmap
+        Array backed by the temporary file
+    """
+    with tempfile.TemporaryFile(dir=directory) as backing_file:
+        return np.memmap(backing_file, dtype=dtype, mode='w+', shape=shape)
+
+
+def shared_array(shape, dtype=np.float64):
+    """Create a zero-filled float array in anonymous shared memory. The
+    memory is shared with processes forked after its creation, so values
+    written by those processes are visible in the current process.
+
+    Parameters
+    ----------
+    shape : tup
+        Shape of the array
+
+    dtype : type
+        Floating point data type of the array
+
+    Returns
+    -------
+    array : numpy.ndarray
+        Array backed by shared memory
+    """
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    buffer = mmap.mmap(-1, max(nbytes, 1))
+    return np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+
+def simulate_integration_worker(task):
+    """Create one integration for ``Observation.add_crs_and_noise_parallel``.
+    Runs in a worker process forked after ``PARALLEL_INTEGRATION_INPUTS``
+    has been populated with the Observation instance, the seed image and
+    the shared output arrays.
+
+    Parameters
+    ----------
+    task : tup
+        Integration number, poisson seed and cosmic ray seed
+
+    Returns
+    -------
+    integ : int
+        Integration number
+    """
+    integ, poissonseed, crseed = task
+    obs = PARALLEL_INTEGRATION_INPUTS['observation']
+    seed = PARALLEL_INTEGRATION_INPUTS['seed']
+
+    # The worker has its own copy of the parameters, so the seeds can be
+    # changed without affecting other integrations
+    obs.params['simSignals']['poissonseed'] = poissonseed
+    obs.params['cosmicRay']['seed'] = crseed
+    obs.crlist_integration = integ
+
+    if len(seed.shape) == 4:
+        seed = seed[integ, :, :, :]
+    ramp, zeroframe = obs.simulate_integration(seed)
+    PARALLEL_INTEGRATION_INPUTS['sim_exposure'][integ, :, :, :] = ramp
+    PARALLEL_INTEGRATION_INPUTS['sim_zero'][integ, :, :] = zeroframe
+    return integ
+
+
 if __name__ == '__main__':
 
     usagestring = ('USAGE: obs_generator.py inputs.yaml '
@@ -0,0 +1,162 @@
+#! /usr/bin/env python
+
+"""This module contains the array functions used by the vectorized ramp
+engine in ``obs_generator.py``, which builds integrations from a seed
+image a block of frames at a time rather than one frame at a time.
+
+For each block, the Poisson noise of the signal arriving in every frame
+is drawn in a single call to a ``numpy.random.Generator``, the frames
+are accumulated with ``numpy.cumsum``, and the frames within each group
+are averaged by reshaping the block to (group, frame, y, x).
+
+RAPID dark current ramps are averaged into other readout patterns in the
+same way, using a strided view of the dark that places the frames of
+each group along their own axis.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.ramp_generator.ramp_engine import poisson_realization
+        rng = np.random.default_rng(seed)
+        noisy_frames = poisson_realization(rng, signal_per_frame, gain, size=(nframes, ny, nx))
+"""
+import numpy as np
+
+
+def average_groups(frames, nframe, nskip):
+    """Average the frames in a block into groups. The block must contain
+    a whole number of groups, with the ``nskip`` skipped frames of each
+    group preceding its ``nframe`` averaged frames.
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        3D array (frame, y, x) of cumulative frame signals
+
+    nframe : int
+        Number of frames averaged into each group
+
+    nskip : int
+        Number of skipped frames in each group
+
+    Returns
+    -------
+    groups : numpy.ndarray
+        3D array (group, y, x) of averaged group signals
+    """
+    frames_per_group = nframe + nskip
+    nframes, yd, xd = frames.shape
+    if nframes % frames_per_group != 0:
+        raise ValueError(('Number of frames ({}) is not a multiple of the number of frames per group ({}).'
+                          .format(nframes, frames_per_group)))
+    grouped = frames.reshape(nframes // frames_per_group, frames_per_group, yd, xd)
+    return grouped[:, nskip:, :, :].mean(axis=1)
+
+
+def average_rapid_groups(data, ngroup, nframe, nskip, out=None):
+    """Average the frames of RAPID integrations into groups of another
+    readout pattern. Each group is made of ``nframe`` averaged frames
+    followed by ``nskip`` skipped frames, starting from the first frame.
+    The frames are accessed through a strided view of ``data``, without
+    copying.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        4D array (integration, frame, y, x) of RAPID frames
+
+    ngroup : int
+        Number of groups to create
+
+    nframe : int
+        Number of frames averaged into each group
+
+    nskip : int
+        Number of skipped frames in each group
+
+    out : numpy.ndarray
+        4D array (integration, group, y, x) in which to place the result.
+        If None, a new array is created.
+
+    Returns
+    -------
+    groups : numpy.ndarray
+        4D array (integration, group, y, x) of averaged group signals
+    """
+    frames_per_group = nframe + nskip
+    nint, nframes, yd, xd = data.shape
+    needed = (ngroup - 1) * frames_per_group + nframe
+    if nframes < needed:
+        raise ValueError(('{} groups of {} frames with {} skipped frames need {} RAPID frames, but only {} '
+                          'are present.'.format(ngroup, nframe, nskip, needed, nframes)))
+
+    istride, fstride, ystride, xstride = data.strides
+    frames = np.lib.stride_tricks.as_strided(data, shape=(nint, ngroup, nframe, yd, xd),
+                                             strides=(istride, frames_per_group * fstride, fstride,
+                                                      ystride, xstride),
+                                             writeable=False)
+    return np.mean(frames, axis=2, out=out)
+
+
+def groups_per_block(ngroup, frames_per_group, frame_pixels, pixel_limit):
+    """Number of groups to build at once so that each block of frames
+    holds no more than ``pixel_limit`` pixels. At least one group is
+    always used.
+
+    Parameters
+    ----------
+    ngroup : int
+        Total number of groups in the integration
+
+    frames_per_group : int
+        Number of frames (averaged and skipped) in each group
+
+    frame_pixels : int
+        Number of pixels in one frame
+
+    pixel_limit : int
+        Maximum number of pixels in a block
+
+    Returns
+    -------
+    block_groups : int
+        Number of groups per block
+    """
+    block_groups = pixel_limit // (frames_per_group * frame_pixels)
+    return int(min(max(block_groups, 1), ngroup))
+
+
+def poisson_realization(rng, signal, gain, size=None):
+    """Add Poisson noise to signals in units of ADU. The signal is
+    multiplied by the gain before drawing the noise, and the result
+    divided by the gain, so that the returned values are also in ADU.
+    Pixels with negative signal can't have Poisson noise added, and are
+    returned as zero. This matches ``Observation.do_poisson``.
+
+    Parameters
+    ----------
+    rng : numpy.random.Generator
+        Random number generator
+
+    signal : numpy.ndarray
+        Signal in ADU. Must be broadcastable to ``size``
+
+    gain : float
+        Gain in e/ADU
+
+    size : tup
+        Shape of the output. If None, the shape of ``signal`` is used.
+        Use this to draw several realizations of a 2D signal at once.
+
+    Returns
+    -------
+    noisy : numpy.ndarray
+        Poisson realization of ``signal``, in ADU, with the same precision
+        as ``signal`` (float64 for integer signals)
+    """
+    electrons = signal * gain
+    noisy = rng.poisson(np.maximum(electrons, 0.), size=size).astype(np.result_type(electrons, np.float32))
+    noisy /= gain
+    return noisy
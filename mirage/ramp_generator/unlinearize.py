@@ -12,7 +12,8 @@ import numpy as np
 import os
 
 from mirage.logging import logging_functions
-from mirage.utils.constants import LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME
+from mirage.utils.constants import LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME, UNLINEARIZE_BLOCK_PIXEL_LIMIT, \
+                                   UNLINEARIZE_FLOAT32_ACCURACY
 
 
 classdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
@@ -22,6 +23,55 @@ logging_functions.create_logger(log_config_file, STANDARD_LOGFILE_NAME)
 
 def unlinearize(image, coeffs, sat, lin_satmap, maxiter=10, accuracy=0.000001, robberto=False,
                 save_accuracy_map=False, accuracy_file='unlinearize_no_convergence.fits'):
+    """Insert non-linearity into linear signals by solving for the raw
+    signals that the linearity correction would turn into ``image``,
+    using Newton's method.
+
+    The exposure is processed a block of groups at a time. Within each
+    block, only pixels that have not yet converged are kept in the
+    active set, so converged pixels are not recomputed. When ``accuracy``
+    is at least UNLINEARIZE_FLOAT32_ACCURACY, the iterations are done in
+    float32 to reduce memory use.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Linear signals. 2D, 3D or 4D, with the last two axes matching
+        ``sat``
+
+    coeffs : numpy.ndarray
+        3D array of linearity correction coefficients (coefficient, y, x)
+
+    sat : numpy.ndarray
+        2D saturation map for the non-linear signals
+
+    lin_satmap : numpy.ndarray
+        Linearized saturation map. Pixels with linear signals of zero or
+        below, or at or above this, are not changed.
+
+    maxiter : int
+        Maximum number of iterations
+
+    accuracy : float
+        Pixels are considered converged when the linearity correction
+        applied to the solution matches ``image`` to within this
+        fractional accuracy
+
+    robberto : bool
+        If True, use a single step approximation rather than iterating
+
+    save_accuracy_map : bool
+        If True and some pixels do not converge, save a map of the
+        accuracy of all pixels to ``accuracy_file``
+
+    accuracy_file : str
+        Name of the accuracy map file
+
+    Returns
+    -------
+    x : numpy.ndarray
+        Non-linear signals, with the same shape as ``image``
+    """
     # Insert non-linearity into the linear synthetic sources
     logger = logging.getLogger('mirage.ramp_generator.unlinearize.unlinearize')
 
@@ -42,38 +92,83 @@ def unlinearize(image, coeffs, sat, lin_satmap, maxiter=10, accuracy=0.000001, r
     # linearity correction to the saturation map
     # lin_satmap = nonLinFunc(sat,coeffs,sat)
 
-    # Find pixels with "good" signals, to have the nonlin applied.
-    # Negative pix or pix with signals above the requested max
-    # value will not be changed.
-    x = np.copy(image)
-    i1 = np.where((image > 0.) & (image < lin_satmap))
-    dev = np.zeros_like(image, dtype=float)
-    dev[i1] = 1.
-    i2 = np.where((image <= 0.) | (image >= lin_satmap))
-    numhigh = np.where(image >= lin_satmap)
-    i = 0
-
-    # Initial run of the nonlin function - when calling the
-    # non-lin function, give the original satmap for the
-    # non-linear signal values
-    val = nonLinFunc(image, coeffs, sat)
-    val[i2] = 1.
-
-    if robberto:
-        x = image * val
-    else:
-        x[i1] = (image[i1]+image[i1]/val[i1]) / 2.
-        while i < maxiter:
-            i = i + 1
-            val = nonLinFunc(x, coeffs, sat)
-            val[i2] = 1.
-            dev[i1] = np.abs(image[i1] / val[i1]-1.)
-            inds = np.where(dev[i1] > accuracy)
-            if inds[0].size < 1:
+    dtype = np.float32 if accuracy >= UNLINEARIZE_FLOAT32_ACCURACY else np.float64
+
+    shape = image.shape
+    yd, xd = shape[-2:]
+    x = np.array(image, order='C')
+    planes = x.reshape((-1, yd, xd))
+    image_planes = np.reshape(image, (-1, yd, xd))
+    lin_satmap = np.asarray(lin_satmap)
+    if lin_satmap.ndim > 2:
+        lin_satmap_planes = np.broadcast_to(lin_satmap, shape).reshape((-1, yd, xd))
+
+    # Accuracy of each pixel. Pixels that are not unlinearized are -1.
+    if save_accuracy_map:
+        dev = np.full(planes.shape, -1.)
+
+    iterations = 0
+    num_unconverged = 0
+    block_size = max(1, UNLINEARIZE_BLOCK_PIXEL_LIMIT // (yd * xd))
+    for start in range(0, planes.shape[0], block_size):
+        block_image = image_planes[start:start + block_size]
+        if lin_satmap.ndim > 2:
+            block_limit = lin_satmap_planes[start:start + block_size]
+        else:
+            block_limit = lin_satmap
+
+        # Find pixels with "good" signals, to have the nonlin applied.
+        # Negative pix or pix with signals above the requested max
+        # value will not be changed.
+        good = (block_image > 0.) & (block_image < block_limit)
+        index = np.flatnonzero(good)
+        if index.size == 0:
+            continue
+        _, rows, cols = np.unravel_index(index, good.shape)
+        target = block_image[good].astype(dtype)
+        pix_coeffs = coeffs[:, rows, cols].astype(dtype)
+        pix_sat = sat[rows, cols].astype(dtype)
+        block_x = planes[start:start + block_size].reshape(-1)
+        if save_accuracy_map:
+            block_dev = dev[start:start + block_size].reshape(-1)
+
+        # Initial run of the nonlin function - when calling the
+        # non-lin function, give the original satmap for the
+        # non-linear signal values
+        val, _ = nonlin_value_and_derivative(np.minimum(target, pix_sat), pix_coeffs)
+        if robberto:
+            block_x[index] = target * val
+            continue
+
+        xval = (target + target / val) / 2.
+        for i in range(1, maxiter + 1):
+            iterations = max(iterations, i)
+            val, deriv = nonlin_value_and_derivative(np.minimum(xval, pix_sat), pix_coeffs)
+            pix_dev = np.abs(target / val - 1.)
+
+            # Save converged pixels and remove them from the active set
+            converged = pix_dev <= accuracy
+            block_x[index[converged]] = xval[converged]
+            if save_accuracy_map:
+                block_dev[index[converged]] = pix_dev[converged]
+            active = ~converged
+            if not np.any(active):
                 break
-            val1 = nonLinDeriv(x, coeffs, sat)
-            val1[i2] = 1.
-            x[i1] = x[i1] + (image[i1] - val[i1]) / val1[i1]
+            index = index[active]
+            xval = xval[active]
+            val = val[active]
+            deriv = deriv[active]
+            target = target[active]
+            pix_sat = pix_sat[active]
+            pix_coeffs = pix_coeffs[:, active]
+            if save_accuracy_map:
+                block_dev[index] = pix_dev[active]
+
+            xval = xval + (target - val) / deriv
+        else:
+            # Pixels still active after maxiter iterations
+            block_x[index] = xval
+            num_unconverged += index.size
 
     # If we max out the number of iterations,
     # save the array of accuracy values. Spot
@@ -81,20 +176,49 @@ def unlinearize(image, coeffs, sat, lin_satmap, maxiter=10, accuracy=0.000001, r
     # accuracy reqs are randomly located on the detector,
     # and don't seem to be correlated with point source
     # locations.
-    if i == maxiter and save_accuracy_map:
+    if num_unconverged > 0 and save_accuracy_map:
         from astropy.io import fits
-        logger.warning(("WARNING: some pixels failed to unlinearize correctly within "
+        logger.warning(("WARNING: {} pixels failed to unlinearize correctly within "
                         "the maximum number of iterations. Map of accuracy of the "
-                        "unlinearized values saved to {}.".format(accuracy_file)))
-        devcheck = np.copy(dev)
-        devcheck[i2] = -1.
+                        "unlinearized values saved to {}.".format(num_unconverged, accuracy_file)))
         h0 = fits.PrimaryHDU()
-        h1 = fits.ImageHDU(devcheck)
+        h1 = fits.ImageHDU(dev.reshape(shape))
         hl = fits.HDUList([h0, h1])
         hl.writeto(accuracy_file, overwrite=True)
     return x
 
 
+def nonlin_value_and_derivative(values, coeffs):
+    """Evaluate the linearity correction polynomial and its first
+    derivative in a single Horner pass
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        1D array of signals
+
+    coeffs : numpy.ndarray
+        2D array of coefficients (coefficient, pixel), in order of
+        increasing power
+
+    Returns
+    -------
+    value : numpy.ndarray
+        Polynomial evaluated at ``values``
+
+    deriv : numpy.ndarray
+        First derivative of the polynomial evaluated at ``values``
+    """
+    value = np.copy(coeffs[-1])
+    deriv = np.zeros_like(value)
+    for coeff in coeffs[-2::-1]:
+        deriv *= values
+        deriv += value
+        value *= values
+        value += coeff
+    return value, deriv
+
+
 def nonLinFunc(image, coeffs, limits):
     # Apply linearity correction coefficients
     # to image.
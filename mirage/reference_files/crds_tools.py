@@ -145,6 +145,35 @@ def dict_from_yaml(yaml_dict):
     return crds_dict
 
 
+def get_context():
+    """Determine the CRDS context (e.g. jwst_1100.pmap) that CRDS, and
+    therefore the JWST calibration pipeline, will use to select reference
+    files. This is taken from the CRDS_CONTEXT environment variable if it
+    is set, or otherwise from the CRDS server or the local CRDS cache.
+
+    Returns
+    -------
+    context : str
+        Name of the CRDS context. None if it cannot be determined.
+    """
+    logger = logging.getLogger('mirage.reference_files.crds_tools.get_context')
+
+    # IMPORTANT: Import of crds package must be done AFTER the environment
+    # variables are set in the functions above. CRDS exits, rather than
+    # raising an exception, if neither the server nor a local cache of its
+    # configuration is available
+    try:
+        import crds
+        context = crds.get_context_name('jwst')
+    except (Exception, SystemExit) as e:
+        logger.info('Unable to determine the CRDS context: {}'.format(e))
+        return None
+
+    if not context:
+        return None
+    return str(context)
+
+
 def get_reffiles(parameter_dict, reffile_types, download=True):
     """Determine CRDS's best reference files to use for a particular
     observation, and download them if they are not already present in
@@ -0,0 +1,151 @@
+#! /usr/bin/env python
+
+"""Tools for adding many equally-sized stamp images into a seed image
+(and its segmentation map) at once, rather than one source at a time.
+Used by the batch point source renderer in ``catalog_seed_image.py``.
+
+Stamps are given as a 3D array of shape (number of stamps, y, x), along
+with the aperture coordinates of the lower left corner of each stamp.
+Stamps may fall partially or completely off of the image. Pixels
+outside the image are ignored.
+"""
+import numpy as np
+
+
+def stamp_pixel_indices(xstarts, ystarts, stamp_shape, image_shape):
+    """Calculate the flattened image indexes covered by a collection of
+    stamp images, along with a mask of which of those pixels actually
+    land on the image.
+
+    Parameters
+    ----------
+    xstarts : numpy.ndarray
+        1D array of x coordinates on the image of the lower left corner
+        of each stamp
+
+    ystarts : numpy.ndarray
+        1D array of y coordinates on the image of the lower left corner
+        of each stamp
+
+    stamp_shape : tup
+        (y, x) dimensions of each stamp
+
+    image_shape : tup
+        (y, x) dimensions of the image the stamps will be added to
+
+    Returns
+    -------
+    flat_index : numpy.ndarray
+        3D array (number of stamps, y, x) of indexes into the flattened
+        image. Values for pixels that are not on the image are meaningless.
+
+    on_image : numpy.ndarray
+        3D boolean array. True for stamp pixels that land on the image.
+    """
+    stamp_y_dim, stamp_x_dim = stamp_shape
+    image_y_dim, image_x_dim = image_shape
+
+    rows = np.asarray(ystarts, dtype=np.int64)[:, np.newaxis] + np.arange(stamp_y_dim)
+    cols = np.asarray(xstarts, dtype=np.int64)[:, np.newaxis] + np.arange(stamp_x_dim)
+
+    good_rows = (rows >= 0) & (rows < image_y_dim)
+    good_cols = (cols >= 0) & (cols < image_x_dim)
+    on_image = good_rows[:, :, np.newaxis] & good_cols[:, np.newaxis, :]
+
+    flat_index = rows[:, :, np.newaxis] * image_x_dim + cols[:, np.newaxis, :]
+    return flat_index, on_image
+
+
+def scatter_add_stamps(image, stamps, xstarts, ystarts):
+    """Add a stack of stamp images into ``image`` in place. Overlapping
+    stamps are summed.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        2D image to which the stamps are added
+
+    stamps : numpy.ndarray
+        3D array (number of stamps, y, x) of stamp images
+
+    xstarts : numpy.ndarray
+        1D array of x coordinates on ``image`` of the lower left corner
+        of each stamp
+
+    ystarts : numpy.ndarray
+        1D array of y coordinates on ``image`` of the lower left corner
+        of each stamp
+    """
+    flat_index, on_image = stamp_pixel_indices(xstarts, ystarts, stamps.shape[1:], image.shape)
+
+    # Index the image itself rather than a flattened copy, so that
+    # non-contiguous images (e.g. slices of larger arrays) are updated
+    pixels = np.unravel_index(flat_index[on_image], image.shape)
+    np.add.at(image, pixels, stamps[on_image])
+
+
+def scatter_segmentation(segmap, source_order, stamps, xstarts, ystarts, numbers, orders, threshold):
+    """Add a stack of sources to a segmentation map in place. Pixels
+    with signals greater than or equal to ``threshold`` are assigned the
+    number of the source. Where sources overlap, the source with the
+    largest ``orders`` value wins, regardless of the order in which
+    batches of sources are added. This reproduces the behavior of adding
+    sources one at a time in catalog order.
+
+    Parameters
+    ----------
+    segmap : numpy.ndarray
+        2D segmentation map
+
+    source_order : numpy.ndarray
+        2D integer array, the same shape as ``segmap``, containing the
+        order value of the source currently occupying each pixel. Pixels
+        not yet assigned by this renderer should be set to -1. Updated in
+        place.
+
+    stamps : numpy.ndarray
+        3D array (number of stamps, y, x) of stamp images
+
+    xstarts : numpy.ndarray
+        1D array of x coordinates of the lower left corner of each stamp
+
+    ystarts : numpy.ndarray
+        1D array of y coordinates of the lower left corner of each stamp
+
+    numbers : numpy.ndarray
+        1D array of segmentation map values (source indexes) for each stamp
+
+    orders : numpy.ndarray
+        1D array of integers giving the precedence of each stamp. Usually
+        the row number of the source in the catalog.
+
+    threshold : float
+        Pixels with signal values at or above this will be added to the
+        segmentation map
+    """
+    flat_index, on_image = stamp_pixel_indices(xstarts, ystarts, stamps.shape[1:], segmap.shape)
+    flag = on_image & (stamps >= threshold)
+
+    pixels = flat_index[flag]
+    if len(pixels) == 0:
+        return
+    order = np.broadcast_to(np.asarray(orders)[:, np.newaxis, np.newaxis], stamps.shape)[flag]
+    number = np.broadcast_to(np.asarray(numbers)[:, np.newaxis, np.newaxis], stamps.shape)[flag]
+
+    # Keep only the highest-precedence source for each pixel in this batch
+    sort = np.lexsort((order, pixels))
+    pixels = pixels[sort]
+    order = order[sort]
+    number = number[sort]
+    last = np.append(pixels[1:] != pixels[:-1], True)
+    pixels = pixels[last]
+    order = order[last]
+    number = number[last]
+
+    # Only overwrite pixels claimed by lower-precedence sources. The maps
+    # are indexed directly, so that non-contiguous maps are updated
+    pixels = np.unravel_index(pixels, segmap.shape)
+    later = order > source_order[pixels]
+    pixels = tuple(axis[later] for axis in pixels)
+    segmap[pixels] = number[later]
+    source_order[pixels] = order[later]
@@ -0,0 +1,175 @@
+#! /usr/bin/env python
+
+"""This module contains a cache of parsed source catalogs, shared by all
+of the exposures simulated in a process, so that a catalog used by many
+exposures (e.g. all of the exposures in a proposal created by
+``yaml_generator``) is only parsed once.
+
+Catalogs are keyed by a hash of their contents, so modified catalogs are
+read again. Along with each table, the cache keeps the source countrates
+calculated from its magnitudes, keyed by the instrument, filter,
+magnitude column, magnitude system and zeropoints used. If a directory
+is given, parsed ascii catalogs are also saved there as FITS binary
+tables, which later runs can read much faster than the ascii files.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.seed_image import catalog_cache
+        catalog = catalog_cache.read_catalog('stars.cat', directory='catalog_cache/')
+"""
+from collections import OrderedDict
+import logging
+import os
+import tempfile
+
+from mirage.catalogs import utils as catalog_utils
+from mirage.logging import logging_functions
+from mirage.utils.constants import CATALOG_CACHE_SIZE, LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME
+from mirage.utils.utils import file_hash
+
+
+classdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+log_config_file = os.path.join(classdir, 'logging', LOG_CONFIG_FILENAME)
+logging_functions.create_logger(log_config_file, STANDARD_LOGFILE_NAME)
+
+# Name of the column holding cached countrates in the tables returned to
+# callers
+COUNTRATE_COLUMN = 'catalog_countrate'
+
+# Parsed catalogs, keyed by the hash of the catalog file, from least to most
+# recently used. Each entry is a dictionary holding the table and the
+# countrates calculated from it
+CATALOGS = OrderedDict()
+
+
+def clear():
+    """Remove all catalogs from the cache"""
+    CATALOGS.clear()
+
+
+def get_countrates(filename, key, convert):
+    """Return the countrates of all sources in a catalog, calculating them
+    only if they are not already cached
+
+    Parameters
+    ----------
+    filename : str
+        Name of the catalog file
+
+    key : tuple
+        Values that determine the countrates, such as the instrument,
+        filter, magnitude column, magnitude system and zeropoints
+
+    convert : function
+        Function, called with no arguments, that returns the countrates of
+        all rows of the catalog
+
+    Returns
+    -------
+    countrates : numpy.ndarray
+        Countrates of all rows of the catalog. These are shared with other
+        callers and must not be modified.
+    """
+    digest = file_hash(filename)
+    if digest not in CATALOGS:
+        return convert()
+
+    countrates = CATALOGS[digest]['countrates']
+    if key not in countrates:
+        countrates[key] = convert()
+    return countrates[key]
+
+
+def read_catalog(filename, directory=None):
+    """Return the contents of a catalog file, parsing the file only if it
+    is not already cached
+
+    Parameters
+    ----------
+    filename : str
+        Name of the ascii or FITS binary table catalog file
+
+    directory : str
+        Directory in which parsed ascii catalogs are saved as FITS binary
+        tables. If None, parsed catalogs are only kept in memory.
+
+    Returns
+    -------
+    catalog : astropy.table.Table
+        Copy of the catalog contents, which the caller may modify
+    """
+    logger = logging.getLogger('mirage.seed_image.catalog_cache')
+    digest = file_hash(filename)
+    if digest in CATALOGS:
+        CATALOGS.move_to_end(digest)
+        return CATALOGS[digest]['table'].copy()
+
+    # Binary catalogs are already fast to read, so only ascii catalogs are saved
+    save = (directory is not None) and (not catalog_utils.is_binary_catalog(filename))
+    catalog = None
+    if save:
+        saved_file = saved_filename(directory, digest)
+        if os.path.isfile(saved_file):
+            try:
+                catalog = catalog_utils.read_catalog(saved_file)
+                logger.info('Read parsed version of {} from {}'.format(filename, saved_file))
+            except Exception as exc:
+                logger.warning('Unable to read parsed catalog {}: {}. Reading {}.'.format(saved_file, exc, filename))
+                catalog = None
+
+    if catalog is None:
+        catalog = catalog_utils.read_catalog(filename)
+        if save:
+            save_catalog(catalog, saved_filename(directory, digest))
+
+    CATALOGS[digest] = {'table': catalog, 'countrates': {}}
+    while len(CATALOGS) > CATALOG_CACHE_SIZE:
+        CATALOGS.popitem(last=False)
+    return catalog.copy()
+
+
+def save_catalog(catalog, filename):
+    """Save a parsed catalog. The file is written under a temporary name
+    and then renamed, so that other processes never see a partial file.
+
+    Parameters
+    ----------
+    catalog : astropy.table.Table
+        Catalog contents
+
+    filename : str
+        Name of the FITS binary table to create
+    """
+    directory = os.path.dirname(filename)
+    os.makedirs(directory, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix='.fits')
+    os.close(handle)
+    try:
+        catalog_utils.write_catalog(catalog, temporary)
+        os.replace(temporary, filename)
+    except Exception:
+        if os.path.isfile(temporary):
+            os.remove(temporary)
+        raise
+
+
+def saved_filename(directory, digest):
+    """Name of the file holding the parsed version of a catalog
+
+    Parameters
+    ----------
+    directory : str
+        Directory in which parsed catalogs are saved
+
+    digest : str
+        Hash of the catalog file contents
+
+    Returns
+    -------
+    filename : str
+        Name of the FITS binary table
+    """
+    return os.path.join(directory, '{}_catalog.fits'.format(digest))
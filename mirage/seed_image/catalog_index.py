@@ -0,0 +1,208 @@
+#! /usr/bin/env python
+
+"""This module contains a spatial index of the source positions in a
+catalog file, used to find the sources near an aperture without
+examining every source in the catalog.
+
+The index is a k-d tree built from the unit vectors of the RA, Dec
+positions of the sources. Each index is built the first time its catalog
+is used in a process, and is kept for later exposures in that process.
+If a directory is given, indexes are also saved there, so that later
+runs can load them rather than building them again. Indexes are matched
+to catalogs using a hash of the catalog contents, so a modified catalog
+gets a new index.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.seed_image import catalog_index
+        index = catalog_index.get_index('stars.cat', load_positions, directory='indexes/')
+        rows = index.query(ra, dec, radius)
+"""
+import logging
+import os
+import pickle
+import tempfile
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from mirage.logging import logging_functions
+from mirage.utils.constants import LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME
+from mirage.utils.utils import file_hash
+
+
+classdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+log_config_file = os.path.join(classdir, 'logging', LOG_CONFIG_FILENAME)
+logging_functions.create_logger(log_config_file, STANDARD_LOGFILE_NAME)
+
+# Indexes built or loaded in this process, keyed by the full path of the
+# catalog. Each entry is a tuple of the catalog hash and the index
+INDEXES = {}
+
+
+def radec_to_unit_vectors(ra, dec):
+    """Convert RA, Dec positions to unit vectors
+
+    Parameters
+    ----------
+    ra : numpy.ndarray
+        RA values in degrees
+
+    dec : numpy.ndarray
+        Dec values in degrees
+
+    Returns
+    -------
+    vectors : numpy.ndarray
+        Array of shape (N, 3) containing the unit vectors
+    """
+    ra = np.radians(np.asarray(ra, dtype=float))
+    dec = np.radians(np.asarray(dec, dtype=float))
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+class CatalogIndex():
+    def __init__(self, ra, dec):
+        """Build the index from the positions of all sources in a catalog
+
+        Parameters
+        ----------
+        ra : numpy.ndarray
+            RA values of the sources, in degrees
+
+        dec : numpy.ndarray
+            Dec values of the sources, in degrees
+        """
+        vectors = radec_to_unit_vectors(ra, dec)
+
+        # Sources without valid positions (e.g. those whose positions come
+        # from an ephemeris file) are left out of the tree
+        self.rows = np.where(np.all(np.isfinite(vectors), axis=1))[0]
+        self.tree = cKDTree(vectors[self.rows])
+        self.nrows = len(vectors)
+
+    def query(self, ra, dec, radius):
+        """Find the sources within a given angular distance of a position
+
+        Parameters
+        ----------
+        ra : float
+            RA of the position, in degrees
+
+        dec : float
+            Dec of the position, in degrees
+
+        radius : float
+            Angular distance, in degrees. Sources slightly farther than
+            this may also be returned, so callers needing an exact cut
+            should check the separations of the returned sources.
+
+        Returns
+        -------
+        rows : numpy.ndarray
+            Sorted row numbers of the sources in the catalog
+        """
+        # Distance between the unit vectors of points separated by radius,
+        # with a small margin for rounding
+        chord = 2. * np.sin(np.radians(min(radius, 180.)) / 2.) * (1. + 1e-9) + 1e-12
+        found = self.tree.query_ball_point(radec_to_unit_vectors(ra, dec), chord)
+        return np.sort(self.rows[np.array(found, dtype=int)])
+
+
+def get_index(catalog_file, load_positions, directory=None):
+    """Return the index of a catalog file, loading it from ``directory``
+    or building it if necessary
+
+    Parameters
+    ----------
+    catalog_file : str
+        Name of the catalog file
+
+    load_positions : function
+        Function, called with no arguments, that returns the RA and Dec
+        values, in degrees, of all rows of the catalog. This is only
+        called if the index must be built.
+
+    directory : str
+        Directory in which indexes are saved. If None, indexes are only
+        kept in memory.
+
+    Returns
+    -------
+    index : CatalogIndex
+        Index of the catalog
+    """
+    logger = logging.getLogger('mirage.seed_image.catalog_index')
+    catalog_file = os.path.abspath(catalog_file)
+    digest = file_hash(catalog_file)
+    if catalog_file in INDEXES and INDEXES[catalog_file][0] == digest:
+        return INDEXES[catalog_file][1]
+
+    index = None
+    if directory is not None:
+        filename = index_filename(directory, digest)
+        if os.path.isfile(filename):
+            try:
+                with open(filename, 'rb') as infile:
+                    index = pickle.load(infile)
+                logger.info('Loaded spatial index of {} from {}'.format(catalog_file, filename))
+            except Exception as exc:
+                logger.warning('Unable to load spatial index {}: {}. Rebuilding.'.format(filename, exc))
+                index = None
+
+    if index is None:
+        ra, dec = load_positions()
+        index = CatalogIndex(ra, dec)
+        logger.info('Built spatial index of the {} sources in {}'.format(index.nrows, catalog_file))
+        if directory is not None:
+            save_index(index, index_filename(directory, digest))
+
+    INDEXES[catalog_file] = (digest, index)
+    return index
+
+
+def index_filename(directory, digest):
+    """Name of the file holding the index of a catalog
+
+    Parameters
+    ----------
+    directory : str
+        Directory in which indexes are saved
+
+    digest : str
+        Hash of the catalog file contents
+
+    Returns
+    -------
+    filename : str
+        Name of the index file
+    """
+    return os.path.join(directory, '{}_catalog_index.pkl'.format(digest))
+
+
+def save_index(index, filename):
+    """Save an index to a file. The file is written under a temporary name
+    and then renamed, so that other processes never see a partial file.
+
+    Parameters
+    ----------
+    index : CatalogIndex
+        Index to save
+
+    filename : str
+        Name of the index file
+    """
+    directory = os.path.dirname(filename)
+    os.makedirs(directory, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as outfile:
+            pickle.dump(index, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, filename)
+    except Exception:
+        if os.path.isfile(temporary):
+            os.remove(temporary)
+        raise
@@ -20,11 +20,11 @@ import shutil
 from yaml.scanner import ScannerError
 
 import math
+import multiprocessing
 import yaml
 import time
 import pkg_resources
 import asdf
-import scipy.signal as s1
 import scipy.special as sp
 from scipy.ndimage import rotate
 import numpy as np
@@ -37,28 +37,35 @@ from astropy.stats import sigma_clipped_stats
 import astropy.units as u
 import pysiaf
 
+from . import catalog_cache
+from . import catalog_index
 from . import moving_targets
 from . import segmentation_map as segmap
+from .batch_stamps import scatter_add_stamps
+from .sersic_library import SersicStampLibrary
+from .stamp_convolution import StampConvolver
 import mirage
 from mirage.catalogs.catalog_generator import ExtendedCatalog, TSO_GRISM_INDEX
 from mirage.catalogs.utils import catalog_index_check, determine_used_cats
 from mirage.reference_files.downloader import download_file
 from mirage.seed_image import tso, ephemeris_tools
-from ..ghosts.niriss_ghosts import determine_ghost_stamp_filename, get_ghost, source_mags_to_ghost_mags
+from ..ghosts.niriss_ghosts import catalog_mags_to_ghost_mags, determine_ghost_stamp_filename, get_ghost
 from ..logging import logging_functions
 from ..reference_files import crds_tools
 from ..utils import backgrounds
 from ..utils import rotations, polynomial, read_siaf_table, utils
 from ..utils import set_telescope_pointing_separated as set_telescope_pointing
-from ..utils import siaf_interface, file_io
+from ..utils import resident_assets, siaf_interface, file_io
 from ..utils.constants import CRDS_FILE_TYPES, MEAN_GAIN_VALUES, SERSIC_FRACTIONAL_SIGNAL, \
                               SEGMENTATION_MIN_SIGNAL_RATE, SUPPORTED_SEGMENTATION_THRESHOLD_UNITS, \
                               LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME, TSO_MODES, NIRISS_GHOST_GAP_FILE, \
                               NIRISS_GHOST_GAP_URL, NIRCAM_SW_GRISMTS_APERTURES, NIRCAM_LW_GRISMTS_APERTURES, \
-                              DISPERSED_MODES
+                              DISPERSED_MODES, PSF_PHASE_RESOLUTION, PSF_POSITION_RESOLUTION, \
+                              BATCH_STAMP_PIXEL_LIMIT, PARALLEL_TILES_PER_PROCESS
 from ..utils.flux_cal import fluxcal_info, sersic_fractional_radius, sersic_total_signal
 from ..utils.timer import Timer
 from ..utils.utils import flatten_nested_list
+from ..psf.psf_cache import PSFStampCache
 from ..psf.psf_selection import get_gridded_psf_library, get_psf_wings
 from mirage.utils.file_splitting import find_file_splits, SplitFileMetaData
 from ..psf.segment_psfs import (get_gridded_segment_psf_library_list,
@@ -80,6 +87,11 @@ WFE_OPTIONS = ['predicted', 'requirements']
 WFEGROUP_OPTIONS = np.arange(5)
 
 
+# Inputs shared with the worker processes used to add point sources in
+# parallel. Populated by Catalog_seed.add_point_sources_parallel() before
+# the workers are forked.
+PARALLEL_TILE_INPUTS = {}
+
 classdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
 log_config_file = os.path.join(classdir, 'logging', LOG_CONFIG_FILENAME)
 logging_functions.create_logger(log_config_file, STANDARD_LOGFILE_NAME)
@@ -149,6 +161,43 @@ class Catalog_seed():
         # Names of Mirage-created source catalogs containing ghost sources
         self.ghost_catalogs = []
 
+        # Point source rendering options. By default, point sources are
+        # added one at a time. If batch_point_sources is True, sources
+        # with similar locations and sub-pixel phases share a single
+        # evaluation of the PSF library. See set_psf_rendering_options()
+        self.batch_point_sources = False
+        self.psf_phase_resolution = PSF_PHASE_RESOLUTION
+        self.psf_position_resolution = PSF_POSITION_RESOLUTION
+
+        # Maximum number of evaluated PSF library stamps to keep in
+        # self.psf_cache. If zero, the cache is not used and the library
+        # is evaluated for every source.
+        self.psf_cache_size = 0
+        self.psf_cache = None
+
+        # Number of processes to use when adding point sources
+        self.parallel = 1
+
+        # Data type of the seed image and the source images it is built
+        # from. See utils.get_working_precision()
+        self.working_dtype = np.float64
+
+        # Library of Sersic galaxy stamps, shared by galaxies with similar
+        # parameters. See set_sersic_library_options()
+        self.sersic_library = None
+        self.sersic_library_file = None
+
+        # Directory in which spatial indexes of source catalogs are saved.
+        # See set_catalog_index_options()
+        self.catalog_index_dir = None
+
+        # Directory in which parsed versions of ascii source catalogs are
+        # saved. See set_catalog_cache_options()
+        self.catalog_cache_dir = None
+
+        # Engine for convolving galaxy and extended source stamps with the PSF
+        self.stamp_convolver = StampConvolver()
+
         # Initialize timer
         self.timer = Timer()
 
@@ -197,6 +246,11 @@ class Catalog_seed():
         self.coord_transform = self.read_distortion_reffile()
         self.expand_catalog_for_segments = bool(self.params['simSignals']['expand_catalog_for_segments'])
         self.add_psf_wings = self.params['simSignals']['add_psf_wings']
+        self.set_psf_rendering_options()
+        self.set_sersic_library_options()
+        self.set_catalog_index_options()
+        self.set_catalog_cache_options()
+        self.working_dtype = utils.get_working_precision(self.params)
 
         # Read in the transmission file so it can be used later
         self.prepare_transmission_file()
@@ -303,11 +357,11 @@ class Catalog_seed():
         self.prepare_psf_entries()
 
         if not self.expand_catalog_for_segments:
-            self.psf_library = get_gridded_psf_library(
-                self.params['Inst']['instrument'], self.detector, self.psf_filter, self.psf_pupil,
-                self.params['simSignals']['psfwfe'],
-                self.params['simSignals']['psfwfegroup'],
-                self.params['simSignals']['psfpath'])
+            library_inputs = (self.params['Inst']['instrument'], self.detector, self.psf_filter, self.psf_pupil,
+                              self.params['simSignals']['psfwfe'], self.params['simSignals']['psfwfegroup'],
+                              self.params['simSignals']['psfpath'])
+            self.psf_library = resident_assets.get('psf_library', library_inputs,
+                                                   lambda: get_gridded_psf_library(*library_inputs))
             self.psf_library_core_y_dim, self.psf_library_core_x_dim = self.psf_library.data.shape[-2:]
 
             # Versions of photutils prior to 1.10.0 use an integer for the oversampling factor, while
@@ -322,9 +376,11 @@ class Catalog_seed():
         # If reading in segment PSFs, use get_gridded_segment_psf_library_list
         # to get a list of photutils.griddedPSFModel objects
         else:
-            self.psf_library = get_gridded_segment_psf_library_list(
-                self.params['Inst']['instrument'], self.detector, self.psf_filter,
-                self.params['simSignals']['psfpath'], pupilname=self.psf_pupil)
+            library_inputs = (self.params['Inst']['instrument'], self.detector, self.psf_filter,
+                              self.params['simSignals']['psfpath'], self.psf_pupil)
+            self.psf_library = resident_assets.get('segment_psf_library', library_inputs,
+                                                   lambda: get_gridded_segment_psf_library_list(
+                                                       *library_inputs[:4], pupilname=self.psf_pupil))
             self.psf_library_core_y_dim, self.psf_library_core_x_dim = self.psf_library[0].data.shape[-2:]
             self.psf_library_oversamp = 1
 
@@ -1698,7 +1754,7 @@ class Catalog_seed():
                         # eval_psf should be close to 1.0, but not exactly. For the purposes
                         # of convolution, we want the total signal to be exactly 1.0
                         conv_psf = eval_psf / np.sum(eval_psf)
-                        convolved_ghost_stamp = s1.fftconvolve(ghost_stamp, conv_psf, mode='same')
+                        convolved_ghost_stamp = self.stamp_convolver.convolve(ghost_stamp, conv_psf)
 
                         convolved_ghost_stamp_nested = []
                         for sublist in ghost_stamp_nested:
@@ -1742,10 +1798,7 @@ class Catalog_seed():
                     # Convolve stamp with PSF
                     stamp_nested = []
                     for psf_sublist in psf_frames_nested:
-                        stamp_sublist = []
-                        for psf_entry in psf_sublist:
-                            stamp_sublist.append(s1.fftconvolve(stamp, psf_entry, mode='same'))
-                        stamp_nested.append(stamp_sublist)
+                        stamp_nested.append(self.stamp_convolver.convolve_many([stamp] * len(psf_sublist), psf_sublist))
 
 
             elif input_type == 'galaxies':
@@ -1769,10 +1822,7 @@ class Catalog_seed():
                 # Convolve the galaxy with the instrument PSF
                 stamp_nested = []
                 for psf_sublist in psf_frames_nested:
-                    stamp_sublist = []
-                    for psf_entry in psf_sublist:
-                        stamp_sublist.append(s1.fftconvolve(stamp, psf_entry, mode='same'))
-                    stamp_nested.append(stamp_sublist)
+                    stamp_nested.append(self.stamp_convolver.convolve_many([stamp] * len(psf_sublist), psf_sublist))
 
             # Now that we have stamp images for galaxies and extended
             # sources, check to see if they overlap the detector or not.
@@ -1873,6 +1923,12 @@ class Catalog_seed():
         y_list : numpy.ndarray
             1D array of y pixel values
         """
+        # Transform all positions at once unless positions are nested
+        # by frame
+        if not any(isinstance(in_ra, np.ndarray) for in_ra in ra_list):
+            x_list, y_list, ra, dec, ra_str, dec_str = self.get_position_lists(ra_list, dec_list, False)
+            return x_list, y_list
+
         x_list = []
         y_list = []
         for in_ra, in_dec in zip(ra_list, dec_list):
@@ -1911,6 +1967,12 @@ class Catalog_seed():
         dec_list : numpy.ndarray
             1D array of Dec values
         """
+        # Transform all positions at once unless positions are nested
+        # by frame
+        if not any(isinstance(in_x, np.ndarray) for in_x in x_list):
+            x, y, ra_list, dec_list, ra_str, dec_str = self.get_position_lists(x_list, y_list, True)
+            return ra_list, dec_list
+
         ra_list = []
         dec_list = []
         for in_x, in_y in zip(x_list, y_list):
@@ -2049,6 +2111,110 @@ class Catalog_seed():
 
         return pixel_x, pixel_y, ra_number, dec_number, ra_string, dec_string
 
+    def get_position_lists(self, input_x, input_y, pixel_flag):
+        """Vectorized version of ``get_positions``. Given columns of input
+        positions ( (x,y) or (RA,Dec) ), calculate the corresponding detector
+        (x,y) and RA, Dec for all sources at once.
+
+        Parameters
+        ----------
+        input_x : list
+            Detector x coordinates or RAs of sources. RAs can be in decimal
+            degrees or (e.g 10:23:34.2 or 10h23m34.2s)
+
+        input_y : list
+            Detector y coordinates or Decs of sources. Decs can be in decimal
+            degrees or (e.g. 10d:23m:34.2s)
+
+        pixel_flag : bool
+            True if input_x and input_y are in units of pixels. False if they are
+            in the RA, Dec coordinate system.
+
+        Returns
+        -------
+        pixelx : numpy.ndarray
+            Detector x coordinates of sources
+
+        pixely : numpy.ndarray
+            Detector y coordinates of sources
+
+        ra : numpy.ndarray
+            RAs of sources (degrees)
+
+        dec : numpy.ndarray
+            Decs of sources (degrees)
+
+        ra_strings : numpy.ndarray
+            Input RA strings, if RAs are given in sexagesimal form. Otherwise
+            None, and strings for the sources that are kept can be made using
+            ``makePos``
+
+        dec_strings : numpy.ndarray
+            Input Dec strings, or None
+        """
+        ra_strings = None
+        dec_strings = None
+        try:
+            entry0 = np.array(input_x, dtype=float)
+            entry1 = np.array(input_y, dtype=float)
+        except ValueError:
+            # if inputs can't be converted to floats, then
+            # assume we have RA/Dec strings. Convert to floats.
+            ra_strings = np.array(input_x, dtype=str)
+            dec_strings = np.array(input_y, dtype=str)
+            numbers = [utils.parse_RA_Dec(ra_string, dec_string)
+                       for ra_string, dec_string in zip(ra_strings, dec_strings)]
+            entry0 = np.array([number[0] for number in numbers], dtype=float)
+            entry1 = np.array([number[1] for number in numbers], dtype=float)
+
+        if len(entry0) == 0:
+            return entry0, entry1, np.copy(entry0), np.copy(entry1), ra_strings, dec_strings
+
+        if not pixel_flag:
+            ra_number = entry0
+            dec_number = entry1
+            pixel_x, pixel_y = self.RADecToXY_astrometric(ra_number, dec_number)
+        else:
+            pixel_x = entry0
+            pixel_y = entry1
+            ra_number, dec_number = self.xy_to_radec_degrees(pixel_x, pixel_y)
+
+        return (np.array(pixel_x, dtype=float), np.array(pixel_y, dtype=float), np.array(ra_number, dtype=float),
+                np.array(dec_number, dtype=float), ra_strings, dec_strings)
+
+    def position_strings(self, index, ra, dec, ra_strings, dec_strings):
+        """Return the RA, Dec strings of one source from the outputs of
+        ``get_position_lists``
+
+        Parameters
+        ----------
+        index : int
+            Row number of the source
+
+        ra : numpy.ndarray
+            RAs of sources (degrees)
+
+        dec : numpy.ndarray
+            Decs of sources (degrees)
+
+        ra_strings : numpy.ndarray
+            Input RA strings, or None
+
+        dec_strings : numpy.ndarray
+            Input Dec strings, or None
+
+        Returns
+        -------
+        ra_string : str
+            String representation of RA
+
+        dec_string : str
+            String representation of Dec
+        """
+        if ra_strings is not None:
+            return ra_strings[index], dec_strings[index]
+        return self.makePos(ra[index], dec[index])
+
     def nonsidereal_CRImage(self, file):
         """
         Create countrate image of non-sidereal sources
@@ -2327,10 +2493,10 @@ class Catalog_seed():
     def create_sidereal_image(self):
         # Generate a signal rate image from input sources
         if (self.params['Output']['grism_source_image'] == False) and (not self.params['Inst']['mode'] in ["pom", "wfss"]):
-            signalimage = np.zeros(self.nominal_dims)
+            signalimage = np.zeros(self.nominal_dims, dtype=self.working_dtype)
             segmentation_map = np.zeros(self.nominal_dims)
         else:
-            signalimage = np.zeros(self.output_dims, dtype=float)
+            signalimage = np.zeros(self.output_dims, dtype=self.working_dtype)
             segmentation_map = np.zeros(self.output_dims)
 
 
@@ -2378,7 +2544,7 @@ class Catalog_seed():
                 ptsrc_segmap = segmap.SegMap()
                 ptsrc_segmap.ydim, ptsrc_segmap.xdim = self.output_dims
                 ptsrc_segmap.initialize_map()
-                psfimage = np.zeros(self.output_dims)
+                psfimage = np.zeros(self.output_dims, dtype=self.working_dtype)
 
                 library_list = get_segment_library_list(
                     self.params['Inst']['instrument'].lower(), self.detector, self.psf_filter,
@@ -2612,6 +2778,9 @@ class Catalog_seed():
         # CONSTANT BACKGROUND - multiply by transmission image
         signalimage = signalimage + self.params['simSignals']['bkgdrate']
 
+        # Sources read in from files may have a higher precision
+        signalimage = signalimage.astype(self.working_dtype, copy=False)
+
         # Save the final rate image of added signals
         if self.params['Output']['save_intermediates'] is True:
             rateImageName = self.basename + '_AddedSources_adu_per_sec.fits'
@@ -2741,14 +2910,19 @@ class Catalog_seed():
         if segment_offset is not None:
             lines = self.shift_sources_by_offset(lines, segment_offset, pixelflag)
 
+        # Determine the name of the column to use for source magnitudes, and
+        # get the countrates of all sources in the catalog
+        mag_column = self.select_magnitude_column(lines, filename)
+        self.add_catalog_countrates(lines, filename, mag_column, magsys)
+
         # Check the source list and remove any sources that are well outside the
         # field of view of the detector. These sources cause the coordinate
         # conversion to hang.
         self.logger.info('Filtering point sources to keep only those on the detector')
-        indexes, lines = self.remove_outside_fov_sources(indexes, lines, pixelflag, 4096)
-
-        # Determine the name of the column to use for source magnitudes
-        mag_column = self.select_magnitude_column(lines, filename)
+        if segment_offset is None:
+            indexes, lines = self.remove_outside_fov_sources(indexes, lines, pixelflag, 4096, catalog_file=filename)
+        else:
+            indexes, lines = self.remove_outside_fov_sources(indexes, lines, pixelflag, 4096)
 
         # For NIRISS observations where ghosts will be added, create a table to hold
         # the ghost entries
@@ -2759,13 +2933,32 @@ class Catalog_seed():
             ghost_y = []
             ghost_filename = []
             ghost_mag = []
+            ghost_rows = []  # Catalog rows of the sources that have ghosts
             ghost_mags = None
         else:
             ghost_x = None
 
+        # Calculate the detector positions of all sources at once
+        all_pixelx, all_pixely, all_ra, all_dec, ra_strings, dec_strings = self.get_position_lists(lines['x_or_RA'],
+                                                                                                   lines['y_or_Dec'],
+                                                                                                   pixelflag)
+
+        # Only sources that may fall on the subarray need to be examined individually,
+        # unless ghosts are being added, since sources off the subarray can have ghosts
+        # on it. Use the largest PSF here. The PSF size of each source is checked below.
+        if ghost_x is not None:
+            near = np.ones(len(lines), dtype=bool)
+        else:
+            max_edge = int(self.find_max_psf_size() // 2)
+            near = ((all_pixely > (miny - max_edge)) & (all_pixely < (maxy + max_edge)) &
+                    (all_pixelx > (minx - max_edge)) & (all_pixelx < (maxx + max_edge)))
+
         skipped_non_niriss = False
         ghost_i = 0
-        for index, values in zip(indexes, lines):
+        for row in np.where(near)[0]:
+            index = indexes[row]
+            values = lines[row]
+
             # If the filter/pupil pair are not in the ghost summary file, log that only
             # for the first source, so that it's not repeated for all sources.
             if ghost_i == 0:
@@ -2773,15 +2966,19 @@ class Catalog_seed():
             else:
                 log_ghost_err = False
 
-            pixelx, pixely, ra, dec, ra_str, dec_str = self.get_positions(values['x_or_RA'],
-                                                                          values['y_or_Dec'],
-                                                                          pixelflag, 4096)
+            pixelx = all_pixelx[row]
+            pixely = all_pixely[row]
+            ra = all_ra[row]
+            dec = all_dec[row]
 
             # Get the input magnitude and countrate of the point source
             mag = float(values[mag_column])
-            countrate = utils.magnitude_to_countrate(self.instrument, self.params['Readout']['filter'],
-                                                     magsys, mag, photfnu=self.photfnu, photflam=self.photflam,
-                                                     vegamag_zeropoint=self.vegazeropoint)
+            if catalog_cache.COUNTRATE_COLUMN in lines.colnames:
+                countrate = values[catalog_cache.COUNTRATE_COLUMN]
+            else:
+                countrate = utils.magnitude_to_countrate(self.instrument, self.params['Readout']['filter'],
+                                                         magsys, mag, photfnu=self.photfnu, photflam=self.photflam,
+                                                         vegamag_zeropoint=self.vegazeropoint)
 
             # If this is a NIRISS simulation and the user wants to add ghosts,
             # do that here.
@@ -2795,13 +2992,7 @@ class Catalog_seed():
                     ghost_mag.append(gmag)
                     ghost_filename.append(gfile)
 
-                    ghost_src, skipped_non_niriss = source_mags_to_ghost_mags(values, self.params['Reffiles']['flux_cal'],
-                                                                              magsys, NIRISS_GHOST_GAP_FILE, self.params['Readout']['filter'], log_skipped_filters=False)
-
-                    if ghost_mags is None:
-                        ghost_mags = copy.deepcopy(ghost_src)
-                    else:
-                        ghost_mags = vstack([ghost_mags, ghost_src])
+                    ghost_rows.append(row)
 
                 # Increment the counter to control the logging regardless of whether the source
                 # is on the detector or not.
@@ -2813,6 +3004,7 @@ class Catalog_seed():
 
             if pixely > (miny-edgey) and pixely < (maxy+edgey) and pixelx > (minx-edgex) and pixelx < (maxx+edgex):
                 # set up an entry for the output table
+                ra_str, dec_str = self.position_strings(row, all_ra, all_dec, ra_strings, dec_strings)
                 entry = [index, pixelx, pixely, ra_str, dec_str, ra, dec, mag]
 
                 # Calculate the countrate for the source
@@ -2837,6 +3029,12 @@ class Catalog_seed():
                 pslist.write("%i %s %s %14.8f %14.8f %9.3f %9.3f  %9.3f  %13.6e   %13.6e  %s\n" %
                              (index, ra_str, dec_str, ra, dec, pixelx, pixely, mag, countrate, framecounts, tso_catalog))
 
+        # Calculate the magnitudes of all ghosts at once
+        if ghost_x is not None and len(ghost_rows) > 0:
+            ghost_mags, skipped_non_niriss = catalog_mags_to_ghost_mags(lines[ghost_rows], self.params['Reffiles']['flux_cal'],
+                                                                        magsys, NIRISS_GHOST_GAP_FILE, self.params['Readout']['filter'],
+                                                                        log_skipped_filters=False)
+
         if self.params['Inst']['instrument'].lower() == 'niriss' and self.params['simSignals']['add_ghosts'] and skipped_non_niriss:
             self.logger.info("Skipped the calculation of ghost source magnitudes for the non-NIRISS magnitude columns in {}".format(filename))
 
@@ -2910,6 +3108,20 @@ class Catalog_seed():
             dimension = self.psf_wing_sizes['number_of_pixels'][brighter[0]]
         return dimension
 
+    def find_max_psf_size(self):
+        """Determine the largest PSF dimension that ``find_psf_size`` can
+        return for any countrate
+
+        Returns
+        -------
+        dimension : int
+            Size of the largest PSF in pixels
+        """
+        dimension = self.psf_library_core_x_dim
+        if self.add_psf_wings is True:
+            dimension = max(dimension, np.max(self.psf_wing_sizes['number_of_pixels']))
+        return dimension
+
     def shift_sources_by_offset(self, lines, segment_offset, pixelflag):
         self.logger.info('    Shifting point source locations by arcsecond offset {}'.format(segment_offset))
 
@@ -2949,10 +3161,11 @@ class Catalog_seed():
 
         return shifted_lines
 
-    def remove_outside_fov_sources(self, index, source, pixflag, delta_pixels):
+    def remove_outside_fov_sources(self, index, source, pixflag, delta_pixels, catalog_file=None):
         """Filter out entries in the source catalog that are located well outside the field of
         view of the detector. This can be a fairly rough cut. We just need to remove sources
-        that are very far from the detector.
+        that are very far from the detector. If the name of the catalog file is given, a
+        spatial index of the catalog is used to find the sources to examine.
 
         Parameters:
         -----------
@@ -2971,6 +3184,10 @@ class Catalog_seed():
             to keep sources in the source list. (e.g. delta_pixels=2048 will keep all
             sources located at -2048 to 4096.)
 
+        catalog_file : str
+            Name of the catalog file that ``source`` was read from, with rows
+            in the same order. If None, every source is examined.
+
         Returns:
         --------
         index : list
@@ -3005,12 +3222,26 @@ class Catalog_seed():
                 # if it cannot be converted to a float, then the unit is 'hour'
                 ra_unit = 'hour'
 
+            # Use the spatial index of the catalog to find the sources that may be
+            # near the aperture, so that the rest of the catalog is not examined
+            if catalog_file is not None and os.path.isfile(catalog_file):
+                def load_positions():
+                    positions = SkyCoord(ra=catalog_x, dec=catalog_y, unit=(ra_unit, dec_unit))
+                    return positions.ra.deg, positions.dec.deg
+
+                spatial_index = catalog_index.get_index(catalog_file, load_positions,
+                                                        directory=self.catalog_index_dir)
+                candidates = spatial_index.query(self.ra, self.dec, delta_degrees.value)
+            else:
+                candidates = np.arange(len(source))
+
             # Temporarily replace any input positions that are None or N/A
             # with dummy values. This will allow users to supply an ephemeris
             # file and not have to add in RA, Dec numbers, which could be
             # confusing and which are ignored by Mirage anyway.
             allowed_dummy_values = ['none', 'n/a']
-            for i, row in enumerate(source):
+            for i in candidates:
+                row = source[i]
                 #if isinstance(row['x_or_RA'], str) and isinstance(row['y_or_Dec'], str):
                 if row['x_or_RA'] == np.nan or row['y_or_Dec'] == np.nan:
                     if 'ephemeris_file' in row.colnames:
@@ -3024,8 +3255,8 @@ class Catalog_seed():
 
             # Assume that units are consisent within each column. (i.e. no mixing of
             # 12h:23m:34.5s and 189.87463 degrees within a column)
-            catalog = SkyCoord(ra=catalog_x, dec=catalog_y, unit=(ra_unit, dec_unit))
-            good = np.where(reference.separation(catalog) < delta_degrees)[0]
+            catalog = SkyCoord(ra=catalog_x[candidates], dec=catalog_y[candidates], unit=(ra_unit, dec_unit))
+            good = candidates[np.where(reference.separation(catalog) < delta_degrees)[0]]
 
             # If an ephemeris column is present, mark any rows that contain
             # an ephemeris file as good. Regardless of the RA, Dec values in
@@ -3066,7 +3297,7 @@ class Catalog_seed():
         dims = np.array(self.nominal_dims)
 
         # Create the empty image
-        psfimage = np.zeros(self.output_dims)
+        psfimage = np.zeros(self.output_dims, dtype=self.working_dtype)
 
         # Create empty seed cube for possible WFSS dispersion
         seed_cube = {}
@@ -3077,100 +3308,372 @@ class Catalog_seed():
             ptsrc_segmap.ydim, ptsrc_segmap.xdim = self.output_dims
             ptsrc_segmap.initialize_map()
 
-        # Loop over the entries in the point source list
-        for i, entry in enumerate(pointSources):
-            # Start timer
-            self.timer.start()
+        if self.parallel > 1:
+            self.add_point_sources_parallel(pointSources, psfimage, ptsrc_segmap, seed_cube,
+                                            segment_number=segment_number)
+        else:
+            self.add_point_sources(pointSources, psfimage, ptsrc_segmap, seed_cube,
+                                   segment_number=segment_number)
 
-            # Find the PSF size to use based on the countrate
-            psf_x_dim = self.find_psf_size(entry['countrate_e/s'])
+        if self.params['Inst']['mode'] in DISPERSED_MODES:
+            # Save the seed cube file of point sources
+            pickle.dump(seed_cube, open("%s_star_seed_cube.pickle" % (self.basename), "wb"), protocol=pickle.HIGHEST_PROTOCOL)
 
-            # Assume same PSF size in x and y
-            psf_y_dim = psf_x_dim
+        return psfimage, ptsrc_segmap
 
-            scaled_psf, _, _, min_x, min_y, wings_added = self.create_psf_stamp(
-                entry['pixelx'], entry['pixely'], psf_x_dim, psf_y_dim,
-                segment_number=segment_number, ignore_detector=True
-            )
+    def add_point_sources(self, pointSources, psfimage, ptsrc_segmap, seed_cube, segment_number=None):
+        """Add point sources to the seed image and segmentation map, either
+        one at a time or, if ``self.batch_point_sources`` is True, in
+        batches that share evaluations of the PSF library.
 
-            # Skip sources that fall completely off the detector
-            if scaled_psf is None:
-                self.timer.stop()
-                continue
+        Parameters
+        ----------
+        pointSources : astropy.table.Table
+            Table of point sources
 
-            scaled_psf *= entry['countrate_e/s']
+        psfimage : numpy.ndarray
+            2D seed image to add the sources to. Updated in place.
 
-            # PSF may not be centered in array now if part of the array falls
-            # off of the aperture
-            stamp_x_loc = psf_x_dim // 2 - min_x
-            stamp_y_loc = psf_y_dim // 2 - min_y
-            updated_psf_dimensions = scaled_psf.shape
+        ptsrc_segmap : mirage.seed_image.segmentation_map.SegMap
+            Segmentation map to add the sources to. Updated in place.
 
-            # If the source subpixel location is beyond 0.5 (i.e. the edge
-            # of the pixel), then we shift the wing->core offset by 1.
-            # We also need to shift the location of the wing array on the
-            # detector by 1
-            if wings_added:
-                x_delta = int(np.modf(entry['pixelx'])[0] > 0.5)
-                y_delta = int(np.modf(entry['pixely'])[0] > 0.5)
-            else:
-                x_delta = 0
-                y_delta = 0
+        seed_cube : dict
+            Seed cube for WFSS dispersion. Updated in place for dispersed
+            modes.
 
-            # Get the coordinates that describe the overlap between the
-            # PSF image and the output aperture
-            xap, yap, xpts, ypts, (i1, i2), (j1, j2), (k1, k2), \
-                (l1, l2) = self.create_psf_stamp_coords(entry['pixelx']+x_delta, entry['pixely']+y_delta,
-                                                        updated_psf_dimensions,
-                                                        stamp_x_loc, stamp_y_loc,
-                                                        coord_sys='aperture')
+        segment_number : int, optional
+            The number of the mirror segment to make an image for
+        """
+        if self.batch_point_sources:
+            self.add_point_sources_batch(pointSources, psfimage, ptsrc_segmap, seed_cube,
+                                         segment_number=segment_number)
+        else:
+            # Loop over the entries in the point source list
+            for i, entry in enumerate(pointSources):
+                # Start timer
+                self.timer.start()
 
-            # Skip sources that fall completely off the detector
-            if None in [i1, i2, j1, j2, k1, k2, l1, l2]:
-                self.timer.stop()
-                continue
+                # Find the PSF size to use based on the countrate
+                psf_x_dim = self.find_psf_size(entry['countrate_e/s'])
 
-            self.logger.info("******************************* %s" % (self.basename))
+                # Assume same PSF size in x and y
+                psf_y_dim = psf_x_dim
 
-            try:
-                psf_to_add = scaled_psf[l1:l2, k1:k2]
-                psfimage[j1:j2, i1:i2] += psf_to_add
+                scaled_psf, _, _, min_x, min_y, wings_added = self.create_psf_stamp(
+                    entry['pixelx'], entry['pixely'], psf_x_dim, psf_y_dim,
+                    segment_number=segment_number, ignore_detector=True
+                )
 
-                # Add source to segmentation map
-                ptsrc_segmap.add_object_threshold(psf_to_add, j1, i1, entry['index'], self.segmentation_threshold)
+                # Skip sources that fall completely off the detector
+                if scaled_psf is None:
+                    self.timer.stop()
+                    continue
 
-                if self.params['Inst']['mode'] in DISPERSED_MODES:
-                    # Add source to seed cube file
-                    stamp = np.zeros(psf_to_add.shape)
-                    flag = psf_to_add >= self.segmentation_threshold
-                    stamp[flag] = entry['index']
-                    seed_cube[entry['index']] = [i1, j1, psf_to_add*1, stamp*1]
-            except IndexError:
-                # In here we catch sources that are off the edge
-                # of the detector. These may not necessarily be caught in
-                # getpointsourcelist because if the PSF is not centered
-                # in the webbpsf stamp, then the area to be pulled from
-                # the stamp may shift off of the detector.
-                pass
+                scaled_psf *= entry['countrate_e/s']
 
-            # Stop timer
-            self.timer.stop(name='ptsrc_{}'.format(str(i).zfill(6)))
+                # PSF may not be centered in array now if part of the array falls
+                # off of the aperture
+                stamp_x_loc = psf_x_dim // 2 - min_x
+                stamp_y_loc = psf_y_dim // 2 - min_y
+                updated_psf_dimensions = scaled_psf.shape
 
-            # If there are more than 100 point sources, provide an estimate of processing time
-            if len(pointSources) > 100:
-                if ((i == 20) or ((i > 0) and (np.mod(i, 100) == 0))):
-                    time_per_ptsrc = self.timer.sum(key_str='ptsrc_') / (i+1)
-                    estimated_remaining_time = time_per_ptsrc * (len(pointSources) - (i+1)) * u.second
-                    time_remaining = np.around(estimated_remaining_time.to(u.minute).value, decimals=2)
-                    finish_time = datetime.datetime.now() + datetime.timedelta(minutes=time_remaining)
-                    self.logger.info(('Working on source #{}. Estimated time remaining to add all point sources to the stamp image: {} minutes. '
-                                      'Projected finish time: {}'.format(i, time_remaining, finish_time)))
+                # If the source subpixel location is beyond 0.5 (i.e. the edge
+                # of the pixel), then we shift the wing->core offset by 1.
+                # We also need to shift the location of the wing array on the
+                # detector by 1
+                if wings_added:
+                    x_delta = int(np.modf(entry['pixelx'])[0] > 0.5)
+                    y_delta = int(np.modf(entry['pixely'])[0] > 0.5)
+                else:
+                    x_delta = 0
+                    y_delta = 0
 
-        if self.params['Inst']['mode'] in DISPERSED_MODES:
-            # Save the seed cube file of point sources
-            pickle.dump(seed_cube, open("%s_star_seed_cube.pickle" % (self.basename), "wb"), protocol=pickle.HIGHEST_PROTOCOL)
+                # Get the coordinates that describe the overlap between the
+                # PSF image and the output aperture
+                xap, yap, xpts, ypts, (i1, i2), (j1, j2), (k1, k2), \
+                    (l1, l2) = self.create_psf_stamp_coords(entry['pixelx']+x_delta, entry['pixely']+y_delta,
+                                                            updated_psf_dimensions,
+                                                            stamp_x_loc, stamp_y_loc,
+                                                            coord_sys='aperture')
 
-        return psfimage, ptsrc_segmap
+                # Skip sources that fall completely off the detector
+                if None in [i1, i2, j1, j2, k1, k2, l1, l2]:
+                    self.timer.stop()
+                    continue
+
+                self.logger.info("******************************* %s" % (self.basename))
+
+                try:
+                    psf_to_add = scaled_psf[l1:l2, k1:k2]
+                    psfimage[j1:j2, i1:i2] += psf_to_add
+
+                    # Add source to segmentation map
+                    ptsrc_segmap.add_object_threshold(psf_to_add, j1, i1, entry['index'], self.segmentation_threshold)
+
+                    if self.params['Inst']['mode'] in DISPERSED_MODES:
+                        # Add source to seed cube file
+                        stamp = np.zeros(psf_to_add.shape)
+                        flag = psf_to_add >= self.segmentation_threshold
+                        stamp[flag] = entry['index']
+                        seed_cube[entry['index']] = [i1, j1, psf_to_add*1, stamp*1]
+                except IndexError:
+                    # In here we catch sources that are off the edge
+                    # of the detector. These may not necessarily be caught in
+                    # getpointsourcelist because if the PSF is not centered
+                    # in the webbpsf stamp, then the area to be pulled from
+                    # the stamp may shift off of the detector.
+                    pass
+
+                # Stop timer
+                self.timer.stop(name='ptsrc_{}'.format(str(i).zfill(6)))
+
+                # If there are more than 100 point sources, provide an estimate of processing time
+                if len(pointSources) > 100:
+                    if ((i == 20) or ((i > 0) and (np.mod(i, 100) == 0))):
+                        time_per_ptsrc = self.timer.sum(key_str='ptsrc_') / (i+1)
+                        estimated_remaining_time = time_per_ptsrc * (len(pointSources) - (i+1)) * u.second
+                        time_remaining = np.around(estimated_remaining_time.to(u.minute).value, decimals=2)
+                        finish_time = datetime.datetime.now() + datetime.timedelta(minutes=time_remaining)
+                        self.logger.info(('Working on source #{}. Estimated time remaining to add all point sources to the stamp image: {} minutes. '
+                                          'Projected finish time: {}'.format(i, time_remaining, finish_time)))
+
+    def add_point_sources_parallel(self, pointSources, psfimage, ptsrc_segmap, seed_cube, segment_number=None):
+        """Add point sources to the seed image and segmentation map using
+        ``self.parallel`` processes. The sources are split into spatial
+        tiles using ``point_source_tiles``. Each tile is rendered into its
+        own partial seed image and segmentation map by a worker process,
+        and the results are then summed into ``psfimage`` and
+        ``ptsrc_segmap``. Where sources from different tiles overlap in the
+        segmentation map, the source later in the catalog takes precedence,
+        exactly as when sources are added one at a time.
+
+        Worker processes are forked from the current process so that the
+        PSF library and other reference data do not have to be copied. On
+        platforms that do not support forking, sources are added in serial.
+
+        Parameters
+        ----------
+        pointSources : astropy.table.Table
+            Table of point sources
+
+        psfimage : numpy.ndarray
+            2D seed image to add the sources to. Updated in place.
+
+        ptsrc_segmap : mirage.seed_image.segmentation_map.SegMap
+            Segmentation map to add the sources to. Updated in place.
+
+        seed_cube : dict
+            Seed cube for WFSS dispersion. Updated in place for dispersed
+            modes.
+
+        segment_number : int, optional
+            The number of the mirror segment to make an image for
+        """
+        tiles = self.point_source_tiles(pointSources, self.parallel * PARALLEL_TILES_PER_PROCESS)
+
+        if (len(tiles) < 2) or ('fork' not in multiprocessing.get_all_start_methods()):
+            if len(tiles) > 1:
+                self.logger.warning('Unable to fork worker processes on this platform. Adding point sources in serial.')
+            self.add_point_sources(pointSources, psfimage, ptsrc_segmap, seed_cube, segment_number=segment_number)
+            return
+
+        nproc = min(self.parallel, len(tiles))
+        self.logger.info('Adding {} point sources in {} tiles using {} processes.'.format(len(pointSources), len(tiles),
+                                                                                       nproc))
+
+        # Row number of the source currently occupying each pixel of the
+        # segmentation map
+        source_order = np.full(ptsrc_segmap.segmap.shape, -1, dtype=np.int64)
+        tile_cubes = {}
+
+        PARALLEL_TILE_INPUTS['seed'] = self
+        PARALLEL_TILE_INPUTS['sources'] = pointSources
+        PARALLEL_TILE_INPUTS['segment_number'] = segment_number
+        try:
+            with multiprocessing.get_context('fork').Pool(processes=nproc) as pool:
+                # imap returns results in tile order, which keeps the sum
+                # of the partial seed images reproducible
+                for y0, x0, tile_image, tile_segmap, tile_order, tile_cube in pool.imap(render_point_source_tile,
+                                                                                        tiles):
+                    ny, nx = tile_image.shape
+                    psfimage[y0:y0 + ny, x0:x0 + nx] += tile_image
+
+                    later = tile_order > source_order[y0:y0 + ny, x0:x0 + nx]
+                    ptsrc_segmap.segmap[y0:y0 + ny, x0:x0 + nx][later] = tile_segmap[later]
+                    source_order[y0:y0 + ny, x0:x0 + nx][later] = tile_order[later]
+                    tile_cubes.update(tile_cube)
+        finally:
+            PARALLEL_TILE_INPUTS.clear()
+
+        # Keep the seed cube in catalog order
+        for index in pointSources['index']:
+            if index in tile_cubes:
+                seed_cube[index] = tile_cubes[index]
+
+    def point_source_tiles(self, pointSources, num_tiles):
+        """Split a table of point sources into spatial tiles. The output
+        aperture is divided into a grid of roughly ``num_tiles`` equally
+        sized tiles, and each source is assigned to the tile containing its
+        location. Sources outside the aperture are assigned to the nearest
+        tile.
+
+        Parameters
+        ----------
+        pointSources : astropy.table.Table
+            Table of point sources
+
+        num_tiles : int
+            Requested number of tiles
+
+        Returns
+        -------
+        tiles : list
+            List of 1D arrays. Each contains the row numbers, in increasing
+            order, of the sources in one non-empty tile.
+        """
+        if len(pointSources) == 0:
+            return []
+
+        ydim, xdim = self.output_dims
+        ntiles_x = max(1, int(np.round(np.sqrt(num_tiles * xdim / ydim))))
+        ntiles_y = max(1, int(np.ceil(num_tiles / ntiles_x)))
+
+        xloc = np.array(pointSources['pixelx'], dtype=float)
+        yloc = np.array(pointSources['pixely'], dtype=float)
+        tile_x = np.clip(np.floor(xloc * ntiles_x / xdim), 0, ntiles_x - 1).astype(int)
+        tile_y = np.clip(np.floor(yloc * ntiles_y / ydim), 0, ntiles_y - 1).astype(int)
+        tile_number = tile_y * ntiles_x + tile_x
+
+        rows = np.argsort(tile_number, kind='stable')
+        boundaries = np.flatnonzero(np.diff(tile_number[rows])) + 1
+        return np.split(rows, boundaries)
+
+    def add_point_sources_batch(self, pointSources, psfimage, ptsrc_segmap, seed_cube, segment_number=None):
+        """Add point sources to the seed image in batches rather than one
+        at a time. Sources are grouped by PSF stamp size, location on the
+        detector (in boxes ``self.psf_position_resolution`` pixels on a
+        side), and sub-pixel phase (in bins ``self.psf_phase_resolution``
+        pixels wide). The PSF library is evaluated once per group, at the
+        mean location of the group's sources, and the scaled stamps of all
+        sources in the group are then added to the seed image and
+        segmentation map together. As in the one-at-a-time case, sources
+        later in the catalog take precedence in the segmentation map.
+
+        Parameters
+        ----------
+        pointSources : astropy.table.Table
+            Table of point sources
+
+        psfimage : numpy.ndarray
+            2D seed image to add the sources to. Updated in place.
+
+        ptsrc_segmap : mirage.seed_image.segmentation_map.SegMap
+            Segmentation map to add the sources to. Updated in place.
+
+        seed_cube : dict
+            Seed cube for WFSS dispersion. Updated in place for dispersed
+            modes.
+
+        segment_number : int, optional
+            The number of the mirror segment to make an image for
+        """
+        num_sources = len(pointSources)
+        if num_sources == 0:
+            return
+
+        countrates = np.array(pointSources['countrate_e/s'], dtype=float)
+        xloc = np.array(pointSources['pixelx'], dtype=float)
+        yloc = np.array(pointSources['pixely'], dtype=float)
+        indexes = np.array(pointSources['index'])
+        psf_dims = np.array([self.find_psf_size(rate) for rate in countrates]).astype(int)
+
+        # Sub-pixel phases. Whether the phase is beyond 0.5 controls where
+        # the PSF core is placed within the wings, so all sources sharing
+        # a PSF evaluation must agree on it. This uses np.modf in order to
+        # match create_psf_stamp() for sources at negative coordinates.
+        x_phase = xloc - np.floor(xloc)
+        y_phase = yloc - np.floor(yloc)
+        x_beyond_half = np.modf(xloc)[0] > 0.5
+        y_beyond_half = np.modf(yloc)[0] > 0.5
+
+        group_keys = np.column_stack([psf_dims,
+                                      np.floor(xloc / self.psf_position_resolution),
+                                      np.floor(yloc / self.psf_position_resolution),
+                                      np.floor(x_phase / self.psf_phase_resolution),
+                                      np.floor(y_phase / self.psf_phase_resolution),
+                                      x_beyond_half, y_beyond_half]).astype(np.int64)
+        _, group, group_size = np.unique(group_keys, axis=0, return_inverse=True, return_counts=True)
+        group = group.ravel()
+
+        # Location at which to evaluate the PSF library for each group
+        group_x = np.floor(np.bincount(group, weights=xloc) / group_size) + np.bincount(group, weights=x_phase) / group_size
+        group_y = np.floor(np.bincount(group, weights=yloc) / group_size) + np.bincount(group, weights=y_phase) / group_size
+
+        members_by_group = np.split(np.argsort(group, kind='stable'), np.cumsum(group_size)[:-1])
+        self.logger.info('Adding {} point sources using {} evaluations of the PSF library.'
+                         .format(num_sources, len(members_by_group)))
+
+        # Catalog row of the source currently occupying each pixel of the
+        # segmentation map. Used to preserve catalog-order precedence.
+        source_order = np.full(ptsrc_segmap.segmap.shape, -1, dtype=np.int64)
+        dispersed = self.params['Inst']['mode'] in DISPERSED_MODES
+        batch_cube = {}
+
+        for group_number, members in enumerate(members_by_group):
+            psf_dim = psf_dims[members[0]]
+            psf, _, _, min_x, min_y, wings_added = self.create_psf_stamp(
+                group_x[group_number], group_y[group_number], psf_dim, psf_dim,
+                segment_number=segment_number, ignore_detector=True
+            )
+
+            # Skip sources that fall completely off the detector
+            if psf is None:
+                continue
+
+            # Same placement as create_psf_stamp_coords(..., coord_sys='aperture')
+            # in the one-source-at-a-time case
+            stamp_x_loc = psf_dim // 2 - min_x
+            stamp_y_loc = psf_dim // 2 - min_y
+            if wings_added:
+                x_delta = x_beyond_half[members].astype(int)
+                y_delta = y_beyond_half[members].astype(int)
+            else:
+                x_delta = 0
+                y_delta = 0
+            xstarts = (np.floor(xloc[members] + x_delta + self.coord_adjust['xoffset']).astype(np.int64) -
+                       int(math.floor(stamp_x_loc)))
+            ystarts = (np.floor(yloc[members] + y_delta + self.coord_adjust['yoffset']).astype(np.int64) -
+                       int(math.floor(stamp_y_loc)))
+
+            # Limit the number of stamps held in memory at once
+            chunk_size = max(1, BATCH_STAMP_PIXEL_LIMIT // psf.size)
+            for start in range(0, len(members), chunk_size):
+                chunk = members[start:start + chunk_size]
+                xs = xstarts[start:start + chunk_size]
+                ys = ystarts[start:start + chunk_size]
+                stamps = psf[np.newaxis, :, :] * countrates[chunk][:, np.newaxis, np.newaxis]
+
+                scatter_add_stamps(psfimage, stamps, xs, ys)
+                ptsrc_segmap.add_objects_threshold(stamps, ys, xs, indexes[chunk], self.segmentation_threshold,
+                                                   orders=chunk, source_order=source_order)
+
+                if dispersed:
+                    for stamp, xstart, ystart, index in zip(stamps, xs, ys, indexes[chunk]):
+                        i1 = max(xstart, 0)
+                        i2 = min(xstart + stamp.shape[1], psfimage.shape[1])
+                        j1 = max(ystart, 0)
+                        j2 = min(ystart + stamp.shape[0], psfimage.shape[0])
+                        if (i2 <= i1) or (j2 <= j1):
+                            continue
+                        psf_to_add = stamp[j1 - ystart:j2 - ystart, i1 - xstart:i2 - xstart]
+                        seg_stamp = np.zeros(psf_to_add.shape)
+                        seg_stamp[psf_to_add >= self.segmentation_threshold] = index
+                        batch_cube[index] = [i1, j1, psf_to_add * 1, seg_stamp]
+
+        # Keep the seed cube in catalog order
+        for index in indexes:
+            if index in batch_cube:
+                seed_cube[index] = batch_cube[index]
 
     def create_psf_stamp(self, x_location, y_location, psf_dim_x, psf_dim_y,
                          ignore_detector=False, segment_number=None):
@@ -3263,8 +3766,7 @@ class Catalog_seed():
                 return None, None, None, False
 
             # Step 4
-            full_psf = library.evaluate(x=xpts_core, y=ypts_core, flux=1.0,
-                                        x_0=xc_core, y_0=yc_core)
+            full_psf = self.evaluate_psf_library(library, xpts_core, ypts_core, xc_core, yc_core)
             k1 = k1c
             l1 = l1c
 
@@ -3333,8 +3835,7 @@ class Catalog_seed():
                     return None, None, None, False
 
                 # Step 4
-                psf = self.psf_library.evaluate(x=xpts_core, y=ypts_core, flux=1.,
-                                                x_0=xc_core, y_0=yc_core)
+                psf = self.evaluate_psf_library(self.psf_library, xpts_core, ypts_core, xc_core, yc_core)
 
                 # Step 5
                 wing_start_x = k1c + delta_core_to_wing_x
@@ -3350,6 +3851,36 @@ class Catalog_seed():
 
         return full_psf, i1, j1, k1, l1, add_wings
 
+    def evaluate_psf_library(self, library, x_points, y_points, x_center, y_center):
+        """Evaluate the gridded PSF library at the given location, using
+        the PSF stamp cache if it is enabled.
+
+        Parameters
+        ----------
+        library : photutils.psf.GriddedPSFModel
+            Gridded PSF library to evaluate
+
+        x_points : numpy.ndarray
+            2D array of x coordinates at which to evaluate the PSF
+
+        y_points : numpy.ndarray
+            2D array of y coordinates at which to evaluate the PSF
+
+        x_center : float
+            X coordinate of the center of the PSF
+
+        y_center : float
+            Y coordinate of the center of the PSF
+
+        Returns
+        -------
+        psf : numpy.ndarray
+            2D array containing the PSF, normalized to a total flux of 1.0
+        """
+        if self.psf_cache is None:
+            return library.evaluate(x=x_points, y=y_points, flux=1.0, x_0=x_center, y_0=y_center)
+        return self.psf_cache.evaluate(library, x=x_points, y=y_points, flux=1.0, x_0=x_center, y_0=y_center)
+
     def create_psf_stamp_coords(self, aperture_x, aperture_y, stamp_dims, stamp_x, stamp_y,
                                 coord_sys='full_frame', ignore_detector=False):
         """Calculate the coordinates in the aperture coordinate system
@@ -3662,7 +4193,7 @@ class Catalog_seed():
             Magnitude system of the source brightnesses (e.g. 'abmag')
         """
         try:
-            gtab = ascii.read(filename)
+            gtab = catalog_cache.read_catalog(filename, directory=self.catalog_cache_dir)
             # Look at the header lines to see if inputs
             # are in units of pixels or RA, Dec
             pflag = False
@@ -3891,10 +4422,37 @@ class Catalog_seed():
         dec_str : str
             Declination value in DD:MM:SS
         """
+        ra, dec = self.xy_to_radec_degrees(pixelx, pixely)
+
+        # Translate the RA/Dec floats to strings
+        ra_str, dec_str = self.makePos(ra, dec)
+
+        return ra, dec, ra_str, dec_str
+
+    def xy_to_radec_degrees(self, pixelx, pixely):
+        """Translate x, y locations on the detector to RA, Dec. If a
+        distortion reference file is provided, use that. Otherwise fall back
+        to using pysiaf. Unlike ``XYToRADec``, this works on arrays of
+        positions, and does not create RA, Dec strings.
+
+        Parameters:
+        -----------
+        pixelx : float or numpy.ndarray
+            X coordinate values in the aperture
+
+        pixely : float or numpy.ndarray
+            Y coordinate values in the aperture
+
+        Returns:
+        --------
+        ra : float or numpy.ndarray
+            Right ascention values in degrees
+
+        dec : float or numpy.ndarray
+            Declination values in degrees
+        """
         if self.coord_transform is not None:
-            pixelx += self.subarray_bounds[0]
-            pixely += self.subarray_bounds[1]
-            loc_v2, loc_v3 = self.coord_transform(pixelx, pixely)
+            loc_v2, loc_v3 = self.coord_transform(pixelx + self.subarray_bounds[0], pixely + self.subarray_bounds[1])
         else:
             # Use SIAF to do the calculations if the distortion reffile is
             # not present. In this case, add 1 to the input pixel values
@@ -3905,17 +4463,13 @@ class Catalog_seed():
             ra, dec = pysiaf.utils.rotations.pointing(self.attitude_matrix, loc_v2, loc_v3)
         else:
             ra, dec = pysiaf.utils.rotations.pointing(self.intermediate_attitude_matrix, loc_v2, loc_v3)
-
-        # Translate the RA/Dec floats to strings
-        ra_str, dec_str = self.makePos(ra, dec)
-
-        return ra, dec, ra_str, dec_str
+        return ra, dec
 
     def readGalaxyFile(self, filename):
         # Read in the galaxy source list
         try:
             # read table
-            gtab = ascii.read(filename)
+            gtab = catalog_cache.read_catalog(filename, directory=self.catalog_cache_dir)
 
             # Look at the header lines to see if inputs
             # are in units of pixels or RA, Dec
@@ -4000,13 +4554,15 @@ class Catalog_seed():
         # Get source index numbers
         indexes = galaxylist['index']
 
+        # Determine the name of the column to use for source magnitudes, and
+        # get the countrates of all sources in the catalog
+        mag_column = self.select_magnitude_column(galaxylist, catfile)
+        self.add_catalog_countrates(galaxylist, catfile, mag_column, magsystem)
+
         # Check the source list and remove any sources that are well outside the
         # field of view of the detector. These sources cause the coordinate
         # conversion to hang.
-        indexes, galaxylist = self.remove_outside_fov_sources(indexes, galaxylist, pixelflag, 4096)
-
-        # Determine the name of the column to use for source magnitudes
-        mag_column = self.select_magnitude_column(galaxylist, catfile)
+        indexes, galaxylist = self.remove_outside_fov_sources(indexes, galaxylist, pixelflag, 4096, catalog_file=catfile)
 
         # For NIRISS observations where ghosts will be added, create a table to hold
         # the ghost entries
@@ -4016,14 +4572,41 @@ class Catalog_seed():
             ghost_y = []
             ghost_filename = []
             ghost_mag = []
+            ghost_rows = []  # Catalog rows of the sources that have ghosts
             ghost_mags = None
         else:
             ghost_x = None
 
+        # If galaxy radii are given in units of arcseconds, translate to pixels
+        if radiusflag is False:
+            galaxylist['radius'] = galaxylist['radius'] / self.siaf.XSciScale
+
+        # Calculate the detector positions of all sources at once
+        all_pixelx, all_pixely, all_ra, all_dec, ra_strings, dec_strings = self.get_position_lists(galaxylist['x_or_RA'],
+                                                                                                   galaxylist['y_or_Dec'],
+                                                                                                   pixelflag)
+
+        # how many pixels beyond the nominal subarray edges can a source be located and
+        # still have it fall partially on the subarray? Galaxy stamps are nominally set to
+        # have a length and width equal to 100 times the requested radius.
+        edge = np.array(galaxylist['radius'], dtype=float) * 100 / 2 - 1
+
+        # only keep the source if the peak will fall within the subarray
+        on_subarray = ((all_pixely > (miny - edge)) & (all_pixely < (maxy + edge)) &
+                       (all_pixelx > (minx - edge)) & (all_pixelx < (maxx + edge)))
+
+        # Sources off the subarray need to be examined only if ghosts are being added
+        if ghost_x is not None:
+            near = np.ones(len(galaxylist), dtype=bool)
+        else:
+            near = on_subarray
+
         # Loop over galaxy sources
         skipped_non_niriss = False
         ghost_i = 0
-        for index, source in zip(indexes, galaxylist):
+        for row in np.where(near)[0]:
+            index = indexes[row]
+            source = galaxylist[row]
 
             # If the filter/pupil combination does not have an entry
             # in the ghost summary file, log that only for the first
@@ -4032,32 +4615,20 @@ class Catalog_seed():
             if ghost_i > 0:
                 log_ghost_err = False
 
-            # If galaxy radii are given in units of arcseconds, translate to pixels
-            if radiusflag is False:
-                source['radius'] /= self.siaf.XSciScale
-
-            # how many pixels beyond the nominal subarray edges can a source be located and
-            # still have it fall partially on the subarray? Galaxy stamps are nominally set to
-            # have a length and width equal to 100 times the requested radius.
-            edgex = source['radius'] * 100 / 2 - 1
-            edgey = source['radius'] * 100 / 2 - 1
-
-            # reset the field of view limits for the size of the current stamp image
-            outminy = miny - edgey
-            outmaxy = maxy + edgey
-            outminx = minx - edgex
-            outmaxx = maxx + edgex
-
-            pixelx, pixely, ra, dec, ra_str, dec_str = self.get_positions(source['x_or_RA'],
-                                                                          source['y_or_Dec'],
-                                                                          pixelflag, 4096)
+            pixelx = all_pixelx[row]
+            pixely = all_pixely[row]
+            ra = all_ra[row]
+            dec = all_dec[row]
 
             # Calculate count rate
             mag = float(source[mag_column])
             # Convert magnitudes to countrate (ADU/sec) and counts per frame
-            rate = utils.magnitude_to_countrate(self.instrument, self.params['Readout']['filter'],
-                                                magsystem, mag, photfnu=self.photfnu, photflam=self.photflam,
-                                                vegamag_zeropoint=self.vegazeropoint)
+            if catalog_cache.COUNTRATE_COLUMN in galaxylist.colnames:
+                rate = source[catalog_cache.COUNTRATE_COLUMN]
+            else:
+                rate = utils.magnitude_to_countrate(self.instrument, self.params['Readout']['filter'],
+                                                    magsystem, mag, photfnu=self.photfnu, photflam=self.photflam,
+                                                    vegamag_zeropoint=self.vegazeropoint)
 
             # If this is a NIRISS simulation and the user wants to add ghosts,
             # do that here.
@@ -4071,22 +4642,15 @@ class Catalog_seed():
                     ghost_mag.append(gmag)
                     ghost_filename.append(gfile)
 
-                    ghost_src, skipped_non_niriss = source_mags_to_ghost_mags(source, self.params['Reffiles']['flux_cal'], magsystem,
-                                                                              NIRISS_GHOST_GAP_FILE, self.params['Readout']['filter'], log_skipped_filters=False)
-
-                    if ghost_mags is None:
-                        ghost_mags = copy.deepcopy(ghost_src)
-                    else:
-                        ghost_mags = vstack([ghost_mags, ghost_src])
+                    ghost_rows.append(row)
 
                 # Increment the counter to control the logging regardless of whether the source
                 # is on the detector or not.
                 ghost_i += 1
 
-            # only keep the source if the peak will fall within the subarray
-            if pixely > outminy and pixely < outmaxy and pixelx > outminx and pixelx < outmaxx:
-
+            if on_subarray[row]:
                 pixelv2, pixelv3 = pysiaf.utils.rotations.getv2v3(self.attitude_matrix, ra, dec)
+                ra_str, dec_str = self.position_strings(row, all_ra, all_dec, ra_strings, dec_strings)
                 entry = [index, pixelx, pixely, ra_str, dec_str, ra, dec, pixelv2, pixelv3,
                          source['radius'], source['ellipticity'], source['pos_angle'], source['sersic_index']]
 
@@ -4103,6 +4667,12 @@ class Catalog_seed():
                 # add the good point source, including location and counts, to the pointSourceList
                 filteredList.add_row(entry)
 
+        # Calculate the magnitudes of all ghosts at once
+        if ghost_x is not None and len(ghost_rows) > 0:
+            ghost_mags, skipped_non_niriss = catalog_mags_to_ghost_mags(galaxylist[ghost_rows], self.params['Reffiles']['flux_cal'],
+                                                                        magsystem, NIRISS_GHOST_GAP_FILE, self.params['Readout']['filter'],
+                                                                        log_skipped_filters=False)
+
         if self.params['Inst']['instrument'].lower() == 'niriss' and self.params['simSignals']['add_ghosts'] and skipped_non_niriss:
             self.logger.info(("Skipped the calculation of ghost source magnitudes for the non-NIRISS magnitude columns in "
                               "galaxy source catalog."))
@@ -4129,9 +4699,11 @@ class Catalog_seed():
         return filteredList, ghosts_from_galaxies
 
     def create_galaxy(self, r_Sersic, ellipticity, sersic_index, position_angle, total_counts, subpixx, subpixy,
-                      signal_matching_threshold=0.02):
+                      signal_matching_threshold=0.02, use_library=True):
         """Create a model 2d sersic image with a given radius, eccentricity,
-        position angle, and total counts.
+        position angle, and total counts. If the Sersic stamp library is
+        enabled (``self.sersic_library``) and the galaxy is centered on
+        a pixel, the stamp is taken from the library rather than evaluated.
 
         Parameters
         ----------
@@ -4162,11 +4734,24 @@ class Catalog_seed():
             signal is incorrect by more than this threshold, fall back to
             manual scaling of the galaxy stamp.
 
+        use_library : bool
+            If False, always evaluate the Sersic profile, even if the
+            library is enabled
+
         Returns
         -------
         img : numpy.ndarray
             2D array containing the 2D sersic profile
         """
+        if use_library and (self.sersic_library is not None) and (subpixx == 0.) and (subpixy == 0.):
+            def create_unit_stamp(radius, ellip, index, angle):
+                return self.create_galaxy(radius, ellip, index, angle, 1., 0., 0.,
+                                          signal_matching_threshold=signal_matching_threshold, use_library=False)
+
+            stamp = self.sersic_library.get_stamp(r_Sersic, ellipticity, sersic_index, position_angle,
+                                                  create_unit_stamp)
+            return stamp * total_counts
+
         # Calculate the total signal associated with the source
         sersic_total = sersic_total_signal(r_Sersic, sersic_index)
 
@@ -4278,10 +4863,22 @@ class Catalog_seed():
             return stamp
         yd, xd = stamp.shape
         mid = int(xd / 2)
-        for rad in range(mid):
-            signal = np.sum(stamp[mid - rad:mid + rad + 1, mid - rad:mid + rad + 1]) / totsignal
-            if signal >= threshold:
-                return stamp[mid - rad:mid + rad + 1, mid - rad:mid + rad + 1]
+        if mid == 0:
+            return stamp
+
+        # Use a summed area table to find the signal within every
+        # square box centered on the middle pixel in a single pass
+        area = np.zeros((yd + 1, xd + 1))
+        area[1:, 1:] = np.cumsum(np.cumsum(stamp, axis=0), axis=1)
+        rad = np.arange(mid)
+        low = mid - rad
+        high = mid + rad + 1
+        signal = (area[high, high] - area[low, high] - area[high, low] + area[low, low]) / totsignal
+
+        enough = np.flatnonzero(signal >= threshold)
+        if len(enough) > 0:
+            rad = enough[0]
+            return stamp[mid - rad:mid + rad + 1, mid - rad:mid + rad + 1]
         # If we make it all the way through the stamp without
         # hitting the threshold, then return the full stamp image
         return stamp
@@ -4335,7 +4932,7 @@ class Catalog_seed():
         seed_cube = {}
 
         # create the final galaxy countrate image
-        galimage = np.zeros((yd, xd))
+        galimage = np.zeros((yd, xd), dtype=self.working_dtype)
 
         # Create corresponding segmentation map
         segmentation = segmap.SegMap()
@@ -4347,6 +4944,11 @@ class Catalog_seed():
         if self.add_psf_wings is True:
             self.translate_psf_table(magsys)
 
+        # Galaxies waiting to be convolved with the PSF and added to the
+        # image. These are processed in blocks, in catalog order.
+        pending = []
+        pending_pixels = 0
+
         for entry_index, entry in enumerate(galaxylist):
             # Start timer
             self.timer.start()
@@ -4420,28 +5022,13 @@ class Catalog_seed():
 
             # Make sure the stamp is at least partially on the detector
             if i1 is not None and i2 is not None and j1 is not None and j2 is not None:
-                # Convolve the galaxy image with the PSF image
-                stamp = s1.fftconvolve(stamp, psf_image, mode='same')
-
-                # Now add the stamp to the main image
-                if ((j2 > j1) and (i2 > i1) and (l2 > l1) and (k2 > k1) and (j1 < yd) and (i1 < xd)):
-                    stamp_to_add = stamp[l1:l2, k1:k2]
-                    galimage[j1:j2, i1:i2] += stamp_to_add
-
-                    # Add source to segmentation map
-                    segmentation.add_object_threshold(stamp_to_add, j1, i1, entry['index'], self.segmentation_threshold)
-
-                    if self.params['Inst']['mode'] in DISPERSED_MODES:
-                        # Add source to the seed cube
-                        stamp = np.zeros(stamp_to_add.shape)
-                        flag = stamp_to_add >= self.segmentation_threshold
-                        stamp[flag] = entry['index']
-                        seed_cube[entry['index']] = [i1, j1, stamp_to_add*1, stamp*1]
-
-                else:
-                    pass
-            else:
-                pass
+                # Queue the galaxy to be convolved with the PSF image
+                pending.append((entry['index'], stamp, psf_image, (i1, i2, j1, j2, k1, k2, l1, l2)))
+                pending_pixels += stamp.size
+                if pending_pixels > BATCH_STAMP_PIXEL_LIMIT:
+                    self.add_convolved_stamps(pending, galimage, segmentation, seed_cube)
+                    pending = []
+                    pending_pixels = 0
 
             self.timer.stop(name='gal_{}'.format(str(entry_index).zfill(6)))
 
@@ -4455,10 +5042,19 @@ class Catalog_seed():
                     self.logger.info(('Working on galaxy #{}. Estimated time remaining to add all galaxies to the stamp image: {} minutes. '
                                       'Projected finish time: {}'.format(entry_index, time_remaining, finish_time)))
 
+        self.add_convolved_stamps(pending, galimage, segmentation, seed_cube)
+
         if self.params['Inst']['mode'] in DISPERSED_MODES:
             # Save the seed cube file of galaxy sources
             pickle.dump(seed_cube, open("%s_galaxy_seed_cube.pickle" % (self.basename), "wb"), protocol=pickle.HIGHEST_PROTOCOL)
 
+        # Save the Sersic stamp library so it can be reused in later runs
+        if self.sersic_library is not None:
+            self.logger.info('Sersic stamp library: {} galaxies used existing stamps, {} new stamps created.'
+                             .format(self.sersic_library.hits, self.sersic_library.misses))
+            if self.sersic_library_file is not None:
+                self.sersic_library.save(self.sersic_library_file)
+
         return galimage, segmentation.segmap, ghost_sources_from_galaxies
 
     def calc_x_position_angle(self, galaxy_entry):
@@ -4721,7 +5317,7 @@ class Catalog_seed():
         # Check the source list and remove any sources that are well outside the
         # field of view of the detector. These sources cause the coordinate
         # conversion to hang.
-        indexes, lines = self.remove_outside_fov_sources(indexes, lines, pixelflag, 4096)
+        indexes, lines = self.remove_outside_fov_sources(indexes, lines, pixelflag, 4096, catalog_file=filename)
 
         # Determine the name of the column to use for source magnitudes
         mag_column = self.select_magnitude_column(lines, filename)
@@ -4734,15 +5330,22 @@ class Catalog_seed():
             ghost_y = []
             ghost_filename = []
             ghost_mag = []
+            ghost_rows = []  # Catalog rows of the sources that have ghosts
             ghost_mags = None
         else:
             ghost_x = None
 
-        # Loop over input lines in the source list
+        # Calculate the detector positions of all sources at once
+        all_pixelx, all_pixely, all_ra, all_dec, ra_strings, dec_strings = self.get_position_lists(lines['x_or_RA'],
+                                                                                                   lines['y_or_Dec'],
+                                                                                                   pixelflag)
+
+        # Loop over input lines in the source list. Every source is examined, since
+        # the size of each stamp image is needed to know whether it falls on the subarray
         skipped_non_niriss = False
         all_stamps = []
         ghost_i = 0
-        for indexnum, values in zip(indexes, lines):
+        for row, (indexnum, values) in enumerate(zip(indexes, lines)):
             if not os.path.isfile(values['filename']):
                 raise FileNotFoundError('{} from extended source catalog does not exist.'.format(values['filename']))
 
@@ -4753,9 +5356,11 @@ class Catalog_seed():
             else:
                 log_ghost_err = False
 
-            pixelx, pixely, ra, dec, ra_str, dec_str = self.get_positions(values['x_or_RA'],
-                                                                          values['y_or_Dec'],
-                                                                          pixelflag, 4096)
+            pixelx = all_pixelx[row]
+            pixely = all_pixely[row]
+            ra = all_ra[row]
+            dec = all_dec[row]
+
             # Get the input magnitude
             try:
                 mag = float(values[mag_column])
@@ -4828,13 +5433,7 @@ class Catalog_seed():
                     ghost_mag.append(gmag)
                     ghost_filename.append(gfile)
 
-                    ghost_src, skipped_non_niriss = source_mags_to_ghost_mags(values, self.params['Reffiles']['flux_cal'],
-                                                                              magsys, NIRISS_GHOST_GAP_FILE, self.params['Readout']['filter'], log_skipped_filters=False)
-
-                    if ghost_mags is None:
-                        ghost_mags = copy.deepcopy(ghost_src)
-                    else:
-                        ghost_mags = vstack([ghost_mags, ghost_src])
+                    ghost_rows.append(row)
 
                 # Increment the counter to control the logging regardless of whether the source
                 # is on the detector or not.
@@ -4844,6 +5443,7 @@ class Catalog_seed():
             if pixely > miny and pixely < maxy and pixelx > minx and pixelx < maxx:
 
                 # Set up an entry for the output table
+                ra_str, dec_str = self.position_strings(row, all_ra, all_dec, ra_strings, dec_strings)
                 entry = [indexnum, pixelx, pixely, ra_str, dec_str, ra, dec, mag]
 
                 # save the stamp image after normalizing to a total signal of 1.
@@ -4880,6 +5480,12 @@ class Catalog_seed():
                              (indexnum, ra_str, dec_str, ra, dec, pixelx, pixely, magwrite, countrate,
                               framecounts)))
 
+        # Calculate the magnitudes of all ghosts at once
+        if ghost_x is not None and len(ghost_rows) > 0:
+            ghost_mags, skipped_non_niriss = catalog_mags_to_ghost_mags(lines[ghost_rows], self.params['Reffiles']['flux_cal'],
+                                                                        magsys, NIRISS_GHOST_GAP_FILE, self.params['Readout']['filter'],
+                                                                        log_skipped_filters=False)
+
         if ghost_search and self.params['Inst']['instrument'].lower() == 'niriss' and \
            self.params['simSignals']['add_ghosts'] and skipped_non_niriss:
             self.logger.info("Skipped the calculation of ghost source magnitudes for the non-NIRISS magnitude columns in {}".format(filename))
@@ -4937,7 +5543,7 @@ class Catalog_seed():
     def make_extended_source_image(self, extSources, extStamps, extConvolutions):
         # Create the empty image
         yd, xd = self.output_dims
-        extimage = np.zeros(self.output_dims)
+        extimage = np.zeros(self.output_dims, dtype=self.working_dtype)
 
         # Prepare seed cube for extended sources
         seed_cube = {}
@@ -4954,6 +5560,11 @@ class Catalog_seed():
             else:
                 self.logger.info('Extended sources will not be convolved with the PSF.')
 
+        # Sources waiting to be (optionally) convolved with the PSF and
+        # added to the image. These are processed in blocks, in catalog order.
+        pending = []
+        pending_pixels = 0
+
         # Loop over the entries in the source list
         for entry, stamp, convolution in zip(extSources, extStamps, extConvolutions):
             stamp_dims = stamp.shape
@@ -5011,13 +5622,11 @@ class Catalog_seed():
 
                 if None in [i1, i2, j1, j2, k1, k2, l1, l2]:
                     continue
-
-                # Convolve the extended image with the stamp image
-                stamp = s1.fftconvolve(stamp, psf_image, mode='same')
             else:
                 # If no PSF convolution is to be done, find the
                 # coordinates describing the overlap between the
                 # original stamp image and the aperture
+                psf_image = None
                 xap, yap, xpts, ypts, (i1, i2), (j1, j2), (k1, k2), \
                     (l1, l2) = self.create_psf_stamp_coords(entry['pixelx'], entry['pixely'],
                                                             stamp_dims, stamp_dims[1] // 2, stamp_dims[0] // 2,
@@ -5025,25 +5634,19 @@ class Catalog_seed():
 
             # Make sure the stamp is at least partially on the detector
             if i1 is not None and i2 is not None and j1 is not None and j2 is not None:
-
-                # Now add the stamp to the main image
-                if ((j2 > j1) and (i2 > i1) and (l2 > l1) and (k2 > k1) and (j1 < yd) and (i1 < xd)):
-                    stamp_to_add = stamp[l1:l2, k1:k2]
-                    extimage[j1:j2, i1:i2] += stamp_to_add
-
-                # Add source to segmentation map
-                segmentation.add_object_threshold(stamp_to_add, j1, i1, entry['index'],
-                                                  self.segmentation_threshold)
-
-                if self.params['Inst']['mode'] in DISPERSED_MODES:
-                    # Add source to seed cube
-                    stamp = np.zeros(stamp_to_add.shape)
-                    flag = stamp_to_add >= self.segmentation_threshold
-                    stamp[flag] = entry['index']
-                    seed_cube[entry['index']] = [i1, j1, stamp_to_add*1, stamp*1]
+                # Queue the source to be convolved with the PSF (if
+                # requested) and added to the image
+                pending.append((entry['index'], stamp, psf_image, (i1, i2, j1, j2, k1, k2, l1, l2)))
+                pending_pixels += stamp.size
+                if pending_pixels > BATCH_STAMP_PIXEL_LIMIT:
+                    self.add_convolved_stamps(pending, extimage, segmentation, seed_cube)
+                    pending = []
+                    pending_pixels = 0
 
                 self.n_extend += 1
 
+        self.add_convolved_stamps(pending, extimage, segmentation, seed_cube)
+
         if self.params['Inst']['mode'] in DISPERSED_MODES:
             # Save the seed cube
             pickle.dump(seed_cube, open("%s_extended_seed_cube.pickle" % (self.basename), "wb"), protocol=pickle.HIGHEST_PROTOCOL)
@@ -5054,6 +5657,53 @@ class Catalog_seed():
             self.logger.info('Number of extended sources present within the aperture: {}'.format(self.n_extend))
         return extimage, segmentation.segmap
 
+    def add_convolved_stamps(self, sources, image, segmentation, seed_cube):
+        """Convolve a list of galaxy or extended source stamps with their
+        PSFs, using ``self.stamp_convolver``, and add them, in order, to
+        the seed image, segmentation map and seed cube.
+
+        Parameters
+        ----------
+        sources : list
+            List of tuples, one per source, of (index, stamp, psf, coords).
+            ``index`` is the source's index number. ``stamp`` is the
+            2D stamp image of the source. ``psf`` is the 2D PSF image to
+            convolve with the stamp, or None for no convolution. ``coords``
+            is the tuple (i1, i2, j1, j2, k1, k2, l1, l2) from
+            ``create_psf_stamp_coords`` describing the overlap between the
+            stamp and the aperture.
+
+        image : numpy.ndarray
+            2D seed image. Updated in place.
+
+        segmentation : mirage.seed_image.segmentation_map.SegMap
+            Segmentation map. Updated in place.
+
+        seed_cube : dict
+            Seed cube for WFSS dispersion. Updated in place for dispersed
+            modes.
+        """
+        if len(sources) == 0:
+            return
+
+        yd, xd = image.shape
+        convolved = self.stamp_convolver.convolve_many([source[1] for source in sources],
+                                                       [source[2] for source in sources])
+        for (index, _, _, (i1, i2, j1, j2, k1, k2, l1, l2)), stamp in zip(sources, convolved):
+            if ((j2 > j1) and (i2 > i1) and (l2 > l1) and (k2 > k1) and (j1 < yd) and (i1 < xd)):
+                stamp_to_add = stamp[l1:l2, k1:k2]
+                image[j1:j2, i1:i2] += stamp_to_add
+
+                # Add source to segmentation map
+                segmentation.add_object_threshold(stamp_to_add, j1, i1, index, self.segmentation_threshold)
+
+                if self.params['Inst']['mode'] in DISPERSED_MODES:
+                    # Add source to the seed cube
+                    seg_stamp = np.zeros(stamp_to_add.shape)
+                    flag = stamp_to_add >= self.segmentation_threshold
+                    seg_stamp[flag] = index
+                    seed_cube[index] = [i1, j1, stamp_to_add*1, seg_stamp*1]
+
     def enlarge_stamp(self, image, dims):
         """Place the given image within an enlarged array of zeros. If the
         requested dimension lengths are odd while ``image``'s dimension
@@ -5577,6 +6227,133 @@ class Catalog_seed():
         elif segmentation_threshold_units in ['erg/cm2/hz']:
             self.segmentation_threshold /= self.photfnu
 
+    def set_psf_rendering_options(self):
+        """Read in the optional yaml file entries that control how point
+        sources are rendered. Entries missing from the yaml file keep the
+        default values set in ``__init__``.
+        """
+        for key, value_type in [('batch_point_sources', bool), ('psf_phase_resolution', float),
+                                ('psf_position_resolution', int), ('psf_cache_size', int),
+                                ('parallel', int)]:
+            try:
+                setattr(self, key, value_type(self.params['simSignals'][key]))
+            except KeyError:
+                self.logger.info(('simSignals:{} not present in input yaml file. Using the default value of: {}'
+                                  .format(key, getattr(self, key))))
+
+        if (self.psf_phase_resolution <= 0.) or (self.psf_phase_resolution > 1.):
+            raise ValueError(('simSignals:psf_phase_resolution must be greater than 0 and no larger than 1 pixel. '
+                              'Got {}.'.format(self.psf_phase_resolution)))
+        if self.psf_position_resolution < 1:
+            raise ValueError(('simSignals:psf_position_resolution must be at least 1 pixel. Got {}.'
+                              .format(self.psf_position_resolution)))
+
+        # Values less than 1 mean use all available cores
+        max_cores = multiprocessing.cpu_count()
+        if (self.parallel < 1) or (self.parallel > max_cores):
+            self.parallel = max_cores
+
+        # Evaluations of the PSF library are cached for all point sources,
+        # galaxies, extended sources and moving targets when requested
+        if self.psf_cache_size > 0:
+            self.psf_cache = PSFStampCache(phase_resolution=self.psf_phase_resolution,
+                                           position_resolution=self.psf_position_resolution,
+                                           max_stamps=self.psf_cache_size)
+        else:
+            self.psf_cache = None
+
+    def add_catalog_countrates(self, catalog, filename, mag_column, magsys):
+        """Add a column containing the countrates of all sources to a
+        catalog. The countrates are cached along with the parsed catalog, so
+        they are calculated only once for each filter and magnitude system.
+        If the magnitudes are not all numbers, no column is added and the
+        countrate of each source is calculated when the source is examined.
+
+        Parameters
+        ----------
+        catalog : astropy.table.Table
+            Catalog read from ``filename``, before any sources are removed
+
+        filename : str
+            Name of the catalog file
+
+        mag_column : str
+            Name of the column containing the source magnitudes
+
+        magsys : str
+            Magnitude system of the source magnitudes (e.g. 'abmag')
+        """
+        filter_name = self.params['Readout']['filter']
+        key = (self.instrument, filter_name, mag_column, magsys, self.photfnu, self.photflam, self.vegazeropoint)
+
+        def convert():
+            try:
+                return utils.magnitude_to_countrate(self.instrument, filter_name, magsys, catalog[mag_column],
+                                                    photfnu=self.photfnu, photflam=self.photflam,
+                                                    vegamag_zeropoint=self.vegazeropoint)
+            except (TypeError, ValueError):
+                return None
+
+        countrates = catalog_cache.get_countrates(filename, key, convert)
+        if countrates is not None and len(countrates) == len(catalog):
+            catalog[catalog_cache.COUNTRATE_COLUMN] = countrates
+
+    def set_catalog_cache_options(self):
+        """Read in the optional yaml file entry giving the directory in
+        which parsed versions of ascii source catalogs are saved. Without
+        it, parsed catalogs are only kept in memory.
+        """
+        try:
+            self.catalog_cache_dir = self.params['simSignals']['catalog_cache_dir']
+        except KeyError:
+            self.catalog_cache_dir = None
+            self.logger.info(('simSignals:catalog_cache_dir not present in input yaml file. Parsed source '
+                              'catalogs will not be saved.'))
+        if (self.catalog_cache_dir is not None) and (str(self.catalog_cache_dir).lower() == 'none'):
+            self.catalog_cache_dir = None
+
+    def set_catalog_index_options(self):
+        """Read in the optional yaml file entry giving the directory in
+        which spatial indexes of the source catalogs are saved. Without it,
+        indexes are only kept in memory.
+        """
+        try:
+            self.catalog_index_dir = self.params['simSignals']['catalog_index_dir']
+        except KeyError:
+            self.catalog_index_dir = None
+            self.logger.info(('simSignals:catalog_index_dir not present in input yaml file. Spatial indexes '
+                              'of source catalogs will not be saved.'))
+        if (self.catalog_index_dir is not None) and (str(self.catalog_index_dir).lower() == 'none'):
+            self.catalog_index_dir = None
+
+    def set_sersic_library_options(self):
+        """Read in the optional yaml file entries controlling the Sersic
+        galaxy stamp library, and create the library if requested. If a
+        library file is given and exists, its stamps are loaded.
+        """
+        try:
+            use_library = bool(self.params['simSignals']['sersic_library'])
+        except KeyError:
+            use_library = False
+            self.logger.info('simSignals:sersic_library not present in input yaml file. Sersic stamp library not used.')
+
+        try:
+            library_file = self.params['simSignals']['sersic_library_file']
+        except KeyError:
+            library_file = None
+        if (library_file is not None) and (str(library_file).lower() == 'none'):
+            library_file = None
+
+        if not use_library:
+            self.sersic_library = None
+            self.sersic_library_file = None
+            return
+
+        self.sersic_library = SersicStampLibrary()
+        self.sersic_library_file = library_file
+        if (library_file is not None) and os.path.isfile(library_file):
+            self.sersic_library.load(library_file)
+
     def input_check(self, inparam):
         # Check for the existence of the input file. In
         # this case we do not check the directory tree
@@ -5703,6 +6480,75 @@ class Catalog_seed():
         return parser
 
 
+def render_point_source_tile(rows):
+    """Render one tile of point sources for ``Catalog_seed.add_point_sources_parallel``.
+    Runs in a worker process forked after ``PARALLEL_TILE_INPUTS`` has
+    been populated with the Catalog_seed instance, the full table of point
+    sources, and the segment number.
+
+    Parameters
+    ----------
+    rows : numpy.ndarray
+        Row numbers, in increasing order, of the sources in this tile
+
+    Returns
+    -------
+    y0 : int
+        Row of the output aperture corresponding to the first row of the
+        returned arrays
+
+    x0 : int
+        Column of the output aperture corresponding to the first column of
+        the returned arrays
+
+    image : numpy.ndarray
+        2D seed image of the tile, cropped to the area affected by its
+        sources
+
+    tile_segmap : numpy.ndarray
+        Segmentation map of the tile, with the same shape as ``image``
+
+    tile_order : numpy.ndarray
+        Row number, in the full table, of the source occupying each pixel
+        of ``tile_segmap``, or -1 for empty pixels
+
+    seed_cube : dict
+        Seed cube entries of the tile's sources (dispersed modes only)
+    """
+    seed = PARALLEL_TILE_INPUTS['seed']
+    sources = PARALLEL_TILE_INPUTS['sources'][rows]
+
+    image = np.zeros(seed.output_dims, dtype=seed.working_dtype)
+    tile_segmap = segmap.SegMap()
+    tile_segmap.ydim, tile_segmap.xdim = seed.output_dims
+    tile_segmap.initialize_map()
+    seed_cube = {}
+    seed.add_point_sources(sources, image, tile_segmap, seed_cube,
+                           segment_number=PARALLEL_TILE_INPUTS['segment_number'])
+
+    # Crop to the area containing signal, to limit the data sent back
+    # to the parent process
+    touched = (image != 0) | (tile_segmap.segmap != 0)
+    touched_rows = np.flatnonzero(np.any(touched, axis=1))
+    touched_cols = np.flatnonzero(np.any(touched, axis=0))
+    if len(touched_rows) == 0:
+        return 0, 0, np.zeros((0, 0)), np.zeros((0, 0), dtype=tile_segmap.segmap.dtype), \
+            np.zeros((0, 0), dtype=np.int64), seed_cube
+    y0, y1 = touched_rows[0], touched_rows[-1] + 1
+    x0, x1 = touched_cols[0], touched_cols[-1] + 1
+    image = image[y0:y1, x0:x1]
+    tile_segmap = tile_segmap.segmap[y0:y1, x0:x1]
+
+    # Translate segmentation map values (source indexes) into row numbers.
+    # If an index appears more than once, the last row wins, as it would
+    # when adding sources one at a time.
+    indexes = np.array(sources['index'])
+    sort = np.argsort(indexes, kind='stable')
+    position = np.searchsorted(indexes[sort], tile_segmap, side='right') - 1
+    tile_order = np.where(tile_segmap != 0, rows[sort][np.clip(position, 0, None)], -1)
+    return y0, x0, image, tile_segmap, tile_order, seed_cube
+
+
 if __name__ == '__main__':
 
     usagestring = 'USAGE: catalog_seed_image.py inputs.yaml'
@@ -8,21 +8,25 @@ catalog_seed_image.py
 
 import numpy as np
 
+from .batch_stamps import scatter_segmentation
+from mirage.utils.constants import SEGMENTATION_MAP_DTYPE
+
 
 class SegMap():
-    def __init__(self):
+    def __init__(self, dtype=SEGMENTATION_MAP_DTYPE):
         self.xdim = 2048
         self.ydim = 2048
         self.zdim = None
         self.intdim = None
+        self.dtype = dtype
 
     def initialize_map(self):
         if self.zdim is None and self.intdim is None:
-            self.segmap = np.zeros((self.ydim, self.xdim), dtype=np.int64)
+            self.segmap = np.zeros((self.ydim, self.xdim), dtype=self.dtype)
         elif self.zdim is not None and self.intdim is None:
-            self.segmap = np.zeros((self.zdim, self.ydim, self.xdim), dtype=np.int64)
+            self.segmap = np.zeros((self.zdim, self.ydim, self.xdim), dtype=self.dtype)
         elif self.zdim is not None and self.intdim is not None:
-            self.segmap = np.zeros((self.intdim, self.zdim, self.ydim, self.xdim), dtype=np.int64)
+            self.segmap = np.zeros((self.intdim, self.zdim, self.ydim, self.xdim), dtype=self.dtype)
 
     def add_object_basic(self, ystart, yend, xstart, xend, number):
         # Add an object to the segmentation map
@@ -42,11 +46,11 @@ class SegMap():
         # In this case, only flag pixels whose
         # signal is higher than the given cutoff
         yd, xd = image.shape
-        stamp = self.segmap[ystart:ystart+yd, xstart:xstart+xd]
+        stamp = self.segmap[..., ystart:ystart+yd, xstart:xstart+xd]
         maxsig = np.max(image)
         cutoff = maxsig * perc
         flag = image >= cutoff
-        stamp[flag] = number
+        stamp[..., flag] = number
 
     def add_object_threshold(self, image, ystart, xstart, number, threshold):
         """Add an object to the segmentation map
@@ -74,6 +78,54 @@ class SegMap():
             the segmentation map as part of this object
         """
         yd, xd = image.shape
-        stamp = self.segmap[ystart:ystart+yd, xstart:xstart+xd]
+        stamp = self.segmap[..., ystart:ystart+yd, xstart:xstart+xd]
         flag = image >= threshold
-        stamp[flag] = number
+        stamp[..., flag] = number
+
+    def add_objects_threshold(self, images, ystarts, xstarts, numbers, threshold, orders=None, source_order=None):
+        """Add many objects to a 2D segmentation map at once. Only pixels
+        whose signal is at or above the given threshold are flagged. By
+        default the result is the same as calling ``add_object_threshold``
+        for each object in turn, so where objects overlap, later objects
+        take precedence. Unlike ``add_object_threshold``, stamps may extend
+        beyond the edges of the map. Pixels off the map are ignored.
+
+        Parameters
+        ----------
+        images : numpy.ndarray
+            3D array (number of objects, y, x) of stamp images
+
+        ystarts : numpy.ndarray
+            1D array of y coordinates, in the coordinate system of the full
+            seed image, of the lower left corner of each stamp
+
+        xstarts : numpy.ndarray
+            1D array of x coordinates, in the coordinate system of the full
+            seed image, of the lower left corner of each stamp
+
+        numbers : numpy.ndarray
+            1D array of values to be placed into the segmentation map for
+            each object
+
+        threshold : float
+            Pixels with signal values at or above this will be added to
+            the segmentation map
+
+        orders : numpy.ndarray
+            1D array of integers giving the precedence of each object. If
+            None, objects take precedence in the order given.
+
+        source_order : numpy.ndarray
+            2D integer array, the same shape as the map, holding the
+            precedence of the object occupying each pixel, or -1. Updated
+            in place. Pass the same array to several calls in order to
+            keep precedence across batches. If None, objects in this batch
+            overwrite any existing values in the map.
+        """
+        if self.segmap.ndim != 2:
+            raise ValueError('Batched object addition is only supported for 2D segmentation maps.')
+        if orders is None:
+            orders = np.arange(len(numbers))
+        if source_order is None:
+            source_order = np.full(self.segmap.shape, -1, dtype=np.int64)
+        scatter_segmentation(self.segmap, source_order, images, xstarts, ystarts, numbers, orders, threshold)
@@ -0,0 +1,284 @@
+#! /usr/bin/env python
+
+"""This module contains a library of 2D Sersic galaxy stamp images, used
+to avoid evaluating a new Sersic profile for every galaxy in a catalog.
+
+Galaxies are binned by Sersic index, ellipticity, effective radius (in
+logarithmic bins), and position angle. The first galaxy in each bin
+causes a stamp with a total signal of 1.0 to be created using the bin
+center values, and this stamp is then scaled to the requested signal for
+all later galaxies in the bin.
+
+Sersic stamps centered on a pixel are exactly symmetric under rotations
+by 90 degrees and under reflection about the x axis. The library only
+stores stamps with position angles between 0 and 45 degrees, and
+produces all other position angles by rotating and flipping those
+stamps.
+
+The library can be saved to, and loaded from, a file so that it can be
+reused between runs.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.seed_image.sersic_library import SersicStampLibrary
+        library = SersicStampLibrary()
+        stamp = library.get_stamp(3.5, 0.2, 1.5, 0.7, create_stamp) * total_signal
+"""
+from collections import OrderedDict
+import logging
+import os
+
+import numpy as np
+
+from mirage.logging import logging_functions
+from mirage.utils.constants import SERSIC_LIBRARY_INDEX_RESOLUTION, SERSIC_LIBRARY_ELLIPTICITY_RESOLUTION, \
+                                   SERSIC_LIBRARY_RADIUS_RESOLUTION, SERSIC_LIBRARY_ANGLE_RESOLUTION, \
+                                   SERSIC_LIBRARY_MAX_PIXELS, LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME
+
+
+classdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+log_config_file = os.path.join(classdir, 'logging', LOG_CONFIG_FILENAME)
+logging_functions.create_logger(log_config_file, STANDARD_LOGFILE_NAME)
+
+
+def orient_stamp(stamp, quarter_turns, mirror):
+    """Transform a stamp created with position angle theta into the stamp
+    for position angle ``mirror * -theta + quarter_turns * pi/2``
+
+    Parameters
+    ----------
+    stamp : numpy.ndarray
+        2D stamp image, centered on its central pixel
+
+    quarter_turns : int
+        Number of 90 degree rotations, in the direction of increasing
+        position angle
+
+    mirror : bool
+        If True, reflect the stamp about the x axis (negating the position
+        angle) before rotating
+
+    Returns
+    -------
+    stamp : numpy.ndarray
+        Transformed stamp image
+    """
+    if mirror:
+        stamp = stamp[::-1, :]
+    return np.rot90(stamp, k=-quarter_turns)
+
+
+class SersicStampLibrary():
+    """Least recently used collection of unit-signal Sersic stamp images,
+    indexed by binned Sersic index, ellipticity, effective radius and
+    position angle.
+
+    Parameters
+    ----------
+    index_resolution : float
+        Width of the Sersic index bins
+
+    ellipticity_resolution : float
+        Width of the ellipticity bins
+
+    radius_resolution : float
+        Fractional width of the effective radius bins
+
+    angle_resolution : float
+        Width of the position angle bins, in degrees
+
+    max_pixels : int
+        Maximum total number of pixels in the stamps held in the library.
+        When this is exceeded, the least recently used stamps are discarded.
+    """
+    def __init__(self, index_resolution=SERSIC_LIBRARY_INDEX_RESOLUTION,
+                 ellipticity_resolution=SERSIC_LIBRARY_ELLIPTICITY_RESOLUTION,
+                 radius_resolution=SERSIC_LIBRARY_RADIUS_RESOLUTION,
+                 angle_resolution=SERSIC_LIBRARY_ANGLE_RESOLUTION, max_pixels=SERSIC_LIBRARY_MAX_PIXELS):
+        self.logger = logging.getLogger('mirage.seed_image.sersic_library')
+        for name, value in [('index_resolution', index_resolution), ('ellipticity_resolution', ellipticity_resolution),
+                            ('radius_resolution', radius_resolution), ('angle_resolution', angle_resolution),
+                            ('max_pixels', max_pixels)]:
+            if value <= 0:
+                raise ValueError('{} must be greater than zero. Got {}.'.format(name, value))
+
+        self.index_resolution = index_resolution
+        self.ellipticity_resolution = ellipticity_resolution
+        self.radius_resolution = radius_resolution
+        self.angle_resolution = angle_resolution
+        self.max_pixels = max_pixels
+        self.stamps = OrderedDict()
+        self.num_pixels = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.stamps)
+
+    @property
+    def resolutions(self):
+        """Bin widths defining the library"""
+        return np.array([self.index_resolution, self.ellipticity_resolution, self.radius_resolution,
+                         self.angle_resolution])
+
+    def quantize(self, r_eff, ellipticity, sersic_index, position_angle):
+        """Find the library key, and the bin center parameter values, for a
+        galaxy, along with the transformation needed to produce the
+        galaxy's stamp from the library stamp.
+
+        Parameters
+        ----------
+        r_eff : float
+            Half light radius of the sersic profile, in units of pixels
+
+        ellipticity : float
+            Ellipticity of sersic profile
+
+        sersic_index : float
+            Sersic index
+
+        position_angle : float
+            Position angle in units of radians
+
+        Returns
+        -------
+        key : tup
+            Library key (index bin, ellipticity bin, radius bin, angle bin)
+
+        parameters : tup
+            (r_eff, ellipticity, sersic_index, position_angle) at the center
+            of the bin. Position angle is between 0 and pi/4.
+
+        quarter_turns : int
+            Number of 90 degree rotations to apply to the library stamp
+
+        mirror : bool
+            Whether to reflect the library stamp before rotating
+        """
+        # Reduce the position angle to between 0 and 45 degrees. Stamps
+        # are symmetric under 180 degree rotations.
+        angle = np.mod(position_angle, np.pi)
+        quarter_turns = int(angle // (np.pi / 2))
+        angle -= quarter_turns * np.pi / 2
+        mirror = angle > (np.pi / 4)
+        if mirror:
+            # The stamp for this angle is a quarter turn of the mirrored
+            # stamp for pi/2 - angle
+            angle = np.pi / 2 - angle
+            quarter_turns += 1
+
+        angle_step = np.radians(self.angle_resolution)
+        angle_bin = int(angle // angle_step)
+        angle_center = (angle_bin * angle_step + min((angle_bin + 1) * angle_step, np.pi / 4)) / 2.
+
+        index_bin = int(sersic_index // self.index_resolution)
+        index_center = (index_bin + 0.5) * self.index_resolution
+
+        ellipticity_bin = int(ellipticity // self.ellipticity_resolution)
+        ellipticity_center = (ellipticity_bin * self.ellipticity_resolution +
+                              min((ellipticity_bin + 1) * self.ellipticity_resolution, 1.)) / 2.
+
+        log_step = np.log1p(self.radius_resolution)
+        radius_bin = int(np.floor(np.log(r_eff) / log_step))
+        radius_center = np.exp((radius_bin + 0.5) * log_step)
+
+        key = (index_bin, ellipticity_bin, radius_bin, angle_bin)
+        parameters = (radius_center, ellipticity_center, index_center, angle_center)
+        return key, parameters, quarter_turns % 4, mirror
+
+    def get_stamp(self, r_eff, ellipticity, sersic_index, position_angle, create_stamp):
+        """Return the stamp image of a galaxy with a total signal of 1.0,
+        centered in its central pixel.
+
+        Parameters
+        ----------
+        r_eff : float
+            Half light radius of the sersic profile, in units of pixels
+
+        ellipticity : float
+            Ellipticity of sersic profile
+
+        sersic_index : float
+            Sersic index
+
+        position_angle : float
+            Position angle in units of radians
+
+        create_stamp : func
+            Function called as ``create_stamp(r_eff, ellipticity, sersic_index,
+            position_angle)``, returning a unit-signal stamp, used to create
+            stamps missing from the library
+
+        Returns
+        -------
+        stamp : numpy.ndarray
+            2D stamp image. This is a view into the library, and should not
+            be modified in place.
+        """
+        key, parameters, quarter_turns, mirror = self.quantize(r_eff, ellipticity, sersic_index, position_angle)
+        try:
+            stamp = self.stamps[key]
+            self.stamps.move_to_end(key)
+            self.hits += 1
+        except KeyError:
+            stamp = create_stamp(*parameters)
+            self.add(key, stamp)
+            self.misses += 1
+        return orient_stamp(stamp, quarter_turns, mirror)
+
+    def add(self, key, stamp):
+        """Add a stamp to the library, removing the least recently used
+        stamps if the library is too large
+
+        Parameters
+        ----------
+        key : tup
+            Library key
+
+        stamp : numpy.ndarray
+            2D unit-signal stamp image
+        """
+        if key in self.stamps:
+            self.num_pixels -= self.stamps.pop(key).size
+        self.stamps[key] = stamp
+        self.num_pixels += stamp.size
+        while (self.num_pixels > self.max_pixels) and (len(self.stamps) > 1):
+            _, removed = self.stamps.popitem(last=False)
+            self.num_pixels -= removed.size
+
+    def save(self, filename):
+        """Save the library to a numpy ``.npz`` file
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to save the library into
+        """
+        arrays = {'resolutions': self.resolutions,
+                  'keys': np.array(list(self.stamps.keys()), dtype=np.int64).reshape(-1, 4)}
+        for i, stamp in enumerate(self.stamps.values()):
+            arrays['stamp_{}'.format(i)] = stamp
+        with open(filename, 'wb') as fobj:
+            np.savez(fobj, **arrays)
+        self.logger.info('Sersic stamp library containing {} stamps saved to {}'.format(len(self.stamps), filename))
+
+    def load(self, filename):
+        """Add the stamps saved in a file by ``save`` to the library. The
+        file is ignored if it was created using different bin widths.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file containing the saved library
+        """
+        with np.load(filename) as saved:
+            if not np.allclose(saved['resolutions'], self.resolutions):
+                self.logger.info(('Sersic stamp library in {} was created with different bin widths. '
+                                  'Ignoring.'.format(filename)))
+                return
+            for i, key in enumerate(saved['keys']):
+                self.add(tuple(int(val) for val in key), saved['stamp_{}'.format(i)])
+        self.logger.info('Loaded {} stamps into the Sersic stamp library from {}'.format(len(self.stamps), filename))
@@ -0,0 +1,231 @@
+#! /usr/bin/env python
+
+"""This module contains a convolution engine for the stamp images of
+galaxies and extended sources, which are convolved with the PSF before
+being added to the seed image.
+
+All convolutions return the same result as
+``scipy.signal.fftconvolve(stamp, psf, mode='same')``. For each
+convolution, the direct or FFT method is chosen based on the sizes of the
+stamp and PSF. For FFT convolutions:
+
+* The Fourier transform of each PSF is cached, keyed by the contents of
+  the PSF and the FFT size. Sources that share a PSF (e.g. because they
+  fall in the same grid cell and sub-pixel phase bin of the PSF stamp
+  cache) only pay for one transform of the PSF.
+* Stamps with the same shape are transformed together as a stack of
+  real FFTs, and stamps that are used more than once (e.g. one stamp
+  convolved with a series of PSFs for a moving target) are transformed
+  only once.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.seed_image.stamp_convolution import StampConvolver
+        convolver = StampConvolver()
+        convolved = convolver.convolve_many([stamp1, stamp2], [psf1, psf2])
+"""
+from collections import OrderedDict
+import hashlib
+
+import numpy as np
+from scipy import fft
+from scipy import signal
+
+from mirage.utils.constants import PSF_SPECTRUM_CACHE_SIZE, BATCH_STAMP_PIXEL_LIMIT
+
+
+class StampConvolver():
+    """Convolve stamp images with PSFs, caching the Fourier transforms of
+    the PSFs.
+
+    Parameters
+    ----------
+    max_spectra : int
+        Maximum number of PSF Fourier transforms to cache. When this is
+        exceeded, the least recently used transform is discarded.
+
+    workers : int
+        Number of threads used by ``scipy.fft`` for each stack of FFTs.
+        -1 uses all available cores.
+    """
+    def __init__(self, max_spectra=PSF_SPECTRUM_CACHE_SIZE, workers=None):
+        if max_spectra < 1:
+            raise ValueError('max_spectra must be at least 1. Got {}.'.format(max_spectra))
+        self.max_spectra = max_spectra
+        self.workers = workers
+        self.spectra = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def psf_key(psf):
+        """Create a key identifying a PSF image by its contents
+
+        Parameters
+        ----------
+        psf : numpy.ndarray
+            2D PSF image
+
+        Returns
+        -------
+        key : tup
+            Shape and hash of ``psf``
+        """
+        psf = np.ascontiguousarray(psf, dtype=float)
+        return psf.shape, hashlib.blake2b(psf.tobytes(), digest_size=16).digest()
+
+    @staticmethod
+    def fft_shape(stamp_shape, psf_shape):
+        """Shape of the padded arrays used to convolve a stamp with a PSF
+
+        Parameters
+        ----------
+        stamp_shape : tup
+            (y, x) shape of the stamp
+
+        psf_shape : tup
+            (y, x) shape of the PSF
+
+        Returns
+        -------
+        shape : tup
+            (y, x) shape of the FFTs
+        """
+        return tuple(fft.next_fast_len(int(s + p - 1), real=True) for s, p in zip(stamp_shape, psf_shape))
+
+    def use_fft(self, stamp, psf):
+        """Decide whether the FFT or direct method is faster for convolving
+        ``stamp`` with ``psf``
+
+        Parameters
+        ----------
+        stamp : numpy.ndarray
+            2D stamp image
+
+        psf : numpy.ndarray
+            2D PSF image
+
+        Returns
+        -------
+        use_fft : bool
+            True if the FFT method should be used
+        """
+        return signal.choose_conv_method(stamp, psf, mode='same') == 'fft'
+
+    def psf_spectrum(self, psf, shape, key=None):
+        """Return the real FFT of ``psf`` zero padded to ``shape``, using
+        the cache if possible
+
+        Parameters
+        ----------
+        psf : numpy.ndarray
+            2D PSF image
+
+        shape : tup
+            (y, x) shape of the FFT
+
+        key : tup
+            Key from ``psf_key``. Calculated if not given.
+
+        Returns
+        -------
+        spectrum : numpy.ndarray
+            2D complex array
+        """
+        if key is None:
+            key = self.psf_key(psf)
+        cache_key = (key, shape)
+        try:
+            spectrum = self.spectra[cache_key]
+            self.spectra.move_to_end(cache_key)
+            self.hits += 1
+        except KeyError:
+            spectrum = fft.rfft2(psf, s=shape, workers=self.workers)
+            self.spectra[cache_key] = spectrum
+            self.misses += 1
+            if len(self.spectra) > self.max_spectra:
+                self.spectra.popitem(last=False)
+        return spectrum
+
+    def convolve(self, stamp, psf):
+        """Convolve a single stamp with a PSF. Equivalent to
+        ``scipy.signal.fftconvolve(stamp, psf, mode='same')``
+
+        Parameters
+        ----------
+        stamp : numpy.ndarray
+            2D stamp image
+
+        psf : numpy.ndarray
+            2D PSF image
+
+        Returns
+        -------
+        convolved : numpy.ndarray
+            2D array with the same shape as ``stamp``
+        """
+        return self.convolve_many([stamp], [psf])[0]
+
+    def convolve_many(self, stamps, psfs):
+        """Convolve each stamp with the corresponding PSF. Each result is
+        equivalent to ``scipy.signal.fftconvolve(stamp, psf, mode='same')``.
+
+        Parameters
+        ----------
+        stamps : list
+            List of 2D stamp images
+
+        psfs : list
+            List of 2D PSF images, one per stamp. Entries may be None, in
+            which case the corresponding stamp is returned unchanged.
+
+        Returns
+        -------
+        convolved : list
+            List of convolved stamp images, in the same order as ``stamps``
+        """
+        convolved = [None] * len(stamps)
+
+        # Group the FFT convolutions by stamp shape and PSF shape
+        groups = {}
+        for i, (stamp, psf) in enumerate(zip(stamps, psfs)):
+            if psf is None:
+                convolved[i] = stamp
+            elif self.use_fft(stamp, psf):
+                groups.setdefault((stamp.shape, psf.shape), []).append(i)
+            else:
+                convolved[i] = signal.convolve(stamp, psf, mode='same', method='direct')
+
+        for (stamp_shape, psf_shape), members in groups.items():
+            shape = self.fft_shape(stamp_shape, psf_shape)
+
+            # 'same' mode output is centered within the full convolution
+            ystart = (psf_shape[0] - 1) // 2
+            xstart = (psf_shape[1] - 1) // 2
+
+            # Limit the number of stamps transformed at once
+            chunk_size = max(1, BATCH_STAMP_PIXEL_LIMIT // (shape[0] * shape[1]))
+            for chunk_start in range(0, len(members), chunk_size):
+                chunk = members[chunk_start:chunk_start + chunk_size]
+
+                # Transform each distinct stamp only once
+                stamp_ids = OrderedDict()
+                for i in chunk:
+                    stamp_ids.setdefault(id(stamps[i]), i)
+                stamp_stack = np.array([stamps[i] for i in stamp_ids.values()], dtype=float)
+                stamp_spectra = fft.rfft2(stamp_stack, s=shape, axes=(-2, -1), workers=self.workers)
+                stamp_number = {stamp_id: n for n, stamp_id in enumerate(stamp_ids)}
+
+                products = np.empty((len(chunk), ) + stamp_spectra.shape[1:], dtype=stamp_spectra.dtype)
+                for n, i in enumerate(chunk):
+                    np.multiply(stamp_spectra[stamp_number[id(stamps[i])]], self.psf_spectrum(psfs[i], shape),
+                                out=products[n])
+
+                full = fft.irfft2(products, s=shape, axes=(-2, -1), workers=self.workers)
+                for n, i in enumerate(chunk):
+                    convolved[i] = full[n, ystart:ystart + stamp_shape[0], xstart:xstart + stamp_shape[1]].copy()
+
+        return convolved
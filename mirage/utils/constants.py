@@ -104,6 +104,14 @@ WFSS_ALLOWED_CATALOGS = ['pointsource', 'galaxyListFile', 'extended']
 TS_IMAGING_ALLOWED_CATALOGS = ['pointsource', 'galaxyListFile', 'extended', 'tso_imaging_catalog']
 TS_GRISM_ALLOWED_CATALOGS = ['pointsource', 'galaxyListFile', 'extended', 'tso_grism_catalog']
 
+# File name extensions of source catalogs saved as FITS binary tables
+# rather than ascii tables
+BINARY_CATALOG_EXTENSIONS = ('.fits', '.fit', '.fts')
+
+# Maximum number of parsed source catalogs kept in memory by
+# mirage.seed_image.catalog_cache
+CATALOG_CACHE_SIZE = 8
+
 TSO_MODES = ['ts_imaging', 'ts_grism']
 
 # Upper limit to the size of a seed image or dark current array. Arrays
@@ -152,6 +160,9 @@ PSF_NORM_MIN = 0.8
 SEGMENTATION_MIN_SIGNAL_RATE = 0.031  # ADU/sec
 SUPPORTED_SEGMENTATION_THRESHOLD_UNITS = ['adu/s', 'adu/sec', 'e/s', 'e/sec', 'mjy/str', 'mjy/sr', 'erg/cm2/a', 'erg/cm2/hz']
 
+# Data type of segmentation maps. Source indexes must fit within this type.
+SEGMENTATION_MAP_DTYPE = np.int32
+
 # For use in converting background MJy/sr to e-/sec
 PRIMARY_MIRROR_AREA = 25.326 * u.meter * u.meter
 PLANCK = 6.62607004e-34  * u.meter * u.meter * u.kg / u.second
@@ -159,6 +170,81 @@ PLANCK = 6.62607004e-34  * u.meter * u.meter * u.kg / u.second
 # Fraction of the total Sersic
 SERSIC_FRACTIONAL_SIGNAL = 0.9995
 
+# Bin widths used by the Sersic galaxy stamp library. Galaxies whose
+# parameters fall in the same bins share a single stamp image. The radius
+# resolution is fractional (i.e. logarithmic bins), and the angle
+# resolution is in degrees.
+SERSIC_LIBRARY_INDEX_RESOLUTION = 0.05
+SERSIC_LIBRARY_ELLIPTICITY_RESOLUTION = 0.02
+SERSIC_LIBRARY_RADIUS_RESOLUTION = 0.02
+SERSIC_LIBRARY_ANGLE_RESOLUTION = 1.0
+
+# Maximum total number of pixels in the stamps held by the Sersic stamp
+# library (2**25 float64 pixels is 256MB)
+SERSIC_LIBRARY_MAX_PIXELS = 2**25
+
+# Batch point source rendering. Sources whose sub-pixel phases fall within
+# PSF_PHASE_RESOLUTION pixels of one another, and whose locations fall within
+# the same PSF_POSITION_RESOLUTION x PSF_POSITION_RESOLUTION pixel box, share
+# a single evaluation of the gridded PSF library.
+PSF_PHASE_RESOLUTION = 0.05  # pixels
+PSF_POSITION_RESOLUTION = 256  # pixels
+
+# Maximum number of stamp pixels held in memory at once when adding
+# batches of stamp images to a seed image
+BATCH_STAMP_PIXEL_LIMIT = 2**24
+
+# Maximum number of PSF Fourier transforms cached when convolving galaxy
+# and extended source stamps with the PSF
+PSF_SPECTRUM_CACHE_SIZE = 256
+
+# Maximum number of frame pixels held in memory at once when building
+# integrations with the vectorized ramp engine
+RAMP_BLOCK_PIXEL_LIMIT = 2**25
+
+# Maximum number of pixels convolved with the IPC kernel at once. Larger
+# exposures are convolved a block of groups at a time.
+IPC_BLOCK_PIXEL_LIMIT = 2**25
+
+# Maximum number of pixels for which the crosstalk signal is calculated at
+# once. Larger exposures are processed a block of groups at a time.
+CROSSTALK_BLOCK_PIXEL_LIMIT = 2**25
+
+# Maximum number of pixels unlinearized at once. Larger exposures are
+# processed a block of groups at a time.
+UNLINEARIZE_BLOCK_PIXEL_LIMIT = 2**22
+
+# Smallest nonlin:accuracy value for which unlinearization is done using
+# float32 arithmetic. Smaller values use float64.
+UNLINEARIZE_FLOAT32_ACCURACY = 1e-5
+
+# Data types that can be used for the seed images, ramps and darks created
+# by Mirage, selected using simSignals:working_precision
+WORKING_PRECISIONS = {'float32': np.float32, 'float64': np.float64}
+
+# Default maximum total size, in GB, of the linearized dark current files kept
+# in a LinearizedDarkCache, selected using Output:linearized_dark_cache_size
+LINEARIZED_DARK_CACHE_SIZE = 20.
+
+# Default maximum total size, in GB, of the reference file data kept in
+# memory by mirage.utils.reference_registry, selected using
+# Output:reference_memory_limit
+REFERENCE_REGISTRY_MEMORY_LIMIT = 4.
+
+# Maximum number of assets of each kind (e.g. PSF libraries) kept in memory
+# by mirage.utils.resident_assets, when it is enabled
+RESIDENT_ASSETS_PER_KIND = 4
+
+# Suggested maximum number of evaluated PSF library stamps to keep in a
+# PSFStampCache. Catalog_seed only uses the cache if simSignals:psf_cache_size
+# is greater than zero.
+PSF_CACHE_MAX_STAMPS = 1000
+
+# When adding point sources in parallel, the number of spatial tiles the
+# source list is split into for each worker process. Using several tiles
+# per process balances the load when sources are not evenly distributed.
+PARALLEL_TILES_PER_PROCESS = 4
+
 # Configuration file for defining the logs
 LOG_CONFIG_FILENAME = 'logging_config.yaml'
 
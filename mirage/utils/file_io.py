@@ -26,6 +26,7 @@ from astropy.io import ascii, fits
 import astropy.units as q
 import numpy as np
 
+from mirage.catalogs.utils import read_catalog
 from mirage.logging import logging_functions
 from mirage.utils.constants import LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME
 
@@ -185,7 +186,7 @@ def readMTFile(filename):
             are in units of pixels/hour. If false, arcsec/hour
         magsys -- magnitude system of the moving target magnitudes
     """
-    mtlist = ascii.read(filename, comment='#')
+    mtlist = read_catalog(filename, comment='#')
 
     # Convert all relevant columns to floats
     for col in mtlist.colnames:
@@ -39,6 +39,14 @@ logging_functions.create_logger(log_config_file, STANDARD_LOGFILE_NAME)
 
 class Read_fits():
     def __init__(self):
+        # Subarray bounds of the data, if only a subarray was read from
+        # the file. See read_astropy()
+        self.bounds = None
+
+        # Range of integrations of the data, if only some integrations
+        # were read from the file. See read_astropy()
+        self.integrations = None
+
         self.translate = {}
         self.translate['READPATT'] = 'exposure.readpatt'
         self.translate['NINTS'] = 'exposure.nints'
@@ -68,24 +76,66 @@ class Read_fits():
             except:
                 self.header[key] = None
 
-    def read_astropy(self):
-
-        h = fits.open(self.file)
+    def read_astropy(self, frames=None, bounds=None, integrations=None):
+        """Read in the file using astropy. Only the requested integrations,
+        frames and subarray are read from the file, so that reading a small
+        window of a large dark current ramp reads only a small fraction of
+        the file.
+
+        Parameters
+        ----------
+        frames : int
+            Number of frames (or groups) to read from the start of each
+            integration. If None, all frames are read. Files with fewer
+            frames are read in full.
+
+        bounds : list
+            Subarray bounds [xstart, ystart, xend, yend] (inclusive) of the
+            pixels to read. If None, all pixels are read. If given, the
+            bounds are recorded in ``self.bounds``.
+
+        integrations : tuple
+            Indexes (start, stop) of the range of integrations to read, with
+            stop excluded. If None, all integrations are read. If given,
+            the range is recorded in ``self.integrations``.
+        """
+        self.bounds = bounds
+        self.integrations = integrations
+        window = [slice(None), slice(None)]
+        if bounds is not None:
+            window = [slice(bounds[1], bounds[3] + 1), slice(bounds[0], bounds[2] + 1)]
 
         self.data = None
         self.zeroframe = None
         self.sbAndRefpix = None
         self.zero_sbAndRefpix = None
-        for i in range(len(h)):
-            name = h[i].name
-            if name == 'SCI':
-                self.data = h[i].data
-            if name == 'ZEROFRAME':
-                self.zeroframe = h[i].data
-            if name == 'SBANDREFPIX':
-                self.sbAndRefpix = h[i].data
-            if name == 'ZEROSBANDREFPIX':
-                self.zero_sbAndRefpix = h[i].data
+        with fits.open(self.file) as h:
+            for i in range(len(h)):
+                name = h[i].name
+                if name not in ['SCI', 'ZEROFRAME', 'SBANDREFPIX', 'ZEROSBANDREFPIX']:
+                    continue
+
+                # Sections of the data are read from the file only when
+                # sliced, so select the frames and pixels first
+                ndim = h[i].header['NAXIS']
+                slices = [slice(None)] * (ndim - 2) + window
+                if (name in ['SCI', 'SBANDREFPIX']) and (ndim == 4) and (frames is not None):
+                    slices[1] = slice(0, frames)
+                integration_axis = (ndim == 4) or ((ndim == 3) and (name in ['ZEROFRAME', 'ZEROSBANDREFPIX']))
+                if (integrations is not None) and integration_axis:
+                    slices[0] = slice(*integrations)
+                data = h[i].section[tuple(slices)]
+
+                if name == 'SCI':
+                    self.data = data
+                if name == 'ZEROFRAME':
+                    self.zeroframe = data
+                if name == 'SBANDREFPIX':
+                    self.sbAndRefpix = data
+                if name == 'ZEROSBANDREFPIX':
+                    self.zero_sbAndRefpix = data
+
+            primary_header = h[0].header
 
         #to match what happens with the RampModel version,
         #populate any of the remaining None extensions with
@@ -96,7 +146,7 @@ class Read_fits():
         self.header = {}
         for key in self.translate:
             try:
-                self.header[key] = h[0].header[key]
+                self.header[key] = primary_header[key]
             except:
                 self.header[key] = None
 
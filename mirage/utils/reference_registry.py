@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+
+"""This module contains a process-wide registry of data read from
+reference files, such as gain, saturation and linearity coefficient
+images and the cosmic ray library, so that each file is read only once
+per process, no matter how many exposures are simulated.
+
+Data are keyed by the full path, size and modification time of the file,
+along with the extension read, so modified files are read again. Arrays
+are memory-mapped from the file where possible, and are returned with
+their ``writeable`` flag set to False, since they are shared by all
+callers. Callers that need to modify the data must make a copy. Once the
+total size of the arrays held is above the memory limit, the least
+recently used entries are removed from the registry.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.utils import reference_registry
+        gain, header = reference_registry.read_fits_data('gain.fits')
+"""
+from collections import OrderedDict
+import logging
+import os
+
+from astropy.io import fits
+import numpy as np
+
+from mirage.utils.constants import REFERENCE_REGISTRY_MEMORY_LIMIT
+
+
+# Registry entries, keyed by file identity and extensions, from least to
+# most recently used. Each entry is a tuple of (data, header, size in bytes)
+ENTRIES = OrderedDict()
+
+# Maximum total size, in bytes, of the data held in the registry
+MEMORY_LIMIT = REFERENCE_REGISTRY_MEMORY_LIMIT * 1e9
+
+
+def clear():
+    """Remove all entries from the registry"""
+    ENTRIES.clear()
+
+
+def read_fits_data(filename, ext=1, header_ext=0):
+    """Return the data in one extension of a FITS file, along with the
+    header of another extension, reading the file only if it is not
+    already in the registry
+
+    Parameters
+    ----------
+    filename : str
+        Name of FITS file
+
+    ext : int or str
+        Extension containing the data. If None, the first extension
+        containing data is used, as in ``astropy.io.fits.getdata``
+
+    header_ext : int or str
+        Extension containing the header to return
+
+    Returns
+    -------
+    data : numpy.ndarray
+        Read-only data from ``ext``
+
+    header : astropy.io.fits.Header
+        Copy of the header of ``header_ext``
+    """
+    filename = os.path.abspath(filename)
+    status = os.stat(filename)
+    key = (filename, status.st_size, status.st_mtime_ns, ext, header_ext)
+
+    if key in ENTRIES:
+        ENTRIES.move_to_end(key)
+        data, header, size = ENTRIES[key]
+        return data, header.copy()
+
+    with fits.open(filename) as hdulist:
+        if ext is None:
+            ext = [index for index, hdu in enumerate(hdulist) if hdu.data is not None][0]
+        data = hdulist[ext].data
+        header = hdulist[header_ext].header.copy()
+    if data is not None:
+        data.flags.writeable = False
+        size = data.nbytes
+    else:
+        size = 0
+
+    # Earlier versions of the same file are no longer needed
+    for old_key in [old_key for old_key in ENTRIES if old_key[0] == filename and old_key[1:3] != key[1:3]]:
+        del ENTRIES[old_key]
+
+    ENTRIES[key] = (data, header, size)
+    while len(ENTRIES) > 1 and total_size() > MEMORY_LIMIT:
+        old_key, _ = ENTRIES.popitem(last=False)
+        logging.getLogger('mirage.utils.reference_registry').info('Removed {} from reference data registry'
+                                                                  .format(old_key[0]))
+    return data, header.copy()
+
+
+def set_memory_limit(limit):
+    """Set the maximum total size of the data held in the registry,
+    removing the least recently used entries if necessary
+
+    Parameters
+    ----------
+    limit : float
+        Memory limit in GB
+    """
+    global MEMORY_LIMIT
+    MEMORY_LIMIT = limit * 1e9
+    while len(ENTRIES) > 0 and total_size() > MEMORY_LIMIT:
+        ENTRIES.popitem(last=False)
+
+
+def total_size():
+    """Total size of the data held in the registry
+
+    Returns
+    -------
+    size : int
+        Size in bytes
+    """
+    return np.sum([entry[2] for entry in ENTRIES.values()], dtype=np.int64)
@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+
+"""This module keeps large, read-only inputs such as PSF libraries and SIAF
+instances in memory, so that they can be reused by all of the exposures
+simulated in a process. Data read from reference files are kept by
+``mirage.utils.reference_registry`` instead.
+
+Keeping assets is disabled by default, in which case ``get`` simply calls
+the loader. It is enabled in the worker processes of
+``mirage.batch_simulator``, which simulate many exposures that share these
+inputs. Assets are stored by kind, and the least recently used asset of
+each kind is dropped once more than ``RESIDENT_ASSETS_PER_KIND`` are held.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.utils import resident_assets
+        resident_assets.enable()
+        library = resident_assets.get('psf_library', key, load_library)
+"""
+from collections import OrderedDict
+
+from mirage.utils.constants import RESIDENT_ASSETS_PER_KIND
+
+
+# Assets, keyed by kind and then by the key of each asset. None if keeping
+# assets is disabled
+ASSETS = None
+
+
+def clear():
+    """Remove all assets, leaving keeping assets enabled or disabled"""
+    if ASSETS is not None:
+        ASSETS.clear()
+
+
+def disable():
+    """Stop keeping assets, and remove all assets"""
+    global ASSETS
+    ASSETS = None
+
+
+def enable():
+    """Start keeping assets in memory"""
+    global ASSETS
+    if ASSETS is None:
+        ASSETS = {}
+
+
+def get(kind, key, loader):
+    """Return an asset, loading it if it is not already in memory
+
+    Parameters
+    ----------
+    kind : str
+        Kind of asset (e.g. 'psf_library')
+
+    key : tuple
+        Hashable values that identify the asset, such as the inputs of
+        ``loader``
+
+    loader : function
+        Function, called with no arguments, that loads the asset. Assets
+        that are kept must not be modified by the caller.
+
+    Returns
+    -------
+    asset : obj
+        The asset returned by ``loader``
+    """
+    if ASSETS is None:
+        return loader()
+
+    assets = ASSETS.setdefault(kind, OrderedDict())
+    if key in assets:
+        assets.move_to_end(key)
+        return assets[key]
+
+    asset = loader()
+    assets[key] = asset
+    while len(assets) > RESIDENT_ASSETS_PER_KIND:
+        assets.popitem(last=False)
+    return asset
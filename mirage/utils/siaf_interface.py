@@ -26,7 +26,7 @@ import pysiaf
 from pysiaf import iando
 
 from mirage.logging import logging_functions
-from ..utils import rotations
+from ..utils import resident_assets, rotations
 from ..utils import set_telescope_pointing_separated as set_telescope_pointing
 from mirage.utils.constants import LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME
 
@@ -139,7 +139,7 @@ def get_instance(instrument):
     siaf : pysiaf.Siaf
         Siaf object for the requested instrument
     """
-    siaf = pysiaf.Siaf(instrument)
+    siaf = resident_assets.get('siaf', (instrument.lower(), ), lambda: pysiaf.Siaf(instrument))
     return siaf
 
 
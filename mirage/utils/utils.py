@@ -19,6 +19,7 @@ Dependencies
 """
 
 import copy
+import hashlib
 import json
 import os
 import logging
@@ -35,13 +36,21 @@ from mirage.logging import logging_functions
 from mirage.utils.constants import CRDS_FILE_TYPES, NIRISS_FILTER_WHEEL_FILTERS, NIRISS_PUPIL_WHEEL_FILTERS, \
                                    NIRCAM_PUPIL_WHEEL_FILTERS, NIRCAM_2_FILTER_CROSSES, NIRCAM_WL8_CROSSING_FILTERS, \
                                    NIRCAM_CLEAR_CROSSING_FILTERS, NIRCAM_GO_PW_FILTER_PAIRINGS, NIRCAM_FILTERS, \
-                                   NIRISS_FILTERS, FGS_FILTERS, LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME
+                                   NIRISS_FILTERS, FGS_FILTERS, LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME, \
+                                   WORKING_PRECISIONS
 
 
 classdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
 log_config_file = os.path.join(classdir, 'logging', LOG_CONFIG_FILENAME)
 logging_functions.create_logger(log_config_file, STANDARD_LOGFILE_NAME)
 
+# Hashes of file contents, keyed by (filename, size, modification time), so
+# that each file is only read once per process
+FILE_HASHES = {}
+
+# Number of bytes read at a time when hashing files
+HASH_CHUNK_SIZE = 2**24
+
 
 def append_dictionary(base_dictionary, added_dictionary, braid=False):
     """Append the content of added_dictionary key-by-key to the base_dictionary.
@@ -277,8 +286,9 @@ def countrate_to_magnitude(instrument, filter_name, magsys, count_rate, photfnu=
         Magnitude system of the input magnitudes. Allowed values are:
         'abmag', 'stmag', 'vegamag'
 
-    count_rate : float or list
-        Count rate (ADU/s) to be transformed
+    count_rate : float, list or numpy.ndarray
+        Count rate(s) (ADU/s) to be transformed. A whole catalog column can
+        be given, in which case all values are converted at once.
 
     photfnu : float
         Photfnu value that relates count rate and flux density. Only used
@@ -295,9 +305,12 @@ def countrate_to_magnitude(instrument, filter_name, magsys, count_rate, photfnu=
 
     Returns
     -------
-    mag : float or list
+    mag : float or numpy.ndarray
         Magnitude value(s) corresponding to input count_rates
     """
+    if not np.isscalar(count_rate):
+        count_rate = np.asarray(count_rate, dtype=float)
+
     # For NIRISS filters in the filter wheel, we increase the count rate by a
     # factor of 1/0.84. This is because the throughput of the CLEARP element
     # in the pupil wheel (which will be used in combination with the filter)
@@ -424,6 +437,31 @@ def expand_environment_variable(variable_name, offline=False):
     return variable_directory
 
 
+def file_hash(filename):
+    """Calculate the SHA-256 hash of the contents of a file
+
+    Parameters
+    ----------
+    filename : str
+        Name of file
+
+    Returns
+    -------
+    digest : str
+        Hexadecimal SHA-256 digest of the file contents
+    """
+    filename = os.path.abspath(filename)
+    status = os.stat(filename)
+    identity = (filename, status.st_size, status.st_mtime_ns)
+    if identity not in FILE_HASHES:
+        sha = hashlib.sha256()
+        with open(filename, 'rb') as infile:
+            for chunk in iter(lambda: infile.read(HASH_CHUNK_SIZE), b''):
+                sha.update(chunk)
+        FILE_HASHES[identity] = sha.hexdigest()
+    return FILE_HASHES[identity]
+
+
 def flatten_nested_list(nested_list):
     """Flatten a list of lists. Works only for 2 levels.
 
@@ -838,6 +876,34 @@ def get_subarray_info(params, subarray_table):
     return params
 
 
+def get_working_precision(params):
+    """Find the data type in which seed images, ramps and darks are
+    created, from the simSignals:working_precision entry of the yaml file
+
+    Parameters
+    ----------
+    params : dict
+        Nested dictionary of yaml file contents
+
+    Returns
+    -------
+    dtype : type
+        numpy.float32 or numpy.float64. If the entry is not present in
+        the yaml file, numpy.float64 is returned.
+    """
+    logger = logging.getLogger('mirage.utils.utils.get_working_precision')
+    try:
+        precision = str(params['simSignals']['working_precision']).lower()
+    except KeyError:
+        logger.info('simSignals:working_precision not present in yaml file. Using float64.')
+        return np.float64
+
+    if precision not in WORKING_PRECISIONS:
+        raise ValueError(("simSignals:working_precision must be one of {}. Got {}."
+                          .format(list(WORKING_PRECISIONS.keys()), precision)))
+    return WORKING_PRECISIONS[precision]
+
+
 def normalize_filters(instrument, filter_name, pupil_name):
     """Modify filter/pupil values to be consistent with the filter/pupil wheels
     that they are in.
@@ -870,8 +936,9 @@ def magnitude_to_countrate(instrument, filter_name, magsys, mag, photfnu=None, p
         Magnitude system of the input magnitudes. Allowed values are:
         'abmag', 'stmag', 'vegamag'
 
-    mag : float or list
-        Magnitude value(s) to transform
+    mag : float, list or numpy.ndarray
+        Magnitude value(s) to transform. A whole catalog column can be
+        given, in which case all values are converted at once.
 
     photfnu : float
         Photfnu value that relates count rate and flux density. Only used
@@ -888,10 +955,13 @@ def magnitude_to_countrate(instrument, filter_name, magsys, mag, photfnu=None, p
 
     Returns
     -------
-    count_rate : float or list
+    count_rate : float or numpy.ndarray
         Count rate (ADU/s) corresponding to the input magnutude(s)
 
     """
+    if not np.isscalar(mag):
+        mag = np.asarray(mag, dtype=float)
+
     # For NIRISS filters in the filter wheel, we increase the count rate by a
     # factor of 1/0.84. This is because the throughput of the CLEARP element
     # in the pupil wheel (which will be used in combination with the filter)
@@ -118,7 +118,8 @@ from ..utils.utils import calc_frame_time, ensure_dir_exists, expand_environment
 from .generate_observationlist import get_observation_dict
 from ..constants import NIRISS_PUPIL_WHEEL_ELEMENTS, NIRISS_FILTER_WHEEL_ELEMENTS
 from ..utils.constants import CRDS_FILE_TYPES, SEGMENTATION_MIN_SIGNAL_RATE, \
-                              LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME
+                              LOG_CONFIG_FILENAME, STANDARD_LOGFILE_NAME, PSF_PHASE_RESOLUTION, \
+                              PSF_POSITION_RESOLUTION
 from ..utils import siaf_interface, utils
 
 ENV_VAR = 'MIRAGE_DATA'
@@ -308,6 +309,7 @@ class SimInput:
         self.expand_catalog_for_segments = False
         self.dateobs_for_background = dateobs_for_background
         self.add_psf_wings = True
+        self.batch_point_sources = False
         self.add_ghosts = add_ghosts
         self.convolve_ghosts = convolve_ghosts_with_psf
         self.convolve_extended = convolve_extended_with_psf
@@ -2069,11 +2071,20 @@ class SimInput:
             f.write('  gridded_psf_library_row_padding: 4  # Number of outer rows and columns to avoid when evaluating library. RECOMMEND 4.\n')
             f.write('  psf_wing_threshold_file: {}   # File defining PSF sizes versus magnitude\n'.format(input['psf_wing_threshold_file']))
             f.write('  add_psf_wings: {}  # Whether or not to place the core of the psf from the gridded library into an image of the wings before adding.\n'.format(self.add_psf_wings))
+            f.write('  batch_point_sources: {}  # Add point sources in groups that share a single evaluation of the PSF library. Faster for crowded fields.\n'.format(self.batch_point_sources))
+            f.write('  psf_phase_resolution: {}  # Sub-pixel phase bin width (pixels) for point sources sharing a PSF evaluation\n'.format(PSF_PHASE_RESOLUTION))
+            f.write('  psf_position_resolution: {}  # Box size (pixels) on the detector for point sources sharing a PSF evaluation\n'.format(PSF_POSITION_RESOLUTION))
+            f.write('  psf_cache_size: 0  # Number of evaluated PSF library stamps to cache and reuse. 0 disables the cache.\n')
+            f.write('  parallel: 1  # Number of processes to use when adding point sources and creating integrations. Values less than 1 use all available cores.\n')
             f.write('  psfpath: {}   #Path to PSF library\n'.format(input['psfpath']))
             f.write('  psfwfe: {}   #PSF WFE value (predicted or requirements)\n'.format(self.psfwfe))
             f.write('  psfwfegroup: {}      #WFE realization group (0 to 4)\n'.format(self.psfwfegroup))
             f.write(('  galaxyListFile: {}    #File containing a list of positions/ellipticities/magnitudes of galaxies '
                      'to simulate\n'.format(GalaxyCatalog)))
+            f.write('  sersic_library: False  # Reuse Sersic stamps for galaxies with similar index, ellipticity, radius and position angle\n')
+            f.write('  sersic_library_file: None  # File in which to save the Sersic stamp library so it can be reused in later runs\n')
+            f.write('  catalog_index_dir: None  # Directory in which to save spatial indexes of the source catalogs so they can be reused in later runs\n')
+            f.write('  catalog_cache_dir: None  # Directory in which to save parsed versions of ascii source catalogs so later runs can read them quickly\n')
             f.write('  extended: {}          #Extended emission count rate image file name\n'.format(ExtendedCatalog))
             f.write('  extendedscale: {}                          #Scaling factor for extended emission image\n'.format(ExtendedScale))
             f.write(('  extendedCenter: {}                   #x, y pixel location at which to place the extended image '
@@ -2099,6 +2110,8 @@ class SimInput:
                      '"high","medium","low" similar to what is used in the ETC\n'.format(BackgroundRate)))
             f.write(('  poissonseed: {}                  #Random number generator seed for Poisson simulation)\n'
                      .format(np.random.randint(1, 2**32-2))))
+            f.write('  vectorized_ramp: False                    # Build integrations a block of frames at a time\n')
+            f.write('  working_precision: float32                # Data type of seed images, integrations and darks (float32 or float64)\n')
             f.write('  photonyield: True                         #Apply photon yield in simulation\n')
             f.write('  pymethod: True                            #Use double Poisson simulation for photon yield\n')
             f.write('  expand_catalog_for_segments: {}                     # Expand catalog for 18 segments and use distinct PSFs\n'
@@ -2131,6 +2144,10 @@ class SimInput:
             f.write('  format: DMS          # Output file format Options: DMS, SSR(not yet implemented)\n')
             f.write('  save_intermediates: False   # Save intermediate products separately (point source image, etc)\n')
             f.write('  grism_source_image: {}   # grism\n'.format(input['grism_source_image']))
+            f.write('  stream_integrations: 0   # Number of whole integrations to process at a time. 0 for all at once\n')
+            f.write('  linearized_dark_cache: None   # Directory in which to cache linearized darks. None to disable\n')
+            f.write('  linearized_dark_cache_size: 20   # Maximum total size, in GB, of the linearized dark cache\n')
+            f.write('  reference_memory_limit: 4   # Maximum total size, in GB, of reference file data kept in memory\n')
             f.write('  unsigned: True   # Output unsigned integers? (0-65535 if true. -32768 to 32768 if false)\n')
             f.write('  dmsOrient: True    # Output in DMS orientation (vs. fitswriter orientation).\n')
             f.write('  program_number: {}    # Program Number\n'.format(input['ProposalID']))
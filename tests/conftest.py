@@ -0,0 +1,29 @@
+#! /usr/bin/env python
+
+"""Fixtures shared by the Mirage tests
+
+Use
+---
+
+    Fixtures defined here are available to all test modules:
+
+    ::
+
+        @pytest.mark.usefixtures('mirage_data')
+        def test_something():
+            ...
+"""
+import os
+
+import pytest
+
+
+@pytest.fixture
+def mirage_data(tmp_path_factory, monkeypatch):
+    """Set the MIRAGE_DATA environment variable to an empty directory if
+    it is not already set (e.g. on Github Actions CI). This allows tests
+    that create Mirage classes with ``offline=True``, but do not read any
+    of the Mirage reference data, to run anywhere.
+    """
+    if os.environ.get('MIRAGE_DATA') is None:
+        monkeypatch.setenv('MIRAGE_DATA', str(tmp_path_factory.mktemp('mirage_data')))
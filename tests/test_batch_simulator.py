@@ -0,0 +1,142 @@
+#! /usr/bin/env python
+
+"""Tests for the simulation of batches of exposures by
+``batch_simulator.py``, using a stand-in for ``ImgSim``
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_batch_simulator.py
+"""
+import logging
+import os
+
+from astropy.io import ascii
+from astropy.table import Table
+import pytest
+import yaml
+
+from mirage import batch_simulator
+from mirage.logging import logging_functions
+from mirage.utils import resident_assets
+from mirage.utils.constants import STANDARD_LOGFILE_NAME
+
+
+class ImgSimStandIn():
+    """Stand-in for ImgSim, which fails on the first attempt for yaml
+    files with 'retry' in their name, and always fails for those with
+    'fail' in their name. Like ImgSim, it copies the standard log file
+    to the output directory.
+    """
+    def __init__(self, paramfile=None, offline=False, concurrent_dark_prep=False):
+        self.paramfile = paramfile
+
+    def create(self):
+        logging.getLogger('mirage.imaging_simulator').info('Simulating {}'.format(self.paramfile))
+        library = resident_assets.get('library', ('filter', ), lambda: object())
+        marker = self.paramfile.replace('.yaml', '.done')
+        if ('fail' in self.paramfile) or ('retry' in self.paramfile and not os.path.isfile(marker + '_tried')):
+            open(marker + '_tried', 'w').close()
+            raise ValueError('Simulation failed')
+        with open(marker, 'w') as outfile:
+            outfile.write('{} {}'.format(os.getpid(), id(library)))
+        logging_functions.move_logfile_to_standard_location(self.paramfile, STANDARD_LOGFILE_NAME)
+
+
+def write_yaml(directory, name, filtername='F200W', mode='imaging'):
+    """Write a minimal yaml file for an exposure"""
+    params = {'Inst': {'instrument': 'NIRCam', 'mode': mode},
+              'Readout': {'array_name': 'NRCB1_FULL', 'filter': filtername, 'pupil': 'CLEAR'},
+              'Reffiles': {'dark': 'dark.fits', 'gain': 'gain.fits'},
+              'Output': {'directory': str(directory)}}
+    filename = os.path.join(directory, name)
+    with open(filename, 'w') as outfile:
+        yaml.dump(params, outfile)
+    return filename
+
+
+@pytest.fixture
+def yaml_dir(tmp_path, monkeypatch):
+    """Directory of yaml files for exposures in two groups"""
+    monkeypatch.setattr(batch_simulator, 'ImgSim', ImgSimStandIn)
+    for index in range(4):
+        write_yaml(tmp_path, 'f200w_{}.yaml'.format(index))
+    write_yaml(tmp_path, 'f200w_retry.yaml')
+    write_yaml(tmp_path, 'f444w_0.yaml', filtername='F444W')
+    write_yaml(tmp_path, 'f444w_fail.yaml', filtername='F444W')
+    write_yaml(tmp_path, 'wfss.yaml', mode='wfss')
+    return str(tmp_path)
+
+
+def test_resident_assets():
+    """Assets should only be kept when enabled, and the least recently
+    used assets should be dropped
+    """
+    assert resident_assets.get('test', (1, ), lambda: [1]) is not resident_assets.get('test', (1, ), lambda: [1])
+    resident_assets.enable()
+    try:
+        first = resident_assets.get('test', (1, ), lambda: [1])
+        assert resident_assets.get('test', (1, ), lambda: [1]) is first
+        for key in range(2, 2 + resident_assets.RESIDENT_ASSETS_PER_KIND):
+            resident_assets.get('test', (key, ), lambda: [key])
+        assert resident_assets.get('test', (1, ), lambda: [1]) is not first
+    finally:
+        resident_assets.disable()
+
+
+def test_grouping(yaml_dir):
+    """Exposures should be grouped by filter, and groups split into tasks
+    for each process
+    """
+    batch = batch_simulator.BatchSim(yaml_dir, processes=3)
+    paramfiles = batch.find_yaml_files()
+    assert len(paramfiles) == 8
+    groups = batch.group_exposures(paramfiles)
+    assert [len(group_files) for group_files in groups.values()] == [6, 2]
+    tasks = batch.make_tasks(groups)
+    assert sorted(len(task) for task in tasks) == [2, 3, 3]
+    assert sorted(sum(tasks, [])) == paramfiles
+
+    # Yaml files can also be listed in a table
+    table_file = os.path.join(yaml_dir, 'observations.csv')
+    ascii.write(Table({'yamlfile': [os.path.basename(name) for name in paramfiles]}), table_file, format='csv')
+    assert batch_simulator.BatchSim(table_file).find_yaml_files() == paramfiles
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_batch_simulation(yaml_dir, processes):
+    """All exposures should be simulated, with failed exposures retried,
+    and shared assets kept by each process
+    """
+    summary_file = os.path.join(yaml_dir, 'summary.csv')
+    batch = batch_simulator.BatchSim(yaml_dir, processes=processes, summary_file=summary_file)
+    summary = batch.create()
+    summary = {os.path.basename(row['yamlfile']): row for row in summary}
+    assert summary['f200w_retry.yaml']['status'] == 'complete'
+    assert summary['f200w_retry.yaml']['attempts'] == 2
+    assert summary['f444w_fail.yaml']['status'] == 'failed'
+    assert 'Simulation failed' in summary['f444w_fail.yaml']['error']
+    assert summary['wfss.yaml']['status'] == 'skipped'
+    assert len(ascii.read(summary_file)) == 8
+
+    # Exposures simulated by the same process reuse its assets
+    libraries = {}
+    for name in summary:
+        if summary[name]['status'] == 'complete':
+            with open(os.path.join(yaml_dir, name.replace('.yaml', '.done'))) as infile:
+                pid, library = infile.read().split()
+            libraries.setdefault(pid, set()).add(library)
+    assert all(len(library) == 1 for library in libraries.values())
+    assert resident_assets.ASSETS is None
+
+    # Each exposure has its own log, containing only its own messages
+    for name in summary:
+        if summary[name]['status'] != 'skipped':
+            with open(os.path.join(yaml_dir, 'mirage_logs', name.replace('.yaml', '.log'))) as infile:
+                messages = [line for line in infile if 'mirage.imaging_simulator' in line]
+            assert len(messages) == summary[name]['attempts']
+            assert all(name in message for message in messages)
@@ -0,0 +1,181 @@
+#! /usr/bin/env python
+
+"""Tests for the batch stamp tools in ``batch_stamps.py``, and the batch
+point source renderer in ``catalog_seed_image.py`` that uses them.
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_batch_stamps.py
+"""
+from astropy.nddata import NDData
+from astropy.table import Table
+import numpy as np
+from photutils.psf import GriddedPSFModel
+import pytest
+
+from mirage.seed_image import catalog_seed_image
+from mirage.seed_image.batch_stamps import scatter_add_stamps, scatter_segmentation
+
+
+def create_gaussian_psf_grid(core_dim=31):
+    """Create a small GriddedPSFModel containing Gaussian PSFs whose
+    widths vary across the detector
+    """
+    half = core_dim // 2
+    y, x = np.mgrid[-half:half + 1, -half:half + 1]
+    data = np.array([np.exp(-(x**2 + y**2) / (2 * sigma**2)) for sigma in [1.2, 1.5, 1.8, 2.1]])
+    data /= np.sum(data, axis=(1, 2))[:, np.newaxis, np.newaxis]
+    meta = {'grid_xypos': [(0, 0), (2047, 0), (0, 2047), (2047, 2047)], 'oversampling': 1}
+    return GriddedPSFModel(NDData(data, meta=meta))
+
+
+def create_seed_object(add_psf_wings=False):
+    """Create a minimal Catalog_seed instance able to render point sources"""
+    seed = catalog_seed_image.Catalog_seed(offline=True)
+    seed.params = {'Inst': {'mode': 'imaging'}, 'simSignals': {}}
+    seed.basename = 'test_batch'
+    seed.output_dims = (300, 300)
+    seed.nominal_dims = (300, 300)
+    seed.subarray_bounds = [800, 800, 1099, 1099]
+    seed.ffsize = 2048
+    seed.psf_library = create_gaussian_psf_grid()
+    seed.psf_library_oversamp = 1
+    seed.psf_library_core_x_dim = 27
+    seed.psf_library_core_y_dim = 27
+    seed.segmentation_threshold = 0.5
+    seed.add_psf_wings = add_psf_wings
+    if add_psf_wings:
+        y, x = np.mgrid[-40:41, -40:41]
+        seed.psf_wings = 1e-4 / (1. + (x**2 + y**2) / 25.)
+        seed.psf_wing_sizes = Table()
+        seed.psf_wing_sizes['countrate'] = [1e5, 1e3]
+        seed.psf_wing_sizes['number_of_pixels'] = [81, 41]
+    return seed
+
+
+def create_source_table(num_sources=300):
+    """Random point sources, including some that fall partially off the aperture"""
+    np.random.seed(42)
+    tab = Table()
+    tab['index'] = np.arange(num_sources) + 1
+    tab['pixelx'] = np.random.uniform(-10, 310, num_sources)
+    tab['pixely'] = np.random.uniform(-10, 310, num_sources)
+    tab['countrate_e/s'] = 10**np.random.uniform(1, 6, num_sources)
+    return tab
+
+
+def test_scatter_add_stamps():
+    """Stamps partially off the image should be clipped, and overlapping
+    stamps summed
+    """
+    image = np.zeros((10, 10))
+    stamps = np.ones((3, 4, 4))
+    stamps[1] *= 2.
+    xstarts = np.array([-2, 1, 8])
+    ystarts = np.array([-2, 1, 8])
+    scatter_add_stamps(image, stamps, xstarts, ystarts)
+
+    truth = np.zeros((10, 10))
+    truth[0:2, 0:2] += 1.
+    truth[1:5, 1:5] += 2.
+    truth[8:10, 8:10] += 1.
+    assert np.array_equal(image, truth)
+
+    # Non-contiguous images, such as slices of larger arrays, are updated
+    full = np.zeros((3, 10, 20))
+    scatter_add_stamps(full[1, :, 5:15], stamps, xstarts, ystarts)
+    assert np.array_equal(full[1, :, 5:15], truth)
+    assert np.sum(full) == np.sum(truth)
+
+
+def test_scatter_segmentation_precedence():
+    """Later sources should take precedence regardless of the order in which
+    batches are added
+    """
+    stamps = np.ones((2, 3, 3))
+    xstarts = np.array([0, 1])
+    ystarts = np.array([0, 1])
+    numbers = np.array([10, 20])
+
+    forward = np.zeros((5, 5), dtype=np.int64)
+    order = np.full(forward.shape, -1)
+    scatter_segmentation(forward, order, stamps, xstarts, ystarts, numbers, np.array([0, 1]), 0.5)
+
+    backward = np.zeros((5, 5), dtype=np.int64)
+    order = np.full(backward.shape, -1)
+    scatter_segmentation(backward, order, stamps[1:], xstarts[1:], ystarts[1:], numbers[1:], np.array([1]), 0.5)
+    scatter_segmentation(backward, order, stamps[:1], xstarts[:1], ystarts[:1], numbers[:1], np.array([0]), 0.5)
+
+    assert np.array_equal(forward, backward)
+    assert forward[1, 1] == 20
+    assert forward[0, 0] == 10
+
+    # Non-contiguous maps are updated
+    full = np.zeros((5, 10), dtype=np.int64)
+    order = np.full(forward.shape, -1)
+    scatter_segmentation(full[:, 3:8], order, stamps, xstarts, ystarts, numbers, np.array([0, 1]), 0.5)
+    assert np.array_equal(full[:, 3:8], forward)
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_batch_point_sources_match_loop():
+    """The batch renderer should match the one-source-at-a-time renderer
+    exactly when no sources share a PSF evaluation, and to within the PSF
+    variation across a group when they do
+    """
+    sources = create_source_table()
+    for wings in [False, True]:
+        seed = create_seed_object(add_psf_wings=wings)
+        loop_image, loop_segmap = seed.make_point_source_image(sources)
+
+        seed.batch_point_sources = True
+        seed.psf_position_resolution = 1
+        seed.psf_phase_resolution = 0.001
+        batch_image, batch_segmap = seed.make_point_source_image(sources)
+        assert np.allclose(batch_image, loop_image, rtol=1e-10, atol=1e-10)
+        assert np.array_equal(batch_segmap.segmap, loop_segmap.segmap)
+
+        seed.psf_position_resolution = 256
+        seed.psf_phase_resolution = 0.05
+        batch_image, batch_segmap = seed.make_point_source_image(sources)
+        assert np.max(np.abs(batch_image - loop_image)) < 0.05 * np.max(loop_image)
+        assert np.isclose(np.sum(batch_image), np.sum(loop_image), rtol=1e-3)
+
+        # Segmentation maps can only differ at pixels close to the threshold
+        assert np.sum(batch_segmap.segmap != loop_segmap.segmap) < 0.01 * loop_segmap.segmap.size
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_point_source_tiles():
+    """Every source should be assigned to exactly one tile, with catalog
+    order preserved within each tile
+    """
+    seed = create_seed_object()
+    sources = create_source_table()
+    tiles = seed.point_source_tiles(sources, 8)
+    assert len(tiles) > 1
+    assert np.array_equal(np.sort(np.concatenate(tiles)), np.arange(len(sources)))
+    for rows in tiles:
+        assert np.all(np.diff(rows) > 0)
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_parallel_point_sources_match_serial():
+    """Point sources added by several processes should reproduce the
+    serial seed image and segmentation map, including the precedence of
+    overlapping sources in the segmentation map
+    """
+    sources = create_source_table()
+    for wings in [False, True]:
+        seed = create_seed_object(add_psf_wings=wings)
+        serial_image, serial_segmap = seed.make_point_source_image(sources)
+
+        seed.parallel = 3
+        parallel_image, parallel_segmap = seed.make_point_source_image(sources)
+        assert np.allclose(parallel_image, serial_image, rtol=1e-10, atol=1e-10)
+        assert np.array_equal(parallel_segmap.segmap, serial_segmap.segmap)
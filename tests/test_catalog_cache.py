@@ -0,0 +1,119 @@
+#! /usr/bin/env python
+
+"""Tests for the cache of parsed source catalogs in ``catalog_cache.py``
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_catalog_cache.py
+"""
+import os
+
+import numpy as np
+import pytest
+
+from mirage.catalogs.catalog_generator import PointSourceCatalog
+from mirage.seed_image import catalog_cache, catalog_seed_image
+from mirage.utils import utils
+from mirage.utils.constants import CATALOG_CACHE_SIZE
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """Start and end each test with an empty cache"""
+    catalog_cache.clear()
+    yield
+    catalog_cache.clear()
+
+
+def make_catalog(filename, number=20, seed=1):
+    """Save a point source catalog with ``number`` sources"""
+    np.random.seed(seed)
+    catalog = PointSourceCatalog(ra=np.random.uniform(10, 11, number), dec=np.random.uniform(20, 21, number))
+    catalog.add_magnitude_column(np.random.uniform(15, 25, number), instrument='nircam', filter_name='f200w',
+                                 magnitude_system='vegamag')
+    catalog.save(filename)
+    return filename
+
+
+def test_read_catalog(tmp_path):
+    """Catalogs should be parsed once, returned as copies, and parsed
+    again when modified
+    """
+    filename = make_catalog(str(tmp_path / 'stars.cat'))
+    catalog = catalog_cache.read_catalog(filename)
+    assert len(catalog) == 20
+    assert 'vegamag' in catalog.meta['comments']
+
+    catalog['x_or_RA'][0] = 0.
+    second = catalog_cache.read_catalog(filename)
+    assert second['x_or_RA'][0] != 0.
+    assert len(catalog_cache.CATALOGS) == 1
+
+    make_catalog(filename, number=30)
+    assert len(catalog_cache.read_catalog(filename)) == 30
+    assert len(catalog_cache.CATALOGS) == 2
+
+
+def test_saved_catalog(tmp_path):
+    """Parsed ascii catalogs should be saved and read back in later runs"""
+    filename = make_catalog(str(tmp_path / 'stars.cat'))
+    directory = str(tmp_path / 'parsed')
+    catalog = catalog_cache.read_catalog(filename, directory=directory)
+    saved = os.listdir(directory)
+    assert len(saved) == 1
+    assert saved[0].endswith('_catalog.fits')
+
+    # A new process would read the saved version
+    catalog_cache.clear()
+    loaded = catalog_cache.read_catalog(filename, directory=directory)
+    assert loaded.colnames == catalog.colnames
+    assert loaded.meta['comments'] == catalog.meta['comments']
+    for column in catalog.colnames:
+        assert np.array_equal(loaded[column], catalog[column])
+
+
+def test_cache_size(tmp_path):
+    """Only the most recently used catalogs should be kept"""
+    filenames = [make_catalog(str(tmp_path / 'stars_{}.cat'.format(i)), number=i + 1)
+                 for i in range(CATALOG_CACHE_SIZE + 1)]
+    for filename in filenames:
+        catalog_cache.read_catalog(filename)
+    assert len(catalog_cache.CATALOGS) == CATALOG_CACHE_SIZE
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_catalog_countrates(tmp_path):
+    """Countrates should be calculated once per filter and match those
+    calculated for individual sources
+    """
+    filename = make_catalog(str(tmp_path / 'stars.cat'))
+    seed = catalog_seed_image.Catalog_seed()
+    seed.instrument = 'nircam'
+    seed.params = {'Inst': {'instrument': 'nircam'}, 'Readout': {'filter': 'F200W', 'pupil': 'CLEAR'}}
+    seed.photfnu = 1e-31
+    seed.photflam = 1e-21
+    seed.vegazeropoint = 25.
+
+    lines, pixelflag, magsys = seed.read_point_source_file(filename)
+    mag_column = seed.select_magnitude_column(lines, filename)
+    seed.add_catalog_countrates(lines, filename, mag_column, magsys)
+    expected = [utils.magnitude_to_countrate('nircam', 'F200W', magsys, float(mag), vegamag_zeropoint=25.)
+                for mag in lines[mag_column]]
+    assert np.allclose(lines[catalog_cache.COUNTRATE_COLUMN], expected, rtol=1e-12, atol=0.)
+
+    countrates = next(iter(catalog_cache.CATALOGS.values()))['countrates']
+    assert len(countrates) == 1
+    lines, pixelflag, magsys = seed.read_point_source_file(filename)
+    seed.add_catalog_countrates(lines, filename, mag_column, magsys)
+    assert len(countrates) == 1
+
+    # A different zeropoint gives new countrates
+    seed.vegazeropoint = 26.
+    seed.add_catalog_countrates(lines, filename, mag_column, magsys)
+    assert len(countrates) == 2
+    assert np.allclose(lines[catalog_cache.COUNTRATE_COLUMN], np.array(expected) * 10**0.4)
@@ -354,6 +354,43 @@ def test_cat_from_file():
         cat_object = catalog_generator.cat_from_file(cat_path, catalogs[cat_name][0])
         assert isinstance(cat_object, catalogs[cat_name][1])
 
+
+def test_binary_catalogs(tmp_path):
+    """Test writing, converting and reading catalogs saved as FITS binary
+    tables
+    """
+    data_path = os.path.join(TEST_DATA_DIR, 'catalog_generation/')
+    for cat_name, catalog_type in [('galaxy_1.cat', 'galaxy'), ('extended_test.cat', 'extended'),
+                                   ('nonsidereal_source_test.cat', 'non_sidereal')]:
+        ascii_file = os.path.join(data_path, cat_name)
+        binary_file = utils.convert_catalog(ascii_file, str(tmp_path / cat_name.replace('.cat', '.fits')))
+        assert utils.is_binary_catalog(binary_file)
+
+        ascii_table = utils.read_catalog(ascii_file)
+        binary_table = utils.read_catalog(binary_file)
+        assert binary_table.colnames == ascii_table.colnames
+        assert binary_table.meta['comments'][0:4] == ascii_table.meta['comments'][0:4]
+        for colname in ascii_table.colnames:
+            assert np.all(binary_table[colname] == ascii_table[colname])
+            assert binary_table[colname].dtype.kind == ascii_table[colname].dtype.kind
+
+        cat_object = catalog_generator.cat_from_file(binary_file, catalog_type)
+        assert np.all(cat_object.table['index'] == ascii_table['index'])
+
+    # Catalog objects are saved as binary tables when given a FITS extension
+    ptsrc = catalog_generator.PointSourceCatalog(x=[100., 200.], y=[300., 400.])
+    ptsrc.add_magnitude_column([15., 16.], magnitude_system='vegamag', instrument='nircam', filter_name='f200w')
+    binary_file = str(tmp_path / 'ptsrc.fits')
+    ptsrc.save(binary_file)
+    with open(binary_file, 'rb') as infile:
+        assert infile.read(6) == b'SIMPLE'
+    binary_table = utils.read_catalog(binary_file)
+    assert 'position_pixels' in binary_table.meta['comments'][0:4]
+    assert 'vegamag' in binary_table.meta['comments'][0:4]
+
+    with pytest.raises(ValueError):
+        utils.convert_catalog(os.path.join(data_path, 'ptsrc_1.cat'), str(tmp_path / 'ptsrc.txt'))
+
 if not ON_GITHUB:
     os.environ['MIRAGE_DATA'] = orig_mirage_data
 
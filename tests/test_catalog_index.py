@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+
+"""Tests for the spatial index of source catalogs in ``catalog_index.py``
+and its use when selecting the sources near an aperture
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_catalog_index.py
+"""
+import os
+
+from astropy.coordinates import SkyCoord
+import astropy.units as u
+import numpy as np
+import pytest
+
+from mirage.catalogs.catalog_generator import PointSourceCatalog
+from mirage.seed_image import catalog_index, catalog_seed_image
+from mirage.utils import siaf_interface
+
+
+RA_CENTER = 12.008818
+DEC_CENTER = 45.008818
+
+
+@pytest.fixture
+def catalog_file(tmp_path):
+    """Point source catalog spread over a region much larger than a detector"""
+    np.random.seed(4)
+    number = 5000
+    ra = RA_CENTER + np.random.uniform(-0.5, 0.5, number)
+    dec = DEC_CENTER + np.random.uniform(-0.5, 0.5, number)
+    catalog = PointSourceCatalog(ra=ra, dec=dec)
+    catalog.add_magnitude_column(np.random.uniform(15, 25, number), instrument='nircam', filter_name='f200w')
+    filename = str(tmp_path / 'stars.cat')
+    catalog.save(filename)
+    catalog_index.INDEXES.clear()
+    yield filename
+    catalog_index.INDEXES.clear()
+
+
+def test_query():
+    """Queries should return every source within the radius"""
+    np.random.seed(2)
+    ra = np.random.uniform(0, 360, 20000)
+    dec = np.degrees(np.arcsin(np.random.uniform(-1, 1, 20000)))
+    ra[5] = np.nan
+    index = catalog_index.CatalogIndex(ra, dec)
+    assert index.nrows == 20000
+    assert 5 not in index.rows
+
+    sources = SkyCoord(ra=ra * u.deg, dec=dec * u.deg)
+    for center_ra, center_dec, radius in [(10., 20., 5.), (359., -89., 3.), (180., 0., 0.01)]:
+        separation = SkyCoord(ra=center_ra * u.deg, dec=center_dec * u.deg).separation(sources).deg
+        expected = np.where(separation < radius)[0]
+        rows = index.query(center_ra, center_dec, radius)
+        assert np.all(np.diff(rows) > 0)
+        assert set(expected) <= set(rows)
+        assert np.all(separation[rows] < radius * (1. + 1e-6))
+
+
+def test_saved_index(catalog_file, tmp_path):
+    """Indexes should be kept in memory, saved and loaded, and rebuilt
+    when the catalog changes
+    """
+    directory = str(tmp_path / 'indexes')
+    calls = []
+
+    def load_positions():
+        calls.append(1)
+        return np.array([RA_CENTER, RA_CENTER + 1.]), np.array([DEC_CENTER, DEC_CENTER])
+
+    index = catalog_index.get_index(catalog_file, load_positions, directory=directory)
+    assert catalog_index.get_index(catalog_file, load_positions, directory=directory) is index
+    assert len(os.listdir(directory)) == 1
+
+    # A new process would load the saved index
+    catalog_index.INDEXES.clear()
+    loaded = catalog_index.get_index(catalog_file, load_positions, directory=directory)
+    assert len(calls) == 1
+    assert np.array_equal(loaded.query(RA_CENTER, DEC_CENTER, 0.1), [0])
+
+    # Changing the catalog changes its index
+    with open(catalog_file, 'a') as outfile:
+        outfile.write('\n')
+    catalog_index.get_index(catalog_file, load_positions, directory=directory)
+    assert len(calls) == 2
+    assert len(os.listdir(directory)) == 2
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_remove_outside_fov_sources(catalog_file):
+    """Sources selected using the index should match those found by
+    examining every source
+    """
+    aperture = 'NRCB2_FULL'
+    seed = catalog_seed_image.Catalog_seed()
+    inst_siaf = siaf_interface.get_instance('nircam')
+    seed.siaf = inst_siaf[aperture]
+    seed.ra = RA_CENTER
+    seed.dec = DEC_CENTER
+
+    lines, pixelflag, magsys = seed.read_point_source_file(catalog_file)
+    all_indexes, all_sources = seed.remove_outside_fov_sources(lines['index'], lines, pixelflag, 4096)
+    indexes, sources = seed.remove_outside_fov_sources(lines['index'], lines, pixelflag, 4096,
+                                                       catalog_file=catalog_file)
+    assert 0 < len(indexes) < len(lines)
+    assert np.array_equal(indexes, all_indexes)
+    assert np.array_equal(sources['x_or_RA'], all_sources['x_or_RA'])
+    assert os.path.abspath(catalog_file) in catalog_index.INDEXES
@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+
+"""Tests for the addition of crosstalk by ``Observation.add_crosstalk``
+and ``Observation.crosstalk_image`` in ``obs_generator.py``.
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_crosstalk.py
+"""
+import os
+
+import numpy as np
+import pytest
+
+from mirage.ramp_generator import obs_generator
+
+
+def crosstalk_truth(frame, coeffs):
+    """Create the crosstalk image of a single frame one amplifier pair at
+    a time
+    """
+    truth = np.zeros_like(frame)
+    shifts = [1, -1, 1, -1]
+    for amp in range(4):
+        source = frame[:, amp * 512:(amp + 1) * 512]
+        for subamp in range(4):
+            if subamp == amp:
+                continue
+            primary = coeffs['xt{}{}'.format(amp + 1, subamp + 1)]
+            post = coeffs['xt{}{}post'.format(amp + 1, subamp + 1)]
+            if np.absolute(amp - subamp) == 2:
+                # The post term shift is applied to the flattened region
+                received = source * primary + np.roll(source * post, shifts[subamp])
+            else:
+                received = np.fliplr(source) * primary + np.roll(np.fliplr(source) * post, shifts[subamp], axis=1)
+            truth[:, subamp * 512:(subamp + 1) * 512] += received
+    return truth
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_crosstalk_image():
+    """The crosstalk signal for a stack of frames should match that
+    calculated one frame and amplifier pair at a time
+    """
+    np.random.seed(8)
+    coeffs = {}
+    for amp in range(1, 5):
+        for subamp in range(1, 5):
+            coeffs['xt{}{}'.format(amp, subamp)] = np.random.normal(scale=1e-3)
+            coeffs['xt{}{}post'.format(amp, subamp)] = np.random.normal(scale=1e-3)
+
+    obs = obs_generator.Observation(offline=True)
+    obs.params = {'Output': {'save_intermediates': False}}
+    frames = np.random.random((2, 3, 6, 2048)) * 1000.
+    xtalk = obs.crosstalk_image(frames, coeffs)
+    assert xtalk.shape == frames.shape
+    for integ in range(2):
+        for group in range(3):
+            assert np.allclose(xtalk[integ, group], crosstalk_truth(frames[integ, group], coeffs))
+
+    # Single frames are supported
+    assert np.allclose(obs.crosstalk_image(frames[0, 0], coeffs), xtalk[0, 0])
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_add_crosstalk():
+    """Crosstalk from the coefficient file should be added to all groups
+    of all integrations in place
+    """
+    np.random.seed(9)
+    obs = obs_generator.Observation(offline=True)
+    obs.params = {'Readout': {'namp': 4},
+                  'Reffiles': {'crosstalk': os.path.join(obs.modpath, 'config', 'xtalk20150303g0.errorcut.txt')},
+                  'Output': {'save_intermediates': False}}
+    obs.instrument = 'NIRCAM'
+    obs.detector = 'NRCA1'
+    coeffs = obs.read_crosstalk_file(obs.params['Reffiles']['crosstalk'], 'A1')
+
+    exposure = np.random.random((2, 2, 4, 2048)) * 1000.
+    original = np.copy(exposure)
+    obs_generator.CROSSTALK_BLOCK_PIXEL_LIMIT, limit = 1, obs_generator.CROSSTALK_BLOCK_PIXEL_LIMIT
+    try:
+        result = obs.add_crosstalk(exposure)
+    finally:
+        obs_generator.CROSSTALK_BLOCK_PIXEL_LIMIT = limit
+    assert result is exposure
+    for integ in range(2):
+        for group in range(2):
+            truth = original[integ, group] + crosstalk_truth(original[integ, group], coeffs[0])
+            assert np.allclose(result[integ, group], truth)
@@ -0,0 +1,161 @@
+#! /usr/bin/env python
+
+"""Tests for the cache of linearized darks in ``dark_cache.py``, and its
+use by ``DarkPrep``
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_dark_cache.py
+"""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from mirage.dark import dark_prep
+from mirage.dark.dark_cache import LinearizedDarkCache
+from mirage.utils import read_fits
+
+
+def create_linear_dark():
+    """Create linearized dark and zeroframe objects"""
+    np.random.seed(31)
+    linear_dark = read_fits.Read_fits()
+    linear_dark.data = np.random.normal(10., 2., (2, 3, 8, 8)).astype(np.float32)
+    linear_dark.sbAndRefpix = np.random.normal(12000., 10., (2, 3, 8, 8)).astype(np.float32)
+    linear_dark.header = {key: None for key in linear_dark.translate}
+    linear_dark.header.update({'READPATT': 'RAPID', 'NGROUPS': 3, 'NFRAMES': 1, 'DETECTOR': 'NRCA1'})
+
+    zero_model = read_fits.Read_fits()
+    zero_model.data = linear_dark.data[:, 0, :, :]
+    zero_model.sbAndRefpix = linear_dark.sbAndRefpix[:, 0, :, :]
+    return linear_dark, zero_model
+
+
+def write_file(filename, contents):
+    """Write a small text file"""
+    with open(filename, 'w') as outfile:
+        outfile.write(contents)
+
+
+def test_cache_key(tmp_path):
+    """Keys should depend on the contents of the dark and reference files
+    and the settings, but not on file names
+    """
+    cache = LinearizedDarkCache(os.path.join(tmp_path, 'cache'))
+    dark_file = os.path.join(tmp_path, 'dark.fits')
+    copied_file = os.path.join(tmp_path, 'copy.fits')
+    linearity_file = os.path.join(tmp_path, 'linearity.fits')
+    write_file(dark_file, 'dark')
+    write_file(copied_file, 'dark')
+    write_file(linearity_file, 'linearity')
+
+    reference_files = {'linearity': linearity_file, 'superbias': 'none'}
+    settings = {'pipeline_version': '1.0', 'subarray_bounds': [0, 0, 7, 7]}
+    key = cache.key(dark_file, reference_files, settings)
+    assert cache.key(copied_file, reference_files, settings) == key
+    assert cache.key(dark_file, reference_files, dict(settings, pipeline_version='1.1')) != key
+    assert cache.key(dark_file, dict(reference_files, superbias=linearity_file), settings) != key
+
+    # Modified files are hashed again
+    time.sleep(0.01)
+    write_file(linearity_file, 'new linearity')
+    assert cache.key(dark_file, reference_files, settings) != key
+
+
+def test_cache_save_and_load(tmp_path):
+    """Cached darks should be returned unchanged, and the least recently
+    used files should be removed when the cache is full
+    """
+    linear_dark, zero_model = create_linear_dark()
+    info = {'DETECTOR': 'NRCA1', 'INSTRUME': 'NIRCAM', 'FASTAXIS': -1, 'SLOWAXIS': 2,
+            'R_LINEAR': 'linearity.fits', 'R_MASK': 'mask.fits', 'R_SATURA': 'saturation.fits', 'R_SUPERB': None}
+    cache = LinearizedDarkCache(os.path.join(tmp_path, 'cache'))
+    assert cache.load('missing') is None
+
+    cache.save('first', linear_dark, zero_model, info)
+    entry = cache.load('first')
+    assert np.array_equal(entry['data'], linear_dark.data)
+    assert np.array_equal(entry['sbAndRefpix'], linear_dark.sbAndRefpix)
+    assert np.array_equal(entry['zeroframe'], zero_model.data)
+    assert np.array_equal(entry['zero_sbAndRefpix'], zero_model.sbAndRefpix)
+    assert entry['header'] == linear_dark.header
+    assert entry['info'] == info
+
+    # Room for only two entries. Using the first entry makes the second
+    # the least recently used
+    cache.max_bytes = 2.5 * os.path.getsize(cache.filename('first'))
+    cache.save('second', linear_dark, zero_model, info)
+    os.utime(cache.filename('second'), (0, 0))
+    cache.load('first')
+    cache.save('third', linear_dark, zero_model, info)
+    assert os.path.isfile(cache.filename('first'))
+    assert not os.path.isfile(cache.filename('second'))
+    assert os.path.isfile(cache.filename('third'))
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_dark_prep_cache(tmp_path):
+    """DarkPrep should restore linearized darks and their metadata from
+    the cache
+    """
+    prep = dark_prep.DarkPrep(offline=True)
+    prep.dark_cache = LinearizedDarkCache(os.path.join(tmp_path, 'cache'))
+    prep.linDark, prep.zeroModel = create_linear_dark()
+    prep.detector, prep.instrument, prep.fastaxis, prep.slowaxis = 'NRCA1', 'NIRCAM', -1, 2
+    prep.linearity_reffile, prep.mask_reffile = 'linearity.fits', 'mask.fits'
+    prep.saturation_reffile, prep.superbias_reffile = 'saturation.fits', 'superbias.fits'
+    prep.save_cached_dark('key')
+
+    restored = dark_prep.DarkPrep(offline=True)
+    restored.dark_cache = prep.dark_cache
+    assert not restored.load_cached_dark(None)
+    assert not restored.load_cached_dark('missing')
+    assert restored.load_cached_dark('key')
+    assert np.array_equal(restored.linDark.data, prep.linDark.data)
+    assert np.array_equal(restored.zeroModel.sbAndRefpix, prep.zeroModel.sbAndRefpix)
+    assert restored.linDark.header == prep.linDark.header
+    assert (restored.detector, restored.fastaxis, restored.superbias_reffile) == ('NRCA1', -1, 'superbias.fits')
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_dark_prep_cache_key(tmp_path, monkeypatch):
+    """Keys should include the CRDS context when reference files are
+    selected from CRDS, and the cache should not be used when the context
+    is unknown
+    """
+    dark_file = os.path.join(tmp_path, 'dark.fits')
+    write_file(dark_file, 'dark')
+    reference_files = {}
+    for name in ['badpixmask', 'saturation', 'superbias', 'linearity']:
+        reference_files[name] = os.path.join(tmp_path, '{}.fits'.format(name))
+        write_file(reference_files[name], name)
+
+    prep = dark_prep.DarkPrep(offline=True)
+    prep.dark_cache = LinearizedDarkCache(os.path.join(tmp_path, 'cache'))
+    prep.params = {'Inst': {'use_JWST_pipeline': True}, 'Reffiles': dict(reference_files),
+                   'Readout': {'readpatt': 'RAPID', 'ngroup': 3, 'nframe': 1, 'nskip': 0}}
+    prep.runStep = {'linearized_darkfile': False}
+    prep.subarray_bounds = [0, 0, 7, 7]
+
+    contexts = []
+    monkeypatch.setattr(dark_prep.crds_tools, 'get_context', lambda: contexts[-1])
+
+    # The context is not needed when all reference files are provided
+    contexts.append(None)
+    assert prep.linearized_dark_cache_key(dark_file) is not None
+
+    prep.params['Reffiles']['superbias'] = 'none'
+    assert prep.linearized_dark_cache_key(dark_file) is None
+
+    contexts.append('jwst_0001.pmap')
+    key = prep.linearized_dark_cache_key(dark_file)
+    assert key is not None
+    contexts.append('jwst_0002.pmap')
+    assert prep.linearized_dark_cache_key(dark_file) != key
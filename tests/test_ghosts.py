@@ -18,7 +18,7 @@ import pytest
 
 from mirage.ghosts import niriss_ghosts
 from mirage.reference_files.downloader import download_file
-from mirage.utils.constants import DEFAULT_NIRISS_PTSRC_GHOST_FILE, NIRISS_GHOST_GAP_FILE, \
+from mirage.utils.constants import CONFIG_DIR, DEFAULT_NIRISS_PTSRC_GHOST_FILE, NIRISS_GHOST_GAP_FILE, \
                                    NIRISS_GHOST_GAP_URL
 
 
@@ -129,3 +129,39 @@ def test_get_ghost():
     assert not np.isfinite(xghost)
     assert not np.isfinite(yghost)
     assert not np.isfinite(fluxghost)
+
+
+def test_catalog_mags_to_ghost_mags(tmp_path):
+    """Ghost magnitudes calculated for a whole catalog should match those
+    calculated for each source
+    """
+    gap_file = str(tmp_path / 'gap_summary.txt')
+    gap = Table()
+    gap['filt'] = ['CLEAR', 'CLEAR']
+    gap['pupil'] = ['F090W', 'CLEARP']
+    gap['gapx_50'] = [1168.9, 1100.]
+    gap['gapy_50'] = [937.2, 950.]
+    gap['frac_50'] = [1.1, 0.5]
+    gap.write(gap_file, format='ascii')
+    flux_cal = os.path.join(CONFIG_DIR, 'niriss_zeropoints.list')
+
+    catalog = Table()
+    catalog['index'] = [1, 2, 3]
+    catalog['niriss_f090w_magnitude'] = [15., 18., 21.]
+    catalog['niriss_f277w_magnitude'] = [16., 19., 22.]
+    catalog['nircam_f200w_clear_magnitude'] = [16., 19., 22.]
+
+    ghost_mags, skipped = niriss_ghosts.catalog_mags_to_ghost_mags(catalog, flux_cal, 'abmag', gap_file, 'CLEAR')
+    assert skipped
+    assert ghost_mags.colnames == ['niriss_f090w_magnitude', 'niriss_f277w_magnitude']
+    assert len(ghost_mags) == 3
+
+    # Ghosts are fainter by the ghost flux fraction
+    assert np.allclose(ghost_mags['niriss_f090w_magnitude'] - catalog['niriss_f090w_magnitude'], -2.5 * np.log10(0.011))
+    assert np.allclose(ghost_mags['niriss_f277w_magnitude'] - catalog['niriss_f277w_magnitude'], -2.5 * np.log10(0.005))
+
+    for row, ghost_row in zip(catalog, ghost_mags):
+        single, _ = niriss_ghosts.source_mags_to_ghost_mags(row, flux_cal, 'abmag', gap_file, 'CLEAR')
+        assert len(single) == 1
+        for column in ghost_mags.colnames:
+            assert np.isclose(single[column][0], ghost_row[column])
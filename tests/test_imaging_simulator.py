@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+
+"""Tests for running ``dark_prep`` at the same time as the seed image
+creation in ``imaging_simulator.py``, using stand-ins for the three stages
+of Mirage
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_imaging_simulator.py
+"""
+import os
+
+import numpy as np
+import pytest
+
+from mirage import imaging_simulator
+from mirage.utils import read_fits
+
+
+class SeedStandIn():
+    """Stand-in for Catalog_seed, which records the process it was run in"""
+    def __init__(self, offline=False):
+        self.seed_files = ['seed.fits']
+
+    def make_seed(self):
+        self.seedimage = np.ones((4, 4))
+        self.seed_segmap = np.zeros((4, 4), dtype=int)
+        self.seedinfo = {'pid': os.getpid()}
+
+
+class DarkPrepStandIn():
+    """Stand-in for DarkPrep, which records the process it was run in"""
+    def __init__(self, offline=False):
+        pass
+
+    def prepare(self):
+        if 'fail' in self.paramfile:
+            raise ValueError('Dark preparation failed')
+        self.prepDark = read_fits.Read_fits()
+        self.prepDark.data = np.full((1, 2, 4, 4), 5.)
+        self.prepDark.header = {'pid': os.getpid()}
+        self.dark_files = ['dark.fits']
+
+
+class ObservationStandIn():
+    """Stand-in for Observation"""
+    def __init__(self, offline=False):
+        pass
+
+    def create(self):
+        pass
+
+
+@pytest.fixture
+def stand_ins(monkeypatch, mirage_data):
+    """Replace the three stages of Mirage called by ImgSim. ImgSim still
+    checks MIRAGE_DATA, which the mirage_data fixture sets if needed.
+    """
+    monkeypatch.setattr(imaging_simulator.catalog_seed_image, 'Catalog_seed', SeedStandIn)
+    monkeypatch.setattr(imaging_simulator.dark_prep, 'DarkPrep', DarkPrepStandIn)
+    monkeypatch.setattr(imaging_simulator.obs_generator, 'Observation', ObservationStandIn)
+    monkeypatch.setattr(imaging_simulator.logging_functions, 'move_logfile_to_standard_location',
+                        lambda *args, **kwargs: None)
+
+
+def test_concurrent_dark_prep(stand_ins):
+    """The dark should be prepared in a separate process and passed to the
+    observation generator, along with the seed image from this process
+    """
+    for concurrent in [False, True]:
+        sim = imaging_simulator.ImgSim(paramfile='test.yaml', offline=True, concurrent_dark_prep=concurrent)
+        sim.create()
+        assert np.array_equal(sim.linDark.data, np.full((1, 2, 4, 4), 5.))
+        assert sim.seedinfo['pid'] == os.getpid()
+        assert (sim.linDark.header['pid'] != os.getpid()) == concurrent
+
+
+def test_concurrent_dark_prep_failure(stand_ins):
+    """Errors in the dark preparation process should be raised"""
+    sim = imaging_simulator.ImgSim(paramfile='fail.yaml', offline=True, concurrent_dark_prep=True)
+    with pytest.raises(RuntimeError, match='Dark preparation failed'):
+        sim.create()
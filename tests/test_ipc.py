@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+
+"""Tests for the addition of interpixel capacitance effects by
+``Observation.add_ipc`` in ``obs_generator.py``.
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_ipc.py
+"""
+import numpy as np
+import pytest
+
+from mirage.ramp_generator import obs_generator
+
+
+def ipc_truth(data, kernel, yoff, xoff):
+    """Add IPC to the science pixels of each group one pixel at a time"""
+    kny, knx = kernel.shape[0:2]
+    ny = data.shape[-2] - yoff
+    nx = data.shape[-1] - xoff
+    truth = np.copy(data)
+    for y in range(ny):
+        for x in range(nx):
+            value = np.zeros(data.shape[0:2])
+            for j in range(kny):
+                for i in range(knx):
+                    ypix = y + kny - 1 - j - kny // 2
+                    xpix = x + knx - 1 - i - knx // 2
+                    if 0 <= ypix < ny and 0 <= xpix < nx:
+                        weight = kernel[j, i] if kernel.ndim == 2 else kernel[j, i, yoff + y, xoff + x]
+                        value += weight * data[:, :, yoff + ypix, xoff + xpix]
+            truth[:, :, yoff + y, xoff + x] = value
+    return truth
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_add_ipc():
+    """2D and 4D kernels, including kernels with even dimensions, should
+    be applied to the science pixels of all groups, leaving reference
+    pixels unchanged
+    """
+    np.random.seed(3)
+    data = np.random.random((2, 3, 24, 30))
+
+    obs = obs_generator.Observation(offline=True)
+    # The lower and left edges contain 4 reference pixels
+    obs.subarray_bounds = [0, 0, 29, 23]
+
+    kernels = [np.random.random((3, 3)), np.random.random((4, 3)),
+               np.random.random((3, 3, 24, 30)), np.random.random((2, 3, 24, 30))]
+    for kernel in kernels:
+        obs.kernel = kernel
+        truth = ipc_truth(data, kernel, 4, 4)
+        result = obs.add_ipc(np.copy(data))
+        assert np.allclose(result, truth)
+
+    # Data are modified in place
+    obs.kernel = kernels[0]
+    inplace = np.copy(data)
+    result = obs.add_ipc(inplace)
+    assert result is inplace
+
+    # Blocks of groups give the same result as convolving all at once
+    obs_generator.IPC_BLOCK_PIXEL_LIMIT, limit = 1, obs_generator.IPC_BLOCK_PIXEL_LIMIT
+    try:
+        assert np.allclose(obs.add_ipc(np.copy(data)), result)
+    finally:
+        obs_generator.IPC_BLOCK_PIXEL_LIMIT = limit
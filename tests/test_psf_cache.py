@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+
+"""Tests for the PSF stamp cache in ``psf_cache.py``, and its use when
+creating PSF stamps in ``catalog_seed_image.py``.
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_psf_cache.py
+"""
+import numpy as np
+import pytest
+
+from mirage.psf.psf_cache import PSFStampCache
+from .test_batch_stamps import create_gaussian_psf_grid, create_seed_object, create_source_table
+
+
+def test_cache_matches_library():
+    """With fine resolution, the cached stamp should match a direct
+    evaluation of the library, including stamps requested for a subset
+    of pixels and for negative coordinates
+    """
+    library = create_gaussian_psf_grid()
+    cache = PSFStampCache(phase_resolution=0.001, position_resolution=1, max_stamps=10)
+
+    for x_0, y_0 in [(100.2345, 210.7891), (-3.6005, 4.5005)]:
+        ypts, xpts = np.mgrid[int(y_0) - 13: int(y_0) + 14, int(x_0) - 10: int(x_0) + 14]
+        direct = library.evaluate(x=xpts, y=ypts, flux=1., x_0=x_0, y_0=y_0)
+        cached = cache.evaluate(library, x=xpts, y=ypts, flux=1., x_0=x_0, y_0=y_0)
+        assert np.allclose(cached, direct, rtol=1e-3, atol=1e-6)
+
+    # Quantized locations and flux scaling
+    cache = PSFStampCache(phase_resolution=0.05, position_resolution=256, max_stamps=10)
+    ypts, xpts = np.mgrid[90:111, 90:111]
+    first = cache.evaluate(library, x=xpts, y=ypts, flux=1., x_0=100.41, y_0=100.22)
+    second = cache.evaluate(library, x=xpts + 5, y=ypts + 7, flux=3., x_0=105.42, y_0=107.21)
+    assert cache.misses == 1
+    assert cache.hits == 1
+    assert np.allclose(second, 3. * first)
+
+
+def test_cache_lru_eviction():
+    """The least recently used stamp should be discarded when the cache
+    is full
+    """
+    library = create_gaussian_psf_grid()
+    cache = PSFStampCache(phase_resolution=0.1, position_resolution=256, max_stamps=2)
+    ypts, xpts = np.mgrid[0:11, 0:11]
+
+    cache.evaluate(library, x=xpts, y=ypts, flux=1., x_0=5.05, y_0=5.05)
+    cache.evaluate(library, x=xpts, y=ypts, flux=1., x_0=5.15, y_0=5.05)
+    cache.evaluate(library, x=xpts, y=ypts, flux=1., x_0=5.05, y_0=5.05)
+    cache.evaluate(library, x=xpts, y=ypts, flux=1., x_0=5.25, y_0=5.05)
+    assert len(cache) == 2
+    assert cache.misses == 3
+
+    # The first stamp was used more recently than the second
+    cache.evaluate(library, x=xpts, y=ypts, flux=1., x_0=5.05, y_0=5.05)
+    assert cache.misses == 3
+    cache.evaluate(library, x=xpts, y=ypts, flux=1., x_0=5.15, y_0=5.05)
+    assert cache.misses == 4
+
+
+def test_invalid_cache_parameters():
+    """Out of range resolutions and sizes should raise exceptions"""
+    with pytest.raises(ValueError):
+        PSFStampCache(phase_resolution=0.)
+    with pytest.raises(ValueError):
+        PSFStampCache(position_resolution=0)
+    with pytest.raises(ValueError):
+        PSFStampCache(max_stamps=0)
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_cached_point_sources():
+    """Point source images made using the cache should be close to those
+    made by evaluating the library for every source
+    """
+    sources = create_source_table()
+    for wings in [False, True]:
+        seed = create_seed_object(add_psf_wings=wings)
+        direct_image, _ = seed.make_point_source_image(sources)
+
+        seed.psf_cache = PSFStampCache(phase_resolution=0.05, position_resolution=256, max_stamps=1000)
+        cached_image, _ = seed.make_point_source_image(sources)
+        assert seed.psf_cache.hits > 0
+        assert np.max(np.abs(cached_image - direct_image)) < 0.05 * np.max(direct_image)
+        assert np.isclose(np.sum(cached_image), np.sum(direct_image), rtol=1e-3)
@@ -160,3 +160,58 @@ def test_ext_rotations(pav3, ext_pos_angs, expected_ext_pos_angs):
 
 
 
+
+
+@pytest.mark.parametrize("pixel_flag", [False, True])
+def test_position_lists(pixel_flag):
+    """Positions of whole catalog columns should match those calculated
+    one source at a time
+    """
+    aperture = 'NRCB2_SUB160'
+    pointing_ra = 12.008818
+    pointing_dec = 45.008818
+
+    c = catalog_seed_image.Catalog_seed()
+    c.use_intermediate_aperture = False
+    inst_siaf = siaf_interface.get_instance('nircam')
+    c.siaf = inst_siaf[aperture]
+    c.coord_transform = None
+    c.local_roll, c.attitude_matrix, c.ffsize, \
+        c.subarray_bounds = siaf_interface.get_siaf_information(inst_siaf, aperture, pointing_ra,
+                                                                pointing_dec, 30.)
+
+    if pixel_flag:
+        input_x = [-100.5, 0., 80.2, 2000.]
+        input_y = [12., 159., -3.7, 40.]
+    else:
+        offsets = np.array([-60., -2., 0., 3.5, 100.]) / 3600.
+        input_x = list(pointing_ra + offsets)
+        input_y = list(pointing_dec - offsets)
+
+    pixelx, pixely, ra, dec, ra_strings, dec_strings = c.get_position_lists(input_x, input_y, pixel_flag)
+    assert ra_strings is None
+    for row, (in_x, in_y) in enumerate(zip(input_x, input_y)):
+        x, y, ra_row, dec_row, ra_str, dec_str = c.get_positions(in_x, in_y, pixel_flag, 4096)
+        assert np.isclose(pixelx[row], x, rtol=0, atol=1e-6)
+        assert np.isclose(pixely[row], y, rtol=0, atol=1e-6)
+        assert np.isclose(ra[row], ra_row, rtol=0, atol=1e-10)
+        assert np.isclose(dec[row], dec_row, rtol=0, atol=1e-10)
+        assert c.position_strings(row, ra, dec, ra_strings, dec_strings) == (ra_str, dec_str)
+
+    if not pixel_flag:
+        # Sexagesimal inputs are kept as given. These are rounded to
+        # 0.0001 seconds, so positions agree to a fraction of a pixel
+        ra_str_inputs = [c.makePos(in_ra, in_dec)[0] for in_ra, in_dec in zip(input_x, input_y)]
+        dec_str_inputs = [c.makePos(in_ra, in_dec)[1] for in_ra, in_dec in zip(input_x, input_y)]
+        str_x, str_y, str_ra, str_dec, ra_strings, dec_strings = c.get_position_lists(ra_str_inputs, dec_str_inputs,
+                                                                                      False)
+        assert np.allclose(str_x, pixelx, rtol=0, atol=0.1)
+        assert np.allclose(str_y, pixely, rtol=0, atol=0.1)
+        assert c.position_strings(1, str_ra, str_dec, ra_strings, dec_strings) == (ra_str_inputs[1],
+                                                                                   dec_str_inputs[1])
+
+        x_list, y_list = c.radec_list_to_xy_list(input_x, input_y)
+        assert np.allclose(x_list, pixelx, rtol=0, atol=1e-6)
+        ra_list, dec_list = c.xy_list_to_radec_list(x_list, y_list)
+        for x, y, ra_row, dec_row in zip(x_list, y_list, ra_list, dec_list):
+            assert np.allclose(c.XYToRADec(x, y)[0:2], (ra_row, dec_row), rtol=0, atol=1e-10)
@@ -0,0 +1,288 @@
+#! /usr/bin/env python
+
+"""Tests for the vectorized ramp engine in ``ramp_engine.py``,
+``Observation.frame_to_ramp_vectorized``, ``Observation.do_cosmic_rays``
+and ``Observation.add_synthetic_to_dark`` in ``obs_generator.py``, and
+``DarkPrep.reorder_dark`` in ``dark_prep.py``.
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_ramp_engine.py
+"""
+import io
+import random
+
+import numpy as np
+import pytest
+from astropy.table import Table
+
+from mirage.dark import dark_prep
+from mirage.ramp_generator import obs_generator
+from mirage.ramp_generator.ramp_engine import average_groups, average_rapid_groups, groups_per_block, \
+    poisson_realization
+from mirage.utils import read_fits
+
+
+def make_observation(ngroup, nframe, nskip, seed=1234):
+    """Create an Observation instance with the parameters needed to build
+    ramps without cosmic rays
+    """
+    obs = obs_generator.Observation(offline=True)
+    obs.params = {'Readout': {'ngroup': ngroup, 'nframe': nframe, 'nskip': nskip},
+                  'simSignals': {'poissonseed': seed}}
+    obs.runStep = {'cosmicray': False}
+    obs.gain = 2.
+    obs.frametime = 10.
+    return obs
+
+
+def test_average_groups():
+    """Frames should be averaged into groups, ignoring skipped frames"""
+    frames = np.arange(12, dtype=float).reshape(12, 1, 1) * np.ones((1, 2, 3))
+    groups = average_groups(frames, 2, 1)
+    assert groups.shape == (4, 2, 3)
+    assert np.allclose(groups[:, 0, 0], [1.5, 4.5, 7.5, 10.5])
+    assert groups_per_block(10, 3, 100, 1000) == 3
+    assert groups_per_block(10, 3, 100, 10) == 1
+    assert groups_per_block(2, 3, 100, 10**6) == 2
+
+
+def rapid_truth(data, ngroup, nframe, nskip):
+    """Average RAPID frames into groups one integration and group at a time"""
+    nint = data.shape[0]
+    truth = np.zeros((nint, ngroup) + data.shape[2:])
+    for integ in range(nint):
+        for group in range(ngroup):
+            first = group * (nframe + nskip)
+            truth[integ, group] = np.mean(data[integ, first:first + nframe], axis=0)
+    return truth
+
+
+def rapid_dark(nint, nframes):
+    """Create a RAPID dark current object"""
+    dark = read_fits.Read_fits()
+    dark.header = {'READPATT': 'RAPID', 'NFRAMES': 1}
+    dark.data = np.random.normal(100., 10., (nint, nframes, 6, 7)).astype(np.float32)
+    dark.sbAndRefpix = np.random.normal(12000., 10., (nint, nframes, 6, 7)).astype(np.float32)
+    dark.zeroframe = dark.data[:, 0, :, :]
+    return dark
+
+
+def rapid_dark_copy(dark):
+    """Copy a dark current object, so that it can be modified"""
+    copied = read_fits.Read_fits()
+    copied.header = dict(dark.header)
+    copied.data = np.copy(dark.data)
+    copied.sbAndRefpix = np.copy(dark.sbAndRefpix)
+    copied.zeroframe = None
+    return copied
+
+
+def test_average_rapid_groups():
+    """RAPID frames should be averaged into groups, skipping frames at the
+    end of each group, including when the trailing skipped frames of the
+    last group are not present
+    """
+    np.random.seed(6)
+    data = np.random.random((2, 18, 5, 4))
+    for ngroup, nframe, nskip in [(3, 4, 2), (3, 2, 6), (18, 1, 0)]:
+        groups = average_rapid_groups(data, ngroup, nframe, nskip)
+        assert np.allclose(groups, rapid_truth(data, ngroup, nframe, nskip))
+
+    out = np.zeros((2, 3, 5, 4), dtype=np.float32)
+    result = average_rapid_groups(data, 3, 2, 6, out=out)
+    assert result is out
+    assert np.allclose(out, rapid_truth(data, 3, 2, 6))
+
+    with pytest.raises(ValueError):
+        average_rapid_groups(data, 4, 4, 2)
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_rapid_dark_reordering():
+    """RAPID darks should be averaged into the requested readout pattern
+    by both DarkPrep and Observation
+    """
+    np.random.seed(7)
+    readout = {'readpatt': 'MEDIUM8', 'ngroup': 3, 'nframe': 8, 'nskip': 2, 'nint': 2}
+    readpatterns = Table({'name': ['RAPID', 'MEDIUM8'], 'nskip': [0, 2]})
+
+    dark = rapid_dark(2, 28)
+    truth = rapid_truth(dark.data, 3, 8, 2)
+    sb_truth = rapid_truth(dark.sbAndRefpix, 3, 8, 2)
+
+    prep = dark_prep.DarkPrep(offline=True)
+    prep.params = {'Readout': dict(readout)}
+    prep.readpatterns = readpatterns
+    reordered, sbzero = prep.reorder_dark(rapid_dark_copy(dark))
+    assert np.allclose(reordered.data, truth, rtol=1e-6)
+    assert np.allclose(reordered.sbAndRefpix, sb_truth, rtol=1e-6)
+    assert np.array_equal(sbzero, dark.sbAndRefpix[:, 0, :, :])
+    assert reordered.header['READPATT'] == 'MEDIUM8'
+
+    obs = obs_generator.Observation(offline=True)
+    obs.params = {'Readout': dict(readout)}
+    obs.readpatterns = readpatterns
+    synthetic = np.random.random((2, 3, 6, 7))
+    syn_zeroframe = np.random.random((2, 6, 7))
+    expected = synthetic + truth
+    combined, zeroframe, sbandref = obs.add_synthetic_to_dark(synthetic, dark, syn_zeroframe=syn_zeroframe)
+    assert np.allclose(combined, expected, rtol=1e-6)
+    assert np.allclose(sbandref, sb_truth, rtol=1e-6)
+    assert np.allclose(zeroframe, dark.zeroframe + syn_zeroframe)
+
+
+def test_poisson_realization_negative_pixels():
+    """Negative pixels should be returned as zero, and others should
+    have Poisson noise with a variance matching the signal in electrons
+    """
+    rng = np.random.default_rng(5)
+    signal = np.full((50, 50), 100.)
+    signal[0, 0] = -3.
+    noisy = poisson_realization(rng, signal, 2., size=(40, 50, 50))
+    assert np.all(noisy[:, 0, 0] == 0.)
+    electrons = noisy[:, 1:, :] * 2.
+    assert np.isclose(np.mean(electrons), 200., rtol=0.01)
+    assert np.isclose(np.var(electrons), 200., rtol=0.05)
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_negative_seed_pixels():
+    """Pixels with negative signal in the seed image should be handled
+    the same way when building ramps frame by frame and vectorized
+    """
+    rate = np.full((20, 20), 5.)
+    rate[3, 4] = -2.
+    rate[10, 0:5] = -0.5
+    negative = rate < 0.
+
+    ramp, _ = make_observation(4, 2, 1).frame_to_ramp(rate)
+    vectorized_ramp, vectorized_zeroframe = make_observation(4, 2, 1).frame_to_ramp_vectorized(rate)
+    assert np.all(ramp[:, negative] == 0.)
+    assert np.all(vectorized_ramp[:, negative] == 0.)
+    assert np.all(vectorized_zeroframe[negative] == 0.)
+    assert np.all(ramp[:, ~negative] > 0.)
+    assert np.all(vectorized_ramp[:, ~negative] > 0.)
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_vectorized_ramp_2d_seed():
+    """Ramps built from a rate image should be reproducible from the
+    Poisson seed, independent of the block size, and have the expected
+    mean signal in each group
+    """
+    rate = np.full((40, 40), 5.)
+    obs = make_observation(6, 4, 2)
+    ramp, zeroframe = obs.frame_to_ramp_vectorized(rate)
+    assert ramp.shape == (6, 40, 40)
+    assert obs.params['simSignals']['poissonseed'] == 1234 + 6 * 6 - 2
+
+    # Build the same ramp using one group per block
+    repeat = make_observation(6, 4, 2)
+    repeat.ramp_block_pixel_limit = 1
+    repeat_ramp, repeat_zero = repeat.frame_to_ramp_vectorized(rate)
+    assert np.array_equal(ramp, repeat_ramp)
+    assert np.array_equal(zeroframe, repeat_zero)
+
+    # The mean of frames 0-3 of group 0 is 2.5 frames of signal, and each
+    # later group adds 6 frames
+    expected = (2.5 + 6. * np.arange(6)) * 5. * 10.
+    assert np.allclose(np.mean(ramp, axis=(1, 2)), expected, rtol=0.01)
+    assert np.isclose(np.mean(zeroframe), 50., rtol=0.02)
+
+    # Signal within an integration accumulates, so groups never decrease
+    assert np.all(np.diff(ramp, axis=0) > 0)
+
+    # Different seeds give different realizations
+    other = make_observation(6, 4, 2, seed=99)
+    other_ramp, _ = other.frame_to_ramp_vectorized(rate)
+    assert not np.array_equal(ramp, other_ramp)
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_vectorized_ramp_3d_seed():
+    """Ramps built from a seed integration should contain the seed signal
+    of the averaged frames, plus noise
+    """
+    frames = np.cumsum(np.full((8, 30, 30), 500.), axis=0)
+    obs = make_observation(4, 1, 1)
+    ramp, zeroframe = obs.frame_to_ramp_vectorized(frames)
+    assert ramp.shape == (4, 30, 30)
+
+    # Group i is frame 2i of the seed
+    assert np.allclose(np.mean(ramp, axis=(1, 2)), frames[0::2, 0, 0][:4], rtol=0.01)
+    assert np.isclose(np.mean(zeroframe), 500., rtol=0.01)
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_do_cosmic_rays():
+    """Cosmic rays added all at once should match those added one at a
+    time using the same random number sequence, including cosmic rays
+    that fall partially off the frame
+    """
+    obs = make_observation(1, 1, 0)
+    obs.gain = 1.8
+    library = np.random.RandomState(3)
+    obs.cosmicrays = [library.random((1000, 21, 21)) for i in range(10)]
+    image = library.random((60, 70))
+
+    obs.cosmicraylist = io.StringIO()
+    result = obs.do_cosmic_rays(image.copy(), 2, 1, 300, 77)
+    lines = obs.cosmicraylist.getvalue().splitlines()
+    assert len(lines) == 300
+
+    generator = random.Random()
+    generator.seed(77)
+    truth = image.copy()
+    for line in lines:
+        j = int(generator.random() * 60)
+        k = int(generator.random() * 70)
+        n = int(generator.random() * 10.0)
+        m = int(generator.random() * 1000.0)
+        i1, i2 = max(j - 10, 0), min(j + 11, 60)
+        j1, j2 = max(k - 10, 0), min(k + 11, 70)
+        crimage = obs.cosmicrays[n][m, i1 - j + 10:i2 - j + 10, j1 - k + 10:j2 - k + 10]
+        truth[i1:i2, j1:j2] += crimage / obs.gain
+        values = line.split()
+        assert [float(val) for val in values[0:2]] == [(j2 - j1) / 2 + j1, (i2 - i1) / 2 + i1]
+        assert [int(val) for val in values[2:6]] == [2, 1, n, m]
+        assert float(values[6]) == np.max(crimage)
+    assert np.allclose(result, truth, rtol=0, atol=1e-12)
+
+    # No cosmic rays leaves the frame unchanged
+    assert np.array_equal(obs.do_cosmic_rays(image.copy(), 0, 0, 0, 77), image)
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_parallel_integrations():
+    """Integrations created by several processes should be reproducible,
+    independent of the number of processes, and each have their own noise
+    """
+    rate = np.full((20, 20), 5.)
+    exposures = []
+    for nproc in [2, 3]:
+        obs = make_observation(3, 1, 0)
+        obs.params['Readout']['nint'] = 4
+        obs.params['cosmicRay'] = {'seed': 17}
+        obs.vectorized_ramp = True
+        obs.parallel = nproc
+        exposures.append(obs.add_crs_and_noise(rate))
+
+    for (exposure, zero), (other_exposure, other_zero) in zip(exposures[1:], exposures[:-1]):
+        assert np.array_equal(exposure, other_exposure)
+        assert np.array_equal(zero, other_zero)
+
+    sim_exposure, sim_zero = exposures[0]
+    assert sim_exposure.shape == (4, 3, 20, 20)
+    assert np.allclose(np.mean(sim_exposure, axis=(2, 3)), [50., 100., 150.], rtol=0.05)
+    assert np.array_equal(sim_zero, sim_exposure[:, 0, :, :])
+    assert not np.array_equal(sim_exposure[0], sim_exposure[1])
+
+    # Later calls continue the seed sequence
+    next_exposure, _ = obs.add_crs_and_noise(rate)
+    assert not np.array_equal(next_exposure[0], exposures[1][0][0])
@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+
+"""Tests for reading subarrays and frames of dark current files using
+``read_fits.py``, and their use in ``dark_prep.py``
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_read_fits.py
+"""
+import os
+
+from astropy.io import fits
+import numpy as np
+import pytest
+
+from mirage.dark import dark_prep
+from mirage.utils import read_fits
+
+
+def create_dark_file(filename):
+    """Write a small raw dark current file containing SCI, ZEROFRAME and
+    SBANDREFPIX extensions
+    """
+    np.random.seed(21)
+    data = np.random.randint(0, 65535, (2, 10, 12, 16)).astype(np.uint16)
+    sbandrefpix = np.random.normal(12000., 10., (2, 10, 12, 16)).astype(np.float32)
+    primary = fits.PrimaryHDU()
+    primary.header['READPATT'] = 'RAPID'
+    primary.header['NFRAMES'] = 1
+    hdulist = fits.HDUList([primary,
+                            fits.ImageHDU(data, name='SCI'),
+                            fits.ImageHDU(data[:, 0, :, :], name='ZEROFRAME'),
+                            fits.ImageHDU(sbandrefpix, name='SBANDREFPIX')])
+    hdulist.writeto(filename, overwrite=True)
+    return data, sbandrefpix
+
+
+def test_read_astropy_window(tmp_path):
+    """Reading a window of frames and pixels should give the same data as
+    reading the entire file and cropping it
+    """
+    filename = os.path.join(tmp_path, 'dark.fits')
+    data, sbandrefpix = create_dark_file(filename)
+
+    full = read_fits.Read_fits()
+    full.file = filename
+    full.read_astropy()
+    assert full.bounds is None
+    assert np.array_equal(full.data, data)
+    assert full.data.dtype == np.uint16
+    assert full.zero_sbAndRefpix is None
+    assert full.header['READPATT'] == 'RAPID'
+
+    bounds = [4, 2, 11, 8]
+    window = read_fits.Read_fits()
+    window.file = filename
+    window.read_astropy(frames=4, bounds=bounds)
+    assert window.bounds == bounds
+    assert np.array_equal(window.data, data[:, 0:4, 2:9, 4:12])
+    assert np.array_equal(window.sbAndRefpix, sbandrefpix[:, 0:4, 2:9, 4:12])
+    assert np.array_equal(window.zeroframe, data[:, 0, 2:9, 4:12])
+
+    # Requesting more frames than are present returns all frames
+    window.read_astropy(frames=20)
+    assert np.array_equal(window.data, data)
+
+    # Ranges of integrations
+    block = read_fits.Read_fits()
+    block.file = filename
+    block.read_astropy(integrations=(1, 2))
+    assert block.integrations == (1, 2)
+    assert np.array_equal(block.data, data[1:2])
+    assert np.array_equal(block.sbAndRefpix, sbandrefpix[1:2])
+    assert np.array_equal(block.zeroframe, data[1:2, 0, :, :])
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_crop_windowed_dark(tmp_path):
+    """Dark current data read using the subarray bounds should not be
+    cropped again
+    """
+    filename = os.path.join(tmp_path, 'dark.fits')
+    data, _ = create_dark_file(filename)
+
+    prep = dark_prep.DarkPrep(offline=True)
+    prep.params = {'Readout': {'ngroup': 2, 'nframe': 1, 'nskip': 0, 'namp': 1}}
+    prep.subarray_bounds = [4, 2, 11, 8]
+
+    dark = read_fits.Read_fits()
+    dark.file = filename
+    dark.read_astropy(frames=prep.frames_needed(), bounds=prep.subarray_bounds)
+    cropped = prep.crop_dark(dark)
+    assert np.array_equal(cropped.data, data[:, 0:2, 2:9, 4:12])
+
+    full = read_fits.Read_fits()
+    full.file = filename
+    full.read_astropy()
+    full = prep.crop_dark(full)
+    assert np.array_equal(full.data[:, 0:2], cropped.data)
+
+    prep.subarray_bounds = [0, 0, 7, 6]
+    with pytest.raises(ValueError):
+        prep.crop_dark(dark)
@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+
+"""Tests for the process-wide registry of reference file data in
+``reference_registry.py``
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_reference_registry.py
+"""
+import os
+
+from astropy.io import fits
+import numpy as np
+import pytest
+
+from mirage.utils import reference_registry
+
+
+def write_file(filename, value, shape=(10, 10)):
+    """Write a FITS file with a constant image in the SCI extension"""
+    primary = fits.PrimaryHDU()
+    primary.header['VALUE'] = value
+    sci = fits.ImageHDU(np.full(shape, value, dtype=np.float32), name='SCI')
+    fits.HDUList([primary, sci]).writeto(filename, overwrite=True)
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    """Start and end each test with an empty registry"""
+    reference_registry.clear()
+    yield
+    reference_registry.clear()
+
+
+def test_shared_read_only_data(tmp_path):
+    """Data should be read once and shared, and should not be writable"""
+    filename = str(tmp_path / 'gain.fits')
+    write_file(filename, 2.)
+    data, header = reference_registry.read_fits_data(filename)
+    assert np.all(data == 2.)
+    assert header['VALUE'] == 2.
+    assert not data.flags.writeable
+    with pytest.raises(ValueError):
+        data[0, 0] = 1.
+
+    second_data, second_header = reference_registry.read_fits_data(filename)
+    assert second_data is data
+    assert second_header is not header
+    assert len(reference_registry.ENTRIES) == 1
+
+    # The first extension with data is used if no extension is given
+    first_data, _ = reference_registry.read_fits_data(filename, ext=None)
+    assert np.array_equal(first_data, data)
+
+
+def test_modified_file(tmp_path):
+    """Files modified after they are read should be read again"""
+    filename = str(tmp_path / 'gain.fits')
+    write_file(filename, 2.)
+    data, _ = reference_registry.read_fits_data(filename)
+    write_file(filename, 3.)
+    status = os.stat(filename)
+    os.utime(filename, ns=(status.st_atime_ns, status.st_mtime_ns + 1000000000))
+    new_data, header = reference_registry.read_fits_data(filename)
+    assert np.all(new_data == 3.)
+    assert header['VALUE'] == 3.
+    assert len(reference_registry.ENTRIES) == 1
+
+
+def test_memory_limit(tmp_path):
+    """The least recently used data should be removed once the memory
+    limit is exceeded
+    """
+    limit = reference_registry.MEMORY_LIMIT
+    try:
+        # Room for two 10x10 float32 images
+        reference_registry.set_memory_limit(800 / 1e9)
+        filenames = [str(tmp_path / 'ref_{}.fits'.format(index)) for index in range(3)]
+        for index, filename in enumerate(filenames):
+            write_file(filename, index)
+        first, _ = reference_registry.read_fits_data(filenames[0])
+        reference_registry.read_fits_data(filenames[1])
+        assert reference_registry.read_fits_data(filenames[0])[0] is first
+        reference_registry.read_fits_data(filenames[2])
+        assert reference_registry.total_size() == 800
+        assert reference_registry.read_fits_data(filenames[0])[0] is first
+        assert [key[0] for key in reference_registry.ENTRIES] == [filenames[2], filenames[0]]
+
+        # A single file larger than the limit is still kept
+        write_file(filenames[1], 1., shape=(20, 20))
+        reference_registry.read_fits_data(filenames[1])
+        assert [key[0] for key in reference_registry.ENTRIES] == [filenames[1]]
+    finally:
+        reference_registry.MEMORY_LIMIT = limit
@@ -67,3 +67,49 @@ def test_dimensionality():
     map.intdim = 4
     map.initialize_map()
     assert map.segmap.shape == ((4, 3, 2048, 2048))
+
+
+def test_default_dtype():
+    """Segmentation maps should be int32 by default
+    """
+    map = SegMap()
+    map.initialize_map()
+    assert map.segmap.dtype == np.int32
+
+
+def test_add_objects_threshold():
+    """Adding objects in a batch should match adding them one at a time,
+    with stamps partially off the map clipped
+    """
+    np.random.seed(3)
+    images = np.random.uniform(0, 10, (20, 9, 9))
+    ystarts = np.random.randint(-5, 100, 20)
+    xstarts = np.random.randint(-5, 100, 20)
+    numbers = np.arange(20) + 1
+
+    truth = SegMap()
+    truth.xdim = 100
+    truth.ydim = 100
+    truth.initialize_map()
+    for image, ystart, xstart, number in zip(images, ystarts, xstarts, numbers):
+        y1 = max(ystart, 0)
+        x1 = max(xstart, 0)
+        y2 = min(ystart + 9, 100)
+        x2 = min(xstart + 9, 100)
+        truth.add_object_threshold(image[y1 - ystart:y2 - ystart, x1 - xstart:x2 - xstart], y1, x1, number, 5.)
+
+    map = SegMap()
+    map.xdim = 100
+    map.ydim = 100
+    map.initialize_map()
+    map.add_objects_threshold(images, ystarts, xstarts, numbers, 5.)
+    assert np.array_equal(map.segmap, truth.segmap)
+
+    # Precedence is kept across batches added in any order when the
+    # source order map is shared
+    map.initialize_map()
+    source_order = np.full(map.segmap.shape, -1, dtype=np.int64)
+    for batch in [slice(10, 20), slice(0, 10)]:
+        map.add_objects_threshold(images[batch], ystarts[batch], xstarts[batch], numbers[batch], 5.,
+                                  orders=np.arange(20)[batch], source_order=source_order)
+    assert np.array_equal(map.segmap, truth.segmap)
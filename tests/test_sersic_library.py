@@ -0,0 +1,118 @@
+#! /usr/bin/env python
+
+"""Tests for the Sersic galaxy stamp library in ``sersic_library.py``,
+and the galaxy stamp functions in ``catalog_seed_image.py`` that use it.
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_sersic_library.py
+"""
+import os
+
+import numpy as np
+import pytest
+
+from mirage.seed_image import catalog_seed_image
+from mirage.seed_image.sersic_library import SersicStampLibrary
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_library_matches_direct_evaluation():
+    """With fine bins, library stamps (including those produced by
+    rotating and flipping) should match directly evaluated stamps
+    """
+    seed = catalog_seed_image.Catalog_seed(offline=True)
+    seed.sersic_library = SersicStampLibrary(index_resolution=1e-6, ellipticity_resolution=1e-6,
+                                             radius_resolution=1e-7, angle_resolution=1e-5)
+
+    for position_angle in np.radians([0., 20., 44., 46., 89.9, 100., 135., 170., 200., 300., -30.]):
+        direct = seed.create_galaxy(4.2, 0.45, 1.3, position_angle, 500., 0., 0., use_library=False)
+        library = seed.create_galaxy(4.2, 0.45, 1.3, position_angle, 500., 0., 0.)
+        assert library.shape == direct.shape
+        assert np.allclose(library, direct, rtol=1e-4, atol=1e-6 * np.max(direct))
+
+    # Position angles differing by multiples of 90 degrees, and angles
+    # mirrored about 45 degrees, share a single library stamp
+    assert len(seed.sersic_library) < 11
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_library_reuse_and_scaling():
+    """Galaxies falling in the same bins should share a stamp, scaled by
+    their total signal
+    """
+    seed = catalog_seed_image.Catalog_seed(offline=True)
+    seed.sersic_library = SersicStampLibrary()
+    _, (radius, ellipticity, index, angle), _, _ = seed.sersic_library.quantize(3.0, 0.2, 2.0, 0.3)
+    first = seed.create_galaxy(radius, ellipticity, index, angle, 100., 0., 0.)
+    second = seed.create_galaxy(radius * 1.005, ellipticity + 0.005, index + 0.01, angle + 0.005, 300., 0., 0.)
+    assert seed.sersic_library.hits == 1
+    assert seed.sersic_library.misses == 1
+    assert np.allclose(second, 3. * first)
+
+    # Binned stamps remain close to the exact profile. Stamp sizes depend
+    # on the galaxy parameters, so compare the overlapping central region.
+    direct = seed.create_galaxy(radius * 1.005, ellipticity + 0.005, index + 0.01, angle + 0.005, 300., 0., 0.,
+                                use_library=False)
+    assert np.isclose(np.sum(second), np.sum(direct), rtol=1e-3)
+    ny = min(second.shape[0], direct.shape[0]) // 2
+    nx = min(second.shape[1], direct.shape[1]) // 2
+    second_center = second[second.shape[0] // 2 - ny:second.shape[0] // 2 + ny + 1,
+                           second.shape[1] // 2 - nx:second.shape[1] // 2 + nx + 1]
+    direct_center = direct[direct.shape[0] // 2 - ny:direct.shape[0] // 2 + ny + 1,
+                           direct.shape[1] // 2 - nx:direct.shape[1] // 2 + nx + 1]
+    assert np.max(np.abs(second_center - direct_center)) < 0.05 * np.max(direct)
+
+
+def test_library_eviction_and_file(tmp_path):
+    """The library should discard the least recently used stamps when
+    full, and stamps saved to a file should be reloaded
+    """
+    def create_stamp(radius, ellipticity, index, angle):
+        return np.ones((11, 11)) * radius
+
+    library = SersicStampLibrary(max_pixels=250)
+    for radius in [1., 2., 3.]:
+        library.get_stamp(radius, 0.1, 1., 0.1, create_stamp)
+    assert len(library) == 2
+    assert library.num_pixels == 242
+
+    filename = os.path.join(tmp_path, 'sersic_library.npz')
+    library.save(filename)
+    reloaded = SersicStampLibrary(max_pixels=250)
+    reloaded.load(filename)
+    assert list(reloaded.stamps.keys()) == list(library.stamps.keys())
+    stamp = reloaded.get_stamp(3., 0.1, 1., 0.1, create_stamp)
+    assert reloaded.hits == 1
+    assert np.allclose(stamp, library.get_stamp(3., 0.1, 1., 0.1, create_stamp))
+
+    # Files created with different bin widths are ignored
+    different = SersicStampLibrary(index_resolution=0.1)
+    different.load(filename)
+    assert len(different) == 0
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_crop_galaxy_stamp():
+    """The summed area table search should select the smallest centered
+    box containing the requested fraction of the signal
+    """
+    seed = catalog_seed_image.Catalog_seed(offline=True)
+    stamp = seed.create_galaxy(5., 0., 1.5, 0.4, 1000., 0., 0., use_library=False)
+    assert stamp.shape[0] == stamp.shape[1]
+    mid = stamp.shape[1] // 2
+
+    for threshold in [0.5, 0.9, 0.99]:
+        cropped = seed.crop_galaxy_stamp(stamp, threshold)
+        rad = cropped.shape[0] // 2
+        assert np.sum(cropped) >= threshold * np.sum(stamp)
+        smaller = stamp[mid - rad + 1:mid + rad, mid - rad + 1:mid + rad]
+        assert np.sum(smaller) < threshold * np.sum(stamp)
+
+    # Thresholds that can't be reached return the full stamp
+    assert seed.crop_galaxy_stamp(stamp, 1.5).shape == stamp.shape
@@ -0,0 +1,106 @@
+#! /usr/bin/env python
+
+"""Tests for the stamp convolution engine in ``stamp_convolution.py``,
+and its use when adding galaxy and extended source stamps to seed images
+in ``catalog_seed_image.py``.
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_stamp_convolution.py
+"""
+import numpy as np
+import pytest
+from scipy.signal import fftconvolve
+
+from mirage.seed_image import catalog_seed_image
+from mirage.seed_image import segmentation_map
+from mirage.seed_image.stamp_convolution import StampConvolver
+
+
+def test_convolve_many_matches_fftconvolve():
+    """Batched, cached convolutions should match scipy's fftconvolve for
+    stamps and PSFs of various sizes, including repeated stamps and PSFs
+    """
+    np.random.seed(12)
+    psfs = [np.random.random((31, 31)), np.random.random((25, 27)), np.random.random((3, 3))]
+    stamps = [np.random.random((61, 61)), np.random.random((40, 52)), np.random.random((61, 61))]
+
+    stamp_list = []
+    psf_list = []
+    for stamp in stamps:
+        for psf in psfs:
+            stamp_list.append(stamp)
+            psf_list.append(psf)
+    stamp_list.append(stamps[0])
+    psf_list.append(None)
+
+    convolver = StampConvolver()
+    results = convolver.convolve_many(stamp_list, psf_list)
+    for stamp, psf, result in zip(stamp_list[:-1], psf_list[:-1], results[:-1]):
+        assert result.shape == stamp.shape
+        assert np.allclose(result, fftconvolve(stamp, psf, mode='same'))
+    assert results[-1] is stamps[0]
+
+    # Each PSF is transformed once per FFT size, and reused afterwards
+    misses = convolver.misses
+    convolver.convolve_many(stamp_list[:-1], psf_list[:-1])
+    assert convolver.misses == misses
+
+
+def test_psf_spectrum_cache_eviction():
+    """The least recently used PSF transform should be discarded when the
+    cache is full
+    """
+    convolver = StampConvolver(max_spectra=2)
+    psfs = [np.full((5, 5), value) for value in [1., 2., 3.]]
+    for psf in psfs:
+        convolver.psf_spectrum(psf, (16, 16))
+    assert len(convolver.spectra) == 2
+    convolver.psf_spectrum(psfs[0], (16, 16))
+    assert convolver.misses == 4
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_add_convolved_stamps():
+    """Queued stamps should be added to the image and segmentation map in
+    order, matching one-at-a-time fftconvolve results
+    """
+    np.random.seed(5)
+    seed = catalog_seed_image.Catalog_seed(offline=True)
+    seed.params = {'Inst': {'mode': 'imaging'}}
+    seed.segmentation_threshold = 0.5
+
+    psf = np.random.random((15, 15))
+    psf /= np.sum(psf)
+    sources = []
+    for index, (xstart, ystart) in enumerate([(10, 10), (18, 12), (70, 70)]):
+        # The last stamp falls partially off the image
+        stamp = np.random.random((21, 21)) * 10.
+        i2 = min(xstart + 21, 80)
+        j2 = min(ystart + 21, 80)
+        coords = (xstart, i2, ystart, j2, 0, i2 - xstart, 0, j2 - ystart)
+        sources.append((index + 1, stamp, psf if index != 1 else None, coords))
+
+    image = np.zeros((80, 80))
+    segmap = segmentation_map.SegMap()
+    segmap.xdim = 80
+    segmap.ydim = 80
+    segmap.initialize_map()
+    seed.add_convolved_stamps(sources, image, segmap, {})
+
+    truth = np.zeros((80, 80))
+    truth_segmap = np.zeros((80, 80), dtype=int)
+    for index, stamp, stamp_psf, (i1, i2, j1, j2, k1, k2, l1, l2) in sources:
+        if stamp_psf is not None:
+            stamp = fftconvolve(stamp, stamp_psf, mode='same')
+        truth[j1:j2, i1:i2] += stamp[l1:l2, k1:k2]
+        flag = stamp[l1:l2, k1:k2] >= 0.5
+        truth_segmap[j1:j2, i1:i2][flag] = index
+
+    assert np.allclose(image, truth)
+    assert np.array_equal(segmap.segmap, truth_segmap)
@@ -0,0 +1,140 @@
+#! /usr/bin/env python
+
+"""Tests for the creation of exposures a block of integrations at a time
+by ``Observation.process_exposure_in_chunks`` in ``obs_generator.py``.
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_stream_integrations.py
+"""
+import os
+
+from astropy.io import fits
+from astropy.table import Table
+import numpy as np
+import pytest
+
+from mirage.ramp_generator import obs_generator, unlinearize
+from mirage.utils import read_fits
+
+
+def make_observation(directory, nint=5, ngroup=3, parallel=1):
+    """Create an Observation instance, along with a linearized dark,
+    holding everything needed to process a 20x20 pixel subarray exposure
+    """
+    np.random.seed(12)
+    shape = (nint, ngroup, 20, 20)
+
+    obs = obs_generator.Observation(offline=True)
+    obs.params = {'Readout': {'ngroup': ngroup, 'nframe': 1, 'nskip': 0, 'nint': nint,
+                              'readpatt': 'RAPID', 'array_name': 'NRCA1_SUB20'},
+                  'simSignals': {'poissonseed': 42},
+                  'cosmicRay': {'seed': 17},
+                  'nonlin': {'maxiter': 10, 'accuracy': 1e-6},
+                  'Output': {'datatype': 'linear,raw', 'grism_source_image': False,
+                             'save_intermediates': False, 'directory': str(directory)}}
+    obs.runStep = {'cosmicray': False, 'illuminationflat': False, 'pixelflat': False, 'ipc': False,
+                   'crosstalk': False, 'badpixfile': False}
+    obs.readpatterns = Table({'name': ['RAPID'], 'nskip': [0]})
+    obs.subarray_bounds = [0, 0, 19, 19]
+    obs.ffsize = 2048
+    obs.vectorized_ramp = True
+    obs.parallel = parallel
+    obs.gain = 2.
+    obs.frametime = 10.
+    obs.seed_image = np.random.uniform(0., 200., (20, 20))
+
+    dark = read_fits.Read_fits()
+    dark.header = {'READPATT': 'RAPID', 'NFRAMES': 1}
+    dark.data = np.random.normal(100., 10., shape)
+    dark.sbAndRefpix = np.random.normal(12000., 10., shape)
+    dark.zeroframe = dark.data[:, 0, :, :]
+    dark.zero_sbAndRefpix = dark.sbAndRefpix[:, 0, :, :]
+    obs.linear_dark = dark
+
+    obs.satmap = np.full((20, 20), 60000.)
+    coeffs = np.zeros((5, 20, 20))
+    coeffs[1] = 1.
+    coeffs[2] = 2e-6
+    coeffs[3] = 1e-11
+    lin_satmap = unlinearize.nonLinFunc(obs.satmap - 12000., coeffs, obs.satmap + 1.)
+    return obs, coeffs, lin_satmap
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_process_exposure_in_chunks(tmp_path):
+    """Exposures created a block of integrations at a time should match
+    those created all at once, with one or more processes
+    """
+    for parallel in [1, 2]:
+        obs, coeffs, lin_satmap = make_observation(tmp_path, parallel=parallel)
+        simexp, simzero = obs.add_crs_and_noise(obs.seed_image)
+        truth = obs.process_integrations(simexp, simzero, obs.linear_dark, coeffs, lin_satmap)
+
+        obs, coeffs, lin_satmap = make_observation(tmp_path, parallel=parallel)
+        obs.stream_integrations = 2
+        products = obs.process_exposure_in_chunks(None, coeffs, lin_satmap)
+
+        # Blocked outputs are stored in the data types of the output files
+        assert sorted(products.keys()) == sorted(truth.keys())
+        for key in truth:
+            dtype = obs_generator.OUTPUT_DTYPES.get(key, truth[key].dtype)
+            assert products[key].shape == truth[key].shape
+            assert products[key].dtype == dtype
+            assert np.array_equal(products[key], truth[key].astype(dtype))
+
+        # Blocked outputs are backed by temporary files
+        assert isinstance(products['raw_outramp'], np.memmap)
+        assert products['raw_outramp'].shape == (5, 3, 20, 20)
+    assert np.all(products['groupdq'] == 0)
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_dark_read_in_blocks(tmp_path, monkeypatch):
+    """Darks read from a file should be read a block of integrations at a
+    time, and give the same exposure as darks held in memory
+    """
+    obs, coeffs, lin_satmap = make_observation(tmp_path)
+    simexp, simzero = obs.add_crs_and_noise(obs.seed_image)
+    truth = obs.process_integrations(simexp, simzero, obs.linear_dark, coeffs, lin_satmap)
+
+    # Save the dark to a file
+    dark = obs.linear_dark
+    primary = fits.PrimaryHDU()
+    primary.header['READPATT'] = 'RAPID'
+    primary.header['NFRAMES'] = 1
+    dark_file = str(tmp_path / 'linear_dark.fits')
+    fits.HDUList([primary, fits.ImageHDU(dark.data, name='SCI'),
+                  fits.ImageHDU(dark.sbAndRefpix, name='SBANDREFPIX'),
+                  fits.ImageHDU(dark.zeroframe, name='ZEROFRAME'),
+                  fits.ImageHDU(dark.zero_sbAndRefpix, name='ZEROSBANDREFPIX')]).writeto(dark_file)
+
+    obs, coeffs, lin_satmap = make_observation(tmp_path)
+    obs.stream_integrations = 2
+    obs.linear_dark = obs.read_dark_file(dark_file)
+    assert obs.linear_dark.data.shape == (1, 3, 20, 20)
+    assert obs.linear_dark.zeroframe.shape == (1, 20, 20)
+
+    # Record the names of the accuracy maps
+    accuracy_files = []
+    original = unlinearize.unlinearize
+
+    def record_unlinearize(*args, **kwargs):
+        if kwargs['save_accuracy_map']:
+            accuracy_files.append(os.path.basename(kwargs['accuracy_file']))
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(unlinearize, 'unlinearize', record_unlinearize)
+    accuracy_file = str(tmp_path / 'exposure_doNonLin_accuracy.fits')
+    products = obs.process_exposure_in_chunks(None, coeffs, lin_satmap, accuracy_file=accuracy_file)
+    for key in truth:
+        assert np.array_equal(products[key], truth[key].astype(products[key].dtype))
+
+    # Accuracy maps are numbered by the first integration of each block,
+    # starting at 1
+    assert accuracy_files == ['exposure_int{:04d}_doNonLin_accuracy.fits'.format(number) for number in [1, 3, 5]]
@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+
+"""Tests for the insertion of non-linearity into linear ramps by
+``unlinearize.py``
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_unlinearize.py
+"""
+import os
+
+from astropy.io import fits
+import numpy as np
+
+from mirage.ramp_generator import unlinearize
+
+
+def linearity_inputs(shape):
+    """Create a linear ramp, linearity coefficients and saturation maps
+    similar to those of NIRCam detectors
+    """
+    np.random.seed(4)
+    yd, xd = shape[-2:]
+    coeffs = np.zeros((5, yd, xd))
+    coeffs[1] = 1.
+    coeffs[2] = np.random.uniform(1e-6, 3e-6, (yd, xd))
+    coeffs[3] = np.random.uniform(1e-12, 3e-11, (yd, xd))
+    coeffs[4] = np.random.uniform(-1e-16, 1e-16, (yd, xd))
+    sat = np.full((yd, xd), 60000.)
+    lin_satmap = unlinearize.nonLinFunc(sat, coeffs, sat + 1.)
+    image = np.random.uniform(-100., 60000., shape)
+    # Some pixels are above the linearized saturation level
+    image[..., 0, 0:5] = lin_satmap[0, 0:5] + 10.
+    return image, coeffs, sat, lin_satmap
+
+
+def test_nonlin_value_and_derivative():
+    """The single pass polynomial evaluation should match nonLinFunc and
+    nonLinDeriv
+    """
+    image, coeffs, sat, _ = linearity_inputs((6, 7))
+    values = np.abs(image)
+    value, deriv = unlinearize.nonlin_value_and_derivative(values.ravel(), coeffs.reshape(5, -1))
+    assert np.allclose(value, unlinearize.nonLinFunc(values, coeffs, values + 1.).ravel())
+    assert np.allclose(deriv, unlinearize.nonLinDeriv(values, coeffs, values + 1.).ravel())
+
+
+def test_unlinearize():
+    """Unlinearized signals should be linearized back to the input values,
+    and pixels outside the valid signal range should be unchanged
+    """
+    image, coeffs, sat, lin_satmap = linearity_inputs((2, 3, 20, 25))
+    good = (image > 0.) & (image < lin_satmap)
+
+    raw = unlinearize.unlinearize(image, coeffs, sat, lin_satmap, maxiter=10, accuracy=1e-6)
+    assert raw.shape == image.shape
+    assert np.array_equal(raw[~good], image[~good])
+    relinearized = unlinearize.nonLinFunc(raw, coeffs, sat)
+    assert np.all(np.abs(relinearized[good] / image[good] - 1.) <= 1e-6)
+    assert np.all(raw[good] < image[good])
+
+    # Processing a block of groups at a time gives the same result
+    unlinearize.UNLINEARIZE_BLOCK_PIXEL_LIMIT, limit = 1, unlinearize.UNLINEARIZE_BLOCK_PIXEL_LIMIT
+    try:
+        blocks = unlinearize.unlinearize(image, coeffs, sat, lin_satmap, maxiter=10, accuracy=1e-6)
+    finally:
+        unlinearize.UNLINEARIZE_BLOCK_PIXEL_LIMIT = limit
+    assert np.array_equal(raw, blocks)
+
+    # Lower accuracy requirements are met using float32 arithmetic
+    raw32 = unlinearize.unlinearize(image, coeffs, sat, lin_satmap, maxiter=10, accuracy=1e-4)
+    assert np.all(np.abs(unlinearize.nonLinFunc(raw32, coeffs, sat)[good] / image[good] - 1.) <= 1e-4)
+
+
+def test_unlinearize_accuracy_map(tmp_path):
+    """Pixels that do not converge should be recorded in the accuracy map"""
+    image, coeffs, sat, lin_satmap = linearity_inputs((20, 25))
+    good = (image > 0.) & (image < lin_satmap)
+    accuracy_file = os.path.join(tmp_path, 'accuracy.fits')
+    unlinearize.unlinearize(image, coeffs, sat, lin_satmap, maxiter=1, accuracy=1e-12,
+                            save_accuracy_map=True, accuracy_file=accuracy_file)
+    accuracy = fits.getdata(accuracy_file, 1)
+    assert np.all(accuracy[~good] == -1.)
+    assert np.all(accuracy[good] >= 0.)
+    assert np.any(accuracy[good] > 1e-12)
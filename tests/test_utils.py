@@ -12,6 +12,8 @@ Use
 
 """
 
+import numpy as np
+
 from mirage.utils import utils
 
 
@@ -72,4 +74,18 @@ def test_standardize_filters():
     filters = ['F090W', 'F115W/CLEAR', 'CLEAR/']
 
 
-
+def test_magnitude_countrate_columns():
+    """Whole columns of magnitudes and countrates should be converted at
+    once, matching conversions of the individual values
+    """
+    mags = [15., 18.5, 22.]
+    zeropoints = {'photfnu': 3e-31, 'photflam': 4e-21, 'vegamag_zeropoint': 26.}
+    for magsys in ['abmag', 'stmag', 'vegamag']:
+        countrates = utils.magnitude_to_countrate('niriss', 'F200W', magsys, mags, **zeropoints)
+        assert isinstance(countrates, np.ndarray)
+        for mag, countrate in zip(mags, countrates):
+            assert np.isclose(countrate, utils.magnitude_to_countrate('niriss', 'F200W', magsys, mag, **zeropoints),
+                              rtol=1e-12, atol=0.)
+
+        back = utils.countrate_to_magnitude('niriss', 'F200W', magsys, list(countrates), **zeropoints)
+        assert np.allclose(back, mags)
@@ -0,0 +1,66 @@
+#! /usr/bin/env python
+
+"""Tests for the creation of seed images and integrations in float32, as
+selected by the ``simSignals:working_precision`` yaml entry.
+
+Use
+---
+
+    These tests can be run via the command line:
+
+    ::
+
+        pytest -s test_working_precision.py
+"""
+import numpy as np
+import pytest
+
+from mirage.utils import utils
+from .test_batch_stamps import create_seed_object, create_source_table
+from .test_stream_integrations import make_observation
+
+
+def test_get_working_precision():
+    """The working precision should default to float64"""
+    assert utils.get_working_precision({'simSignals': {}}) is np.float64
+    assert utils.get_working_precision({'simSignals': {'working_precision': 'FLOAT32'}}) is np.float32
+    with pytest.raises(ValueError):
+        utils.get_working_precision({'simSignals': {'working_precision': 'float16'}})
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_point_source_image_precision():
+    """Point source images created in float32 should match those created
+    in float64 to within float32 rounding
+    """
+    sources = create_source_table()
+    images = {}
+    for dtype in [np.float64, np.float32]:
+        seed = create_seed_object()
+        seed.working_dtype = dtype
+        images[dtype], _ = seed.make_point_source_image(sources)
+        assert images[dtype].dtype == dtype
+    assert np.allclose(images[np.float32], images[np.float64], rtol=1e-5, atol=1e-3)
+
+
+@pytest.mark.usefixtures('mirage_data')
+def test_integration_precision(tmp_path):
+    """Linear and raw integrations created in float32 should match those
+    created in float64 to well within the noise
+    """
+    for vectorized in [True, False]:
+        products = {}
+        for dtype in [np.float64, np.float32]:
+            obs, coeffs, lin_satmap = make_observation(tmp_path)
+            obs.vectorized_ramp = vectorized
+            obs.working_dtype = dtype
+            obs.linear_dark.data = obs.linear_dark.data.astype(np.float32)
+            obs.linear_dark.sbAndRefpix = obs.linear_dark.sbAndRefpix.astype(np.float32)
+            simexp, simzero = obs.add_crs_and_noise(obs.seed_image)
+            assert simexp.dtype == dtype
+            products[dtype] = obs.process_integrations(simexp, simzero, obs.linear_dark, coeffs, lin_satmap)
+
+        for key in ['lin_outramp', 'raw_outramp']:
+            assert products[np.float32][key].dtype == np.float32
+            assert np.allclose(products[np.float32][key], products[np.float64][key], rtol=0., atol=0.01)
+        assert np.array_equal(products[np.float32]['groupdq'], products[np.float64]['groupdq'])